@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Benchmark micro-batched Gemini analysis against a local stub LLM server.
+
+Usage:
+    python scripts/bench_llm_batching.py [--commands N] [--latency-ms MS]
+        [--per-item-ms MS] [--malformed RATE] [--batch-sizes 1,4,8,16,32]
+
+Starts a stub HTTP server that answers both the single-command and the
+batched prompt after ``latency + per_item * items`` milliseconds, points
+:class:`GeminiAnalysisEngine` at it, and fires ``--commands`` distinct
+concurrent analyses for every batch size.  Prints throughput, latency
+percentiles and the number of upstream calls.  ``--malformed`` corrupts
+that fraction of batched items to exercise the single-call fallback.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import socket
+import sys
+import time
+from pathlib import Path
+from typing import Any
+from unittest.mock import patch
+
+# Ensure the project root is on sys.path so imports work when running as a script
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import httpx
+import uvicorn
+from pydantic import SecretStr
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from iotguard.analysis.engines.gemini import GeminiAnalysisEngine
+from iotguard.core.config import GeminiSettings
+
+_BATCH_MARKER = "**Commands:**"
+
+
+def _stub_app(
+    latency: float, per_item: float, malformed: float, stats: dict[str, int]
+) -> Starlette:
+    rng = random.Random(7)  # noqa: S311 - reproducible, not security-sensitive
+
+    async def generate(request: Request) -> JSONResponse:
+        prompt = (await request.json())["prompt"]
+        stats["calls"] += 1
+        if _BATCH_MARKER in prompt:
+            items = json.loads(prompt.rsplit(_BATCH_MARKER, 1)[1])
+            await asyncio.sleep(latency + per_item * len(items))
+            verdicts = [
+                {"id": item["id"], "risk_level": "LOW", "explanation": "stub"}
+                for item in items
+                if rng.random() >= malformed
+            ]
+            return JSONResponse({"text": json.dumps(verdicts)})
+        await asyncio.sleep(latency + per_item)
+        return JSONResponse({"text": json.dumps({"risk_level": "LOW", "explanation": "stub"})})
+
+    return Starlette(routes=[Route("/generate", generate, methods=["POST"])])
+
+
+class _StubModel:
+    """Stands in for ``genai.GenerativeModel``, forwarding to the stub server."""
+
+    client: httpx.AsyncClient
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    async def generate_content_async(self, prompt: str) -> Any:
+        response = await self.client.post("/generate", json={"prompt": prompt})
+        response.raise_for_status()
+        return type("Response", (), {"text": response.json()["text"]})()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _run_one(batch_size: int, commands: int, stats: dict[str, int]) -> None:
+    settings = GeminiSettings(
+        api_key=SecretStr("stub"),
+        max_concurrency=8,
+        batch_max_items=batch_size,
+        batch_max_wait_ms=10.0,
+    )
+    engine = GeminiAnalysisEngine(settings)
+    latencies: list[float] = []
+
+    async def one(i: int) -> None:
+        start = time.perf_counter()
+        await engine.analyze(f"set thermostat_{i} target {i % 30}", {"device_id": f"d{i}"})
+        latencies.append(time.perf_counter() - start)
+
+    stats["calls"] = 0
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(commands)))
+    elapsed = time.perf_counter() - start
+    await engine.aclose()
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(
+        f"{batch_size:>6} {commands / elapsed:>12.1f} {p50:>10.1f} {p99:>10.1f}"
+        f" {stats['calls']:>8}"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    stats = {"calls": 0}
+    port = _free_port()
+    app = _stub_app(args.latency_ms / 1000, args.per_item_ms / 1000, args.malformed, stats)
+    server = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    limits = httpx.Limits(max_connections=64)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits) as client:
+        _StubModel.client = client
+        with (
+            patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _StubModel),
+            patch("iotguard.analysis.engines.gemini.genai.configure"),
+        ):
+            print(f"{'batch':>6} {'cmds/s':>12} {'p50 ms':>10} {'p99 ms':>10} {'calls':>8}")
+            for batch_size in args.batch_sizes:
+                await _run_one(batch_size, args.commands, stats)
+
+    server.should_exit = True
+    await serving
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=500, help="analyses per batch size")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fixed stub latency")
+    parser.add_argument("--per-item-ms", type=float, default=5.0, help="stub latency per item")
+    parser.add_argument("--malformed", type=float, default=0.0, help="fraction of bad items")
+    parser.add_argument(
+        "--batch-sizes",
+        type=lambda v: [int(x) for x in v.split(",")],
+        default=[1, 4, 8, 16, 32],
+        help="comma-separated GEMINI_BATCH_MAX_ITEMS values",
+    )
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
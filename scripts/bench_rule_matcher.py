@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""Benchmark the rule matcher back-ends at 10, 100 and 1000 rules.
+
+Usage:
+    python scripts/bench_rule_matcher.py [--commands N]
+
+Generates synthetic rules shaped like the seeded ones (literal keywords,
+alternations and numeric thresholds) plus a sprinkling of patterns without
+a literal prefix, then times every back-end over the same commands and
+checks that they agree.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+# Ensure the project root is on sys.path so imports work when running as a script
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from iotguard.analysis.rules.matcher import MATCHER_BACKENDS, build_matcher
+
+_VERBS = ["set", "get", "start", "stop", "flash", "update", "change", "reset", "unlock", "open"]
+_NOUNS = ["temperature", "wifi", "ssid", "proxy", "dns", "firmware", "camera", "door", "fan"]
+
+
+def _make_patterns(count: int, rng: random.Random) -> list[str]:
+    patterns: list[str] = []
+    for i in range(count):
+        verb, noun = rng.choice(_VERBS), rng.choice(_NOUNS)
+        kind = i % 10
+        if kind < 5:
+            patterns.append(rf"{verb}_{noun}{i}")
+        elif kind < 8:
+            patterns.append(rf"({verb}_{noun}{i}|{noun}_{verb}{i}|ota{i})")
+        elif kind == 8:
+            patterns.append(rf"{noun}{i}\s+(3[5-9]|[4-9]\d|\d{{3,}})")
+        else:
+            patterns.append(rf"\d+\s*{noun}{i}")
+    return patterns
+
+
+def _make_commands(count: int, rule_count: int, rng: random.Random) -> list[str]:
+    commands: list[str] = []
+    for _ in range(count):
+        verb, noun = rng.choice(_VERBS), rng.choice(_NOUNS)
+        n = rng.randrange(rule_count * 2)
+        commands.append(f"device-{n} {verb}_{noun}{n} {rng.randint(0, 120)} --force")
+    return commands
+
+
+def run(command_count: int) -> None:
+    rng = random.Random(42)  # noqa: S311 - reproducible workload
+    print(f"{'rules':>6} " + " ".join(f"{b + ' us/cmd':>16}" for b in MATCHER_BACKENDS))
+    for rule_count in (10, 100, 1000):
+        regexes = [re.compile(p, re.IGNORECASE) for p in _make_patterns(rule_count, rng)]
+        commands = _make_commands(command_count, rule_count, rng)
+        timings: list[float] = []
+        results: list[list[list[int]]] = []
+        for backend in MATCHER_BACKENDS:
+            matcher = build_matcher(backend, regexes)
+            start = time.perf_counter()
+            results.append([matcher.match(c) for c in commands])
+            timings.append((time.perf_counter() - start) / command_count * 1e6)
+        if any(r != results[0] for r in results[1:]):
+            raise SystemExit(f"matcher back-ends disagree at {rule_count} rules")
+        print(f"{rule_count:>6} " + " ".join(f"{t:>16.1f}" for t in timings))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=2000, help="commands per rule count")
+    args = parser.parse_args()
+    run(args.commands)
+
+
+if __name__ == "__main__":
+    main()
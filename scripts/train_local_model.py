@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Retrain or evaluate the local risk classifier from ``command_logs``.
+
+Usage:
+    python scripts/train_local_model.py train [--output PATH] [--since ISO]
+        [--until ISO] [--holdout 0.2] [--dimensions 65536] [--epochs 200]
+        [--learning-rate 0.05] [--l2 1e-5] [--no-balance] [--seed 7]
+    python scripts/train_local_model.py evaluate [--model PATH]
+        [--since ISO] [--until ISO]
+
+``train`` fits on the logged verdicts (blocked commands count as at least
+HIGH), reports quality on a random ``--holdout`` split and writes the
+artifact to ``--output`` (default ``LOCAL_MODEL_PATH``); the hold-out
+report is stored in its ``meta.json``.  ``evaluate`` scores an existing
+artifact against the logs of a time window, e.g. traffic since it was
+trained.  Both print accuracy, per-class precision and recall, the share
+of HIGH/CRITICAL commands predicted below HIGH, and inference latency.
+
+Requires a running PostgreSQL instance configured via environment variables
+(or .env file) and numpy (``pip install iotguard[ml]``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Ensure the project root is on sys.path so imports work when running as a script
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import numpy as np
+
+from iotguard.analysis.classifier import (
+    LABELS,
+    ClassifierReport,
+    Example,
+    RiskClassifier,
+    evaluate,
+    training_label,
+)
+from iotguard.analysis.features import device_key
+from iotguard.analysis.models import RiskLevel
+from iotguard.core.config import get_settings
+from iotguard.db.engine import dispose_engine, get_session_factory
+from iotguard.db.repositories import CommandLogRepository
+
+
+async def _load(
+    since: datetime | None,
+    until: datetime | None,
+) -> tuple[list[Example], list[RiskLevel]]:
+    """Read the labelled commands of the window from the database."""
+    settings = get_settings()
+    examples: list[Example] = []
+    labels: list[RiskLevel] = []
+    try:
+        async with get_session_factory(settings.database)() as session:
+            batches = CommandLogRepository(session).stream_labels(since=since, until=until)
+            async for batch in batches:
+                for command, device_type, risk_level, was_blocked in batch:
+                    examples.append((command, device_key({"device_type": device_type})))
+                    labels.append(training_label(risk_level, bool(was_blocked)))
+    finally:
+        await dispose_engine()
+    return examples, labels
+
+
+def _latency(model: RiskClassifier, examples: list[Example]) -> tuple[float, float]:
+    """Mean microseconds per command, scored one at a time and in one batch."""
+    sample = examples[:1000]
+    start = time.perf_counter()
+    for command, device in sample:
+        model.predict(command, device)
+    single = (time.perf_counter() - start) / len(sample)
+    start = time.perf_counter()
+    model.predict_batch(sample)
+    batch = (time.perf_counter() - start) / len(sample)
+    return single * 1e6, batch * 1e6
+
+
+def _print_report(report: ClassifierReport, latency: tuple[float, float] | None) -> None:
+    print(f"samples        {report.samples}")
+    print(f"accuracy       {report.accuracy:.3f}")
+    print(f"underestimated {report.underestimated:.3f}  (HIGH/CRITICAL predicted below HIGH)")
+    print(f"\n{'class':>10} {'precision':>10} {'recall':>8} {'support':>8}")
+    for level in LABELS:
+        name = level.value
+        print(
+            f"{name:>10} {report.precision[name]:>10.3f} {report.recall[name]:>8.3f} "
+            f"{report.support[name]:>8}"
+        )
+    print("\nconfusion (rows: logged, columns: predicted)")
+    print(" " * 10 + "".join(f"{level.value:>10}" for level in LABELS))
+    for level, row in zip(LABELS, report.confusion, strict=True):
+        print(f"{level.value:>10}" + "".join(f"{count:>10}" for count in row))
+    if latency is not None:
+        print(f"\nlatency        {latency[0]:.1f} us/command single, {latency[1]:.1f} batched")
+
+
+async def train(args: argparse.Namespace) -> int:
+    examples, labels = await _load(args.since, args.until)
+    if len(examples) < 2:
+        print(f"Not enough labelled commands to train on ({len(examples)}).", file=sys.stderr)
+        return 1
+
+    order = np.random.default_rng(args.seed).permutation(len(examples))
+    cut = int(len(order) * (1 - args.holdout)) if args.holdout > 0 else len(order)
+    cut = min(max(cut, 1), len(order))
+    train_idx, test_idx = order[:cut], order[cut:]
+
+    start = time.perf_counter()
+    model = RiskClassifier.train(
+        [examples[i] for i in train_idx],
+        [labels[i] for i in train_idx],
+        dimensions=args.dimensions,
+        epochs=args.epochs,
+        learning_rate=args.learning_rate,
+        l2=args.l2,
+        balanced=args.balance,
+    )
+    print(f"Trained on {len(train_idx)} commands in {time.perf_counter() - start:.1f}s.")
+
+    if len(test_idx):
+        holdout = [examples[i] for i in test_idx]
+        report = evaluate(model, holdout, [labels[i] for i in test_idx])
+        model.meta["holdout"] = report.as_dict()
+        print(f"\nHold-out ({len(test_idx)} commands):")
+        _print_report(report, _latency(model, holdout))
+
+    path = model.save(args.output)
+    print(f"\nWrote {path}")
+    return 0
+
+
+async def evaluate_model(args: argparse.Namespace) -> int:
+    model = RiskClassifier.load(args.model)
+    examples, labels = await _load(args.since, args.until)
+    if not examples:
+        print("No labelled commands in the window.", file=sys.stderr)
+        return 1
+    print(f"Model {args.model} trained at {model.meta.get('trained_at')}\n")
+    _print_report(evaluate(model, examples, labels), _latency(model, examples))
+    return 0
+
+
+def main() -> None:
+    default_path = get_settings().local_model.path
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="action", required=True)
+
+    train_cmd = commands.add_parser("train", help="fit a new model and write the artifact")
+    train_cmd.add_argument("--output", default=default_path, help="artifact directory")
+    train_cmd.add_argument("--holdout", type=float, default=0.2, help="fraction held out")
+    train_cmd.add_argument("--dimensions", type=int, default=1 << 16, help="hashed features")
+    train_cmd.add_argument("--epochs", type=int, default=200)
+    train_cmd.add_argument("--learning-rate", type=float, default=0.05)
+    train_cmd.add_argument("--l2", type=float, default=1e-5, help="weight decay")
+    train_cmd.add_argument(
+        "--no-balance",
+        dest="balance",
+        action="store_false",
+        help="do not weight classes by inverse frequency",
+    )
+    train_cmd.add_argument("--seed", type=int, default=7, help="hold-out split seed")
+
+    eval_cmd = commands.add_parser("evaluate", help="score an artifact against the logs")
+    eval_cmd.add_argument("--model", default=default_path, help="artifact directory")
+
+    for cmd in (train_cmd, eval_cmd):
+        cmd.add_argument("--since", type=datetime.fromisoformat, help="oldest log (ISO 8601)")
+        cmd.add_argument("--until", type=datetime.fromisoformat, help="newest log (ISO 8601)")
+
+    args = parser.parse_args()
+    runner = train if args.action == "train" else evaluate_model
+    sys.exit(asyncio.run(runner(args)))
+
+
+if __name__ == "__main__":
+    main()
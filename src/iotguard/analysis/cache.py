@@ -0,0 +1,265 @@
+"""Two-tier cache of LLM analysis verdicts.
+
+:class:`VerdictCache` keeps recently used verdicts in an in-process LRU
+(L1, bounded by entry count and serialised bytes) in front of the shared
+Redis cache (L2).  L1 hits cost neither a round trip nor JSON decoding and
+model reconstruction.
+
+* Freshness depends on the verdict: ``CACHE_TTL_<RISK>`` lets safe verdicts
+  live longer than critical ones.  L1 copies are capped at ``CACHE_L1_TTL``
+  so workers pick up other workers' writes.
+* Failed LLM calls are cached briefly (``CACHE_NEGATIVE_TTL``) so a burst
+  of retries for the same command does not hammer a failing upstream.
+* A verdict past its TTL is still returned, marked ``stale``, for
+  ``CACHE_STALE_TTL`` seconds; the caller serves it and refreshes it in
+  the background.
+
+Redis entries carry their ``fresh_until`` timestamp, so staleness is
+judged the same way on every worker.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import time
+import weakref
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any, cast
+
+import structlog
+
+from iotguard.analysis.models import AnalysisResult, RiskLevel
+from iotguard.core.config import CacheSettings
+from iotguard.observability.metrics import (
+    analysis_cache_l1_bytes,
+    analysis_cache_requests_total,
+)
+
+logger = structlog.get_logger(__name__)
+
+#: Longest error text kept in a negative entry.
+_MAX_ERROR_LEN = 200
+
+# Every live cache; the L1 bytes gauge reports their total, as each LLM
+# engine (a cascade has several) owns one.
+_caches: weakref.WeakSet[VerdictCache] = weakref.WeakSet()
+
+
+@dataclass(frozen=True, slots=True)
+class CachedVerdict:
+    """A cache hit: either a result or the error of a recent failed call."""
+
+    result: AnalysisResult | None
+    error: str | None = None
+    stale: bool = False
+
+
+@dataclass(slots=True)
+class _Entry:
+    result: AnalysisResult | None
+    error: str | None
+    fresh_until: float
+    stale_until: float
+    expires_at: float  # end of this L1 copy's life
+    size: int
+
+
+class VerdictCache:
+    """In-process LRU (L1) in front of an optional Redis cache (L2)."""
+
+    def __init__(
+        self,
+        settings: CacheSettings,
+        *,
+        redis: Any | None = None,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self._settings = settings
+        self._redis = redis
+        self._clock = clock
+        self._l1: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._ttls = {
+            RiskLevel.NONE: settings.ttl_none,
+            RiskLevel.LOW: settings.ttl_low,
+            RiskLevel.MEDIUM: settings.ttl_medium,
+            RiskLevel.HIGH: settings.ttl_high,
+            RiskLevel.CRITICAL: settings.ttl_critical,
+        }
+        _caches.add(self)
+
+    def __len__(self) -> int:
+        return len(self._l1)
+
+    @property
+    def nbytes(self) -> int:
+        """Serialised size of the L1 entries."""
+        return self._bytes
+
+    def ttl_for(self, risk_level: RiskLevel) -> float:
+        """Seconds a verdict of *risk_level* stays fresh."""
+        return self._ttls[risk_level]
+
+    # -- lookups ------------------------------------------------------------
+
+    async def get(self, key: str) -> CachedVerdict | None:
+        """Return the cached verdict for *key*, or ``None`` on a miss."""
+        now = self._clock()
+        entry = self._l1.get(key)
+        if entry is not None:
+            if now < entry.expires_at:
+                self._l1.move_to_end(key)
+                return self._hit("l1", entry, now)
+            self._evict(key)
+        if self._redis is None:
+            analysis_cache_requests_total.labels(tier="l1", result="miss").inc()
+            return None
+
+        try:
+            raw = await self._redis.get(key)
+            if raw is None:
+                analysis_cache_requests_total.labels(tier="l2", result="miss").inc()
+                return None
+            entry = self._decode(raw)
+        except Exception:
+            logger.debug("cache_read_error", key=key)
+            return None
+        if now >= entry.stale_until:
+            analysis_cache_requests_total.labels(tier="l2", result="miss").inc()
+            return None
+        self._store_l1(key, entry)
+        return self._hit("l2", entry, now)
+
+    # -- writes -------------------------------------------------------------
+
+    async def put(self, key: str, result: AnalysisResult) -> None:
+        """Cache *result* for its risk level's TTL."""
+        now = self._clock()
+        fresh_until = now + self.ttl_for(result.risk_level)
+        payload = result.model_dump(mode="json")
+        await self._store(
+            key,
+            payload,
+            result=result,
+            error=None,
+            fresh_until=fresh_until,
+            stale_until=fresh_until + self._settings.stale_ttl,
+        )
+
+    async def put_error(self, key: str, error: str) -> None:
+        """Remember that the call for *key* just failed."""
+        if self._settings.negative_ttl <= 0:
+            return
+        error = error[:_MAX_ERROR_LEN]
+        fresh_until = self._clock() + self._settings.negative_ttl
+        await self._store(
+            key,
+            {"error": error},
+            result=None,
+            error=error,
+            fresh_until=fresh_until,
+            stale_until=fresh_until,
+        )
+
+    def clear(self) -> None:
+        """Drop every L1 entry (L2 is left alone)."""
+        self._l1.clear()
+        self._bytes = 0
+
+    # -- internals ----------------------------------------------------------
+
+    def _hit(self, tier: str, entry: _Entry, now: float) -> CachedVerdict:
+        if entry.error is not None:
+            analysis_cache_requests_total.labels(tier=tier, result="negative").inc()
+            return CachedVerdict(result=None, error=entry.error)
+        stale = now >= entry.fresh_until
+        analysis_cache_requests_total.labels(tier=tier, result="stale" if stale else "hit").inc()
+        # Without an error the entry holds a result.  Copied so callers
+        # cannot mutate the shared L1 instance.
+        result = cast(AnalysisResult, entry.result)
+        return CachedVerdict(result=result.model_copy(), stale=stale)
+
+    async def _store(
+        self,
+        key: str,
+        payload: dict[str, Any],
+        *,
+        result: AnalysisResult | None,
+        error: str | None,
+        fresh_until: float,
+        stale_until: float,
+    ) -> None:
+        payload["fresh_until"] = fresh_until
+        raw = json.dumps(payload)
+        self._store_l1(
+            key,
+            _Entry(
+                result=result,
+                error=error,
+                fresh_until=fresh_until,
+                stale_until=stale_until,
+                expires_at=0.0,
+                size=len(raw),
+            ),
+        )
+        if self._redis is None:
+            return
+        try:
+            ttl = max(1, math.ceil(stale_until - self._clock()))
+            await self._redis.set(key, raw, ex=ttl)
+        except Exception:
+            logger.debug("cache_write_error", key=key)
+
+    def _decode(self, raw: bytes | str) -> _Entry:
+        data = json.loads(raw)
+        # Entries written before freshness was recorded count as fresh.
+        fresh_until = data.pop("fresh_until", math.inf)
+        error = data.get("error")
+        if error is not None:
+            return _Entry(None, error, fresh_until, fresh_until, 0.0, len(raw))
+        result = AnalysisResult(
+            risk_level=RiskLevel(data["risk_level"]),
+            explanation=data["explanation"],
+            suggestions=data.get("suggestions", []),
+            safe_alternatives=data.get("safe_alternatives", []),
+            rule_violations=data.get("rule_violations", []),
+            was_blocked=data.get("was_blocked", False),
+            confidence=data.get("confidence"),
+        )
+        return _Entry(
+            result,
+            None,
+            fresh_until,
+            fresh_until + self._settings.stale_ttl,
+            0.0,
+            len(raw),
+        )
+
+    def _store_l1(self, key: str, entry: _Entry) -> None:
+        settings = self._settings
+        if settings.l1_max_entries <= 0 or entry.size > settings.l1_max_bytes:
+            return
+        # Without Redis there is nothing shared to re-read, so L1 keeps the
+        # entry for its whole life.
+        entry.expires_at = (
+            entry.stale_until
+            if self._redis is None
+            else min(entry.stale_until, self._clock() + settings.l1_ttl)
+        )
+        self._evict(key)
+        self._l1[key] = entry
+        self._bytes += entry.size
+        while len(self._l1) > settings.l1_max_entries or self._bytes > settings.l1_max_bytes:
+            _, old = self._l1.popitem(last=False)
+            self._bytes -= old.size
+
+    def _evict(self, key: str) -> None:
+        old = self._l1.pop(key, None)
+        if old is not None:
+            self._bytes -= old.size
+
+
+analysis_cache_l1_bytes.set_function(lambda: sum(cache.nbytes for cache in list(_caches)))
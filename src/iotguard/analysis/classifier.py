@@ -0,0 +1,345 @@
+"""Linear risk classifier trained from the command log (CPU only, NumPy).
+
+When Gemini is unavailable the rules alone often have nothing to say about
+a command.  :class:`RiskClassifier` is a multinomial logistic regression
+over the hashed n-gram features of :mod:`iotguard.analysis.features`, plus
+the device type and its pairing with the command's verb, trained offline
+from ``command_logs`` verdicts.  Scoring one command is a gather of a few
+dozen weight rows, so it answers in microseconds; :meth:`RiskClassifier.predict_batch`
+scores many commands with one pass per risk level.
+
+The artifact is a directory holding ``weights.npy``, ``bias.npy`` and
+``meta.json``.  Weights are loaded memory-mapped, so workers share the
+page cache instead of each holding a copy.
+
+Training labels are the logged ``risk_level``, raised to at least HIGH
+for commands that were blocked.  Classes are weighted by inverse
+frequency by default: the log is mostly safe commands, and a model that
+only ever says NONE is accurate and useless.
+
+Requires the optional ``numpy`` dependency (``pip install iotguard[ml]``).
+See ``scripts/train_local_model.py`` for retraining and evaluation.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+from collections.abc import Sequence
+from dataclasses import asdict, dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any
+
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.features import command_features, hashed_features
+from iotguard.analysis.models import RiskLevel
+from iotguard.core.exceptions import ConfigError
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None  # type: ignore[assignment]
+
+#: Class order of the model's outputs, safest first.
+LABELS: tuple[RiskLevel, ...] = tuple(RiskLevel)
+
+_FORMAT = 1
+_CONTEXT_WEIGHT = 3.0
+_RISK_INDEX = {level: i for i, level in enumerate(LABELS)}
+
+#: A command and the device type it was sent to ("*" if unknown).
+Example = tuple[str | ParsedCommand, str]
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ConfigError("the local risk classifier requires numpy; install iotguard[ml]")
+
+
+def training_label(risk_level: str, was_blocked: bool) -> RiskLevel:
+    """The class a logged verdict teaches; blocked commands are at least HIGH."""
+    try:
+        level = RiskLevel(risk_level.upper())
+    except ValueError:
+        level = RiskLevel.MEDIUM
+    if was_blocked and _RISK_INDEX[level] < _RISK_INDEX[RiskLevel.HIGH]:
+        return RiskLevel.HIGH
+    return level
+
+
+def _vector(
+    command: str | ParsedCommand,
+    device: str,
+    dimensions: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the ``(indices, values)`` of one unit-length example vector."""
+    parsed = ParsedCommand.of(command)
+    grams, weights = command_features(parsed)
+    grams.append(f"d:{device}")
+    grams.append(f"dv:{device} {parsed.verb}")
+    weights.extend([_CONTEXT_WEIGHT, _CONTEXT_WEIGHT])
+    indices, values = hashed_features(grams, weights, dimensions)
+    values /= np.float32(math.sqrt(float(values @ values)))
+    return indices, values
+
+
+def _encode(
+    examples: Sequence[Example],
+    dimensions: int,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return ``(rows, indices, values)`` of many example vectors."""
+    if not examples:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty, np.zeros(0, dtype=np.float32)
+    vectors = [_vector(command, device, dimensions) for command, device in examples]
+    rows = np.repeat(np.arange(len(vectors)), [len(indices) for indices, _ in vectors])
+    indices = np.concatenate([indices for indices, _ in vectors])
+    values = np.concatenate([values for _, values in vectors])
+    return rows, indices, values
+
+
+def _logits(
+    weights: np.ndarray,
+    bias: np.ndarray,
+    encoded: tuple[np.ndarray, np.ndarray, np.ndarray],
+    n: int,
+) -> np.ndarray:
+    rows, indices, values = encoded
+    gathered = weights[indices] * values[:, None]
+    columns = [np.bincount(rows, weights=gathered[:, k], minlength=n) for k in range(len(bias))]
+    return np.asarray(np.stack(columns, axis=1) + bias)
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return np.asarray(shifted / shifted.sum(axis=-1, keepdims=True))
+
+
+class RiskClassifier:
+    """Softmax regression from hashed command features to risk levels."""
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        *,
+        meta: dict[str, Any] | None = None,
+    ) -> None:
+        _require_numpy()
+        if weights.ndim != 2 or weights.shape[1] != len(LABELS) or bias.shape != (len(LABELS),):
+            raise ConfigError(
+                f"risk classifier weights have shape {weights.shape}, bias {bias.shape}; "
+                f"expected (dimensions, {len(LABELS)}) and ({len(LABELS)},)"
+            )
+        # A plain view of a memory map gathers rows about twice as fast.
+        self.weights = weights.view(np.ndarray) if isinstance(weights, np.memmap) else weights
+        self.bias = np.asarray(bias, dtype=np.float64)
+        self.meta = dict(meta or {})
+
+    @property
+    def dimensions(self) -> int:
+        return int(self.weights.shape[0])
+
+    # ------------------------------------------------------------------
+    # Inference
+    # ------------------------------------------------------------------
+
+    def predict_proba(self, command: str | ParsedCommand, device: str) -> np.ndarray:
+        """Class probabilities of one command, in :data:`LABELS` order."""
+        indices, values = _vector(command, device, self.dimensions)
+        logits = values @ self.weights[indices] + self.bias
+        return _softmax(logits)
+
+    def predict(self, command: str | ParsedCommand, device: str) -> tuple[RiskLevel, float]:
+        """The most likely risk level of one command and its probability."""
+        proba = self.predict_proba(command, device)
+        best = int(np.argmax(proba))
+        return LABELS[best], float(proba[best])
+
+    def predict_proba_batch(self, examples: Sequence[Example]) -> np.ndarray:
+        """Class probabilities of many commands, one row per example."""
+        encoded = _encode(examples, self.dimensions)
+        return _softmax(_logits(self.weights, self.bias, encoded, len(examples)))
+
+    def predict_batch(
+        self,
+        examples: Sequence[Example],
+    ) -> list[tuple[RiskLevel, float]]:
+        """Like :meth:`predict` for many commands at once."""
+        proba = self.predict_proba_batch(examples)
+        best = proba.argmax(axis=1)
+        scores = proba[np.arange(len(best)), best]
+        return [(LABELS[i], float(p)) for i, p in zip(best, scores, strict=True)]
+
+    # ------------------------------------------------------------------
+    # Training
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def train(
+        cls,
+        examples: Sequence[Example],
+        labels: Sequence[RiskLevel],
+        *,
+        dimensions: int = 1 << 16,
+        epochs: int = 200,
+        learning_rate: float = 0.05,
+        l2: float = 1e-5,
+        balanced: bool = True,
+    ) -> RiskClassifier:
+        """Fit a classifier with full-batch Adam on the L2-regularised log loss."""
+        _require_numpy()
+        if len(examples) != len(labels):
+            raise ValueError("examples and labels differ in length")
+        if not examples:
+            raise ValueError("cannot train on an empty data set")
+        n, k = len(examples), len(LABELS)
+        encoded = _encode(examples, dimensions)
+        rows, indices, values = encoded
+        target = np.array([_RISK_INDEX[RiskLevel(label)] for label in labels])
+        onehot = np.eye(k)[target]
+
+        counts = np.bincount(target, minlength=k)
+        if balanced:
+            present = np.count_nonzero(counts)
+            sample_weight = n / (present * counts[target])
+        else:
+            sample_weight = np.ones(n)
+
+        weights = np.zeros((dimensions, k))
+        bias = np.log((counts + 1.0) / (n + k))
+        params = [weights, bias]
+        moments = [np.zeros_like(p) for p in params]
+        squares = [np.zeros_like(p) for p in params]
+        beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+        for step in range(1, epochs + 1):
+            proba = _softmax(_logits(weights, bias, encoded, n))
+            delta = (proba - onehot) * (sample_weight / n)[:, None]
+            per_value = delta[rows] * values[:, None]
+            grad_w = np.stack(
+                [
+                    np.bincount(indices, weights=per_value[:, c], minlength=dimensions)
+                    for c in range(k)
+                ],
+                axis=1,
+            )
+            grads = [grad_w + l2 * weights, delta.sum(axis=0)]
+            for param, grad, m, v in zip(params, grads, moments, squares, strict=True):
+                m *= beta1
+                m += (1 - beta1) * grad
+                v *= beta2
+                v += (1 - beta2) * grad * grad
+                m_hat = m / (1 - beta1**step)
+                v_hat = v / (1 - beta2**step)
+                param -= learning_rate * m_hat / (np.sqrt(v_hat) + eps)
+
+        meta = {
+            "trained_at": datetime.now(UTC).isoformat(),
+            "samples": n,
+            "class_counts": {level.value: int(c) for level, c in zip(LABELS, counts, strict=True)},
+            "epochs": epochs,
+            "learning_rate": learning_rate,
+            "l2": l2,
+            "balanced": balanced,
+        }
+        return cls(weights.astype(np.float32), bias.astype(np.float32), meta=meta)
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self, path: str | Path) -> Path:
+        """Write the artifact directory *path* and return it."""
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "weights.npy", np.ascontiguousarray(self.weights, dtype=np.float32))
+        np.save(directory / "bias.npy", self.bias.astype(np.float32))
+        meta = {
+            **self.meta,
+            "format": _FORMAT,
+            "dimensions": self.dimensions,
+            "labels": [level.value for level in LABELS],
+        }
+        (directory / "meta.json").write_text(json.dumps(meta, indent=2, sort_keys=True))
+        return directory
+
+    @classmethod
+    def load(cls, path: str | Path, *, mmap: bool = True) -> RiskClassifier:
+        """Load an artifact written by :meth:`save`, memory-mapping the weights."""
+        _require_numpy()
+        directory = Path(path)
+        try:
+            meta = json.loads((directory / "meta.json").read_text())
+            weights = np.load(directory / "weights.npy", mmap_mode="r" if mmap else None)
+            bias = np.load(directory / "bias.npy")
+        except (OSError, ValueError) as exc:
+            raise ConfigError(f"cannot load risk classifier from {directory}: {exc}") from exc
+        if meta.get("format") != _FORMAT:
+            raise ConfigError(f"unsupported risk classifier format {meta.get('format')!r}")
+        if meta.get("labels") != [level.value for level in LABELS]:
+            raise ConfigError(f"risk classifier labels {meta.get('labels')} do not match")
+        return cls(weights, bias, meta=meta)
+
+
+# ---------------------------------------------------------------------------
+# Evaluation
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True, slots=True)
+class ClassifierReport:
+    """Hold-out quality of a classifier.
+
+    ``underestimated`` is the share of HIGH/CRITICAL commands predicted
+    below HIGH -- the mistake that lets a dangerous command through.
+    """
+
+    samples: int
+    accuracy: float
+    underestimated: float
+    precision: dict[str, float]
+    recall: dict[str, float]
+    support: dict[str, int]
+    confusion: list[list[int]]
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def evaluate(
+    classifier: RiskClassifier,
+    examples: Sequence[Example],
+    labels: Sequence[RiskLevel],
+) -> ClassifierReport:
+    """Score *classifier* on labelled *examples*."""
+    k = len(LABELS)
+    target = np.array([_RISK_INDEX[RiskLevel(label)] for label in labels], dtype=np.intp)
+    if len(examples):
+        predicted = classifier.predict_proba_batch(examples).argmax(axis=1)
+    else:
+        predicted = np.zeros(0, dtype=np.intp)
+    confusion = np.zeros((k, k), dtype=np.int64)
+    np.add.at(confusion, (target, predicted), 1)
+
+    true_pos = np.diag(confusion)
+    predicted_count = confusion.sum(axis=0)
+    support = confusion.sum(axis=1)
+    high = _RISK_INDEX[RiskLevel.HIGH]
+    dangerous = target >= high
+    return ClassifierReport(
+        samples=len(target),
+        accuracy=float(true_pos.sum() / max(len(target), 1)),
+        underestimated=float((predicted[dangerous] < high).sum() / max(dangerous.sum(), 1)),
+        precision={
+            level.value: float(true_pos[i] / predicted_count[i]) if predicted_count[i] else 0.0
+            for i, level in enumerate(LABELS)
+        },
+        recall={
+            level.value: float(true_pos[i] / support[i]) if support[i] else 0.0
+            for i, level in enumerate(LABELS)
+        },
+        support={level.value: int(support[i]) for i, level in enumerate(LABELS)},
+        confusion=confusion.tolist(),
+    )
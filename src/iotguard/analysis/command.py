@@ -0,0 +1,70 @@
+"""Parsed form of an IoT command, built once per request.
+
+Rule matching, LLM caching and device simulation all need a view of the
+raw command string.  :class:`ParsedCommand` computes those views once and
+is passed through :class:`~iotguard.analysis.service.AnalysisService`, the
+analysis engines and :meth:`~iotguard.devices.service.DeviceService.execute_command`.
+
+Every consumer also accepts a plain string; :meth:`ParsedCommand.of`
+parses it on the spot.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from dataclasses import dataclass
+
+from iotguard.analysis.rules.memo import normalize_command
+
+_NUMBER = re.compile(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)")
+
+
+@dataclass(frozen=True, slots=True)
+class ParsedCommand:
+    """A command with its normalised text, tokens and parameters.
+
+    ``normalized`` collapses whitespace and case, so trivially different
+    spellings share ``digest``.  Security rules are still matched against
+    ``raw`` (patterns may depend on whitespace); ``folded`` is the
+    verdict-preserving key for that.
+    """
+
+    raw: str
+    normalized: str
+    tokens: tuple[str, ...]
+    verb: str
+    params: tuple[float, ...]
+    digest: str
+    folded: str
+
+    @classmethod
+    def parse(cls, command: str) -> ParsedCommand:
+        tokens = tuple(command.lower().split())
+        normalized = " ".join(tokens)
+        return cls(
+            raw=command,
+            normalized=normalized,
+            tokens=tokens,
+            verb=tokens[0] if tokens else "",
+            params=tuple(float(t) for t in tokens if _NUMBER.fullmatch(t)),
+            digest=hashlib.sha256(normalized.encode()).hexdigest()[:24],
+            folded=normalize_command(command),
+        )
+
+    @classmethod
+    def of(cls, command: str | ParsedCommand) -> ParsedCommand:
+        """Return *command* if already parsed, else parse it."""
+        return command if isinstance(command, ParsedCommand) else cls.parse(command)
+
+    def arg_after(self, token: str) -> str | None:
+        """Return the token following the first occurrence of *token*."""
+        tokens = self.tokens
+        try:
+            i = tokens.index(token)
+        except ValueError:
+            return None
+        return tokens[i + 1] if i + 1 < len(tokens) else None
+
+    def __str__(self) -> str:
+        return self.raw
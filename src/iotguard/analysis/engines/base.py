@@ -1,13 +1,17 @@
 """Protocol definition for pluggable analysis engines.
 
 Any class that implements :class:`AnalysisEngine` can be injected into the
-:class:`~iotguard.analysis.service.AnalysisService` pipeline.
+:class:`~iotguard.analysis.service.AnalysisService` pipeline.  The request's
+deadline, if any, is available to engines through
+:func:`~iotguard.core.deadline.current_deadline`; engines that cannot finish
+in time should raise :class:`~iotguard.core.exceptions.DeadlineExceededError`.
 """
 
 from __future__ import annotations
 
 from typing import Any, Protocol, runtime_checkable
 
+from iotguard.analysis.command import ParsedCommand
 from iotguard.analysis.models import AnalysisResult
 
 
@@ -17,7 +21,7 @@ class AnalysisEngine(Protocol):
 
     async def analyze(
         self,
-        command: str,
+        command: str | ParsedCommand,
         device_context: dict[str, Any],
     ) -> AnalysisResult:
         """Evaluate *command* within the given *device_context*.
@@ -25,7 +29,8 @@ class AnalysisEngine(Protocol):
         Parameters
         ----------
         command:
-            The raw IoT command string to analyse.
+            The command to analyse, parsed once by the caller (plain
+            strings are accepted and parsed via :meth:`ParsedCommand.of`).
         device_context:
             Metadata about the target device (``device_id``, ``device_type``,
             ``is_online``, current ``state``, etc.).
@@ -0,0 +1,115 @@
+"""Micro-batching front end for LLM calls.
+
+Per-call overhead dominates when many analyses arrive at once.  A
+:class:`MicroBatcher` collects submitted items for at most ``max_wait``
+seconds or ``max_items`` items, hands them to a *send* function as one
+batch, and resolves every waiting caller with its own result.  A batch
+serves several requests, so it runs in a fresh :mod:`contextvars` context
+rather than inheriting the deadline of whichever caller filled it.
+
+*send* returns one entry per item; ``None`` marks an item whose part of the
+batch response was unusable.  That caller -- and only that caller -- then
+retries through *fallback*, normally a plain single-item call.
+
+Usage::
+
+    batcher = MicroBatcher("gemini", send_batch, call_one, max_items=16, max_wait=0.01)
+
+    result = await batcher.submit(item)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+from collections.abc import Awaitable, Callable, Sequence
+from typing import Generic, TypeVar
+
+import structlog
+
+from iotguard.observability.metrics import llm_batch_fallbacks_total, llm_batch_size
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    """Group concurrent submissions into batches of at most ``max_items``."""
+
+    def __init__(
+        self,
+        name: str,
+        send: Callable[[Sequence[T]], Awaitable[Sequence[R | None]]],
+        fallback: Callable[[T], Awaitable[R]],
+        *,
+        max_items: int,
+        max_wait: float,
+    ) -> None:
+        if max_items < 1:
+            raise ValueError("max_items must be at least 1")
+        self.name = name
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self._send = send
+        self._fallback = fallback
+        self._pending: list[tuple[T, asyncio.Future[R | None]]] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._batches: set[asyncio.Task[None]] = set()
+        self._size = llm_batch_size.labels(name=name)
+        self._fallbacks = llm_batch_fallbacks_total.labels(name=name)
+
+    async def submit(self, item: T) -> R:
+        """Queue *item* for the next batch and return its result."""
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[R | None] = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_items:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush, context=contextvars.Context())
+
+        result = await future
+        if result is None:
+            self._fallbacks.inc()
+            return await self._fallback(item)
+        return result
+
+    def flush(self) -> None:
+        """Send everything queued so far as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.get_running_loop().create_task(
+            self._run(batch), context=contextvars.Context()
+        )
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def aclose(self) -> None:
+        """Send what is queued and wait for in-flight batches."""
+        self.flush()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future[R | None]]]) -> None:
+        self._size.observe(len(batch))
+        try:
+            results = await self._send([item for item, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        if len(results) != len(batch):
+            logger.warning(
+                "llm_batch_size_mismatch", name=self.name, sent=len(batch), got=len(results)
+            )
+            results = [None] * len(batch)
+        for (_, future), result in zip(batch, results, strict=True):
+            if not future.done():
+                future.set_result(result)
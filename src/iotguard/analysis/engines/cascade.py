@@ -0,0 +1,130 @@
+"""Cheapest-first cascade of analysis engines.
+
+Most commands are trivially safe or trivially dangerous, and a cheap
+engine gets those right.  :class:`CascadeEngine` asks its tiers in order
+and returns the first verdict that need not be escalated.  A verdict is
+escalated when its risk level is one the tier is unsure about (MEDIUM by
+default) or its self-reported ``confidence`` is below the tier's
+``min_confidence``.  The last tier always answers.
+
+If a tier fails, the next one is asked.  If an escalated-to tier fails
+(or runs out of time), the cheaper verdict is returned rather than an
+error.
+
+Per-tier request outcomes, latency, cost and agreement with the next tier
+are exported to Prometheus for tuning the thresholds.
+
+Usage::
+
+    engine = CascadeEngine([
+        CascadeTier("flash-8b", cheap_engine, cost=0.1, min_confidence=0.8),
+        CascadeTier("gemini", gemini_engine, cost=1.0),
+    ])
+    result = await engine.analyze(parsed, device_context)
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+import structlog
+
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.engines.base import AnalysisEngine
+from iotguard.analysis.models import AnalysisResult, RiskLevel
+from iotguard.observability.metrics import (
+    cascade_tier_agreement_total,
+    cascade_tier_cost_total,
+    cascade_tier_latency_seconds,
+    cascade_tier_requests_total,
+)
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class CascadeTier:
+    """One engine of a cascade and when its verdicts are escalated.
+
+    Verdicts without a ``confidence`` escalate only on their risk level.
+    """
+
+    name: str
+    engine: AnalysisEngine
+    cost: float = 0.0
+    min_confidence: float = 0.0
+    escalate_on: frozenset[RiskLevel] = field(
+        default_factory=lambda: frozenset({RiskLevel.MEDIUM})
+    )
+
+    def should_escalate(self, result: AnalysisResult) -> bool:
+        if result.risk_level in self.escalate_on:
+            return True
+        return result.confidence is not None and result.confidence < self.min_confidence
+
+
+class CascadeEngine:
+    """Analyse with the cheapest tier that is sure of its verdict."""
+
+    def __init__(self, tiers: Sequence[CascadeTier]) -> None:
+        if not tiers:
+            raise ValueError("a cascade needs at least one tier")
+        self.tiers = tuple(tiers)
+
+    async def analyze(
+        self,
+        command: str | ParsedCommand,
+        device_context: dict[str, Any],
+    ) -> AnalysisResult:
+        parsed = ParsedCommand.of(command)
+        escalated: tuple[CascadeTier, AnalysisResult] | None = None
+        error: Exception | None = None
+
+        for index, tier in enumerate(self.tiers):
+            last = index == len(self.tiers) - 1
+            start = time.monotonic()
+            try:
+                result = await tier.engine.analyze(parsed, device_context)
+            except Exception as exc:
+                cascade_tier_latency_seconds.labels(tier=tier.name).observe(
+                    time.monotonic() - start
+                )
+                cascade_tier_requests_total.labels(tier=tier.name, outcome="failed").inc()
+                cascade_tier_cost_total.labels(tier=tier.name).inc(tier.cost)
+                if escalated is not None:
+                    logger.warning(
+                        "cascade_escalation_failed",
+                        tier=tier.name,
+                        answered_by=escalated[0].name,
+                        error=str(exc),
+                    )
+                    return escalated[1]
+                logger.warning("cascade_tier_failed", tier=tier.name, error=str(exc))
+                error = exc
+                continue
+
+            cascade_tier_latency_seconds.labels(tier=tier.name).observe(time.monotonic() - start)
+            cascade_tier_cost_total.labels(tier=tier.name).inc(tier.cost)
+            if escalated is not None:
+                previous_tier, previous = escalated
+                agree = previous.risk_level == result.risk_level
+                cascade_tier_agreement_total.labels(
+                    tier=previous_tier.name, agree=str(agree).lower()
+                ).inc()
+            if last or not tier.should_escalate(result):
+                cascade_tier_requests_total.labels(tier=tier.name, outcome="answered").inc()
+                return result
+            cascade_tier_requests_total.labels(tier=tier.name, outcome="escalated").inc()
+            logger.debug(
+                "cascade_escalated",
+                tier=tier.name,
+                risk_level=result.risk_level.value,
+                confidence=result.confidence,
+            )
+            escalated = (tier, result)
+
+        assert error is not None
+        raise error
@@ -1,27 +1,82 @@
-"""Gemini-backed analysis engine with circuit breaker and Redis caching.
+"""Gemini-backed analysis engine with circuit breaker and two-tier caching.
 
 This engine sends a structured prompt to the Gemini API, parses the JSON
 response, and maps it to an :class:`~iotguard.analysis.models.AnalysisResult`.
-Repeated identical commands are served from a short-lived Redis cache.
+Repeated identical commands are served from a
+:class:`~iotguard.analysis.cache.VerdictCache` (in-process LRU in front of
+Redis); stale verdicts are served while being refreshed in the background.
+With ``SEMANTIC_CACHE_ENABLED`` a :class:`~iotguard.analysis.semantic.SemanticCache`
+additionally reuses verdicts of near-identical commands.  With
+``GEMINI_BATCH_MAX_ITEMS`` above 1, concurrent misses are packed into one
+prompt by a :class:`~iotguard.analysis.engines.batching.MicroBatcher`.
+Calls use the SDK's async API and are admitted by an
+:class:`~iotguard.core.scheduler.AdaptiveScheduler`, which keeps within the
+RPM/TPM quotas, adapts concurrency to latency and errors, and serves
+security-critical device types first; a slow LLM only delays analyses and
+never the event loop.  Identical analyses that miss the
+cache at the same time are coalesced into one call by a
+:class:`~iotguard.core.singleflight.SingleFlight`, across workers when
+Redis is available.
+
+Calls respect the request's :mod:`~iotguard.core.deadline`: an attempt is
+cut off when it passes, and no retry is started that could not finish in
+time.  Transient failures are retried with jittered backoff and calls
+slower than ``GEMINI_HEDGE_PERCENTILE`` of recent latencies are hedged
+with a duplicate; both draw on one :class:`~iotguard.core.retry.RetryBudget`.
+
+:meth:`GeminiAnalysisEngine.analyze_streaming` streams the response and
+reports the risk level as soon as it has arrived, before the explanation
+and suggestions (see :mod:`~iotguard.analysis.engines.streaming`).
 """
 
 from __future__ import annotations
 
+import asyncio
 import hashlib
 import json
+import random
 import re
-from typing import Any
+import time
+from collections.abc import Callable, Sequence
+from types import SimpleNamespace
+from typing import Any, TypeVar, cast
 
 import google.generativeai as genai
 import structlog
+from google.api_core import exceptions as google_exceptions
 
+from iotguard.analysis.cache import VerdictCache
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.engines.batching import MicroBatcher
+from iotguard.analysis.engines.streaming import RiskLevelScanner, StreamedAnalysis
 from iotguard.analysis.models import AnalysisResult, RiskLevel
-from iotguard.core.circuit_breaker import CircuitBreaker
-from iotguard.core.config import GeminiSettings, RedisSettings
-from iotguard.core.exceptions import LLMError
+from iotguard.analysis.semantic import SemanticCache, SemanticHit
+from iotguard.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from iotguard.core.config import (
+    CacheSettings,
+    GeminiSettings,
+    RedisSettings,
+    SemanticCacheSettings,
+)
+from iotguard.core.deadline import Deadline, current_deadline
+from iotguard.core.exceptions import AnalysisError, DeadlineExceededError, LLMError
+from iotguard.core.hedging import LatencyWindow, hedged
+from iotguard.core.retry import RetryBudget, backoff_delay
+from iotguard.core.scheduler import AdaptiveScheduler, QueueTimeoutError, ShedError, Ticket
+from iotguard.core.singleflight import SingleFlight
+from iotguard.observability.metrics import (
+    llm_retries_total,
+    llm_stream_verdict_seconds,
+    semantic_cache_verifications_total,
+)
 
 logger = structlog.get_logger(__name__)
 
+T = TypeVar("T")
+
+#: Called with the risk level as soon as a streamed response reveals it.
+RiskCallback = Callable[[RiskLevel], None]
+
 _ANALYSIS_PROMPT = """\
 You are an IoT security expert. Analyse the following IoT device command for
 security risks.  Consider the device context provided.
@@ -35,13 +90,98 @@ security risks.  Consider the device context provided.
 Respond ONLY with valid JSON (no markdown fences) containing exactly these keys:
 {{
   "risk_level": "NONE" | "LOW" | "MEDIUM" | "HIGH" | "CRITICAL",
+  "confidence": <0.0 to 1.0, how sure you are of risk_level>,
+  "explanation": "<brief security assessment>",
+  "suggestions": ["<suggestion 1>", "..."],
+  "safe_alternatives": ["<safer command variant>", "..."]
+}}
+"""
+
+
+_BATCH_PROMPT = """\
+You are an IoT security expert. Analyse each of the IoT device commands below
+for security risks, considering the device context given with each command.
+
+Respond ONLY with a valid JSON array (no markdown fences) holding one object
+per command, each containing exactly these keys:
+{{
+  "id": <the command's id>,
+  "risk_level": "NONE" | "LOW" | "MEDIUM" | "HIGH" | "CRITICAL",
+  "confidence": <0.0 to 1.0, how sure you are of risk_level>,
   "explanation": "<brief security assessment>",
   "suggestions": ["<suggestion 1>", "..."],
   "safe_alternatives": ["<safer command variant>", "..."]
 }}
+
+**Commands:**
+{items}
 """
 
-_CACHE_TTL_SECONDS = 300  # 5 minutes
+#: Output token ceiling for one batched call.
+_MAX_BATCH_TOKENS = 8192
+
+#: Queue priority of device types missing from ``GEMINI_DEVICE_PRIORITIES``.
+_DEFAULT_PRIORITY = 1
+
+#: Rough output tokens per analysed command, for the TPM budget; the
+#: real usage is settled from the response.
+_OUTPUT_TOKENS_PER_ITEM = 256
+
+#: Identity of a configured model client: (model name, temperature, max tokens).
+ModelKey = tuple[str, float, int]
+
+#: Seconds the start-up warm-up call may take before it is abandoned.
+_WARM_UP_TIMEOUT = 10.0
+
+#: Failures worth another attempt: the upstream may well answer next time.
+_TRANSIENT_ERRORS: tuple[type[BaseException], ...] = (
+    TimeoutError,
+    ConnectionError,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+def _confidence(value: Any) -> float | None:
+    """The model's self-reported confidence, or ``None`` if unusable."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return min(1.0, max(0.0, float(value)))
+
+
+def _strip_fences(raw_text: str) -> str:
+    """Remove markdown code fences the model sometimes adds anyway."""
+    text = raw_text.strip()
+    if text.startswith("```"):
+        text = re.sub(r"^```(?:json)?\s*", "", text)
+        text = re.sub(r"\s*```$", "", text)
+    return text
+
+
+class ModelPool:
+    """Configured ``GenerativeModel`` clients, created once per key and reused."""
+
+    def __init__(self) -> None:
+        self._models: dict[ModelKey, Any] = {}
+
+    def get(self, key: ModelKey) -> Any:
+        model = self._models.get(key)
+        if model is None:
+            name, temperature, max_tokens = key
+            model = genai.GenerativeModel(
+                name,
+                generation_config=genai.GenerationConfig(
+                    temperature=temperature,
+                    max_output_tokens=max_tokens,
+                ),
+            )
+            self._models[key] = model
+            logger.info("gemini_model_created", model=name, temperature=temperature)
+        return model
+
+    def __len__(self) -> int:
+        return len(self._models)
 
 
 class GeminiAnalysisEngine:
@@ -53,92 +193,514 @@ class GeminiAnalysisEngine:
         redis_settings: RedisSettings | None = None,
         *,
         redis_client: Any | None = None,
+        cache_settings: CacheSettings | None = None,
+        semantic_settings: SemanticCacheSettings | None = None,
+        name: str = "gemini",
     ) -> None:
+        self.name = name
         self._settings = gemini_settings
         self._redis = redis_client
+        self._cache = VerdictCache(cache_settings or CacheSettings(), redis=redis_client)
+        self._semantic: SemanticCache | None = None
+        self._verify_rate = 0.0
+        if semantic_settings is not None and semantic_settings.enabled:
+            self._semantic = SemanticCache(semantic_settings)
+            self._verify_rate = semantic_settings.verify_rate
+        self._refreshes: set[asyncio.Task[AnalysisResult]] = set()
+        self._streams: set[asyncio.Future[AnalysisResult]] = set()
         self._redis_prefix = (
             redis_settings.key_prefix if redis_settings else "iotguard:"
         )
+        # A caller giving up (deadline, hedge loser) says nothing about
+        # Gemini's health, so neither component counts it.
         self._breaker = CircuitBreaker(
-            name="gemini",
+            name=name,
             failure_threshold=3,
             cooldown=30.0,
+            neutral=(DeadlineExceededError, asyncio.CancelledError),
         )
+        # Admits Gemini calls within quota and an adaptive concurrency
+        # limit; excess analyses queue here by priority instead of piling
+        # onto the API (and onto the event loop).
+        self._scheduler = AdaptiveScheduler(
+            name,
+            max_limit=gemini_settings.max_concurrency,
+            min_limit=min(gemini_settings.min_concurrency, gemini_settings.max_concurrency),
+            rpm=gemini_settings.rpm_limit,
+            tpm=gemini_settings.tpm_limit,
+            latency_target=gemini_settings.latency_target,
+            queue_timeout=gemini_settings.queue_timeout,
+            max_queue=gemini_settings.max_queue,
+            neutral=(CircuitOpenError, DeadlineExceededError, asyncio.CancelledError),
+        )
+        self._retry_budget = RetryBudget(
+            gemini_settings.retry_budget_ratio,
+            min_per_second=gemini_settings.retry_budget_min_per_second,
+        )
+        self._latencies: dict[ModelKey, LatencyWindow] = {}
+
+        # Bursts of the same (command, context) share one upstream call.
+        self._flights: SingleFlight[AnalysisResult] = SingleFlight(
+            name,
+            redis=redis_client,
+            lease_ttl=gemini_settings.coalesce_lease,
+        )
+
+        self._models = ModelPool()
+        self._model_key: ModelKey = (
+            gemini_settings.model_name,
+            gemini_settings.temperature,
+            gemini_settings.max_tokens,
+        )
+
+        # Optional: pack concurrent misses into one prompt.
+        self._batcher: MicroBatcher[tuple[str, dict[str, Any]], AnalysisResult] | None = None
+        if gemini_settings.batch_max_items > 1:
+            self._batch_model_key: ModelKey = (
+                gemini_settings.model_name,
+                gemini_settings.temperature,
+                min(gemini_settings.max_tokens * gemini_settings.batch_max_items,
+                    _MAX_BATCH_TOKENS),
+            )
+            self._batcher = MicroBatcher(
+                name,
+                self._send_batch,
+                lambda item: self._guarded_call(*item),
+                max_items=gemini_settings.batch_max_items,
+                max_wait=gemini_settings.batch_max_wait_ms / 1000,
+            )
 
         api_key = gemini_settings.api_key.get_secret_value()
         if api_key:
             genai.configure(api_key=api_key)
+            self._models.get(self._model_key)
+
+    async def warm_up(self) -> bool:
+        """Make one tiny request so the first analysis finds a live connection.
+
+        Failures are logged and otherwise ignored; returns ``True`` on success.
+        """
+        if not self._settings.api_key.get_secret_value():
+            return False
+        start = time.monotonic()
+        try:
+            async with self._scheduler.slot(priority=0):
+                await asyncio.wait_for(
+                    self._models.get(self._model_key).generate_content_async("Reply with OK."),
+                    _WARM_UP_TIMEOUT,
+                )
+        except Exception as exc:
+            logger.warning("gemini_warm_up_failed", error=str(exc))
+            return False
+        logger.info("gemini_warmed_up", elapsed_s=round(time.monotonic() - start, 3))
+        return True
 
     # -- AnalysisEngine protocol --------------------------------------------
 
     async def analyze(
         self,
-        command: str,
+        command: str | ParsedCommand,
         device_context: dict[str, Any],
     ) -> AnalysisResult:
         """Run Gemini analysis with caching and circuit breaker."""
+        return await self._analyze(ParsedCommand.of(command), device_context)
+
+    def analyze_streaming(
+        self,
+        command: str | ParsedCommand,
+        device_context: dict[str, Any],
+    ) -> StreamedAnalysis:
+        """Like :meth:`analyze`, but resolve the risk level as soon as it streams in.
+
+        Cached verdicts and calls coalesced with a non-streaming analysis
+        resolve both futures together.
+        """
+        risk_level: asyncio.Future[RiskLevel] = asyncio.get_running_loop().create_future()
+
+        def on_risk(level: RiskLevel) -> None:
+            if not risk_level.done():
+                risk_level.set_result(level)
+
+        streamed = StreamedAnalysis.start(
+            self._analyze(ParsedCommand.of(command), device_context, on_risk=on_risk),
+            risk_level,
+        )
+        self._streams.add(streamed.result)
+        streamed.result.add_done_callback(self._streams.discard)
+        return streamed
+
+    async def _analyze(
+        self,
+        parsed: ParsedCommand,
+        device_context: dict[str, Any],
+        *,
+        on_risk: RiskCallback | None = None,
+    ) -> AnalysisResult:
         # 1. Check cache
-        cache_key = self._cache_key(command, device_context)
-        cached = await self._get_cached(cache_key)
+        cache_key = self._cache_key(parsed, device_context)
+        cached = await self._cache.get(cache_key)
         if cached is not None:
-            logger.debug("gemini_cache_hit", command=command[:80])
-            return cached
-
-        # 2. Call Gemini behind the circuit breaker
+            if cached.error is not None:
+                raise LLMError(f"Gemini call recently failed: {cached.error}")
+            if cached.stale:
+                self._refresh(cache_key, parsed, device_context)
+            logger.debug("gemini_cache_hit", command=parsed.raw[:80], stale=cached.stale)
+            # Without an error the entry holds a result.
+            return cast(AnalysisResult, cached.result)
+
+        # 2. Reuse the verdict of a near-identical command
+        if self._semantic is not None:
+            hit = self._semantic.lookup(parsed, device_context)
+            if hit is not None:
+                logger.debug(
+                    "gemini_semantic_hit",
+                    command=parsed.raw[:80],
+                    matched=hit.matched[:80],
+                    similarity=round(hit.similarity, 3),
+                )
+                sample = random.random()  # noqa: S311 - sampling only
+                if self._verify_rate and sample < self._verify_rate:
+                    self._verify(hit, cache_key, parsed, device_context)
+                return hit.result
+
+        # 3. Call Gemini once per key, behind the circuit breaker
         api_key = self._settings.api_key.get_secret_value()
         if not api_key:
             raise LLMError("Gemini API key is not configured")
 
         try:
-            async with self._breaker:
-                result = await self._call_gemini(command, device_context)
-        except LLMError:
+            return await self._flights.do(
+                cache_key,
+                lambda: self._analyze_uncached(
+                    cache_key, parsed, device_context, on_risk=on_risk
+                ),
+                load=lambda: self._get_cached(cache_key),
+            )
+        except TimeoutError as exc:
+            # Our deadline passed; the shared call carries on for the others.
+            raise DeadlineExceededError(
+                "request deadline passed while waiting for the Gemini call"
+            ) from exc
+
+    async def aclose(self) -> None:
+        """Drain pending batches and cancel background work (called on shutdown)."""
+        if self._batcher is not None:
+            await self._batcher.aclose()
+        pending = [*self._refreshes, *self._streams]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        await self._flights.aclose()
+
+    # -- internals ----------------------------------------------------------
+
+    async def _analyze_uncached(
+        self,
+        cache_key: str,
+        parsed: ParsedCommand,
+        device_context: dict[str, Any],
+        *,
+        remember_failure: bool = True,
+        on_risk: RiskCallback | None = None,
+    ) -> AnalysisResult:
+        try:
+            if on_risk is not None:
+                # Streamed calls are never batched: one prompt, one verdict.
+                result = await self._guarded_call(parsed.raw, device_context, on_risk=on_risk)
+            elif self._batcher is not None:
+                result = await self._batcher.submit((parsed.raw, device_context))
+            else:
+                result = await self._guarded_call(parsed.raw, device_context)
+        except LLMError as exc:
+            if remember_failure:
+                await self._cache.put_error(cache_key, str(exc))
             raise
-        except Exception as exc:
-            raise LLMError(f"Gemini call failed: {exc}") from exc
 
-        # 3. Store in cache
+        # 4. Store in cache
         await self._set_cached(cache_key, result)
+        if self._semantic is not None:
+            self._semantic.add(parsed, device_context, result)
         return result
 
-    # -- internals ----------------------------------------------------------
+    def _refresh(
+        self,
+        cache_key: str,
+        parsed: ParsedCommand,
+        device_context: dict[str, Any],
+    ) -> None:
+        """Re-analyse a stale verdict in the background (once per key)."""
+        if cache_key in self._flights:
+            return
+        # A failed refresh keeps serving the stale verdict rather than
+        # replacing it with a negative entry.
+        task = asyncio.ensure_future(
+            self._flights.do(
+                cache_key,
+                lambda: self._analyze_uncached(
+                    cache_key, parsed, device_context, remember_failure=False
+                ),
+            )
+        )
+        self._refreshes.add(task)
+        task.add_done_callback(self._refresh_done)
 
-    async def _call_gemini(
+    def _verify(
+        self,
+        hit: SemanticHit,
+        cache_key: str,
+        parsed: ParsedCommand,
+        device_context: dict[str, Any],
+    ) -> None:
+        """Ask the LLM anyway for a sampled semantic hit and record agreement."""
+
+        async def verify() -> AnalysisResult:
+            result = await self._flights.do(
+                cache_key,
+                lambda: self._analyze_uncached(
+                    cache_key, parsed, device_context, remember_failure=False
+                ),
+            )
+            agree = result.risk_level == hit.result.risk_level
+            semantic_cache_verifications_total.labels(agree=str(agree).lower()).inc()
+            if not agree:
+                logger.info(
+                    "gemini_semantic_mismatch",
+                    command=parsed.raw[:80],
+                    matched=hit.matched[:80],
+                    similarity=round(hit.similarity, 3),
+                    cached=hit.result.risk_level.value,
+                    actual=result.risk_level.value,
+                )
+            return result
+
+        task = asyncio.ensure_future(verify())
+        self._refreshes.add(task)
+        task.add_done_callback(self._refresh_done)
+
+    def _refresh_done(self, task: asyncio.Task[AnalysisResult]) -> None:
+        self._refreshes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("gemini_refresh_failed", error=str(task.exception()))
+
+    async def _guarded_call(
         self,
         command: str,
         device_context: dict[str, Any],
+        *,
+        on_risk: RiskCallback | None = None,
     ) -> AnalysisResult:
+        """One single-command call through the scheduler and circuit breaker."""
         prompt = _ANALYSIS_PROMPT.format(
             command=command,
             device_context=json.dumps(device_context, default=str),
         )
+        return await self._generate(
+            self._model_key,
+            prompt,
+            priority=self._priority(device_context),
+            items=1,
+            parse=self._parse_response,
+            on_risk=on_risk,
+        )
 
-        model = genai.GenerativeModel(
-            self._settings.model_name,
-            generation_config=genai.GenerationConfig(
-                temperature=self._settings.temperature,
-                max_output_tokens=self._settings.max_tokens,
-            ),
+    async def _send_batch(
+        self,
+        items: Sequence[tuple[str, dict[str, Any]]],
+    ) -> list[AnalysisResult | None]:
+        """Analyse several commands with one prompt; ``None`` marks unusable items."""
+        if len(items) == 1:
+            return [await self._guarded_call(*items[0])]
+        prompt = _BATCH_PROMPT.format(
+            items=json.dumps(
+                [
+                    {"id": i, "command": command, "device_context": context}
+                    for i, (command, context) in enumerate(items)
+                ],
+                default=str,
+            )
+        )
+        results = await self._generate(
+            self._batch_model_key,
+            prompt,
+            priority=min(self._priority(context) for _, context in items),
+            items=len(items),
+            parse=lambda text: self._parse_batch_response(text, len(items)),
         )
+        malformed = results.count(None)
+        if malformed:
+            logger.warning("gemini_batch_items_malformed", size=len(items), malformed=malformed)
+        return results
+
+    async def _generate(
+        self,
+        model_key: ModelKey,
+        prompt: str,
+        *,
+        priority: int,
+        items: int,
+        parse: Callable[[str], T],
+        on_risk: RiskCallback | None = None,
+    ) -> T:
+        """Send *prompt* and parse the reply, retrying transient failures.
+
+        With *on_risk* the response is streamed (and not hedged).  Errors
+        become :class:`LLMError`, or :class:`DeadlineExceededError` when the
+        current deadline passes first.
+        """
+        estimate = len(prompt) // 4 + _OUTPUT_TOKENS_PER_ITEM * items
+        deadline = current_deadline()
+        self._retry_budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await self._attempt(
+                    model_key, prompt, priority=priority, estimate=estimate,
+                    parse=parse, deadline=deadline, on_risk=on_risk,
+                )
+            except AnalysisError:
+                raise
+            except (QueueTimeoutError, ShedError) as exc:
+                raise LLMError(f"Gemini call not started: {exc}") from exc
+            except _TRANSIENT_ERRORS as exc:
+                if attempt >= self._settings.max_attempts:
+                    raise LLMError(f"Gemini call failed after {attempt} attempts: {exc}") from exc
+                delay = backoff_delay(
+                    attempt - 1,
+                    base=self._settings.retry_base_delay,
+                    cap=self._settings.retry_max_delay,
+                )
+                if deadline is not None and deadline.remaining() <= delay:
+                    llm_retries_total.labels(name=self.name, outcome="deadline").inc()
+                    raise DeadlineExceededError(
+                        f"no time left to retry the Gemini call: {exc}"
+                    ) from exc
+                if not self._retry_budget.withdraw():
+                    llm_retries_total.labels(name=self.name, outcome="budget_exhausted").inc()
+                    raise LLMError(f"Gemini call failed: {exc}") from exc
+                llm_retries_total.labels(name=self.name, outcome="retried").inc()
+                logger.info(
+                    "gemini_call_retry", attempt=attempt, delay_s=round(delay, 3), error=str(exc)
+                )
+                await asyncio.sleep(delay)
+            except Exception as exc:
+                raise LLMError(f"Gemini call failed: {exc}") from exc
+
+    async def _attempt(
+        self,
+        model_key: ModelKey,
+        prompt: str,
+        *,
+        priority: int,
+        estimate: int,
+        parse: Callable[[str], T],
+        deadline: Deadline | None,
+        on_risk: RiskCallback | None = None,
+    ) -> T:
+        """One admitted, possibly hedged call, bounded by the deadline."""
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceededError("request deadline passed before the Gemini call")
+        try:
+            async with asyncio.timeout(deadline.remaining() if deadline else None):
+                async with self._scheduler.slot(priority, estimate) as ticket, self._breaker:
+                    async with asyncio.timeout(self._settings.call_timeout or None):
+                        if on_risk is not None:
+                            response = await self._streamed_call(
+                                model_key, prompt, ticket, on_risk
+                            )
+                        else:
+                            response = await self._hedged_call(model_key, prompt, ticket)
+                    usage = getattr(response, "usage_metadata", None)
+                    total = getattr(usage, "total_token_count", None)
+                    if isinstance(total, int):
+                        ticket.settle(total)
+                    if not response or not response.text:
+                        raise LLMError("Empty response from Gemini API")
+                    return parse(response.text)
+        except TimeoutError:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceededError(
+                    "Gemini call did not finish before the request deadline"
+                ) from None
+            raise
 
-        response = model.generate_content(prompt)
+    async def _hedged_call(self, model_key: ModelKey, prompt: str, ticket: Ticket) -> Any:
+        """Call the model, racing a duplicate if it runs later than usual."""
+        model = self._models.get(model_key)
+        window = self._latencies.get(model_key)
+        if window is None:
+            window = self._latencies[model_key] = LatencyWindow(
+                min_samples=self._settings.hedge_min_samples
+            )
+        delay = None
+        if self._settings.hedge_percentile > 0:
+            delay = window.quantile(self._settings.hedge_percentile)
 
-        if not response or not response.text:
-            raise LLMError("Empty response from Gemini API")
+        def allow_hedge() -> bool:
+            if not self._retry_budget.withdraw():
+                return False
+            ticket.duplicated()
+            return True
 
-        return self._parse_response(response.text)
+        start = time.monotonic()
+        try:
+            response = await hedged(
+                lambda: model.generate_content_async(prompt),
+                delay=delay,
+                allow=allow_hedge,
+                name=self.name,
+            )
+        except google_exceptions.ResourceExhausted:
+            ticket.throttled()
+            raise
+        window.record(time.monotonic() - start)
+        return response
+
+    async def _streamed_call(
+        self,
+        model_key: ModelKey,
+        prompt: str,
+        ticket: Ticket,
+        on_risk: RiskCallback,
+    ) -> Any:
+        """Stream the model's reply, reporting the risk level once it is parsed."""
+        model = self._models.get(model_key)
+        scanner = RiskLevelScanner()
+        chunks: list[str] = []
+        start = time.monotonic()
+        try:
+            response = await model.generate_content_async(prompt, stream=True)
+            async for chunk in response:
+                text = chunk.text or ""
+                chunks.append(text)
+                level = scanner.feed(text)
+                if level is not None:
+                    llm_stream_verdict_seconds.labels(name=self.name).observe(
+                        time.monotonic() - start
+                    )
+                    on_risk(level)
+        except google_exceptions.ResourceExhausted:
+            ticket.throttled()
+            raise
+        return SimpleNamespace(
+            text="".join(chunks),
+            usage_metadata=getattr(response, "usage_metadata", None),
+        )
+
+    def _priority(self, device_context: dict[str, Any]) -> int:
+        """Queue priority of a call for this device (lower is served first)."""
+        device_type = device_context.get("device_type")
+        if not device_type:
+            return _DEFAULT_PRIORITY
+        key = str(getattr(device_type, "value", device_type)).lower()
+        return self._settings.device_priorities.get(key, _DEFAULT_PRIORITY)
 
     @staticmethod
     def _parse_response(raw_text: str) -> AnalysisResult:
         """Parse the JSON response from Gemini into an AnalysisResult."""
-        text = raw_text.strip()
-        # Strip markdown code fences if present
-        if text.startswith("```"):
-            text = re.sub(r"^```(?:json)?\s*", "", text)
-            text = re.sub(r"\s*```$", "", text)
-
         try:
-            data = json.loads(text)
+            data = json.loads(_strip_fences(raw_text))
         except json.JSONDecodeError as exc:
             raise LLMError(f"Failed to parse Gemini response as JSON: {exc}") from exc
 
@@ -154,49 +716,61 @@ class GeminiAnalysisEngine:
             safe_alternatives=data.get("safe_alternatives", []),
             rule_violations=[],
             was_blocked=False,
+            confidence=_confidence(data.get("confidence")),
         )
 
+    @staticmethod
+    def _parse_batch_response(raw_text: str, size: int) -> list[AnalysisResult | None]:
+        """Parse a batched JSON array; items that are missing or invalid are ``None``.
+
+        Unlike the single-command parser, an unknown risk level is not
+        defaulted: the item is retried on its own instead.
+        """
+        results: list[AnalysisResult | None] = [None] * size
+        try:
+            data = json.loads(_strip_fences(raw_text))
+        except json.JSONDecodeError:
+            return results
+        if not isinstance(data, list):
+            return results
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            index = item.get("id")
+            if not isinstance(index, int) or not 0 <= index < size or results[index] is not None:
+                continue
+            try:
+                results[index] = AnalysisResult(
+                    risk_level=RiskLevel(str(item["risk_level"]).upper()),
+                    explanation=item.get("explanation", ""),
+                    suggestions=item.get("suggestions", []),
+                    safe_alternatives=item.get("safe_alternatives", []),
+                    confidence=_confidence(item.get("confidence")),
+                )
+            except (KeyError, ValueError):
+                continue
+        return results
+
     # -- caching helpers ----------------------------------------------------
 
-    def _cache_key(self, command: str, device_context: dict[str, Any]) -> str:
-        raw = f"{command}::{json.dumps(device_context, sort_keys=True, default=str)}"
+    def _cache_key(
+        self, command: str | ParsedCommand, device_context: dict[str, Any]
+    ) -> str:
+        # Keyed on the normalised command so whitespace and case variants
+        # of the same command share one cached analysis.
+        # The engine name keeps verdicts of differently configured engines
+        # (e.g. cascade tiers) apart in the shared Redis tier.
+        parsed = ParsedCommand.of(command)
+        context = json.dumps(device_context, sort_keys=True, default=str)
+        raw = f"{self.name}::{parsed.digest}::{context}"
         digest = hashlib.sha256(raw.encode()).hexdigest()[:24]
         return f"{self._redis_prefix}analysis_cache:{digest}"
 
     async def _get_cached(self, key: str) -> AnalysisResult | None:
-        if self._redis is None:
-            return None
-        try:
-            raw = await self._redis.get(key)
-            if raw is None:
-                return None
-            data = json.loads(raw)
-            return AnalysisResult(
-                risk_level=RiskLevel(data["risk_level"]),
-                explanation=data["explanation"],
-                suggestions=data.get("suggestions", []),
-                safe_alternatives=data.get("safe_alternatives", []),
-                rule_violations=data.get("rule_violations", []),
-                was_blocked=data.get("was_blocked", False),
-            )
-        except Exception:
-            logger.debug("cache_read_error", key=key)
+        cached = await self._cache.get(key)
+        if cached is None or cached.error is not None:
             return None
+        return cached.result
 
     async def _set_cached(self, key: str, result: AnalysisResult) -> None:
-        if self._redis is None:
-            return
-        try:
-            payload = json.dumps(
-                {
-                    "risk_level": result.risk_level.value,
-                    "explanation": result.explanation,
-                    "suggestions": result.suggestions,
-                    "safe_alternatives": result.safe_alternatives,
-                    "rule_violations": result.rule_violations,
-                    "was_blocked": result.was_blocked,
-                }
-            )
-            await self._redis.set(key, payload, ex=_CACHE_TTL_SECONDS)
-        except Exception:
-            logger.debug("cache_write_error", key=key)
+        await self._cache.put(key, result)
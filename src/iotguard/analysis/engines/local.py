@@ -0,0 +1,89 @@
+"""Analysis engine backed by the local risk classifier.
+
+:class:`LocalModelEngine` answers from a
+:class:`~iotguard.analysis.classifier.RiskClassifier` in-process, in
+microseconds and without network access.  It is the first tier of the
+cascade (its ``confidence`` is the predicted class probability, so unsure
+answers escalate) and the fallback when the LLM is unavailable.  It never
+blocks a command: blocking stays the security rules' decision.
+
+Usage::
+
+    engine = LocalModelEngine.load("models/risk-classifier")
+    result = await engine.analyze(parsed, device_context)
+    results = await engine.analyze_batch([(parsed, device_context), ...])
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any
+
+import structlog
+
+from iotguard.analysis.classifier import RiskClassifier
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.features import device_key
+from iotguard.analysis.models import AnalysisResult, RiskLevel
+from iotguard.observability.metrics import local_model_inference_seconds
+
+logger = structlog.get_logger(__name__)
+
+
+class LocalModelEngine:
+    """Risk verdicts from a locally loaded classifier."""
+
+    def __init__(self, classifier: RiskClassifier, *, name: str = "local_model") -> None:
+        self.classifier = classifier
+        self.name = name
+
+    @classmethod
+    def load(cls, path: str | Path, *, name: str = "local_model") -> LocalModelEngine:
+        classifier = RiskClassifier.load(path)
+        logger.info(
+            "local_model_loaded",
+            path=str(path),
+            dimensions=classifier.dimensions,
+            trained_at=classifier.meta.get("trained_at"),
+            samples=classifier.meta.get("samples"),
+        )
+        return cls(classifier, name=name)
+
+    async def analyze(
+        self,
+        command: str | ParsedCommand,
+        device_context: dict[str, Any],
+    ) -> AnalysisResult:
+        start = time.perf_counter()
+        risk_level, confidence = self.classifier.predict(command, device_key(device_context))
+        local_model_inference_seconds.labels(mode="single").observe(time.perf_counter() - start)
+        return self._result(risk_level, confidence)
+
+    async def analyze_batch(
+        self,
+        items: Sequence[tuple[str | ParsedCommand, dict[str, Any]]],
+    ) -> list[AnalysisResult]:
+        """Analyse many commands in one vectorised pass, in order."""
+        if not items:
+            return []
+        start = time.perf_counter()
+        predictions = self.classifier.predict_batch(
+            [(command, device_key(context)) for command, context in items]
+        )
+        local_model_inference_seconds.labels(mode="batch").observe(
+            (time.perf_counter() - start) / len(items)
+        )
+        return [self._result(risk_level, confidence) for risk_level, confidence in predictions]
+
+    @staticmethod
+    def _result(risk_level: RiskLevel, confidence: float) -> AnalysisResult:
+        return AnalysisResult(
+            risk_level=risk_level,
+            explanation=(
+                f"Local model estimate ({confidence:.0%} confidence); "
+                "no LLM explanation available."
+            ),
+            confidence=round(confidence, 4),
+        )
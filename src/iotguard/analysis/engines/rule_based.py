@@ -1,42 +1,74 @@
 """Rule-based analysis engine.
 
-Evaluates security rules loaded from the database against an incoming
-command.  Each matching rule contributes a violation entry and, depending
-on its action (``BLOCK`` / ``WARN`` / ``LOG``), may mark the overall
-result as blocked.
+Evaluates the process-wide compiled rule set against an incoming command.
+Each matching rule contributes a violation entry and, depending on its
+action (``BLOCK`` / ``WARN`` / ``LOG``), may mark the overall result as
+blocked.
 """
 
 from __future__ import annotations
 
-import re
+from collections.abc import Sequence
 from typing import Any
 
 import structlog
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from iotguard.analysis.command import ParsedCommand
 from iotguard.analysis.models import AnalysisResult, RiskLevel
+from iotguard.analysis.rules.compiled import CompiledRule, RuleSetStore, get_rule_store
 from iotguard.db.repositories import SecurityRuleRepository
 
 logger = structlog.get_logger(__name__)
 
 
+def rule_verdict(rules: Sequence[CompiledRule]) -> tuple[RiskLevel, bool]:
+    """Return ``(risk_level, was_blocked)`` for the matched *rules*.
+
+    Any ``BLOCK`` match is CRITICAL and blocks, any ``WARN`` match is HIGH,
+    other matches are LOW and no match at all is NONE.
+    """
+    if not rules:
+        return RiskLevel.NONE, False
+    actions = {rule.action for rule in rules}
+    if "BLOCK" in actions:
+        return RiskLevel.CRITICAL, True
+    if "WARN" in actions:
+        return RiskLevel.HIGH, False
+    return RiskLevel.LOW, False
+
+
 class RuleBasedEngine:
-    """Evaluate commands against :class:`SecurityRule` patterns from the DB."""
+    """Evaluate commands against the compiled :class:`SecurityRule` set."""
 
-    def __init__(self, session: AsyncSession) -> None:
+    def __init__(
+        self,
+        session: AsyncSession,
+        *,
+        rule_store: RuleSetStore | None = None,
+    ) -> None:
         self._rule_repo = SecurityRuleRepository(session)
+        self._rule_store = rule_store or get_rule_store()
 
     async def analyze(
         self,
-        command: str,
+        command: str | ParsedCommand,
         device_context: dict[str, Any],
+        *,
+        first_block: bool = False,
     ) -> AnalysisResult:
         """Match *command* against all active rules and return a result.
 
         The returned :attr:`AnalysisResult.was_blocked` is ``True`` if any
-        matching rule has ``action == 'BLOCK'``.
+        matching rule has ``action == 'BLOCK'``.  With *first_block* the
+        evaluation stops at the first BLOCK match, so ``rule_violations``
+        may omit lower-ranked matches.  Rules scoped to other device types,
+        devices or states than *device_context* describes are skipped.
         """
-        rules = await self._rule_repo.get_matching_rules(command)
+        rule_set = await self._rule_store.get(self._rule_repo)
+        rules = await rule_set.match_async(
+            command, first_block=first_block, context=device_context
+        )
 
         if not rules:
             return AnalysisResult(
@@ -48,20 +80,11 @@ class RuleBasedEngine:
                 was_blocked=False,
             )
 
-        violations: list[str] = []
-        was_blocked = False
-        highest_risk = RiskLevel.LOW
-
-        for rule in rules:
-            action = rule.action.upper()
-            violations.append(
-                f"[{action}] Rule '{rule.name}': {rule.description or rule.pattern}"
-            )
-            if action == "BLOCK":
-                was_blocked = True
-                highest_risk = RiskLevel.CRITICAL
-            elif action == "WARN" and highest_risk.value in ("NONE", "LOW"):
-                highest_risk = RiskLevel.HIGH
+        violations = [
+            f"[{rule.action}] Rule '{rule.name}': {rule.description or rule.pattern}"
+            for rule in rules
+        ]
+        highest_risk, was_blocked = rule_verdict(rules)
 
         explanation = (
             f"Command matched {len(violations)} security rule(s). "
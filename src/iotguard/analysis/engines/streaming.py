@@ -0,0 +1,114 @@
+"""Early verdicts from streamed LLM responses.
+
+The model is asked for a JSON object whose first key is ``risk_level``;
+the explanation and suggestions that follow are far longer.  When the
+response is streamed, :class:`RiskLevelScanner` spots the risk level in
+the first chunks, so the verdict is known long before the full text --
+and the final ``json.loads`` -- is available.
+
+Engines that support this implement :class:`StreamingAnalysisEngine` and
+return a :class:`StreamedAnalysis`: one future resolving with the risk
+level as early as possible, and one with the complete result.
+
+Usage::
+
+    streamed = engine.analyze_streaming(parsed, device_context)
+    risk_level = await streamed.risk_level      # early
+    result = await streamed.result              # explanation, suggestions
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+from collections.abc import Awaitable
+from dataclasses import dataclass
+from typing import Any, Protocol, runtime_checkable
+
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.models import AnalysisResult, RiskLevel
+
+_RISK_LEVEL_RE = re.compile(r'"risk_level"\s*:\s*"([A-Za-z]*)"')
+
+#: How far back a new search starts, so a key split across chunks is found.
+_OVERLAP = 64
+
+
+class RiskLevelScanner:
+    """Find the ``risk_level`` of a JSON verdict while it streams in."""
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._scanned = 0
+        self.risk_level: RiskLevel | None = None
+
+    def feed(self, text: str) -> RiskLevel | None:
+        """Add a chunk; returns the risk level the first time it is known.
+
+        An unknown level maps to MEDIUM, as in the full-response parser.
+        """
+        if self.risk_level is not None:
+            return None
+        self._buffer += text
+        match = _RISK_LEVEL_RE.search(self._buffer, max(0, self._scanned - _OVERLAP))
+        self._scanned = len(self._buffer)
+        if match is None:
+            return None
+        try:
+            self.risk_level = RiskLevel(match.group(1).upper())
+        except ValueError:
+            self.risk_level = RiskLevel.MEDIUM
+        self._buffer = ""
+        return self.risk_level
+
+
+@dataclass(frozen=True, slots=True)
+class StreamedAnalysis:
+    """An analysis whose risk level may be known before its details.
+
+    If the analysis fails before the risk level is known, both futures
+    fail with the same error.
+    """
+
+    risk_level: asyncio.Future[RiskLevel]
+    result: asyncio.Future[AnalysisResult]
+
+    @classmethod
+    def start(
+        cls,
+        work: Awaitable[AnalysisResult],
+        risk_level: asyncio.Future[RiskLevel] | None = None,
+    ) -> StreamedAnalysis:
+        """Run *work* in a task; *risk_level* may be resolved early by it."""
+        loop = asyncio.get_running_loop()
+        risk = risk_level if risk_level is not None else loop.create_future()
+        task = asyncio.ensure_future(work)
+
+        def settle(done: asyncio.Future[AnalysisResult]) -> None:
+            if done.cancelled():
+                risk.cancel()
+                return
+            # Also marks the error as retrieved when nobody awaits the result.
+            exc = done.exception()
+            if risk.done():
+                return
+            if exc is not None:
+                risk.set_exception(exc)
+            else:
+                risk.set_result(done.result().risk_level)
+
+        task.add_done_callback(settle)
+        return cls(risk, task)
+
+
+@runtime_checkable
+class StreamingAnalysisEngine(Protocol):
+    """An analysis engine that can report the risk level early."""
+
+    def analyze_streaming(
+        self,
+        command: str | ParsedCommand,
+        device_context: dict[str, Any],
+    ) -> StreamedAnalysis:
+        """Start analysing *command*; must be called from a running loop."""
+        ...
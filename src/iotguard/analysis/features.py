@@ -0,0 +1,91 @@
+"""Hashed n-gram features of commands, shared by the NumPy-based models.
+
+A command becomes a bag of character 3/4-grams plus (heavier) word
+unigrams and bigrams, with politeness filler dropped, so ``please unlock
+the front door`` and ``unlock front door`` look alike while ``lock`` and
+``unlock`` do not.  :func:`hashed_features` maps the bag into a fixed
+number of dimensions with the hashing trick; the top bit of each hash
+picks a sign so colliding features tend to cancel.
+
+Used by :mod:`iotguard.analysis.semantic` and
+:mod:`iotguard.analysis.classifier`; requires the optional ``numpy``
+dependency for hashing.
+"""
+
+from __future__ import annotations
+
+import itertools
+import zlib
+from collections.abc import Mapping
+from typing import Any
+
+from iotguard.analysis.command import ParsedCommand
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None  # type: ignore[assignment]
+
+_CHAR_NGRAMS = (3, 4)
+_WORD_WEIGHT = 3.0
+
+#: Device key of commands whose device type is unknown.
+ANY_DEVICE = "*"
+
+#: Words that do not change what a command does.
+_FILLER = frozenset(
+    {
+        "a",
+        "an",
+        "the",
+        "please",
+        "kindly",
+        "now",
+        "just",
+        "my",
+        "me",
+        "to",
+        "of",
+        "for",
+        "can",
+        "could",
+        "would",
+        "you",
+    }
+)
+
+
+def command_features(parsed: ParsedCommand) -> tuple[list[str], list[float]]:
+    """Character 3/4-grams plus (heavier) word uni/bigrams, filler removed."""
+    words = [w for w in parsed.tokens if w not in _FILLER] or list(parsed.tokens)
+    text = f" {' '.join(words)} "
+    grams = [f"c:{text[i : i + n]}" for n in _CHAR_NGRAMS for i in range(len(text) - n + 1)]
+    weights = [1.0] * len(grams)
+    grams.extend(f"w:{w}" for w in words)
+    grams.extend(f"b:{a} {b}" for a, b in itertools.pairwise(words))
+    weights.extend([_WORD_WEIGHT] * (len(grams) - len(weights)))
+    return grams, weights
+
+
+def device_key(context: Mapping[str, Any]) -> str:
+    """The lower-cased ``device_type`` of *context*, or :data:`ANY_DEVICE`."""
+    device_type = context.get("device_type")
+    if not device_type:
+        return ANY_DEVICE
+    return str(getattr(device_type, "value", device_type)).lower()
+
+
+def hashed_features(
+    features: list[str],
+    weights: list[float],
+    dimensions: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the ``(indices, values)`` of *features* hashed into *dimensions*.
+
+    Indices may repeat; consumers sum the values of repeated indices.
+    """
+    # Plain Python beats NumPy's per-call overhead at a few dozen features.
+    hashes = [zlib.crc32(f.encode()) for f in features]
+    indices = [h % dimensions for h in hashes]
+    values = [-w if h >> 31 else w for h, w in zip(hashes, weights, strict=True)]
+    return np.array(indices, dtype=np.intp), np.array(values, dtype=np.float32)
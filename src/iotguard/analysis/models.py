@@ -36,6 +36,8 @@ class AnalysisResult(BaseModel):
     safe_alternatives: list[str] = Field(default_factory=list)
     rule_violations: list[str] = Field(default_factory=list)
     was_blocked: bool = False
+    # How sure the engine is of risk_level (0-1); None if it does not say.
+    confidence: float | None = Field(default=None, ge=0.0, le=1.0)
 
 
 # ---------------------------------------------------------------------------
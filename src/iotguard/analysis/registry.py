@@ -0,0 +1,141 @@
+"""Process-wide registry of long-lived analysis engines.
+
+Engines that carry state between requests -- the Gemini circuit breaker,
+the configured SDK client -- must outlive a single HTTP request, otherwise
+the breaker never sees more than one failure.  The registry is built once
+during the application lifespan and handed to every request-scoped
+:class:`~iotguard.analysis.service.AnalysisService`.  Engines share the
+pooled Redis client from :mod:`iotguard.db.redis` for verdict caching.
+
+With ``CASCADE_ENABLED`` the service-facing :attr:`EngineRegistry.llm_engine`
+is a :class:`~iotguard.analysis.engines.cascade.CascadeEngine` that asks a
+cheaper Gemini model first and escalates uncertain verdicts.
+
+With ``LOCAL_MODEL_ENABLED`` the classifier trained from the command log is
+loaded as :attr:`EngineRegistry.local_model`; it becomes the cascade's
+first tier and :attr:`EngineRegistry.fallback_engine`, which answers when
+the LLM fails or runs out of time.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import structlog
+
+from iotguard.analysis.engines.base import AnalysisEngine
+from iotguard.analysis.engines.cascade import CascadeEngine, CascadeTier
+from iotguard.analysis.engines.gemini import GeminiAnalysisEngine
+from iotguard.analysis.engines.local import LocalModelEngine
+from iotguard.analysis.models import RiskLevel
+from iotguard.core.config import Settings
+from iotguard.db.redis import get_redis
+
+logger = structlog.get_logger(__name__)
+
+
+class EngineRegistry:
+    """Own the shared analysis engine instances for the current process."""
+
+    def __init__(self, settings: Settings, *, redis_client: Any | None = None) -> None:
+        self._settings = settings
+        self.redis = redis_client if redis_client is not None else get_redis(settings.redis)
+        self.gemini = GeminiAnalysisEngine(
+            settings.gemini,
+            settings.redis,
+            redis_client=self.redis,
+            cache_settings=settings.cache,
+            semantic_settings=settings.semantic_cache,
+        )
+        self.local_model: LocalModelEngine | None = None
+        self.fallback_engine: AnalysisEngine | None = None
+        if settings.local_model.enabled:
+            self.local_model = LocalModelEngine.load(settings.local_model.path)
+            if settings.local_model.fallback:
+                self.fallback_engine = self.local_model
+        self.cheap_gemini: GeminiAnalysisEngine | None = None
+        self.llm_engine: AnalysisEngine = self.gemini
+        if settings.cascade.enabled:
+            self.llm_engine = self._build_cascade()
+        logger.info(
+            "engine_registry_created",
+            model=settings.gemini.model_name,
+            cascade=settings.cascade.enabled,
+            local_model=settings.local_model.enabled,
+        )
+
+    def _build_cascade(self) -> CascadeEngine:
+        cascade = self._settings.cascade
+        self.cheap_gemini = GeminiAnalysisEngine(
+            self._settings.gemini.model_copy(
+                update={
+                    "model_name": cascade.cheap_model_name,
+                    "temperature": cascade.cheap_temperature,
+                }
+            ),
+            self._settings.redis,
+            redis_client=self.redis,
+            cache_settings=self._settings.cache,
+            name="gemini_cheap",
+        )
+        escalate_on = frozenset(RiskLevel(r.upper()) for r in cascade.escalate_risks)
+        tiers = [
+            CascadeTier(
+                "gemini_cheap",
+                self.cheap_gemini,
+                cost=cascade.cheap_cost,
+                min_confidence=cascade.min_confidence,
+                escalate_on=escalate_on,
+            ),
+            CascadeTier("gemini", self.gemini, cost=cascade.expensive_cost),
+        ]
+        local = self._settings.local_model
+        if self.local_model is not None and local.cascade:
+            tiers.insert(
+                0,
+                CascadeTier(
+                    self.local_model.name,
+                    self.local_model,
+                    cost=local.cost,
+                    min_confidence=local.min_confidence,
+                    escalate_on=escalate_on,
+                ),
+            )
+        return CascadeEngine(tiers)
+
+    async def warm_up(self) -> None:
+        """Warm the LLM clients if ``GEMINI_WARM_UP`` is enabled."""
+        if self._settings.gemini.warm_up:
+            await self.gemini.warm_up()
+            if self.cheap_gemini is not None:
+                await self.cheap_gemini.warm_up()
+
+    async def aclose(self) -> None:
+        """Release resources held by the engines (called on shutdown)."""
+        await self.gemini.aclose()
+        if self.cheap_gemini is not None:
+            await self.cheap_gemini.aclose()
+        logger.info("engine_registry_closed")
+
+
+_registry: EngineRegistry | None = None
+
+
+def get_engine_registry(
+    settings: Settings,
+    *,
+    redis_client: Any | None = None,
+) -> EngineRegistry:
+    """Return (and lazily create) the engine registry singleton."""
+    global _registry
+    if _registry is None:
+        _registry = EngineRegistry(settings, redis_client=redis_client)
+    return _registry
+
+
+async def dispose_engine_registry() -> None:
+    """Close and forget the registry singleton."""
+    global _registry
+    if _registry is not None:
+        await _registry.aclose()
+        _registry = None
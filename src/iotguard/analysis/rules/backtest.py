@@ -0,0 +1,448 @@
+"""Replay historical commands against a candidate rule set.
+
+A backtest answers "what would this rule change have done to past
+traffic?".  The active rules form the baseline; a :class:`RuleSetDiff`
+adds, replaces or removes rules to form the candidate.  Every command in
+``command_logs`` within the time window is evaluated under both rule sets
+and classified as newly blocked, newly allowed, changed risk or
+unchanged.
+
+Rows are streamed from a server-side cursor in chunks and matched in a
+process pool (``re`` holds the GIL), with a bounded number of chunks in
+flight, so memory stays flat however long the history is.  Progress is
+reported per chunk.  :class:`BacktestJobs` runs backtests in the
+background for the rules API, one at a time by default.
+
+The device *state* at the time of a historical command is not logged, so
+commands are replayed without it: state predicates never exclude a rule
+(see :meth:`~iotguard.analysis.rules.compiled.CompiledRule.applies_to`),
+and state-scoped rules may match more history than they would have live.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import UTC, datetime
+from multiprocessing import get_context
+from typing import Any
+
+import structlog
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from iotguard.analysis.engines.rule_based import rule_verdict
+from iotguard.analysis.rules.compiled import CompiledRuleSet
+from iotguard.core.config import RuleSettings
+from iotguard.core.exceptions import BacktestBusyError
+from iotguard.db.models import SecurityRule
+from iotguard.db.repositories import CommandLogRepository, SecurityRuleRepository
+
+logger = structlog.get_logger(__name__)
+
+#: Outcome categories, in report order.
+OUTCOMES = ("newly_blocked", "newly_allowed", "changed_risk")
+
+#: Seconds between progress log lines.
+_PROGRESS_LOG_INTERVAL = 5.0
+
+# (log id, ISO timestamp, command, device id, device type, device primary key)
+BacktestRow = tuple[str, str, str, str | None, str | None, str | None]
+
+
+@dataclass(frozen=True, slots=True)
+class RuleSpec:
+    """A rule as replayed by a backtest; picklable for the worker processes."""
+
+    name: str
+    pattern: str
+    action: str = "BLOCK"
+    priority: int = 100
+    description: str | None = None
+    device_types: tuple[str, ...] | None = None
+    device_ids: tuple[str, ...] | None = None
+    state_predicates: dict[str, Any] | None = None
+
+    @classmethod
+    def from_model(cls, rule: SecurityRule) -> RuleSpec:
+        return cls(
+            name=rule.name,
+            pattern=rule.pattern,
+            action=rule.action,
+            priority=rule.priority,
+            description=rule.description,
+            device_types=tuple(rule.device_types) if rule.device_types else None,
+            device_ids=tuple(rule.device_ids) if rule.device_ids else None,
+            state_predicates=rule.state_predicates or None,
+        )
+
+    def to_model(self) -> SecurityRule:
+        return SecurityRule(
+            name=self.name,
+            pattern=self.pattern,
+            action=self.action,
+            priority=self.priority,
+            description=self.description,
+            device_types=list(self.device_types) if self.device_types else None,
+            device_ids=list(self.device_ids) if self.device_ids else None,
+            state_predicates=self.state_predicates,
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class RuleSetDiff:
+    """Candidate changes to the active rule set.
+
+    Rules in *upsert* replace active rules of the same name or are added;
+    rules named in *remove* are dropped.
+    """
+
+    upsert: tuple[RuleSpec, ...] = ()
+    remove: tuple[str, ...] = ()
+
+    def apply(self, baseline: Sequence[RuleSpec]) -> list[RuleSpec]:
+        replaced = {spec.name for spec in self.upsert} | set(self.remove)
+        return [spec for spec in baseline if spec.name not in replaced] + list(self.upsert)
+
+
+@dataclass(frozen=True, slots=True)
+class BacktestSample:
+    """One historical command whose outcome the candidate changes."""
+
+    log_id: str
+    timestamp: str
+    command: str
+    device_type: str | None
+    risk_before: str
+    risk_after: str
+    blocked_before: bool
+    blocked_after: bool
+    rules_after: tuple[str, ...]
+
+
+@dataclass(slots=True)
+class BacktestReport:
+    """Aggregate outcome of a backtest; mergeable across chunks."""
+
+    scanned: int = 0
+    newly_blocked: int = 0
+    newly_allowed: int = 0
+    changed_risk: int = 0
+    unchanged: int = 0
+    samples: dict[str, list[BacktestSample]] = field(
+        default_factory=lambda: {outcome: [] for outcome in OUTCOMES}
+    )
+
+    def merge(self, other: BacktestReport, sample_limit: int) -> None:
+        self.scanned += other.scanned
+        self.newly_blocked += other.newly_blocked
+        self.newly_allowed += other.newly_allowed
+        self.changed_risk += other.changed_risk
+        self.unchanged += other.unchanged
+        for outcome, samples in other.samples.items():
+            kept = self.samples[outcome]
+            kept.extend(samples[: max(sample_limit - len(kept), 0)])
+
+    def to_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(frozen=True, slots=True)
+class BacktestProgress:
+    processed: int
+    total: int
+
+    @property
+    def fraction(self) -> float:
+        return self.processed / self.total if self.total else 1.0
+
+
+# ---------------------------------------------------------------------------
+# Worker processes
+# ---------------------------------------------------------------------------
+
+_worker_state: tuple[CompiledRuleSet, CompiledRuleSet, int] | None = None
+
+
+def _compile(specs: Sequence[RuleSpec], matcher: str) -> CompiledRuleSet:
+    return CompiledRuleSet.compile([s.to_model() for s in specs], version=0, matcher=matcher)
+
+
+def _init_worker(
+    baseline: Sequence[RuleSpec],
+    candidate: Sequence[RuleSpec],
+    matcher: str,
+    sample_limit: int,
+) -> None:
+    """Compile both rule sets once per worker process."""
+    global _worker_state
+    _worker_state = (_compile(baseline, matcher), _compile(candidate, matcher), sample_limit)
+
+
+def replay_chunk(
+    rows: Sequence[BacktestRow],
+    baseline: CompiledRuleSet,
+    candidate: CompiledRuleSet,
+    sample_limit: int,
+) -> BacktestReport:
+    """Classify *rows* by their outcome under *baseline* vs *candidate*.
+
+    The context carries no ``state`` (it is not logged with commands), so
+    state predicates do not exclude rules.
+    """
+    report = BacktestReport()
+    for log_id, timestamp, command, device_id, device_type, device_pk in rows:
+        context = {"device_id": device_id, "device_type": device_type, "device_pk": device_pk}
+        risk_before, blocked_before = rule_verdict(baseline.match(command, context=context))
+        matched_after = candidate.match(command, context=context)
+        risk_after, blocked_after = rule_verdict(matched_after)
+
+        report.scanned += 1
+        if blocked_after and not blocked_before:
+            outcome = "newly_blocked"
+        elif blocked_before and not blocked_after:
+            outcome = "newly_allowed"
+        elif risk_before != risk_after:
+            outcome = "changed_risk"
+        else:
+            report.unchanged += 1
+            continue
+        setattr(report, outcome, getattr(report, outcome) + 1)
+        samples = report.samples[outcome]
+        if len(samples) < sample_limit:
+            samples.append(
+                BacktestSample(
+                    log_id=log_id,
+                    timestamp=timestamp,
+                    command=command[:512],
+                    device_type=device_type,
+                    risk_before=risk_before.value,
+                    risk_after=risk_after.value,
+                    blocked_before=blocked_before,
+                    blocked_after=blocked_after,
+                    rules_after=tuple(r.name for r in matched_after),
+                )
+            )
+    return report
+
+
+def _replay_in_worker(rows: Sequence[BacktestRow]) -> BacktestReport:
+    assert _worker_state is not None, "backtest worker not initialised"
+    return replay_chunk(rows, *_worker_state)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+
+class BacktestRunner:
+    """Stream a window of ``command_logs`` through a process pool."""
+
+    def __init__(self, engine: AsyncEngine, settings: RuleSettings) -> None:
+        self._engine = engine
+        self._settings = settings
+
+    async def run(
+        self,
+        diff: RuleSetDiff,
+        *,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        progress: Callable[[BacktestProgress], None] | None = None,
+    ) -> BacktestReport:
+        settings = self._settings
+        workers = settings.backtest_workers or os.cpu_count() or 1
+        sample_limit = settings.backtest_sample_limit
+
+        async with AsyncSession(self._engine) as session:
+            baseline = [
+                RuleSpec.from_model(r) for r in await SecurityRuleRepository(session).list_active()
+            ]
+            total = await CommandLogRepository(session).count_window(since=since, until=until)
+        candidate = diff.apply(baseline)
+        logger.info(
+            "rule_backtest_started",
+            rows=total,
+            baseline_rules=len(baseline),
+            candidate_rules=len(candidate),
+            workers=workers,
+        )
+        state_scoped = sorted({s.name for s in (*baseline, *candidate) if s.state_predicates})
+        if state_scoped:
+            logger.warning("rule_backtest_state_unknown", rules=state_scoped)
+
+        report = BacktestReport()
+        loop = asyncio.get_running_loop()
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(baseline, candidate, settings.matcher, sample_limit),
+        )
+        pending: set[asyncio.Future[BacktestReport]] = set()
+        last_log = time.monotonic()
+
+        def collect(done: set[asyncio.Future[BacktestReport]]) -> None:
+            nonlocal last_log
+            for fut in done:
+                report.merge(fut.result(), sample_limit)
+            status = BacktestProgress(processed=report.scanned, total=max(total, report.scanned))
+            if progress is not None:
+                progress(status)
+            if time.monotonic() - last_log >= _PROGRESS_LOG_INTERVAL:
+                last_log = time.monotonic()
+                logger.info(
+                    "rule_backtest_progress",
+                    processed=status.processed,
+                    total=status.total,
+                    percent=round(status.fraction * 100, 1),
+                )
+
+        try:
+            async with AsyncSession(self._engine) as session:
+                batches = CommandLogRepository(session).stream_window(
+                    since=since, until=until, batch_size=settings.backtest_chunk_size
+                )
+                async for batch in batches:
+                    rows: list[BacktestRow] = [
+                        (
+                            str(log_id),
+                            ts.isoformat() if ts else "",
+                            command,
+                            device_id,
+                            kind,
+                            str(pk) if pk is not None else None,
+                        )
+                        for log_id, ts, command, device_id, kind, pk in batch
+                    ]
+                    pending.add(loop.run_in_executor(pool, _replay_in_worker, rows))
+                    # Bound the rows held in memory: two chunks per worker.
+                    if len(pending) >= workers * 2:
+                        done, pending = await asyncio.wait(
+                            pending, return_when=asyncio.FIRST_COMPLETED
+                        )
+                        collect(done)
+            if pending:
+                done, pending = await asyncio.wait(pending)
+                collect(done)
+        finally:
+            for fut in pending:
+                fut.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        logger.info(
+            "rule_backtest_finished",
+            scanned=report.scanned,
+            newly_blocked=report.newly_blocked,
+            newly_allowed=report.newly_allowed,
+            changed_risk=report.changed_risk,
+        )
+        return report
+
+
+# ---------------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------------
+
+
+@dataclass(slots=True)
+class BacktestJob:
+    id: str
+    status: str = "running"  # running | completed | failed | cancelled
+    processed: int = 0
+    total: int = 0
+    started_at: datetime = field(default_factory=lambda: datetime.now(UTC))
+    finished_at: datetime | None = None
+    report: BacktestReport | None = None
+    error: str | None = None
+    task: asyncio.Task[None] | None = field(default=None, repr=False)
+
+
+class BacktestJobs:
+    """In-process registry of background backtests.
+
+    At most *max_running* backtests run at once; each one saturates a
+    process pool.  Finished jobs are kept for inspection up to *keep* at a
+    time.
+    """
+
+    def __init__(self, *, keep: int = 20, max_running: int = 1) -> None:
+        self._jobs: dict[str, BacktestJob] = {}
+        self._keep = keep
+        self._max_running = max_running
+
+    def start(
+        self,
+        runner: BacktestRunner,
+        diff: RuleSetDiff,
+        *,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> BacktestJob:
+        """Start a backtest; raises :class:`BacktestBusyError` when at capacity."""
+        running = sum(1 for j in self._jobs.values() if j.finished_at is None)
+        if running >= self._max_running:
+            raise BacktestBusyError(
+                f"{running} backtest(s) already running; retry when they finish"
+            )
+        job = BacktestJob(id=uuid.uuid4().hex)
+
+        def on_progress(status: BacktestProgress) -> None:
+            job.processed, job.total = status.processed, status.total
+
+        async def _run() -> None:
+            try:
+                job.report = await runner.run(diff, since=since, until=until, progress=on_progress)
+                job.status = "completed"
+            except asyncio.CancelledError:
+                job.status = "cancelled"
+                raise
+            except Exception as exc:
+                logger.exception("rule_backtest_failed", job_id=job.id)
+                job.status, job.error = "failed", str(exc)
+            finally:
+                job.finished_at = datetime.now(UTC)
+
+        self._prune()
+        job.task = asyncio.get_running_loop().create_task(_run())
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> BacktestJob | None:
+        return self._jobs.get(job_id)
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if j.finished_at is not None]
+        finished.sort(key=lambda j: j.finished_at or j.started_at)
+        for job in finished[: max(len(finished) - self._keep + 1, 0)]:
+            del self._jobs[job.id]
+
+    async def cancel_all(self) -> None:
+        tasks = [j.task for j in self._jobs.values() if j.task is not None and not j.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_jobs: BacktestJobs | None = None
+
+
+def get_backtest_jobs() -> BacktestJobs:
+    """Return (and lazily create) the process-wide backtest job registry."""
+    global _jobs
+    if _jobs is None:
+        _jobs = BacktestJobs()
+    return _jobs
+
+
+async def dispose_backtest_jobs() -> None:
+    """Cancel running backtests and forget the registry."""
+    global _jobs
+    if _jobs is not None:
+        await _jobs.cancel_all()
+        _jobs = None
@@ -0,0 +1,601 @@
+"""Compiled, versioned snapshot of the active security rules.
+
+Loading rules from Postgres and compiling their regexes on every command is
+wasteful: the rule catalogue changes rarely but is read on every analysis.
+:class:`RuleSetStore` keeps one immutable :class:`CompiledRuleSet` per
+process.  Readers grab the current snapshot without locking; writers call
+:meth:`RuleSetStore.bump` after changing rules, and the next reader
+reloads and atomically swaps in a fresh snapshot.
+
+Rules may be scoped to device types, device ids and device-state values.
+A snapshot keeps one :class:`RulePartition` per device type (its rules
+plus the global ones) so a command only runs against the rules that can
+apply to its target device.  Verdicts for repeated commands are served
+from a :class:`~iotguard.analysis.rules.memo.VerdictMemo` shared by the
+store's snapshots.
+
+Patterns are validated (:mod:`~iotguard.analysis.rules.validation`) the
+first time a process loads them; until then, and afterwards if they prove
+costly, they run in the :class:`~iotguard.analysis.rules.guard.RuleGuard`
+sandbox.  Coroutines evaluate through :meth:`CompiledRuleSet.match_async`,
+which keeps waits for the sandbox off the event loop.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import uuid
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from dataclasses import dataclass, field
+from functools import partial
+from math import inf
+from typing import Any, TypeVar
+
+import structlog
+
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.rules.guard import RuleGuard, RuleStats, get_rule_guard
+from iotguard.analysis.rules.matcher import LoopMatcher, RuleMatcher, RulePattern, build_matcher
+from iotguard.analysis.rules.memo import VerdictMemo, folds_case, normalize_command
+from iotguard.analysis.rules.ordering import RuleCounters, adaptive_score
+from iotguard.analysis.rules.validation import PatternValidator, get_pattern_validator
+from iotguard.core.config import RuleSettings
+from iotguard.core.exceptions import InvalidRuleError
+from iotguard.db.models import SecurityRule
+from iotguard.db.repositories import SecurityRuleRepository
+from iotguard.observability.metrics import rule_verdict_cache_entries
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledRule:
+    """An active rule with its pattern compiled once."""
+
+    id: uuid.UUID | None
+    name: str
+    pattern: str
+    action: str  # BLOCK | WARN | LOG
+    description: str
+    priority: int
+    regex: re.Pattern[str]
+    cost_us: float | None = None
+    hit_count: int = 0
+    eval_count: int = 0
+    device_types: frozenset[str] = frozenset()
+    device_ids: frozenset[str] = frozenset()
+    state_predicates: tuple[tuple[str, Any], ...] = ()
+
+    @classmethod
+    def from_model(cls, rule: SecurityRule) -> CompiledRule:
+        """Compile *rule*; raises :class:`re.error` for invalid patterns."""
+        return cls(
+            id=rule.id,
+            name=rule.name,
+            pattern=rule.pattern,
+            action=(rule.action or "BLOCK").upper(),
+            description=rule.description or "",
+            priority=rule.priority if rule.priority is not None else 100,
+            regex=re.compile(rule.pattern, re.IGNORECASE),
+            cost_us=rule.cost_us,
+            hit_count=rule.hit_count or 0,
+            eval_count=rule.eval_count or 0,
+            device_types=frozenset(t.lower() for t in rule.device_types or ()),
+            device_ids=frozenset(str(d) for d in rule.device_ids or ()),
+            state_predicates=tuple(sorted((rule.state_predicates or {}).items())),
+        )
+
+    @property
+    def key(self) -> str:
+        """Identity used for per-rule statistics."""
+        return str(self.id) if self.id is not None else self.name
+
+    @property
+    def has_context_scope(self) -> bool:
+        return bool(self.device_ids or self.state_predicates)
+
+    def applies_to(self, context: Mapping[str, Any]) -> bool:
+        """Check the device-id and state scope against *context*.
+
+        Values missing from *context* never exclude a rule, so incomplete
+        context errs on the side of evaluating it.
+        """
+        if self.device_ids:
+            ids = _device_ids(context)
+            if ids and ids.isdisjoint(self.device_ids):
+                return False
+        if self.state_predicates:
+            state = context.get("state")
+            if isinstance(state, Mapping):
+                for key, expected in self.state_predicates:
+                    if key in state and state[key] != expected:
+                        return False
+        return True
+
+
+def _order(rules: list[CompiledRule], adaptive: bool) -> None:
+    """Sort *rules* in place into rule-set order."""
+    if adaptive:
+        rules.sort(key=lambda r: (r.priority, -adaptive_score(r), r.name))
+    else:
+        # Cheapest first within a priority tier; unmeasured rules go last.
+        rules.sort(key=lambda r: (r.priority, r.cost_us if r.cost_us is not None else inf, r.name))
+
+
+#: Partition holding only the rules without a device-type scope.
+GLOBAL_PARTITION = "*"
+
+
+@dataclass(frozen=True, slots=True)
+class RulePartition:
+    """The rules that can apply to one device type, with their own matcher."""
+
+    key: str
+    indices: tuple[int, ...]  # positions in CompiledRuleSet.rules, ascending
+    matcher: RuleMatcher
+
+
+def _device_ids(context: Mapping[str, Any]) -> frozenset[str]:
+    """Return every form of the device's id in *context*.
+
+    A rule's ``device_ids`` may name a device by external id or primary
+    key, so both are matched.
+    """
+    return frozenset(
+        str(value) for key in ("device_id", "device_pk") if (value := context.get(key)) is not None
+    )
+
+
+def _device_type(context: Mapping[str, Any] | None) -> str | None:
+    if context is None:
+        return None
+    device_type = context.get("device_type")
+    if not device_type:
+        return None
+    return str(getattr(device_type, "value", device_type)).lower()
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledRuleSet:
+    """Immutable snapshot of compiled rules, ordered by priority.
+
+    Within a priority tier rules are ordered by cost, or adaptively by hit
+    rate and cost (see :mod:`~iotguard.analysis.rules.ordering`).
+    """
+
+    version: int
+    rules: tuple[CompiledRule, ...] = ()
+    matcher: RuleMatcher = field(default_factory=lambda: LoopMatcher(()))
+    stats: tuple[RuleStats, ...] = ()
+    counters: RuleCounters | None = None
+    partitions: Mapping[str, RulePartition] = field(default_factory=dict)
+    context_scoped: bool = False
+    # Device ids and state predicates any rule is scoped to (memo keys)
+    scope_ids: frozenset[str] = frozenset()
+    scope_predicates: tuple[tuple[str, Any], ...] = ()
+    memo: VerdictMemo | None = None
+    # Whether memo keys may be case-folded (see memo.folds_case)
+    fold_case: bool = True
+    guard: RuleGuard | None = None
+
+    @classmethod
+    def compile(
+        cls,
+        rules: Iterable[SecurityRule],
+        *,
+        version: int,
+        matcher: str = "literal",
+        guard: RuleGuard | None = None,
+        adaptive: bool = False,
+        counters: RuleCounters | None = None,
+        memo: VerdictMemo | None = None,
+    ) -> CompiledRuleSet:
+        """Compile *rules*, dropping (and logging once) invalid patterns.
+
+        *matcher* names the :mod:`~iotguard.analysis.rules.matcher` back-end
+        used to evaluate the whole set against a command.  With a *guard*,
+        every search runs under its time budget and is accounted per rule.
+        With *adaptive*, rules of equal priority are ordered by
+        :func:`~iotguard.analysis.rules.ordering.adaptive_score` instead of
+        by cost alone.  Full evaluations are recorded in *counters*.
+        Verdicts are memoised in *memo*.
+        """
+        compiled: list[CompiledRule] = []
+        for rule in rules:
+            try:
+                compiled.append(CompiledRule.from_model(rule))
+            except re.error as exc:
+                logger.warning(
+                    "invalid_rule_pattern",
+                    rule=rule.name,
+                    pattern=rule.pattern,
+                    error=str(exc),
+                )
+        _order(compiled, adaptive)
+        patterns: list[RulePattern]
+        if guard is None:
+            patterns = [r.regex for r in compiled]
+            stats: tuple[RuleStats, ...] = ()
+        else:
+            guarded = [
+                guard.wrap(r.key, r.name, r.regex, fail_closed=r.action == "BLOCK")
+                for r in compiled
+            ]
+            patterns = list(guarded)
+            stats = tuple(g.stats for g in guarded)
+        partitions: dict[str, RulePartition] = {}
+        device_types = sorted({t for r in compiled for t in r.device_types})
+        if device_types:
+            for key in (GLOBAL_PARTITION, *device_types):
+                indices = tuple(
+                    i
+                    for i, r in enumerate(compiled)
+                    if not r.device_types or key in r.device_types
+                )
+                partitions[key] = RulePartition(
+                    key=key,
+                    indices=indices,
+                    matcher=build_matcher(matcher, [patterns[i] for i in indices]),
+                )
+        scope_predicates: list[tuple[str, Any]] = []
+        for compiled_rule in compiled:
+            for predicate in compiled_rule.state_predicates:
+                if predicate not in scope_predicates:
+                    scope_predicates.append(predicate)
+        return cls(
+            version=version,
+            rules=tuple(compiled),
+            matcher=build_matcher(matcher, patterns),
+            stats=stats,
+            counters=counters,
+            partitions=partitions,
+            context_scoped=any(r.has_context_scope for r in compiled),
+            scope_ids=frozenset(d for r in compiled for d in r.device_ids),
+            scope_predicates=tuple(scope_predicates),
+            memo=memo,
+            fold_case=folds_case(r.pattern for r in compiled),
+            guard=guard,
+        )
+
+    def partition_for(self, context: Mapping[str, Any] | None) -> RulePartition | None:
+        """Return the partition for the context's device type.
+
+        ``None`` means the whole set: the rule set has no type-scoped rules
+        or the device type is unknown (every rule may then apply).
+        """
+        if not self.partitions:
+            return None
+        device_type = _device_type(context)
+        if device_type is None:
+            return None
+        return self.partitions.get(device_type) or self.partitions[GLOBAL_PARTITION]
+
+    def scope_key(
+        self, context: Mapping[str, Any] | None, partition: RulePartition | None
+    ) -> tuple[Any, ...]:
+        """Reduce *context* to what the rules' scopes can tell apart."""
+        if context is None:
+            return ()
+        key: list[Any] = [partition.key if partition is not None else None]
+        if self.scope_ids:
+            ids = _device_ids(context)
+            # Ids no rule names are excluded by every id-scoped rule alike.
+            key.append(tuple(sorted(ids & self.scope_ids)) if ids else None)
+        if self.scope_predicates:
+            state = context.get("state")
+            if isinstance(state, Mapping):
+                key.extend(
+                    None if name not in state else state[name] == expected
+                    for name, expected in self.scope_predicates
+                )
+        return tuple(key)
+
+    def match(
+        self,
+        command: str | ParsedCommand,
+        *,
+        first_block: bool = False,
+        context: Mapping[str, Any] | None = None,
+        dry_run: bool = False,
+    ) -> list[CompiledRule]:
+        """Return the rules whose pattern matches *command*, in rule-set order.
+
+        With a device *context* only rules whose scope admits it are
+        evaluated (see :meth:`partition_for` and
+        :meth:`CompiledRule.applies_to`).  With *first_block* evaluation
+        stops at the first matching ``BLOCK`` rule: the blocked verdict and
+        reason are the same as for a full evaluation, but later WARN/LOG
+        matches are not reported.  A *dry_run* is not counted towards
+        adaptive ordering.
+
+        Blocks while sandboxed rules run; coroutines use :meth:`match_async`.
+        """
+        if isinstance(command, ParsedCommand):
+            text, folded = command.raw, command.folded
+        else:
+            text, folded = command, None
+        partition = self.partition_for(context)
+        memo = self.memo
+        count = not (first_block or dry_run)
+        if memo is None:
+            indices = self._evaluate(text, first_block, context, partition)
+            return self._record(indices, count, partition)
+
+        if not self.fold_case:
+            folded = text
+        elif folded is None:
+            folded = normalize_command(text)
+        key = (folded, self.scope_key(context, partition), first_block)
+        cached = memo.get(self.version, key)
+        if cached is not None:
+            return self._record(cached, count, partition)
+        guard = self.guard
+        overruns = guard.overruns if guard is not None else 0
+        indices = self._evaluate(text, first_block, context, partition)
+        # A verdict reached past the time budget (or failed closed) is not
+        # reused; the next identical command is evaluated afresh.
+        if guard is None or guard.overruns == overruns:
+            memo.put(self.version, key, tuple(indices))
+        return self._record(indices, count, partition)
+
+    def _evaluate(
+        self,
+        command: str,
+        first_block: bool,
+        context: Mapping[str, Any] | None,
+        partition: RulePartition | None,
+    ) -> list[int]:
+        rules = self.rules
+        matcher = self.matcher if partition is None else partition.matcher
+        local = None if partition is None else partition.indices
+        scoped = context is not None and self.context_scoped
+
+        indices: list[int] = []
+        found = matcher.iter_matches(command) if first_block else matcher.match(command)
+        for i in found:
+            if local is not None:
+                i = local[i]
+            rule = rules[i]
+            if scoped and not rule.applies_to(context):  # type: ignore[arg-type]
+                continue
+            indices.append(i)
+            if first_block and rule.action == "BLOCK":
+                break
+        return indices
+
+    def _record(
+        self, indices: Sequence[int], count: bool, partition: RulePartition | None
+    ) -> list[CompiledRule]:
+        """Count hits of the matched *indices* and return their rules.
+
+        Adaptive-order counters only see evaluations that *count*: full
+        evaluations of real traffic.
+        """
+        rules, stats = self.rules, self.stats
+        if stats:
+            for i in indices:
+                stats[i].hits += 1
+        matched = [rules[i] for i in indices]
+        if self.counters is not None and count:
+            self.counters.record(self, matched, partition=partition)
+        return matched
+
+    async def match_async(
+        self,
+        command: str | ParsedCommand,
+        *,
+        first_block: bool = False,
+        context: Mapping[str, Any] | None = None,
+        dry_run: bool = False,
+    ) -> list[CompiledRule]:
+        """:meth:`match` for coroutines."""
+        return await self._offload(
+            partial(self.match, command, first_block=first_block, context=context, dry_run=dry_run)
+        )
+
+    async def match_many_async(
+        self,
+        commands: Sequence[str | ParsedCommand],
+        *,
+        first_block: bool = False,
+        context: Mapping[str, Any] | None = None,
+        dry_run: bool = False,
+    ) -> list[list[CompiledRule]]:
+        """:meth:`match_many` for coroutines.
+
+        Always runs off the event loop: a batch of thousands of commands
+        stalls it even when every rule is cheap.
+        """
+        return await self._offload(
+            partial(
+                self.match_many,
+                commands,
+                first_block=first_block,
+                context=context,
+                dry_run=dry_run,
+            ),
+            batch=True,
+        )
+
+    async def _offload(self, evaluate: Callable[[], T], *, batch: bool = False) -> T:
+        """Run *evaluate* on the guard's thread while any rule is sandboxed.
+
+        Otherwise a *batch* goes to a worker thread and a single command is
+        evaluated inline.
+        """
+        guard = self.guard
+        if guard is not None and any(s.sandboxed for s in self.stats):
+            return await guard.run(evaluate)
+        if batch:
+            return await asyncio.to_thread(evaluate)
+        return evaluate()
+
+    def match_many(
+        self,
+        commands: Sequence[str | ParsedCommand],
+        *,
+        first_block: bool = False,
+        context: Mapping[str, Any] | None = None,
+        dry_run: bool = False,
+    ) -> list[list[CompiledRule]]:
+        """Return :meth:`match` for each of *commands*, in order.
+
+        Duplicate commands are matched once even without a memo;
+        adaptive-order counters still see every command.
+        """
+        partition = self.partition_for(context)
+        unique: dict[str, list[CompiledRule]] = {}
+        results: list[list[CompiledRule]] = []
+        for command in commands:
+            text = str(command)
+            matched = unique.get(text)
+            if matched is None:
+                matched = unique[text] = self.match(
+                    command, first_block=first_block, context=context, dry_run=dry_run
+                )
+            elif self.counters is not None and not (first_block or dry_run):
+                self.counters.record(self, matched, partition=partition)
+            results.append(matched)
+        return results
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+
+class RuleSetStore:
+    """Process-wide holder of the current :class:`CompiledRuleSet`.
+
+    The version only ever increases.  A snapshot is current when its
+    version equals the store's version; otherwise the next call to
+    :meth:`get` reloads from the database.
+    """
+
+    def __init__(
+        self,
+        *,
+        matcher: str = "literal",
+        guard: RuleGuard | None = None,
+        adaptive: bool = False,
+        memo_size: int = 0,
+        validator: PatternValidator | None = None,
+    ) -> None:
+        self._matcher = matcher
+        self._guard = guard
+        self._validator = validator
+        self._adaptive = adaptive
+        self.counters = RuleCounters()
+        self.memo = VerdictMemo(memo_size) if memo_size > 0 else None
+        self._version = 1
+        self._snapshot: CompiledRuleSet | None = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    @property
+    def snapshot(self) -> CompiledRuleSet | None:
+        """The last loaded snapshot (possibly stale), or ``None``."""
+        return self._snapshot
+
+    def order_changed(self, rules: Iterable[SecurityRule]) -> bool:
+        """``True`` if the current snapshot orders *rules* differently.
+
+        *rules* carry the latest stored hit counts; reloading only when the
+        order moves keeps the snapshot (and the verdict memo) warm.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return False
+        compiled: list[CompiledRule] = []
+        for rule in rules:
+            try:
+                compiled.append(CompiledRule.from_model(rule))
+            except re.error:
+                continue
+        _order(compiled, self._adaptive)
+        return [r.key for r in compiled] != [r.key for r in snapshot.rules]
+
+    def bump(self) -> int:
+        """Mark the current snapshot stale and return the new version."""
+        self._version += 1
+        logger.info("rule_set_invalidated", version=self._version)
+        return self._version
+
+    async def get(self, repo: SecurityRuleRepository) -> CompiledRuleSet:
+        """Return the current snapshot, reloading through *repo* if stale."""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self._version:
+            return snapshot
+
+        async with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == self._version:
+                return snapshot
+            # Capture the version *before* querying so that a bump racing
+            # with the load leaves the new snapshot stale.
+            version = self._version
+            rules = await repo.list_active()
+            snapshot = CompiledRuleSet.compile(
+                rules,
+                version=version,
+                matcher=self._matcher,
+                guard=self._guard,
+                adaptive=self._adaptive,
+                counters=self.counters,
+                memo=self.memo,
+            )
+            await self._validate(snapshot)
+            self._snapshot = snapshot
+            logger.info("rule_set_loaded", version=version, count=len(snapshot))
+            return snapshot
+
+    async def _validate(self, rule_set: CompiledRuleSet) -> None:
+        """Validate the rules whose pattern this process has not checked yet.
+
+        Rules already in the database may predate validation or have been
+        validated under other limits.  Cheap rules leave the sandbox; rules
+        that fail are quarantined but keep running.
+        """
+        guard, validator = self._guard, self._validator
+        if guard is None or validator is None:
+            return
+        for rule, stats in zip(rule_set.rules, rule_set.stats, strict=True):
+            if stats.validated:
+                continue
+            try:
+                cost = await validator.validate_async(rule.pattern)
+            except InvalidRuleError as exc:
+                guard.reject(rule.key, rule.name, str(exc))
+            except Exception:
+                # Leave the rule in the sandbox and retry on the next load.
+                logger.exception("rule_validation_error", rule=rule.name)
+            else:
+                guard.admit(rule.key, rule.name, cheap=not cost.warnings)
+
+
+_store: RuleSetStore | None = None
+
+
+def get_rule_store(settings: RuleSettings | None = None) -> RuleSetStore:
+    """Return (and lazily create) the process-wide rule store.
+
+    *settings* only take effect on the call that creates the store, which
+    is normally the application lifespan.
+    """
+    global _store
+    if _store is None:
+        settings = settings or RuleSettings()
+        _store = RuleSetStore(
+            matcher=settings.matcher,
+            guard=get_rule_guard(settings),
+            adaptive=settings.adaptive_order,
+            memo_size=settings.verdict_cache_size,
+            validator=get_pattern_validator(settings),
+        )
+        if _store.memo is not None:
+            rule_verdict_cache_entries.set_function(_store.memo.__len__)
+    return _store
@@ -1,20 +1,22 @@
-"""Security rule engine -- loads rules from the database and evaluates them.
+"""Security rule engine -- evaluates the compiled rule set against commands.
 
 Rules are ordered by priority (ascending -- lower number = higher priority)
 and evaluated sequentially.  A ``BLOCK`` action on any rule causes the
-entire command to be rejected.
+entire command to be rejected.  Rules are loaded and compiled once per
+process by :class:`~iotguard.analysis.rules.compiled.RuleSetStore`.
 """
 
 from __future__ import annotations
 
-import re
+from collections.abc import Mapping, Sequence
 from dataclasses import dataclass, field
-from typing import Sequence
+from typing import Any
 
 import structlog
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from iotguard.db.models import SecurityRule
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.rules.compiled import CompiledRule, RuleSetStore, get_rule_store
 from iotguard.db.repositories import SecurityRuleRepository
 
 logger = structlog.get_logger(__name__)
@@ -52,70 +54,111 @@ class RuleEvaluationResult:
         return [m for m in self.matches if m.action == "LOG"]
 
 
-class SecurityRuleEngine:
-    """Load rules from the DB and match them against commands."""
+def _evaluation_result(rules: Sequence[CompiledRule]) -> RuleEvaluationResult:
+    """Build the result for the matched *rules* (in rule-set order)."""
+    result = RuleEvaluationResult()
+    for rule in rules:
+        result.matches.append(
+            RuleMatch(
+                rule_name=rule.name,
+                pattern=rule.pattern,
+                action=rule.action,
+                description=rule.description,
+                priority=rule.priority,
+            )
+        )
+        if rule.action == "BLOCK" and not result.blocked:
+            result.blocked = True
+            result.block_reason = (
+                f"Blocked by rule '{rule.name}' (priority {rule.priority}): "
+                f"{rule.description or rule.pattern}"
+            )
+    return result
+
 
-    def __init__(self, session: AsyncSession) -> None:
+class SecurityRuleEngine:
+    """Match commands against the shared, compiled rule set."""
+
+    def __init__(
+        self,
+        session: AsyncSession,
+        *,
+        rule_store: RuleSetStore | None = None,
+    ) -> None:
         self._repo = SecurityRuleRepository(session)
-        self._cached_rules: list[SecurityRule] | None = None
+        self._store = rule_store or get_rule_store()
 
-    async def load_rules(self, *, force: bool = False) -> Sequence[SecurityRule]:
-        """Fetch active rules from the database, caching them for the session.
+    async def load_rules(self, *, force: bool = False) -> Sequence[CompiledRule]:
+        """Return the active compiled rules, loading them if stale.
 
-        Pass ``force=True`` to bypass the cache and reload.
+        Pass ``force=True`` to invalidate the shared rule set and reload.
         """
-        if self._cached_rules is None or force:
-            self._cached_rules = list(await self._repo.list_active())
-            logger.info("rules_loaded", count=len(self._cached_rules))
-        return self._cached_rules
-
-    async def evaluate(self, command: str) -> RuleEvaluationResult:
+        if force:
+            self._store.bump()
+        rule_set = await self._store.get(self._repo)
+        return rule_set.rules
+
+    async def evaluate(
+        self,
+        command: str | ParsedCommand,
+        *,
+        first_block: bool = False,
+        context: Mapping[str, Any] | None = None,
+        dry_run: bool = False,
+    ) -> RuleEvaluationResult:
         """Match *command* against all active rules and return the result.
 
         Rules are evaluated in priority order.  If multiple rules match,
         all matches are recorded but the first ``BLOCK`` action encountered
-        determines the overall blocked status.
+        determines the overall blocked status.  Callers that only need the
+        verdict can pass ``first_block=True`` to stop at that rule; the
+        default full evaluation keeps audit records complete.  With a
+        device *context* (``device_type``, ``device_id``, ``state``) only
+        the rules scoped to that device are evaluated.  A *dry_run* (rule
+        testing) does not feed adaptive rule ordering.
         """
-        rules = await self.load_rules()
-        result = RuleEvaluationResult()
-
+        rule_set = await self._store.get(self._repo)
+        rules = await rule_set.match_async(
+            command, first_block=first_block, context=context, dry_run=dry_run
+        )
         for rule in rules:
-            try:
-                if not re.search(rule.pattern, command, re.IGNORECASE):
-                    continue
-            except re.error:
-                logger.warning(
-                    "invalid_rule_pattern",
-                    rule=rule.name,
-                    pattern=rule.pattern,
-                )
-                continue
-
-            match = RuleMatch(
-                rule_name=rule.name,
-                pattern=rule.pattern,
-                action=rule.action.upper(),
-                description=rule.description or "",
-                priority=rule.priority,
-            )
-            result.matches.append(match)
-
-            if match.action == "BLOCK" and not result.blocked:
-                result.blocked = True
-                result.block_reason = (
-                    f"Blocked by rule '{rule.name}' (priority {rule.priority}): "
-                    f"{rule.description or rule.pattern}"
-                )
-
             logger.info(
                 "rule_matched",
                 rule=rule.name,
-                action=match.action,
-                command=command[:100],
+                action=rule.action,
+                command=str(command)[:100],
             )
-
-        return result
+        return _evaluation_result(rules)
+
+    async def evaluate_many(
+        self,
+        commands: Sequence[str | ParsedCommand],
+        *,
+        first_block: bool = False,
+        context: Mapping[str, Any] | None = None,
+        dry_run: bool = False,
+    ) -> list[RuleEvaluationResult]:
+        """Evaluate a batch of *commands*; one result per command, in order.
+
+        Equivalent to calling :meth:`evaluate` per command, but the whole
+        batch runs against one rule-set snapshot, identical commands are
+        matched once and a single summary line is logged instead of one
+        line per match.
+        """
+        rule_set = await self._store.get(self._repo)
+        matched = await rule_set.match_many_async(
+            commands, first_block=first_block, context=context, dry_run=dry_run
+        )
+        results = [_evaluation_result(rules) for rules in matched]
+        logger.info(
+            "rules_batch_evaluated",
+            commands=len(commands),
+            matched=sum(1 for r in results if r.has_matches),
+            blocked=sum(1 for r in results if r.blocked),
+            version=rule_set.version,
+        )
+        return results
 
     def invalidate_cache(self) -> None:
-        """Clear the in-memory rule cache so the next evaluation reloads."""
-        self._cached_rules = None
+        """Invalidate the shared rule set so the next evaluation reloads."""
+        self._store.bump()
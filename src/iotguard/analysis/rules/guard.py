@@ -0,0 +1,386 @@
+"""Time-budgeted rule execution and per-rule cost accounting.
+
+Rule patterns are written by operators, and a single catastrophic
+backtracking search holds the GIL -- stalling the event loop for every
+request.  Threads cannot help (``re`` never releases the GIL), so
+:class:`RuleGuard` combines three defences:
+
+* every rule starts in a sandbox process with a hard timeout of the match
+  budget, and only leaves it once load-time validation
+  (:mod:`~iotguard.analysis.rules.validation`) has shown the pattern to be
+  linear and cheap on adversarial input;
+* every inline search is timed: a rule that exceeds the budget goes back
+  into the sandbox at once, and one that does so ``quarantine_after``
+  times is quarantined -- flagged for operator review -- until its pattern
+  changes;
+* cumulative time, evaluation and hit counts are kept per rule and
+  exposed through ``/v1/rules``.
+
+Waiting for the sandbox blocks, so rule sets with sandboxed rules are
+evaluated on the guard's matching thread (:meth:`RuleGuard.run`) rather
+than on the event loop.
+
+Rules keep running while quarantined -- only an operator can disable
+one.  A sandboxed search that times out, or cannot run because the
+sandbox is (re)starting, has an unknown outcome: ``BLOCK`` rules then
+fail closed and report a match.
+
+Statistics are per worker process.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import re
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from multiprocessing.pool import Pool
+from typing import Any, TypeVar
+
+import structlog
+
+from iotguard.core.config import RuleSettings
+from iotguard.observability.metrics import rule_quarantined_total, rules_quarantined
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+#: Seconds allowed for the sandbox process to start before the first call.
+SANDBOX_STARTUP_TIMEOUT = 30.0
+
+
+@dataclass(slots=True)
+class RuleStats:
+    """Cumulative execution statistics of one rule."""
+
+    evaluations: int = 0
+    hits: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    overruns: int = 0
+    quarantined: bool = False
+    sandboxed: bool = False
+    validated: bool = False
+
+
+def _sandbox_run(pattern: str, flags: int, method: str, string: str, pos: int) -> bool:
+    """Executed in the sandbox process; ``re`` caches the compiled pattern."""
+    regex = re.compile(pattern, flags)
+    return getattr(regex, method)(string, pos) is not None
+
+
+def _sandbox_ping() -> bool:
+    return True
+
+
+class Sandbox:
+    """A single-process pool that is killed and respawned on timeout."""
+
+    def __init__(self) -> None:
+        self._pool: Pool | None = None
+        self._lock = threading.Lock()  # serialises start-up
+
+    def _ensure(self) -> Pool:
+        with self._lock:
+            pool = self._pool
+            if pool is None:
+                pool = multiprocessing.get_context("spawn").Pool(processes=1)
+                # Pay the interpreter start-up outside of any match budget.
+                pool.apply_async(_sandbox_ping).get(SANDBOX_STARTUP_TIMEOUT)
+                self._pool = pool
+            return pool
+
+    def warm(self) -> None:
+        """Start the worker process; blocks until it answers."""
+        self._ensure()
+
+    def start(self) -> None:
+        """Start the worker in a background thread unless it is up or starting."""
+        if self._pool is not None or self._lock.locked():
+            return
+        threading.Thread(target=self._start, name="rule-sandbox-start", daemon=True).start()
+
+    def _start(self) -> None:
+        try:
+            self._ensure()
+        except Exception:
+            logger.exception("rule_sandbox_start_failed")
+
+    def call(self, fn: Callable[..., T], args: tuple[Any, ...], timeout: float) -> T:
+        """Run ``fn(*args)`` in the sandbox; raise ``TimeoutError`` after *timeout*.
+
+        *fn* must be a module-level function.  Blocks while the worker
+        starts.  On timeout the worker is terminated so the runaway
+        computation cannot pile up.
+        """
+        return self._wait(self._ensure(), fn, args, timeout)
+
+    def run(
+        self, regex: re.Pattern[str], method: str, string: str, pos: int, timeout: float
+    ) -> bool:
+        """Run ``regex.<method>(string, pos)`` remotely; raise ``TimeoutError``.
+
+        Never waits for start-up: while the worker is (re)starting in the
+        background the call fails immediately.
+        """
+        pool = self._pool
+        if pool is None:
+            self.start()
+            raise TimeoutError
+        args = (regex.pattern, regex.flags, method, string, pos)
+        try:
+            return self._wait(pool, _sandbox_run, args, timeout)
+        except TimeoutError:
+            self.start()
+            raise
+
+    def _wait(self, pool: Pool, fn: Callable[..., T], args: tuple[Any, ...], timeout: float) -> T:
+        try:
+            return pool.apply_async(fn, args).get(timeout)
+        except multiprocessing.TimeoutError:
+            if self._pool is pool:
+                self._pool = None
+            # Terminating joins the pool's threads; keep that off the caller.
+            threading.Thread(target=_terminate, args=(pool,), daemon=True).start()
+            raise TimeoutError from None
+        except ValueError:
+            # Terminated by a concurrent timeout.
+            raise TimeoutError from None
+
+    def close(self) -> None:
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            _terminate(pool)
+
+
+def _terminate(pool: Pool) -> None:
+    pool.terminate()
+    pool.join()
+
+
+class GuardedPattern:
+    """Drop-in for a compiled rule regex that enforces the match budget.
+
+    Exposes the subset of :class:`re.Pattern` the matchers rely on
+    (``pattern``, ``search``, ``match``); results are only meaningful in a
+    boolean context because sandboxed searches do not return match objects.
+    With *fail_closed* a search whose outcome is unknown reports a match.
+    """
+
+    __slots__ = ("_fail_closed", "_guard", "_name", "_regex", "stats")
+
+    def __init__(
+        self,
+        guard: RuleGuard,
+        name: str,
+        regex: re.Pattern[str],
+        stats: RuleStats,
+        *,
+        fail_closed: bool = False,
+    ) -> None:
+        self._guard = guard
+        self._name = name
+        self._regex = regex
+        self.stats = stats
+        self._fail_closed = fail_closed
+
+    @property
+    def pattern(self) -> str:
+        return self._regex.pattern
+
+    def search(self, string: str, pos: int = 0) -> Any:
+        return self._run("search", string, pos)
+
+    def match(self, string: str, pos: int = 0) -> Any:
+        return self._run("match", string, pos)
+
+    def _run(self, method: str, string: str, pos: int) -> Any:
+        stats = self.stats
+        guard = self._guard
+        unknown = False
+        start = time.perf_counter()
+        try:
+            if stats.sandboxed:
+                found: Any = guard._sandbox.run(self._regex, method, string, pos, guard.budget)
+            else:
+                found = getattr(self._regex, method)(string, pos)
+        except TimeoutError:
+            found = self._fail_closed
+            unknown = True
+        elapsed = time.perf_counter() - start
+        stats.evaluations += 1
+        stats.total_seconds += elapsed
+        if elapsed > stats.max_seconds:
+            stats.max_seconds = elapsed
+        if elapsed > guard.budget:
+            guard._overrun(stats, self._name, elapsed)
+        elif unknown:
+            guard.overruns += 1
+            logger.warning(
+                "rule_sandbox_unavailable", rule=self._name, fail_closed=self._fail_closed
+            )
+        return found or None
+
+
+class RuleGuard:
+    """Owns per-rule statistics, quarantine state and the sandbox.
+
+    :attr:`overruns` counts the searches, across all rules, that exceeded
+    the budget or could not run; it only ever increases.
+    """
+
+    def __init__(
+        self,
+        *,
+        budget_ms: float = 50.0,
+        quarantine_after: int = 3,
+        sandbox_enabled: bool = True,
+    ) -> None:
+        self.budget = budget_ms / 1000
+        self._quarantine_after = quarantine_after
+        self._sandbox_enabled = sandbox_enabled
+        self._sandbox = Sandbox()
+        self._stats: dict[str, RuleStats] = {}
+        self._patterns: dict[str, str] = {}
+        self.overruns = 0
+        # One thread: the sandbox serves one search at a time anyway.
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rule-match")
+
+    @classmethod
+    def from_settings(cls, settings: RuleSettings) -> RuleGuard:
+        return cls(
+            budget_ms=settings.match_budget_ms,
+            quarantine_after=settings.quarantine_after,
+            sandbox_enabled=settings.sandbox_enabled,
+        )
+
+    # -- accounting ---------------------------------------------------------
+
+    def wrap(
+        self, key: str, name: str, regex: re.Pattern[str], *, fail_closed: bool = False
+    ) -> GuardedPattern:
+        """Return a guarded view of *regex* for the rule identified by *key*.
+
+        Statistics and quarantine carry over across rule-set reloads and are
+        reset when the rule's pattern changes; a new pattern runs in the
+        sandbox until :meth:`admit` lets it out.  *fail_closed* is set for
+        ``BLOCK`` rules (see :class:`GuardedPattern`).
+        """
+        stats = self._stats.get(key)
+        if stats is None or self._patterns.get(key) != regex.pattern:
+            stats = RuleStats(sandboxed=self._sandbox_enabled)
+            self._stats[key] = stats
+            self._patterns[key] = regex.pattern
+            if self._sandbox_enabled:
+                self._sandbox.start()
+        return GuardedPattern(self, name, regex, stats, fail_closed=fail_closed)
+
+    def admit(self, key: str, name: str, *, cheap: bool) -> None:
+        """Record that the rule identified by *key* passed validation.
+
+        A *cheap* rule leaves the sandbox and runs inline; any other stays
+        in it.
+        """
+        stats = self._stats.get(key)
+        if stats is None:
+            return
+        stats.validated = True
+        if cheap and not stats.quarantined:
+            stats.sandboxed = False
+        elif stats.sandboxed:
+            logger.info("rule_sandboxed", rule=name, reason="validation")
+
+    def reject(self, key: str, name: str, reason: str) -> None:
+        """Quarantine the rule identified by *key*, whose pattern failed validation."""
+        stats = self._stats.get(key)
+        if stats is None:
+            return
+        stats.validated = True
+        if not stats.quarantined:
+            self._quarantine(stats, name, reason=reason)
+
+    async def run(self, fn: Callable[[], T]) -> T:
+        """Call *fn* on the matching thread and await its result.
+
+        Used to evaluate rule sets with sandboxed rules, whose searches
+        block until the sandbox answers.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn)
+
+    def warm(self) -> None:
+        """Start the sandbox process; blocks until it answers."""
+        if self._sandbox_enabled:
+            self._sandbox.warm()
+
+    async def warm_async(self) -> None:
+        """Run :meth:`warm` in a thread so the event loop stays free."""
+        await asyncio.to_thread(self.warm)
+
+    def stats(self, key: str) -> RuleStats | None:
+        """Return the statistics recorded for *key*, if the rule has run."""
+        return self._stats.get(key)
+
+    def quarantined_count(self) -> int:
+        return sum(1 for s in self._stats.values() if s.quarantined)
+
+    def _overrun(self, stats: RuleStats, name: str, elapsed: float) -> None:
+        self.overruns += 1
+        stats.overruns += 1
+        logger.warning(
+            "rule_budget_exceeded",
+            rule=name,
+            elapsed_ms=round(elapsed * 1000, 2),
+            budget_ms=self.budget * 1000,
+            overruns=stats.overruns,
+        )
+        if self._sandbox_enabled and not stats.sandboxed:
+            # No longer proved cheap.
+            stats.sandboxed = True
+            self._sandbox.start()
+            logger.warning("rule_sandboxed", rule=name, reason="overrun")
+        if stats.overruns >= self._quarantine_after and not stats.quarantined:
+            self._quarantine(stats, name, reason="overruns")
+
+    def _quarantine(self, stats: RuleStats, name: str, *, reason: str) -> None:
+        stats.quarantined = True
+        if self._sandbox_enabled and not stats.sandboxed:
+            stats.sandboxed = True
+            self._sandbox.start()
+        rule_quarantined_total.labels(rule_name=name).inc()
+        logger.error(
+            "rule_quarantined",
+            rule=name,
+            reason=reason,
+            overruns=stats.overruns,
+            sandboxed=stats.sandboxed,
+        )
+
+    def close(self) -> None:
+        """Stop the matching thread and terminate the sandbox process."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._sandbox.close()
+
+
+_guard: RuleGuard | None = None
+
+
+def get_rule_guard(settings: RuleSettings | None = None) -> RuleGuard:
+    """Return (and lazily create) the process-wide rule guard."""
+    global _guard
+    if _guard is None:
+        _guard = RuleGuard.from_settings(settings or RuleSettings())
+        rules_quarantined.set_function(_guard.quarantined_count)
+    return _guard
+
+
+def dispose_rule_guard() -> None:
+    """Terminate the sandbox and forget the process-wide guard."""
+    global _guard
+    if _guard is not None:
+        _guard.close()
+        _guard = None
@@ -0,0 +1,179 @@
+"""Literal extraction from rule patterns.
+
+* :func:`literal_prefixes` -- the literals every match must *start* with.
+* :func:`required_literals` -- literals one of which every match must
+  *contain*, wherever they occur in the pattern.
+
+Both work on the parse tree produced by the standard library's regex parser so
+that escapes, inline flags and verbose mode are interpreted exactly as
+``re.compile`` would.  Extracted literals are lower-cased ASCII: a command
+that can match the pattern case-insensitively must contain them in its
+``lower()`` form, which makes them safe to use as prefilters.
+"""
+
+from __future__ import annotations
+
+import re
+from re import _constants as sre_constants  # type: ignore[attr-defined]
+from re import _parser as sre_parse  # type: ignore[attr-defined]
+from typing import Any
+
+_LITERAL = sre_constants.LITERAL
+_SUBPATTERN = sre_constants.SUBPATTERN
+_BRANCH = sre_constants.BRANCH
+_IN = sre_constants.IN
+_AT = sre_constants.AT
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+#: Upper bound on alternative prefixes tracked per pattern.
+MAX_ALTERNATIVES = 32
+
+
+def _parse(pattern: str) -> Any | None:
+    try:
+        return sre_parse.parse(pattern, re.IGNORECASE)
+    except (re.error, RecursionError, OverflowError):
+        return None
+
+
+def _ascii_char(code: int) -> str | None:
+    char = chr(code)
+    return char.lower() if char.isascii() else None
+
+
+def _class_chars(items: Any) -> list[str] | None:
+    """Return the characters of a class made only of ASCII literals."""
+    chars: list[str] = []
+    for op, av in items:
+        if op != _LITERAL:
+            return None
+        char = _ascii_char(av)
+        if char is None:
+            return None
+        chars.append(char)
+    return chars
+
+
+def _combine(heads: list[str], tails: list[str]) -> list[str] | None:
+    combined = [h + t for h in heads for t in tails]
+    return combined if len(combined) <= MAX_ALTERNATIVES else None
+
+
+def _leading_literals(items: Any) -> tuple[list[str], bool]:
+    """Return ``(prefixes, complete)`` for the literal text opening *items*.
+
+    Every match of *items* starts with one of *prefixes*.  *complete* is
+    ``True`` when every item was consumed, so an enclosing sequence may keep
+    extending the prefixes.
+    """
+    prefixes = [""]
+    for op, av in items:
+        if op == _LITERAL:
+            char = _ascii_char(av)
+            if char is None:
+                return prefixes, False
+            prefixes = [p + char for p in prefixes]
+        elif op == _SUBPATTERN:
+            inner, complete = _leading_literals(av[-1])
+            combined = _combine(prefixes, inner)
+            if combined is None:
+                return prefixes, False
+            prefixes = combined
+            if not complete:
+                return prefixes, False
+        elif op == _BRANCH:
+            alternatives: list[str] = []
+            all_complete = True
+            for branch in av[1]:
+                inner, complete = _leading_literals(branch)
+                alternatives.extend(inner)
+                all_complete = all_complete and complete
+            combined = _combine(prefixes, alternatives)
+            if combined is None:
+                return prefixes, False
+            prefixes = combined
+            if not all_complete:
+                return prefixes, False
+        elif op == _IN:
+            chars = _class_chars(av)
+            combined = _combine(prefixes, chars) if chars else None
+            if combined is None:
+                return prefixes, False
+            prefixes = combined
+        elif op == _AT:
+            # Zero-width anchors (``^``, ``\b``) consume no text.
+            continue
+        elif op in _REPEATS and av[0] >= 1:
+            inner, _ = _leading_literals(av[2])
+            combined = _combine(prefixes, inner)
+            return (combined if combined is not None else prefixes), False
+        else:
+            return prefixes, False
+    return prefixes, True
+
+
+def literal_prefixes(pattern: str) -> tuple[str, ...]:
+    """Return the literal texts one of which every match must start with.
+
+    Returns ``()`` when the pattern can start with something other than a
+    known literal (character ranges, look-arounds, optional items, ...) or
+    cannot be parsed.
+    """
+    parsed = _parse(pattern)
+    if parsed is None:
+        return ()
+    prefixes, _ = _leading_literals(parsed)
+    if not prefixes or any(not p for p in prefixes):
+        return ()
+    return tuple(dict.fromkeys(prefixes))
+
+
+def _stronger(current: list[str] | None, candidate: list[str]) -> list[str]:
+    """Prefer the set whose shortest literal is longest, then the smaller set."""
+    if current is None:
+        return candidate
+    score = (min(map(len, candidate)), -len(candidate))
+    return candidate if score > (min(map(len, current)), -len(current)) else current
+
+
+def _required(items: Any) -> list[str] | None:
+    """Return the strongest set of literals one of which *items* must contain."""
+    items = list(items)
+    best: list[str] | None = None
+    for k, (op, av) in enumerate(items):
+        prefixes, _ = _leading_literals(items[k:])
+        if prefixes and all(prefixes):
+            best = _stronger(best, prefixes)
+
+        inner: list[str] | None = None
+        if op == _SUBPATTERN:
+            inner = _required(av[-1])
+        elif op == _BRANCH:
+            union: list[str] = []
+            for branch in av[1]:
+                found = _required(branch)
+                if found is None:
+                    union = []
+                    break
+                union.extend(found)
+            if 0 < len(union) <= MAX_ALTERNATIVES:
+                inner = union
+        elif op in _REPEATS and av[0] >= 1:
+            inner = _required(av[2])
+        if inner:
+            best = _stronger(best, inner)
+    return best
+
+
+def required_literals(pattern: str) -> tuple[str, ...]:
+    """Return literals one of which must appear in every matching command.
+
+    Unlike :func:`literal_prefixes` the literal may sit anywhere in the
+    pattern, so ``\\d+\\s*volts`` yields ``("volts",)``.  Returns ``()`` when
+    no such literal can be proven (the rule must then always run).
+    """
+    parsed = _parse(pattern)
+    if parsed is None:
+        return ()
+    found = _required(parsed)
+    return tuple(dict.fromkeys(found)) if found else ()
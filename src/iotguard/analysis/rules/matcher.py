@@ -0,0 +1,236 @@
+"""Matcher back-ends that evaluate a whole compiled rule set against a command.
+
+Every back-end returns the indices of matching rules in rule-set (priority)
+order and must agree exactly with ``re.search(pattern, command,
+re.IGNORECASE)`` evaluated per rule.
+
+* :class:`LoopMatcher` -- one ``search`` per rule; the reference behaviour.
+* :class:`PrefixDispatchMatcher` -- indexes rules by the literal prefix
+  every match of their pattern must start with, scans the command once, and
+  only runs a rule's regex (anchored, at that position) where its prefix
+  occurs.  Rules without a usable prefix are searched as before.
+* :class:`RequiredLiteralMatcher` -- finds every required literal of every
+  rule with one Aho-Corasick pass over the command and only searches the
+  rules whose literals occur.  Rules without an extractable literal always
+  run.
+
+Python's ``re`` has no DFA, so folding all patterns into a single
+alternation does not make a scan cheaper than the per-rule loop; the
+single pass is therefore done over the command's characters instead.
+"""
+
+from __future__ import annotations
+
+from collections import deque
+from collections.abc import Iterator, Sequence
+from typing import Protocol
+
+from iotguard.analysis.rules.literals import literal_prefixes, required_literals
+
+MATCHER_BACKENDS = ("loop", "prefix", "literal")
+
+
+class RulePattern(Protocol):
+    """The subset of :class:`re.Pattern` the matchers use."""
+
+    @property
+    def pattern(self) -> str: ...
+
+    def search(self, string: str, pos: int = ...) -> object | None: ...
+
+    def match(self, string: str, pos: int = ...) -> object | None: ...
+
+
+class RuleMatcher(Protocol):
+    """Evaluate every rule of a rule set against a command in one call."""
+
+    def match(self, command: str) -> list[int]:
+        """Return the indices of matching rules, in ascending order."""
+        ...
+
+    def iter_matches(self, command: str) -> Iterator[int]:
+        """Yield the same indices as :meth:`match`, as lazily as possible.
+
+        Lets callers stop evaluating once the outcome is decided.
+        """
+        ...
+
+
+class LoopMatcher:
+    """Reference matcher: one regex search per rule."""
+
+    __slots__ = ("_regexes",)
+
+    def __init__(self, regexes: Sequence[RulePattern]) -> None:
+        self._regexes = tuple(regexes)
+
+    def match(self, command: str) -> list[int]:
+        return [i for i, regex in enumerate(self._regexes) if regex.search(command)]
+
+    def iter_matches(self, command: str) -> Iterator[int]:
+        return (i for i, regex in enumerate(self._regexes) if regex.search(command))
+
+
+class PrefixDispatchMatcher:
+    """Single-pass matcher keyed on mandatory literal prefixes.
+
+    A pattern that starts with the literal ``unlock`` (or with one of the
+    alternatives of ``(unlock|open)``) can only match where that literal
+    occurs, so the command is scanned once and each candidate position is
+    verified with an anchored ``match``.
+    Prefixes are restricted to ASCII and non-ASCII commands fall back to
+    the loop, which keeps case-insensitive positions exact.
+    """
+
+    __slots__ = ("_by_head", "_head_len", "_regexes", "_residual")
+
+    def __init__(self, regexes: Sequence[RulePattern], *, head_len: int = 2) -> None:
+        self._regexes = tuple(regexes)
+        self._head_len = head_len
+        self._by_head: dict[str, list[tuple[int, str]]] = {}
+        residual: list[int] = []
+        for i, regex in enumerate(self._regexes):
+            prefixes = literal_prefixes(regex.pattern)
+            if not prefixes or min(len(p) for p in prefixes) < head_len:
+                residual.append(i)
+                continue
+            for prefix in prefixes:
+                self._by_head.setdefault(prefix[:head_len], []).append((i, prefix))
+        self._residual = tuple(residual)
+
+    @property
+    def indexed_count(self) -> int:
+        """Number of rules served by the prefix index."""
+        return len(self._regexes) - len(self._residual)
+
+    def match(self, command: str) -> list[int]:
+        regexes = self._regexes
+        if not command.isascii():
+            return [i for i, regex in enumerate(regexes) if regex.search(command)]
+
+        matched = {i for i in self._residual if regexes[i].search(command)}
+        folded = command.lower()
+        by_head = self._by_head
+        head_len = self._head_len
+        for pos in range(len(folded) - head_len + 1):
+            candidates = by_head.get(folded[pos : pos + head_len])
+            if candidates is None:
+                continue
+            for i, prefix in candidates:
+                if (
+                    i not in matched
+                    and folded.startswith(prefix, pos)
+                    and regexes[i].match(command, pos)
+                ):
+                    matched.add(i)
+        return sorted(matched)
+
+    def iter_matches(self, command: str) -> Iterator[int]:
+        # Positions are scanned in text order, not rule order: nothing to
+        # gain from laziness.
+        return iter(self.match(command))
+
+
+class AhoCorasick:
+    """Minimal Aho-Corasick automaton mapping keywords to integer labels."""
+
+    __slots__ = ("_fail", "_goto", "_out")
+
+    def __init__(self, keywords: Sequence[tuple[str, int]]) -> None:
+        goto: list[dict[str, int]] = [{}]
+        out: list[set[int]] = [set()]
+        for word, label in keywords:
+            state = 0
+            for char in word:
+                nxt = goto[state].get(char)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][char] = nxt
+                    goto.append({})
+                    out.append(set())
+                state = nxt
+            out[state].add(label)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in goto[state].items():
+                queue.append(nxt)
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(char, 0)
+                out[nxt] |= out[fail[nxt]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = tuple(frozenset(labels) for labels in out)
+
+    def find(self, text: str) -> set[int]:
+        """Return the labels of every keyword occurring in *text*."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found: set[int] = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+class RequiredLiteralMatcher:
+    """Prefilter rules by the literals their patterns require.
+
+    Each command is scanned once for all required literals (lower-cased
+    ASCII, see :func:`~iotguard.analysis.rules.literals.required_literals`);
+    only the rules with a literal present -- plus the rules without any --
+    have their regex searched.  Non-ASCII commands fall back to the loop.
+    """
+
+    __slots__ = ("_automaton", "_regexes", "_residual")
+
+    def __init__(self, regexes: Sequence[RulePattern]) -> None:
+        self._regexes = tuple(regexes)
+        keywords: list[tuple[str, int]] = []
+        residual: list[int] = []
+        for i, regex in enumerate(self._regexes):
+            literals = required_literals(regex.pattern)
+            if not literals:
+                residual.append(i)
+            keywords.extend((literal, i) for literal in literals)
+        self._automaton = AhoCorasick(keywords)
+        self._residual = frozenset(residual)
+
+    @property
+    def indexed_count(self) -> int:
+        """Number of rules served by the literal index."""
+        return len(self._regexes) - len(self._residual)
+
+    def match(self, command: str) -> list[int]:
+        regexes = self._regexes
+        if not command.isascii():
+            return [i for i, regex in enumerate(regexes) if regex.search(command)]
+        candidates = self._automaton.find(command.lower()) | self._residual
+        return [i for i in sorted(candidates) if regexes[i].search(command)]
+
+    def iter_matches(self, command: str) -> Iterator[int]:
+        regexes = self._regexes
+        if not command.isascii():
+            candidates: Sequence[int] = range(len(regexes))
+        else:
+            candidates = sorted(self._automaton.find(command.lower()) | self._residual)
+        return (i for i in candidates if regexes[i].search(command))
+
+
+def build_matcher(backend: str, regexes: Sequence[RulePattern]) -> RuleMatcher:
+    """Instantiate the matcher named *backend* over *regexes*."""
+    if backend == "loop":
+        return LoopMatcher(regexes)
+    if backend == "prefix":
+        return PrefixDispatchMatcher(regexes)
+    if backend == "literal":
+        return RequiredLiteralMatcher(regexes)
+    raise ValueError(f"Unknown rule matcher backend: {backend!r}")
@@ -0,0 +1,98 @@
+"""Memoised rule verdicts for repeated commands.
+
+Fleets send the same few hundred commands over and over, and the verdict
+of a command depends only on the rule-set version, the command and the
+parts of the device context that rule scopes look at.  :class:`VerdictMemo`
+is a bounded LRU keyed by exactly that, so repeated commands skip the
+matcher entirely.  Entries of older versions are dropped as soon as a newer
+version is seen.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+
+from iotguard.observability.metrics import (
+    rule_verdict_cache_evictions_total,
+    rule_verdict_cache_requests_total,
+)
+
+_hits = rule_verdict_cache_requests_total.labels(result="hit")
+_misses = rule_verdict_cache_requests_total.labels(result="miss")
+
+# A scoped inline flag group that turns IGNORECASE off, e.g. ``(?-i:...)``
+_CASE_SENSITIVE_GROUP = re.compile(r"\(\?[a-zA-Z]*-[a-zA-Z]*i")
+
+
+def normalize_command(command: str) -> str:
+    """Return the memo key form of *command*.
+
+    Rules are matched case-insensitively, so ASCII case is folded.
+    Whitespace is significant to patterns and is kept, as is non-ASCII
+    text, whose case folding ``re`` does not mirror exactly.
+    """
+    return command.lower() if command.isascii() else command
+
+
+def folds_case(patterns: Iterable[str]) -> bool:
+    """Return whether :func:`normalize_command` preserves verdicts for *patterns*.
+
+    A pattern can turn case-insensitivity off for a group, as in
+    ``(?-i:REBOOT)``; folding would then let ``REBOOT`` reuse the verdict
+    of ``reboot``.  Anything resembling such a group disables folding.
+    """
+    return not any(_CASE_SENSITIVE_GROUP.search(pattern) for pattern in patterns)
+
+
+class VerdictMemo:
+    """Bounded LRU of ``(version, command, scope, first_block) -> matched rule indices``.
+
+    The process-wide store binds the entries gauge to its memo (see
+    :func:`~iotguard.analysis.rules.compiled.get_rule_store`).  Safe to
+    share between the event loop and the guard's matching thread.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._data: OrderedDict[Hashable, tuple] = OrderedDict()  # type: ignore[type-arg]
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _current(self, version: int) -> bool:
+        if version > self._version:
+            self._data.clear()
+            self._version = version
+        return version == self._version
+
+    def get(self, version: int, key: Hashable) -> tuple | None:  # type: ignore[type-arg]
+        with self._lock:
+            value = self._data.get(key) if self._current(version) else None
+            if value is not None:
+                self._data.move_to_end(key)
+        if value is None:
+            _misses.inc()
+            return None
+        _hits.inc()
+        return value
+
+    def put(self, version: int, key: Hashable, value: tuple) -> None:  # type: ignore[type-arg]
+        with self._lock:
+            if not self._current(version):
+                return  # a stale snapshot finishing late
+            data = self._data
+            data[key] = value
+            data.move_to_end(key)
+            if len(data) <= self.maxsize:
+                return
+            data.popitem(last=False)
+        rule_verdict_cache_evictions_total.inc()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,174 @@
+"""Adaptive ordering of rules within a priority tier.
+
+Rules of equal priority may be evaluated in any order without changing
+whether a command is blocked, so the order is free to optimise early-exit
+evaluation: rules that are likely to match and cheap to run go first.
+The score is the observed hit rate divided by the measured cost.
+
+Hit counts are kept in memory by :class:`RuleCounters` (per compiled rule
+set, only on full evaluations so early exit does not bias them) and
+periodically added to ``security_rules.hit_count`` / ``eval_count`` by
+:class:`RuleStatsFlusher`, which aggregates counts across workers.  The
+rule set is only reloaded when the aggregated counts change the order, so
+a steady fleet keeps its snapshot and verdict memo.  Dry runs through
+``/v1/rules/test`` are not counted.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import uuid
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
+
+import structlog
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from iotguard.core.config import RuleSettings
+from iotguard.db.repositories import SecurityRuleRepository
+
+if TYPE_CHECKING:
+    from iotguard.analysis.rules.compiled import (
+        CompiledRule,
+        CompiledRuleSet,
+        RulePartition,
+        RuleSetStore,
+    )
+
+logger = structlog.get_logger(__name__)
+
+#: Cost assumed for rules whose pattern was never measured.
+DEFAULT_COST_US = 10.0
+
+
+def adaptive_score(rule: CompiledRule) -> float:
+    """Return the expected hits per microsecond of evaluating *rule*.
+
+    The hit rate is Laplace-smoothed so that new rules are neither
+    starved nor promoted on a handful of observations.
+    """
+    hit_rate = (rule.hit_count + 1) / (rule.eval_count + 2)
+    cost = rule.cost_us if rule.cost_us is not None else DEFAULT_COST_US
+    return hit_rate / max(cost, 0.01)
+
+
+class RuleCounters:
+    """In-memory hit and evaluation counts awaiting a flush."""
+
+    def __init__(self) -> None:
+        self._hits: dict[uuid.UUID, int] = {}
+        # Commands evaluated per (rule-set version, partition), and the
+        # rules of each
+        self._commands: dict[tuple[int, str | None], int] = {}
+        self._rule_ids: dict[tuple[int, str | None], tuple[uuid.UUID, ...]] = {}
+
+    def record(
+        self,
+        rule_set: CompiledRuleSet,
+        matched: Iterable[CompiledRule],
+        *,
+        partition: RulePartition | None = None,
+    ) -> None:
+        """Count one full evaluation of *rule_set* that matched *matched*.
+
+        Only the rules of *partition* (all rules if ``None``) are credited
+        with an evaluation.
+        """
+        key = (rule_set.version, partition.key if partition is not None else None)
+        if key not in self._rule_ids:
+            rules = rule_set.rules
+            if partition is not None:
+                rules = tuple(rules[i] for i in partition.indices)
+            self._rule_ids[key] = tuple(r.id for r in rules if r.id is not None)
+        self._commands[key] = self._commands.get(key, 0) + 1
+        hits = self._hits
+        for rule in matched:
+            if rule.id is not None:
+                hits[rule.id] = hits.get(rule.id, 0) + 1
+
+    def drain(self) -> tuple[dict[uuid.UUID, int], dict[uuid.UUID, int]]:
+        """Return and reset ``(hits, evaluations)`` per rule id."""
+        hits, commands, rule_ids = self._hits, self._commands, self._rule_ids
+        self._hits, self._commands, self._rule_ids = {}, {}, {}
+        evaluations: dict[uuid.UUID, int] = {}
+        for key, count in commands.items():
+            for rule_id in rule_ids[key]:
+                evaluations[rule_id] = evaluations.get(rule_id, 0) + count
+        return hits, evaluations
+
+
+class RuleStatsFlusher:
+    """Periodically persist :class:`RuleCounters` and refresh the ordering."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        store: RuleSetStore,
+        settings: RuleSettings,
+    ) -> None:
+        self._engine = engine
+        self._store = store
+        self._settings = settings
+        self._task: asyncio.Task[None] | None = None
+        self._stop = asyncio.Event()
+
+    async def start(self) -> None:
+        """Start the background flush loop."""
+        if self._task is not None:
+            return
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("rule_stats_flusher_started", interval=self._settings.stats_flush_interval)
+
+    async def stop(self) -> None:
+        """Stop the loop and flush whatever is still buffered."""
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        try:
+            await self.flush_once()
+        except Exception:
+            logger.exception("rule_stats_flush_error")
+
+    async def flush_once(self) -> bool:
+        """Write buffered counts to the database; ``True`` if anything was written.
+
+        With adaptive ordering enabled the local rule set is invalidated
+        when the aggregated counts would order it differently.
+        """
+        hits, evaluations = self._store.counters.drain()
+        if not evaluations:
+            return False
+        reorder = False
+        async with AsyncSession(self._engine) as session:
+            repo = SecurityRuleRepository(session)
+            await repo.add_counters(hits, evaluations)
+            await session.commit()
+            if self._settings.adaptive_order:
+                reorder = self._store.order_changed(await repo.list_active())
+        logger.info(
+            "rule_stats_flushed",
+            rules=len(evaluations),
+            hits=sum(hits.values()),
+            reorder=reorder,
+        )
+        if reorder:
+            self._store.bump()
+        return True
+
+    async def _run(self) -> None:
+        interval = self._settings.stats_flush_interval
+        while not self._stop.is_set():
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stop.wait(), timeout=interval)
+            if self._stop.is_set():
+                break
+            try:
+                await self.flush_once()
+            except Exception:
+                logger.exception("rule_stats_flush_error")
@@ -0,0 +1,270 @@
+"""Static detection of backtracking-prone rule patterns.
+
+Python's ``re`` is a backtracking engine: patterns such as ``(a+)+$`` or
+``(a|aa)*b`` take exponential time on crafted input, ``.*.*=.*x`` or
+``a{1,30}a{1,30}b`` polynomial time, and a single such search holds the
+GIL (and therefore the event loop) until it finishes.
+:func:`is_backtracking_prone` flags the constructs responsible so that the
+:mod:`~iotguard.analysis.rules.guard` keeps those rules out of process.
+
+Character classes are compared over a sample alphabet (ASCII plus one
+non-ASCII letter), which is enough to tell ``\\d`` from ``\\s`` and to see
+that ``.`` and ``\\w`` overlap.
+"""
+
+from __future__ import annotations
+
+import re
+from re import _constants as sre_constants  # type: ignore[attr-defined]
+from re import _parser as sre_parse  # type: ignore[attr-defined]
+from typing import Any
+
+_SUBPATTERN = sre_constants.SUBPATTERN
+_BRANCH = sre_constants.BRANCH
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_POSSESSIVE = getattr(sre_constants, "POSSESSIVE_REPEAT", None)
+_ATOMIC = getattr(sre_constants, "ATOMIC_GROUP", None)
+_GROUPREFS = (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS)
+_ASSERTS = (sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+_MAXREPEAT = sre_constants.MAXREPEAT
+_LITERAL = sre_constants.LITERAL
+_ZERO_WIDTH = (sre_constants.AT, *_ASSERTS)
+
+_ALPHABET = frozenset([*map(chr, range(128)), "\u00e9"])
+_CATEGORIES = {
+    sre_constants.CATEGORY_DIGIT: str.isdigit,
+    sre_constants.CATEGORY_NOT_DIGIT: lambda c: not c.isdigit(),
+    sre_constants.CATEGORY_SPACE: str.isspace,
+    sre_constants.CATEGORY_NOT_SPACE: lambda c: not c.isspace(),
+    sre_constants.CATEGORY_WORD: lambda c: c.isalnum() or c == "_",
+    sre_constants.CATEGORY_NOT_WORD: lambda c: not (c.isalnum() or c == "_"),
+}
+
+
+def _children(op: Any, av: Any) -> list[Any]:
+    """Return the sub-sequences nested under one parse-tree node."""
+    if op == _SUBPATTERN:
+        return [av[-1]]
+    if op == _BRANCH:
+        return list(av[1])
+    if op in _REPEATS or op == _POSSESSIVE:
+        return [av[2]]
+    if op in _ASSERTS:
+        return [av[1]]
+    if op == _ATOMIC:
+        return [av]
+    if op == sre_constants.GROUPREF_EXISTS:
+        return [branch for branch in av[1:] if branch is not None]
+    return []
+
+
+def _fold(chars: set[str]) -> frozenset[str]:
+    """Add the other case of each character (rules match case-insensitively)."""
+    return frozenset(chars | {c.swapcase() for c in chars})
+
+
+def _class_members(av: Any) -> tuple[bool, list[frozenset[str]]]:
+    """Return ``(negated, member character sets)`` of an ``IN`` node."""
+    negated = False
+    members: list[frozenset[str]] = []
+    for op, value in av:
+        if op == sre_constants.NEGATE:
+            negated = True
+        elif op == _LITERAL:
+            members.append(frozenset(chr(value)))
+        elif op == sre_constants.RANGE:
+            members.append(frozenset(c for c in _ALPHABET if value[0] <= ord(c) <= value[1]))
+        elif op == sre_constants.CATEGORY:
+            test = _CATEGORIES.get(value)
+            members.append(_ALPHABET if test is None else frozenset(filter(test, _ALPHABET)))
+    return negated, members
+
+
+def _charset(op: Any, av: Any) -> frozenset[str] | None:
+    """Characters a single-character node matches; ``None`` for other nodes."""
+    if op == _LITERAL:
+        return _fold({chr(av)})
+    if op == sre_constants.NOT_LITERAL:
+        return _ALPHABET - _fold({chr(av)})
+    if op == sre_constants.ANY:
+        return _ALPHABET
+    if op == sre_constants.IN:
+        negated, members = _class_members(av)
+        chars = _fold(set().union(*members))
+        return _ALPHABET - chars if negated else chars
+    return None
+
+
+def _consumed(items: Any) -> frozenset[str]:
+    """Every character some part of *items* can consume."""
+    chars: set[str] = set()
+    for op, av in items:
+        single = _charset(op, av)
+        if single is not None:
+            chars |= single
+        elif op in _GROUPREFS:
+            return _ALPHABET
+        else:
+            for child in _children(op, av):
+                chars |= _consumed(child)
+    return frozenset(chars)
+
+
+def _collapsed_alternation(op: Any, av: Any) -> bool:
+    """``True`` for a group such as ``(\\d|\\w)``, whose alternatives overlap.
+
+    The parser turns single-character alternatives into one class, so the
+    overlap has to be read off the class members.
+    """
+    if op != _SUBPATTERN or len(av[-1]) != 1 or av[-1][0][0] != sre_constants.IN:
+        return False
+    negated, members = _class_members(av[-1][0][1])
+    return not negated and any(a & b for i, a in enumerate(members) for b in members[i + 1 :])
+
+
+def _first_chars(items: Any) -> set[str] | None:
+    """First characters of a match of *items*; ``None`` if unknown or empty."""
+    for op, av in items:
+        if op == _LITERAL:
+            return {chr(av).lower()}
+        if op == _SUBPATTERN:
+            return _first_chars(av[-1])
+        if op == _BRANCH:
+            chars: set[str] = set()
+            for branch in av[1]:
+                first = _first_chars(branch)
+                if first is None:
+                    return None
+                chars |= first
+            return chars
+        if op in _REPEATS and av[0] > 0:
+            return _first_chars(av[2])
+        return None
+    return None
+
+
+def _ambiguous(branches: list[Any]) -> bool:
+    """``True`` unless every alternative starts with a distinct known character."""
+    seen: set[str] = set()
+    for branch in branches:
+        first = _first_chars(branch)
+        if first is None or first & seen:
+            return True
+        seen |= first
+    return False
+
+
+def _has_variable_repeat(items: Any) -> bool:
+    """``True`` if *items* contains a repeat or alternation that backtracks."""
+    for op, av in items:
+        if op in _REPEATS and av[0] != av[1]:
+            return True
+        if op == _BRANCH and _ambiguous(av[1]):
+            # (update|flash)+ is linear: one character picks the branch.
+            return True
+        if _collapsed_alternation(op, av):
+            return True
+        if op == _POSSESSIVE or op == _ATOMIC:
+            continue
+        if any(_has_variable_repeat(child) for child in _children(op, av)):
+            return True
+    return False
+
+
+def _flatten(items: Any) -> list[Any]:
+    """*items* with the contents of groups spliced in."""
+    flat: list[Any] = []
+    for op, av in items:
+        if op == _SUBPATTERN:
+            flat.extend(_flatten(av[-1]))
+        else:
+            flat.append((op, av))
+    return flat
+
+
+def _shape(op: Any, av: Any) -> tuple[frozenset[str], bool, bool, bool]:
+    """Return ``(chars, variable, consumes, can_fail)`` of one sequence item.
+
+    *variable* items can match runs of different lengths (and give
+    characters back on backtracking); *consumes* items match at least one
+    character; *can_fail* items may reject the position they are tried at.
+    """
+    single = _charset(op, av)
+    if single is not None:
+        return single, False, True, True
+    if op in _ZERO_WIDTH:
+        return frozenset(), False, False, True
+    if op in _REPEATS or op == _POSSESSIVE:
+        body = av[2]
+        variable = op != _POSSESSIVE and (av[0] != av[1] or _has_variable_repeat(body))
+        required = av[0] > 0 and any(_shape(*item)[2] for item in body)
+        return _consumed(body), variable, required, required
+    if op == _BRANCH:
+        variable = _ambiguous(av[1]) or any(_has_variable_repeat(b) for b in av[1])
+        required = all(branch for branch in av[1])
+        return _consumed([(op, av)]), variable, required, True
+    if op == _ATOMIC:
+        return _consumed(av), False, bool(av), True
+    return _consumed([(op, av)]), True, True, True
+
+
+def _overlapping_runs(items: Any, *, tail_fails: bool = False) -> bool:
+    """``True`` if two variable-width items can split one run of characters.
+
+    ``.*=.*x`` on a long line without ``x`` tries every way of dividing the
+    text between the two ``.*`` -- polynomial work, which only matters if
+    something after the pair can still fail (*tail_fails* treats the end of
+    *items* as such a point).
+    """
+    runs: list[frozenset[str]] = []  # variable items that may still be extending
+    split = False
+    for op, av in _flatten(items):
+        chars, variable, consumes, can_fail = _shape(op, av)
+        if split and can_fail:
+            return True
+        if variable and any(chars & run for run in runs):
+            split = True
+        if consumes:
+            # A run stays open only if it can swallow this item too.
+            runs = [run for run in runs if chars & run]
+        if variable:
+            runs.append(chars)
+    return split and tail_fails
+
+
+def _prone(items: Any) -> bool:
+    if _overlapping_runs(items):
+        # .*.*=.*x, a{1,30}a{1,30}b, \w+_\w+! ...
+        return True
+    for op, av in items:
+        if op in _GROUPREFS:
+            return True
+        if op in _REPEATS and av[1] == _MAXREPEAT and _has_variable_repeat(av[2]):
+            # (a+)+, (a|ab)*, (\w+\s?)*, (\d|\w)+ ...
+            return True
+        if op in _REPEATS and av[1] > 1 and _overlapping_runs([*av[2], *av[2]], tail_fails=True):
+            # (.*a){12}: consecutive iterations split the same run.
+            return True
+        if op == _POSSESSIVE or op == _ATOMIC:
+            # Possessive repeats and atomic groups never backtrack into
+            # their body, so nesting inside them is harmless.
+            continue
+        if any(_prone(child) for child in _children(op, av)):
+            return True
+    return False
+
+
+def is_backtracking_prone(pattern: str) -> bool:
+    """Return ``True`` if *pattern* may need super-linear backtracking.
+
+    Flags unbounded repeats whose body itself repeats or alternates between
+    branches that can start alike, repeats whose consecutive iterations can
+    split the same run of characters, overlapping variable-width items in
+    sequence, and back-references.  Unparseable patterns are reported as
+    prone.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    except (re.error, RecursionError, OverflowError):
+        return True
+    return _prone(parsed)
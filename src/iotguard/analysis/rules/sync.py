@@ -0,0 +1,153 @@
+"""Cross-worker invalidation of the compiled rule set.
+
+Every worker process holds its own :class:`RuleSetStore`, so a rule edit
+served by one worker must reach the others.  :class:`RuleChangeListener`
+runs in the application lifespan and bumps the local store when:
+
+* a Postgres ``NOTIFY`` arrives on
+  :data:`~iotguard.db.repositories.RULES_CHANGED_CHANNEL` (emitted by the
+  repository inside the writing transaction), or
+* the cheap ``count(*) / max(updated_at)`` fingerprint of the
+  ``security_rules`` table changes between two polls.
+
+Polling is the fallback whenever ``LISTEN`` is unavailable (SQLite, poolers
+in transaction mode, a dropped listener connection) and bounds convergence
+to ``RULES_SYNC_POLL_INTERVAL`` seconds.  While ``LISTEN`` is healthy the
+poll is skipped.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+from datetime import datetime
+from typing import Any
+
+import structlog
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from iotguard.analysis.rules.compiled import RuleSetStore
+from iotguard.core.config import RuleSettings
+from iotguard.db.repositories import RULES_CHANGED_CHANNEL, SecurityRuleRepository
+
+logger = structlog.get_logger(__name__)
+
+
+class RuleChangeListener:
+    """Keep the local :class:`RuleSetStore` in step with other workers."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        store: RuleSetStore,
+        settings: RuleSettings,
+    ) -> None:
+        self._engine = engine
+        self._store = store
+        self._settings = settings
+        self._task: asyncio.Task[None] | None = None
+        self._stop = asyncio.Event()
+        self._listen_conn: AsyncConnection | None = None
+        self._driver_conn: Any | None = None
+        self._fingerprint: tuple[int, datetime | None] | None = None
+
+    # -- properties ---------------------------------------------------------
+
+    @property
+    def is_listening(self) -> bool:
+        """``True`` while a ``LISTEN`` connection is attached and open."""
+        driver = self._driver_conn
+        return driver is not None and not driver.is_closed()
+
+    # -- lifecycle ----------------------------------------------------------
+
+    async def start(self) -> None:
+        """Start the background sync loop."""
+        if self._task is not None:
+            return
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        logger.info("rule_sync_started", interval=self._settings.sync_poll_interval)
+
+    async def stop(self) -> None:
+        """Stop the loop and release the ``LISTEN`` connection."""
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        await self._unlisten()
+        logger.info("rule_sync_stopped")
+
+    # -- sync primitives ----------------------------------------------------
+
+    async def poll_once(self) -> bool:
+        """Compare the table fingerprint with the last one; bump on change.
+
+        Returns ``True`` if the store was invalidated.  The first poll only
+        records a baseline.
+        """
+        async with AsyncSession(self._engine) as session:
+            fingerprint = await SecurityRuleRepository(session).change_fingerprint()
+        previous, self._fingerprint = self._fingerprint, fingerprint
+        if previous is None or previous == fingerprint:
+            return False
+        logger.info("rule_change_detected", source="poll")
+        self._store.bump()
+        return True
+
+    def _on_notify(self, _conn: Any, _pid: int, _channel: str, _payload: str) -> None:
+        logger.info("rule_change_detected", source="notify")
+        self._store.bump()
+
+    # -- internals ----------------------------------------------------------
+
+    async def _run(self) -> None:
+        interval = self._settings.sync_poll_interval
+        while not self._stop.is_set():
+            try:
+                if not self.is_listening:
+                    await self._listen()
+                    # Always poll when not listening -- and once right after
+                    # (re)subscribing to catch changes made while detached.
+                    await self.poll_once()
+            except Exception:
+                logger.exception("rule_sync_error")
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._stop.wait(), timeout=interval)
+
+    async def _listen(self) -> None:
+        """Try to attach a ``LISTEN`` subscription (asyncpg only)."""
+        if not self._settings.listen_enabled or self._engine.dialect.name != "postgresql":
+            return
+        await self._unlisten()
+        conn: AsyncConnection | None = None
+        try:
+            conn = await self._engine.connect()
+            raw = await conn.get_raw_connection()
+            driver = raw.driver_connection
+            if driver is None:
+                raise RuntimeError("no driver connection")
+            await driver.add_listener(RULES_CHANGED_CHANNEL, self._on_notify)
+        except Exception as exc:
+            logger.warning("rule_listen_unavailable", error=str(exc))
+            if conn is not None:
+                with contextlib.suppress(Exception):
+                    await conn.close()
+            return
+        self._listen_conn = conn
+        self._driver_conn = driver
+        logger.info("rule_listen_attached", channel=RULES_CHANGED_CHANNEL)
+
+    async def _unlisten(self) -> None:
+        driver, conn = self._driver_conn, self._listen_conn
+        self._driver_conn = None
+        self._listen_conn = None
+        if driver is not None and not driver.is_closed():
+            with contextlib.suppress(Exception):
+                await driver.remove_listener(RULES_CHANGED_CHANNEL, self._on_notify)
+        if conn is not None:
+            with contextlib.suppress(Exception):
+                await conn.close()
@@ -0,0 +1,224 @@
+"""Validation and cost measurement of rule patterns before they are stored.
+
+:class:`PatternValidator` is run by the rules API on create and update:
+
+1. the pattern must compile;
+2. :func:`~iotguard.analysis.rules.safety.is_backtracking_prone` flags
+   nested quantifiers, ambiguous alternation under a repeat and
+   back-references;
+3. the pattern is micro-benchmarked in a sandbox process against an
+   adversarial corpus derived from the pattern itself and against a
+   corpus of representative IoT commands.
+
+Patterns whose worst adversarial search exceeds ``RULES_COST_REJECT_US``
+(or the sandbox timeout) are rejected; those above ``RULES_COST_WARN_US``
+or statically prone are accepted with warnings.  The representative cost
+is stored on the rule and used to order rules within a priority tier.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import threading
+import time
+from dataclasses import dataclass
+from re import _constants as sre_constants  # type: ignore[attr-defined]
+from re import _parser as sre_parse  # type: ignore[attr-defined]
+from typing import Any
+
+import structlog
+
+from iotguard.analysis.rules.guard import Sandbox
+from iotguard.analysis.rules.literals import required_literals
+from iotguard.analysis.rules.safety import is_backtracking_prone
+from iotguard.core.config import RuleSettings
+from iotguard.core.exceptions import InvalidRuleError
+
+logger = structlog.get_logger(__name__)
+
+#: Typical commands seen by the gateway; the stored cost is measured on these.
+REPRESENTATIVE_COMMANDS: tuple[str, ...] = (
+    "turn_on",
+    "turn_off living_room_light",
+    "set_temperature 22",
+    "set_brightness 80",
+    "unlock front_door",
+    "lock front_door",
+    "start_recording camera-1",
+    "get_status",
+    "set_wifi ssid=home password=hunter2",
+    "update_firmware --version 2.4.1 --url https://updates.example.com/fw.bin",
+    "reboot",
+    "rm -rf /tmp/cache && echo done",
+)
+
+#: Length of each adversarial input; matches the analysis API's command limit.
+ADVERSARIAL_LENGTH = 4096
+
+_CATEGORY_SAMPLES = {
+    sre_constants.CATEGORY_DIGIT: "0",
+    sre_constants.CATEGORY_NOT_DIGIT: "a",
+    sre_constants.CATEGORY_SPACE: " ",
+    sre_constants.CATEGORY_NOT_SPACE: "a",
+    sre_constants.CATEGORY_WORD: "a",
+    sre_constants.CATEGORY_NOT_WORD: "-",
+}
+
+
+@dataclass(frozen=True, slots=True)
+class PatternCost:
+    """Outcome of validating a pattern."""
+
+    cost_us: float  # mean search time over the representative corpus
+    worst_us: float  # slowest search over the adversarial corpus
+    backtracking_prone: bool
+    warnings: tuple[str, ...] = ()
+
+
+def _samples(items: Any, out: set[str], *, repeated: bool = False) -> None:
+    """Collect characters that the repeats of *items* can consume."""
+    for op, av in items:
+        if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            _samples(av[2], out, repeated=True)
+        elif op == sre_constants.SUBPATTERN:
+            _samples(av[-1], out, repeated=repeated)
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                _samples(branch, out, repeated=repeated)
+        elif not repeated:
+            continue
+        elif op == sre_constants.LITERAL:
+            out.add(chr(av))
+        elif op == sre_constants.ANY:
+            out.add("a")
+        elif op == sre_constants.IN:
+            for in_op, in_av in av:
+                if in_op == sre_constants.LITERAL:
+                    out.add(chr(in_av))
+                elif in_op == sre_constants.RANGE:
+                    out.add(chr(in_av[0]))
+                elif in_op == sre_constants.CATEGORY:
+                    out.add(_CATEGORY_SAMPLES.get(in_av, "a"))
+
+
+def adversarial_corpus(pattern: str, length: int = ADVERSARIAL_LENGTH) -> list[str]:
+    """Build inputs that maximise backtracking for *pattern*.
+
+    Each input pumps characters (or required literals) the pattern's
+    repeats accept and then ends with a character that forces a failure,
+    so the engine must try every way of splitting the run.
+    """
+    chars = {"a", "0", " "}
+    try:
+        _samples(sre_parse.parse(pattern, re.IGNORECASE), chars)
+    except (re.error, RecursionError, OverflowError):
+        pass
+    pumps = sorted(chars) + [c + " " for c in sorted(chars) if c != " "]
+    pumps += [literal + " " for literal in required_literals(pattern)]
+    corpus: list[str] = []
+    for pump in pumps:
+        run = (pump * (length // len(pump) + 1))[: length - 1]
+        corpus.extend((run + "!", run + "\n"))
+    return corpus
+
+
+def _bench(pattern: str, flags: int, corpus: list[str], repeat: int) -> list[float]:
+    """Executed in the sandbox: best-of-*repeat* search time per input."""
+    regex = re.compile(pattern, flags)
+    timings: list[float] = []
+    for text in corpus:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            regex.search(text)
+            best = min(best, time.perf_counter() - start)
+        timings.append(best)
+    return timings
+
+
+class PatternValidator:
+    """Validate and cost rule patterns in a dedicated sandbox process."""
+
+    def __init__(self, settings: RuleSettings) -> None:
+        self._settings = settings
+        self._sandbox = Sandbox()
+        # A timeout kills the sandbox, so concurrent validations would fail
+        # each other; operators edit rules rarely enough to serialise them.
+        self._lock = threading.Lock()
+
+    def validate(self, pattern: str) -> PatternCost:
+        """Return the cost of *pattern* or raise :class:`InvalidRuleError`.
+
+        Blocks while the sandbox runs; use :meth:`validate_async` from
+        coroutines.
+        """
+        try:
+            regex = re.compile(pattern, re.IGNORECASE)
+        except re.error as exc:
+            raise InvalidRuleError(f"Pattern does not compile: {exc}") from exc
+
+        settings = self._settings
+        timeout = settings.validation_timeout_ms / 1000
+        prone = is_backtracking_prone(pattern)
+        try:
+            with self._lock:
+                adversarial = self._sandbox.call(
+                    _bench, (pattern, regex.flags, adversarial_corpus(pattern), 1), timeout
+                )
+                representative = self._sandbox.call(
+                    _bench, (pattern, regex.flags, list(REPRESENTATIVE_COMMANDS), 5), timeout
+                )
+        except TimeoutError:
+            raise InvalidRuleError(
+                f"Pattern exceeded the {settings.validation_timeout_ms:g} ms validation "
+                "budget (super-linear backtracking)"
+            ) from None
+
+        worst_us = max(adversarial) * 1e6
+        cost_us = sum(representative) / len(representative) * 1e6
+        if worst_us > settings.cost_reject_us:
+            raise InvalidRuleError(
+                f"Pattern worst-case search takes {worst_us:.0f} us "
+                f"(limit {settings.cost_reject_us:g} us)"
+            )
+
+        warnings: list[str] = []
+        if prone:
+            warnings.append("nested quantifier, alternation under a repeat or back-reference")
+        if worst_us > settings.cost_warn_us:
+            warnings.append(f"worst-case search takes {worst_us:.0f} us")
+        if warnings:
+            logger.warning("rule_pattern_flagged", pattern=pattern, warnings=warnings)
+        return PatternCost(
+            cost_us=round(cost_us, 3),
+            worst_us=round(worst_us, 3),
+            backtracking_prone=prone,
+            warnings=tuple(warnings),
+        )
+
+    async def validate_async(self, pattern: str) -> PatternCost:
+        """Run :meth:`validate` in a thread so the event loop stays free."""
+        return await asyncio.to_thread(self.validate, pattern)
+
+    def close(self) -> None:
+        self._sandbox.close()
+
+
+_validator: PatternValidator | None = None
+
+
+def get_pattern_validator(settings: RuleSettings | None = None) -> PatternValidator:
+    """Return (and lazily create) the process-wide pattern validator."""
+    global _validator
+    if _validator is None:
+        _validator = PatternValidator(settings or RuleSettings())
+    return _validator
+
+
+def dispose_pattern_validator() -> None:
+    """Terminate the validation sandbox."""
+    global _validator
+    if _validator is not None:
+        _validator.close()
+        _validator = None
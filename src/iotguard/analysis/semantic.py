@@ -0,0 +1,178 @@
+"""Near-duplicate cache of LLM verdicts.
+
+Phrasings such as ``unlock the front door`` and ``please unlock front door
+now`` hash to different exact-cache keys but deserve the same verdict.
+:class:`SemanticCache` embeds each analysed command as a hashed bag of
+character and word n-grams (CPU only, NumPy) and keeps one matrix of unit
+vectors per device type.  Politeness filler is dropped and whole words
+outweigh character n-grams, so ``lock`` and ``unlock`` stay far apart
+while ``please open the garage door`` matches ``open garage door``.
+
+A lookup reuses the nearest verdict when
+
+* its cosine similarity reaches ``SEMANTIC_CACHE_THRESHOLD``,
+* it has the same numeric parameters (``set 20`` is not ``set 90``), and
+* every neighbour within ``SEMANTIC_CACHE_STABILITY_MARGIN`` below the
+  threshold agrees on the risk level -- if similar commands got different
+  verdicts, the neighbourhood is ambiguous and the LLM is asked instead.
+
+Each index is bounded; the least recently used row is overwritten when it
+is full.  The similarity of every hit is exported, and a sampled fraction
+of hits (``SEMANTIC_CACHE_VERIFY_RATE``) is re-checked against the LLM so
+the threshold can be tuned from observed agreement.
+
+Requires the optional ``numpy`` dependency (``pip install iotguard[semantic]``).
+"""
+
+from __future__ import annotations
+
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any
+
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.features import command_features, device_key, hashed_features
+from iotguard.analysis.models import AnalysisResult, RiskLevel
+from iotguard.core.config import SemanticCacheSettings
+from iotguard.core.exceptions import ConfigError
+from iotguard.observability.metrics import (
+    semantic_cache_entries,
+    semantic_cache_requests_total,
+    semantic_cache_similarity,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None  # type: ignore[assignment]
+
+
+@dataclass(frozen=True, slots=True)
+class SemanticHit:
+    """A reused verdict and how close its command was."""
+
+    result: AnalysisResult
+    similarity: float
+    matched: str
+
+
+@dataclass(slots=True)
+class _Row:
+    command: str
+    params: tuple[float, ...]
+    result: AnalysisResult
+    added: float
+
+
+class _Index:
+    """Fixed-capacity matrix of unit vectors with per-row metadata."""
+
+    def __init__(self, capacity: int, dimensions: int) -> None:
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.rows: list[_Row | None] = [None] * capacity
+        self.size = 0
+
+    def slot(self) -> int:
+        """Return a free row, or the least recently used one."""
+        if self.size < len(self.rows):
+            self.size += 1
+            return self.size - 1
+        return int(np.argmin(self.last_used))
+
+
+class SemanticCache:
+    """Per-device-type nearest-neighbour cache of LLM verdicts."""
+
+    def __init__(self, settings: SemanticCacheSettings) -> None:
+        if np is None:
+            raise ConfigError("SEMANTIC_CACHE_ENABLED requires numpy; install iotguard[semantic]")
+        self._settings = settings
+        self._indexes: dict[str, _Index] = {}
+        semantic_cache_entries.set_function(self.__len__)
+
+    def __len__(self) -> int:
+        return sum(index.size for index in self._indexes.values())
+
+    def embed(self, command: str | ParsedCommand) -> np.ndarray:
+        """Return the unit-length hashed n-gram vector of *command*."""
+        dims = self._settings.dimensions
+        vector = np.zeros(dims, dtype=np.float32)
+        features, weights = command_features(ParsedCommand.of(command))
+        if not features:
+            return vector
+        indices, values = hashed_features(features, weights, dims)
+        np.add.at(vector, indices, values)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def lookup(
+        self,
+        command: str | ParsedCommand,
+        device_context: Mapping[str, Any],
+    ) -> SemanticHit | None:
+        """Return a verdict of a near-identical command, if one is safe to reuse."""
+        index = self._indexes.get(device_key(device_context))
+        if index is None or index.size == 0:
+            semantic_cache_requests_total.labels(result="miss").inc()
+            return None
+        parsed = ParsedCommand.of(command)
+        settings = self._settings
+        now = time.time()
+
+        sims = index.vectors[: index.size] @ self.embed(parsed)
+        floor = settings.threshold - settings.stability_margin
+        candidates = np.flatnonzero(sims >= floor)
+        best: int | None = None
+        risks: set[RiskLevel] = set()
+        for i in candidates[np.argsort(-sims[candidates])]:
+            row = index.rows[i]
+            if row is None or now - row.added > settings.max_age:
+                continue
+            risks.add(row.result.risk_level)
+            if best is None and sims[i] >= settings.threshold and row.params == parsed.params:
+                best = int(i)
+
+        if best is None:
+            semantic_cache_requests_total.labels(result="miss").inc()
+            return None
+        if len(risks) > 1:
+            semantic_cache_requests_total.labels(result="unstable").inc()
+            return None
+
+        similarity = float(sims[best])
+        row = index.rows[best]
+        assert row is not None
+        index.last_used[best] = now
+        semantic_cache_requests_total.labels(result="hit").inc()
+        semantic_cache_similarity.observe(similarity)
+        return SemanticHit(
+            result=row.result.model_copy(),
+            similarity=similarity,
+            matched=row.command,
+        )
+
+    def add(
+        self,
+        command: str | ParsedCommand,
+        device_context: Mapping[str, Any],
+        result: AnalysisResult,
+    ) -> None:
+        """Index the verdict the LLM gave for *command*."""
+        parsed = ParsedCommand.of(command)
+        if not parsed.tokens:
+            return
+        key = device_key(device_context)
+        index = self._indexes.get(key)
+        if index is None:
+            index = _Index(self._settings.capacity, self._settings.dimensions)
+            self._indexes[key] = index
+        now = time.time()
+        i = index.slot()
+        index.vectors[i] = self.embed(parsed)
+        index.last_used[i] = now
+        index.rows[i] = _Row(parsed.raw, parsed.params, result.model_copy(), now)
+
+    def clear(self) -> None:
+        self._indexes.clear()
@@ -3,37 +3,62 @@
 The service checks security rules first; if the command is not blocked it
 delegates to the Gemini LLM engine for deeper analysis.  Results from both
 sources are merged, persisted to the command log, and published via the
-event bus.
+event bus.  When the LLM fails, or the request's deadline leaves no time
+for it, the optional *fallback_engine* (the local risk classifier) answers
+instead, or failing that the rules alone.  :meth:`AnalysisService.analyze_stream`
+yields the verdict as soon as the LLM's risk level is known and the full
+analysis once its explanation has arrived.
 """
 
 from __future__ import annotations
 
+import asyncio
 import time
 import uuid
+from collections.abc import AsyncIterator
 from typing import Any
 
 import structlog
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.engines.base import AnalysisEngine
 from iotguard.analysis.engines.gemini import GeminiAnalysisEngine
 from iotguard.analysis.engines.rule_based import RuleBasedEngine
+from iotguard.analysis.engines.streaming import StreamedAnalysis, StreamingAnalysisEngine
 from iotguard.analysis.models import AnalysisRequest, AnalysisResult, RiskLevel
 from iotguard.core.config import GeminiSettings, RedisSettings
+from iotguard.core.deadline import Deadline, deadline_scope
 from iotguard.core.events import (
     AlertEvent,
     CommandAnalyzedEvent,
     EventBus,
     RuleViolationEvent,
 )
-from iotguard.core.exceptions import AnalysisError
+from iotguard.core.exceptions import AnalysisError, DeadlineExceededError
 from iotguard.db.models import CommandLog
-from iotguard.db.repositories import CommandLogRepository
+from iotguard.db.repositories import CommandLogRepository, DeviceRepository
+from iotguard.observability.metrics import (
+    analysis_deadline_fallbacks_total,
+    analysis_engine_fallbacks_total,
+)
 
 logger = structlog.get_logger(__name__)
 
+_DEADLINE_NOTE = "LLM analysis skipped: request deadline reached"
+
+#: Context keys that select security rules; never taken from ``user_context``.
+_DEVICE_KEYS = frozenset({"device_id", "device_pk", "device_type", "state"})
+
 
 class AnalysisService:
-    """Orchestrate rule-based + LLM analysis for IoT commands."""
+    """Orchestrate rule-based + LLM analysis for IoT commands.
+
+    The service itself is request-scoped (it owns the DB session), but the
+    LLM engine should be a long-lived instance passed in via *llm_engine*
+    so that its circuit breaker and client state survive across requests.
+    The same holds for *fallback_engine*, asked when the LLM cannot answer.
+    """
 
     def __init__(
         self,
@@ -43,6 +68,8 @@ class AnalysisService:
         *,
         redis_settings: RedisSettings | None = None,
         redis_client: Any | None = None,
+        llm_engine: AnalysisEngine | None = None,
+        fallback_engine: AnalysisEngine | None = None,
     ) -> None:
         self._session = session
         self._event_bus = event_bus
@@ -50,11 +77,12 @@ class AnalysisService:
 
         # Engines
         self._rule_engine = RuleBasedEngine(session)
-        self._llm_engine = GeminiAnalysisEngine(
+        self._llm_engine: AnalysisEngine = llm_engine or GeminiAnalysisEngine(
             gemini_settings,
             redis_settings,
             redis_client=redis_client,
         )
+        self._fallback_engine = fallback_engine
 
     # ------------------------------------------------------------------
     # Public API
@@ -65,38 +93,125 @@ class AnalysisService:
         request: AnalysisRequest,
         *,
         user_id: uuid.UUID | None = None,
+        verdict_only: bool = False,
+        parsed: ParsedCommand | None = None,
+        deadline: Deadline | None = None,
     ) -> AnalysisResult:
-        """Run the full analysis pipeline and return a merged result."""
+        """Run the full analysis pipeline and return a merged result.
+
+        With *verdict_only* rule evaluation stops at the first BLOCK match;
+        use it where only ``was_blocked`` matters (execution gating).
+        Callers that also execute the command can pass the *parsed* command
+        to reuse it afterwards.  The engines see *deadline* as the current
+        deadline; if it passes before the LLM answers, the fallback
+        engine's verdict (or the rule-only one) is returned.
+        """
         start = time.monotonic()
-        device_context: dict[str, Any] = {
-            "device_id": request.device_id,
-            **request.user_context,
-        }
+        if parsed is None:
+            parsed = ParsedCommand.parse(request.command)
+        device_context = await self._device_context(request)
 
-        # 1. Rule-based evaluation (always runs)
-        rule_result = await self._rule_engine.analyze(
-            request.command, device_context
-        )
+        with deadline_scope(deadline):
+            # 1. Rule-based evaluation (always runs)
+            if verdict_only:
+                rule_result = await self._rule_engine.analyze(
+                    parsed, device_context, first_block=True
+                )
+            else:
+                rule_result = await self._rule_engine.analyze(parsed, device_context)
 
-        # If rules already blocked the command, skip the LLM call
-        if rule_result.was_blocked:
-            merged = rule_result
-        else:
-            # 2. LLM analysis
+            # If rules already blocked the command, skip the LLM call
+            if rule_result.was_blocked:
+                merged = rule_result
+            else:
+                # 2. LLM analysis
+                merged = await self._analyze_with_llm(
+                    parsed, device_context, rule_result, deadline
+                )
+
+        # 3. Persist and publish
+        await self._record(request, merged, user_id=user_id, start=start)
+        return merged
+
+    async def analyze_stream(
+        self,
+        request: AnalysisRequest,
+        *,
+        user_id: uuid.UUID | None = None,
+        deadline: Deadline | None = None,
+        details: bool = True,
+    ) -> AsyncIterator[tuple[str, AnalysisResult]]:
+        """Analyse like :meth:`analyze`, yielding results as they firm up.
+
+        Yields ``("verdict", result)`` as soon as the risk level is known --
+        the LLM's explanation is not in it yet -- and, with *details*,
+        ``("result", result)`` once the full LLM analysis has arrived.  The
+        last result yielded is the one logged and published.
+        """
+        start = time.monotonic()
+        parsed = ParsedCommand.parse(request.command)
+        device_context = await self._device_context(request)
+
+        with deadline_scope(deadline):
+            rule_result = await self._rule_engine.analyze(parsed, device_context)
+            if rule_result.was_blocked:
+                streamed = None
+            else:
+                # The engine's task inherits the deadline from this scope.
+                streamed = self._stream_llm(parsed, device_context)
+
+        if streamed is None:
+            yield "verdict", rule_result
+            await self._record(request, rule_result, user_id=user_id, start=start)
+            return
+
+        try:
             try:
-                llm_result = await self._llm_engine.analyze(
-                    request.command, device_context
+                async with asyncio.timeout(deadline.remaining() if deadline else None):
+                    risk_level = await asyncio.shield(streamed.risk_level)
+            except Exception as exc:
+                verdict = await self._llm_fallback(
+                    parsed, device_context, rule_result, exc, deadline
                 )
+                yield "verdict", verdict
+                await self._record(request, verdict, user_id=user_id, start=start)
+                return
+            verdict = self._merge_results(
+                rule_result, AnalysisResult(risk_level=risk_level, explanation="")
+            )
+            yield "verdict", verdict
+            if not details:
+                await self._record(request, verdict, user_id=user_id, start=start)
+                return
+
+            try:
+                async with asyncio.timeout(deadline.remaining() if deadline else None):
+                    llm_result = await asyncio.shield(streamed.result)
                 merged = self._merge_results(rule_result, llm_result)
             except Exception as exc:
-                logger.error("llm_analysis_failed", error=str(exc))
-                # Fall back to rule-only result rather than failing entirely
-                if rule_result.rule_violations:
-                    merged = rule_result
-                else:
-                    raise AnalysisError(str(exc)) from exc
-
-        # 3. Persist to command log
+                # The verdict already went out; only the details are missing.
+                logger.warning("llm_details_unavailable", error=str(exc))
+                merged = verdict
+            await self._record(request, merged, user_id=user_id, start=start)
+            yield "result", merged
+        finally:
+            # Stop waiting for details nobody will read.  Engines that share
+            # work between callers (and cache it) carry on in the background.
+            streamed.result.cancel()
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    async def _record(
+        self,
+        request: AnalysisRequest,
+        merged: AnalysisResult,
+        *,
+        user_id: uuid.UUID | None,
+        start: float,
+    ) -> None:
+        """Persist the final result to the command log and publish events."""
         log_entry = CommandLog(
             user_id=user_id,
             device_id=self._try_parse_uuid(request.device_id),
@@ -116,7 +231,7 @@ class AnalysisService:
             elapsed_s=round(elapsed, 3),
         )
 
-        # 4. Publish domain events
+        # Publish domain events
         self._event_bus.publish_nowait(
             CommandAnalyzedEvent(
                 device_id=request.device_id,
@@ -145,11 +260,99 @@ class AnalysisService:
                 )
             )
 
-        return merged
+    async def _analyze_with_llm(
+        self,
+        parsed: ParsedCommand,
+        device_context: dict[str, Any],
+        rule_result: AnalysisResult,
+        deadline: Deadline | None,
+    ) -> AnalysisResult:
+        """Merge in the LLM verdict, or fall back to the rules alone."""
+        try:
+            if deadline is not None and deadline.expired:
+                raise DeadlineExceededError("no time left for LLM analysis")
+            # Engines may bound their own work by the deadline; this bounds
+            # the wait even for those that do not.
+            async with asyncio.timeout(deadline.remaining() if deadline else None):
+                llm_result = await self._llm_engine.analyze(parsed, device_context)
+            return self._merge_results(rule_result, llm_result)
+        except Exception as exc:
+            return await self._llm_fallback(parsed, device_context, rule_result, exc, deadline)
 
-    # ------------------------------------------------------------------
-    # Helpers
-    # ------------------------------------------------------------------
+    def _stream_llm(
+        self,
+        parsed: ParsedCommand,
+        device_context: dict[str, Any],
+    ) -> StreamedAnalysis:
+        """Start the LLM analysis, streamed if the engine supports it."""
+        if isinstance(self._llm_engine, StreamingAnalysisEngine):
+            return self._llm_engine.analyze_streaming(parsed, device_context)
+        return StreamedAnalysis.start(self._llm_engine.analyze(parsed, device_context))
+
+    async def _llm_fallback(
+        self,
+        parsed: ParsedCommand,
+        device_context: dict[str, Any],
+        rule_result: AnalysisResult,
+        exc: Exception,
+        deadline: Deadline | None,
+    ) -> AnalysisResult:
+        """The result to use when the LLM failed or ran out of time."""
+        timed_out = isinstance(exc, DeadlineExceededError) or (
+            isinstance(exc, TimeoutError) and deadline is not None and deadline.expired
+        )
+        if timed_out:
+            logger.warning("llm_analysis_deadline_exceeded", error=str(exc))
+            analysis_deadline_fallbacks_total.inc()
+        else:
+            logger.error("llm_analysis_failed", error=str(exc))
+
+        result = rule_result
+        if self._fallback_engine is not None:
+            try:
+                fallback = await self._fallback_engine.analyze(parsed, device_context)
+            except Exception as fallback_exc:
+                logger.error("fallback_analysis_failed", error=str(fallback_exc))
+            else:
+                analysis_engine_fallbacks_total.labels(
+                    reason="deadline" if timed_out else "llm_error"
+                ).inc()
+                result = self._merge_results(rule_result, fallback)
+        if timed_out:
+            explanation = " | ".join(filter(None, [result.explanation, _DEADLINE_NOTE]))
+            return result.model_copy(update={"explanation": explanation})
+        # Fall back to the rule-only result rather than failing entirely
+        if result is not rule_result or rule_result.rule_violations:
+            return result
+        raise AnalysisError(str(exc)) from exc
+
+    async def _device_context(self, request: AnalysisRequest) -> dict[str, Any]:
+        """Build the context the engines see, filling in the registered device.
+
+        The device's id, type and state scope which security rules apply, so
+        they come only from the request and the device registry; the same
+        keys in ``user_context`` are dropped.  The request may name the
+        device by primary key or external id; a registered device gets both,
+        as ``device_pk`` and ``device_id``.  An unregistered device has no
+        type, and every rule is evaluated for it.
+        """
+        spoofed = _DEVICE_KEYS.intersection(request.user_context)
+        if spoofed:
+            logger.warning(
+                "device_context_keys_ignored",
+                device_id=request.device_id,
+                keys=sorted(spoofed),
+            )
+        context: dict[str, Any] = {
+            key: value for key, value in request.user_context.items() if key not in spoofed
+        }
+        context["device_id"] = request.device_id
+        scope = await DeviceRepository(self._session).get_scope(request.device_id)
+        if scope is not None:
+            pk, context["device_id"], context["device_type"], state = scope
+            context["device_pk"] = str(pk)
+            context["state"] = state or {}
+        return context
 
     @staticmethod
     def _merge_results(
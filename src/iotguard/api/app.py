@@ -9,6 +9,13 @@ import structlog
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from iotguard.analysis.registry import dispose_engine_registry, get_engine_registry
+from iotguard.analysis.rules.backtest import dispose_backtest_jobs
+from iotguard.analysis.rules.compiled import get_rule_store
+from iotguard.analysis.rules.guard import dispose_rule_guard, get_rule_guard
+from iotguard.analysis.rules.ordering import RuleStatsFlusher
+from iotguard.analysis.rules.sync import RuleChangeListener
+from iotguard.analysis.rules.validation import dispose_pattern_validator, get_pattern_validator
 from iotguard.api.dependencies import set_singletons
 from iotguard.api.middleware import (
     CorrelationIdMiddleware,
@@ -19,7 +26,9 @@ from iotguard.api.routers import admin, analysis, analytics, auth, devices, heal
 from iotguard.core.config import Settings, get_settings
 from iotguard.core.events import EventBus
 from iotguard.core.logging import setup_logging
-from iotguard.db.engine import dispose_engine, get_session_factory
+from iotguard.db.engine import dispose_engine, get_engine, get_session_factory
+from iotguard.db.redis import close_redis, get_redis
+from iotguard.db.repositories import SecurityRuleRepository
 from iotguard.mqtt.service import MqttService
 from iotguard.observability.audit import AuditLogger
 from iotguard.observability.metrics import MetricsCollector, create_metrics_app
@@ -52,8 +61,36 @@ async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
     except Exception:
         logger.warning("mqtt_connect_failed_at_startup")
 
+    # Shared Redis pool (verdict cache, health checks)
+    redis_client = get_redis(settings.redis)
+
+    # Long-lived analysis engines (circuit breaker state survives requests)
+    engines = get_engine_registry(settings, redis_client=redis_client)
+    await engines.warm_up()
+
+    # Start the regex sandbox now rather than on the first compile
+    await get_rule_guard(settings.rules).warm_async()
+
+    # Keep the compiled rule set in step with rule edits on other workers
+    rule_store = get_rule_store(settings.rules)
+    try:
+        # Compile and validate existing rules before the first request
+        async with session_factory() as session:
+            await rule_store.get(SecurityRuleRepository(session))
+    except Exception as exc:
+        logger.warning("rule_set_preload_failed", error=str(exc))
+    rule_listener = RuleChangeListener(get_engine(settings.database), rule_store, settings.rules)
+    await rule_listener.start()
+
+    # Persist per-rule hit counts that drive adaptive rule ordering
+    rule_stats_flusher = RuleStatsFlusher(
+        get_engine(settings.database), rule_store, settings.rules
+    )
+    await rule_stats_flusher.start()
+    get_pattern_validator(settings.rules)
+
     # Wire singletons into the DI graph
-    set_singletons(settings, event_bus, mqtt_service)
+    set_singletons(settings, event_bus, mqtt_service, engines=engines)
 
     # Observability
     if settings.observability.prometheus_enabled:
@@ -69,6 +106,13 @@ async def _lifespan(app: FastAPI) -> AsyncIterator[None]:
     # Shutdown
     logger.info("shutting_down")
     await mqtt_service.stop()
+    await rule_listener.stop()
+    await rule_stats_flusher.stop()
+    await dispose_backtest_jobs()
+    dispose_rule_guard()
+    dispose_pattern_validator()
+    await dispose_engine_registry()
+    await close_redis()
     await dispose_engine()
 
 
@@ -8,10 +8,13 @@ from typing import Annotated
 
 import structlog
 from fastapi import Depends, Header, HTTPException, status
+from redis.asyncio import Redis
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from iotguard.analysis.registry import EngineRegistry, get_engine_registry
 from iotguard.analysis.service import AnalysisService
 from iotguard.core.config import Settings, get_settings
+from iotguard.core.deadline import Deadline, parse_deadline
 from iotguard.core.events import EventBus
 from iotguard.core.security import (
     Role,
@@ -20,6 +23,7 @@ from iotguard.core.security import (
     decode_token,
 )
 from iotguard.db.engine import get_session_factory
+from iotguard.db.redis import get_redis
 from iotguard.devices.service import DeviceService
 from iotguard.mqtt.service import MqttService
 
@@ -32,18 +36,22 @@ logger = structlog.get_logger(__name__)
 _settings: Settings | None = None
 _event_bus: EventBus | None = None
 _mqtt_service: MqttService | None = None
+_engines: EngineRegistry | None = None
 
 
 def set_singletons(
     settings: Settings,
     event_bus: EventBus,
     mqtt_service: MqttService,
+    *,
+    engines: EngineRegistry | None = None,
 ) -> None:
     """Called once during ``lifespan`` to wire singletons into the DI graph."""
-    global _settings, _event_bus, _mqtt_service  # noqa: PLW0603
+    global _settings, _event_bus, _mqtt_service, _engines  # noqa: PLW0603
     _settings = settings
     _event_bus = event_bus
     _mqtt_service = mqtt_service
+    _engines = engines
 
 
 # ---------------------------------------------------------------------------
@@ -81,6 +89,18 @@ async def get_db_session(
 DbSession = Annotated[AsyncSession, Depends(get_db_session)]
 
 
+# ---------------------------------------------------------------------------
+# Redis (shared pool)
+# ---------------------------------------------------------------------------
+
+
+def get_redis_client(settings: SettingsDep) -> Redis:
+    return get_redis(settings.redis)
+
+
+RedisDep = Annotated[Redis, Depends(get_redis_client)]
+
+
 # ---------------------------------------------------------------------------
 # Authentication -- JWT bearer
 # ---------------------------------------------------------------------------
@@ -158,6 +178,32 @@ OperatorUser = Annotated[TokenPayload, require_role(Role.ADMIN, Role.OPERATOR)]
 ViewerUser = Annotated[TokenPayload, require_role(Role.ADMIN, Role.OPERATOR, Role.VIEWER)]
 
 
+# ---------------------------------------------------------------------------
+# Request deadline
+# ---------------------------------------------------------------------------
+
+
+def get_request_deadline(
+    settings: SettingsDep,
+    x_request_deadline: str | None = Header(None),
+) -> Deadline | None:
+    """Deadline from the ``X-Request-Deadline`` header (ms) or the default."""
+    try:
+        return parse_deadline(
+            x_request_deadline,
+            default=settings.api.default_deadline,
+            maximum=settings.api.max_deadline,
+        )
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc),
+        ) from exc
+
+
+RequestDeadline = Annotated[Deadline | None, Depends(get_request_deadline)]
+
+
 # ---------------------------------------------------------------------------
 # Service factories
 # ---------------------------------------------------------------------------
@@ -172,16 +218,28 @@ def get_event_bus() -> EventBus:
 EventBusDep = Annotated[EventBus, Depends(get_event_bus)]
 
 
+def get_engines(settings: SettingsDep, redis: RedisDep) -> EngineRegistry:
+    if _engines is None:
+        return get_engine_registry(settings, redis_client=redis)
+    return _engines
+
+
+EnginesDep = Annotated[EngineRegistry, Depends(get_engines)]
+
+
 async def get_analysis_service(
     session: DbSession,
     settings: SettingsDep,
     bus: EventBusDep,
+    engines: EnginesDep,
 ) -> AnalysisService:
     return AnalysisService(
         session,
         settings.gemini,
         bus,
         redis_settings=settings.redis,
+        llm_engine=engines.llm_engine,
+        fallback_engine=engines.fallback_engine,
     )
 
 
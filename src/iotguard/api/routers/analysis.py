@@ -3,23 +3,33 @@
 from __future__ import annotations
 
 import uuid
+from collections.abc import AsyncIterator
 from datetime import datetime
 from typing import Any
 
 from pydantic import BaseModel, Field
 from fastapi import APIRouter, Query
+from fastapi.responses import StreamingResponse
 
+from iotguard.analysis.command import ParsedCommand
 from iotguard.analysis.models import (
     AnalysisRequest as AnalysisRequestModel,
     AnalysisResponse as AnalysisResponseModel,
 )
+from iotguard.analysis.service import AnalysisService
 from iotguard.api.dependencies import (
     AnalysisServiceDep,
     DbSession,
     DeviceServiceDep,
+    EnginesDep,
+    EventBusDep,
     OperatorUser,
+    RequestDeadline,
+    SettingsDep,
     ViewerUser,
 )
+from iotguard.core.exceptions import AnalysisError
+from iotguard.db.engine import get_session_factory
 from iotguard.db.repositories import CommandLogRepository
 
 router = APIRouter(prefix="/v1", tags=["analysis"])
@@ -47,6 +57,14 @@ class AnalysisResponse(BaseModel):
     was_blocked: bool = False
 
 
+class AnalysisStreamEvent(BaseModel):
+    """One line of the ``/v1/analyze/stream`` NDJSON response."""
+
+    event: str  # "verdict", "result" or "error"
+    analysis: AnalysisResponse | None = None
+    detail: str | None = None
+
+
 class AnalyzeAndExecuteResponse(BaseModel):
     analysis: AnalysisResponse
     executed: bool = False
@@ -97,23 +115,80 @@ async def analyze_command(
     body: AnalyzeRequest,
     user: OperatorUser,
     analysis_svc: AnalysisServiceDep,
+    deadline: RequestDeadline,
 ) -> AnalysisResponse:
-    """Analyse an IoT command for security risks."""
+    """Analyse an IoT command for security risks.
+
+    ``X-Request-Deadline`` (milliseconds) bounds the wait for the LLM;
+    past it the rule-only verdict is returned.
+    """
     req = AnalysisRequestModel(
         command=body.command,
         device_id=body.device_id,
         user_context=body.user_context,
     )
-    result = await analysis_svc.analyze(req, user_id=uuid.UUID(user.sub))
+    result = await analysis_svc.analyze(req, user_id=uuid.UUID(user.sub), deadline=deadline)
     return _to_response(body, result)
 
 
+@router.post("/analyze/stream")
+async def analyze_command_stream(
+    body: AnalyzeRequest,
+    user: OperatorUser,
+    settings: SettingsDep,
+    bus: EventBusDep,
+    engines: EnginesDep,
+    deadline: RequestDeadline,
+    details: bool = Query(True, description="Also stream the full LLM analysis"),
+) -> StreamingResponse:
+    """Analyse a command, streaming the verdict before the LLM's explanation.
+
+    The response is newline-delimited JSON: a ``verdict`` event as soon as
+    the risk level is known, then (with *details*) a ``result`` event with
+    the explanation and suggestions.  Failures after the response started
+    arrive as an ``error`` event.
+    """
+    req = AnalysisRequestModel(
+        command=body.command,
+        device_id=body.device_id,
+        user_context=body.user_context,
+    )
+    user_id = uuid.UUID(user.sub)
+
+    async def events() -> AsyncIterator[str]:
+        # The body outlives the request-scoped session dependency, so the
+        # stream logs the analysis through a session of its own.
+        async with get_session_factory(settings.database)() as session:
+            svc = AnalysisService(
+                session,
+                settings.gemini,
+                bus,
+                redis_settings=settings.redis,
+                llm_engine=engines.llm_engine,
+                fallback_engine=engines.fallback_engine,
+            )
+            try:
+                async for stage, result in svc.analyze_stream(
+                    req, user_id=user_id, deadline=deadline, details=details
+                ):
+                    event = AnalysisStreamEvent(event=stage, analysis=_to_response(body, result))
+                    yield event.model_dump_json() + "\n"
+                await session.commit()
+            except AnalysisError as exc:
+                await session.rollback()
+                error = AnalysisStreamEvent(event="error", detail=exc.message)
+                yield error.model_dump_json() + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @router.post("/analyze-and-execute", response_model=AnalyzeAndExecuteResponse)
 async def analyze_and_execute(
     body: AnalyzeRequest,
     user: OperatorUser,
     analysis_svc: AnalysisServiceDep,
     device_svc: DeviceServiceDep,
+    deadline: RequestDeadline,
 ) -> AnalyzeAndExecuteResponse:
     """Analyse a command, and if safe, execute it on the device."""
     req = AnalysisRequestModel(
@@ -121,7 +196,10 @@ async def analyze_and_execute(
         device_id=body.device_id,
         user_context=body.user_context,
     )
-    result = await analysis_svc.analyze(req, user_id=uuid.UUID(user.sub))
+    parsed = ParsedCommand.parse(body.command)
+    result = await analysis_svc.analyze(
+        req, user_id=uuid.UUID(user.sub), verdict_only=True, parsed=parsed, deadline=deadline
+    )
     analysis_resp = _to_response(body, result)
 
     if result.was_blocked:
@@ -134,7 +212,7 @@ async def analyze_and_execute(
         return AnalyzeAndExecuteResponse(analysis=analysis_resp, executed=False)
 
     exec_result = await device_svc.execute_command(
-        device_uuid, body.command, user=user.sub,
+        device_uuid, parsed, user=user.sub,
     )
     return AnalyzeAndExecuteResponse(
         analysis=analysis_resp,
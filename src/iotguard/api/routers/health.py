@@ -8,6 +8,7 @@ from fastapi import APIRouter, Depends
 
 from iotguard.api.dependencies import SettingsDep, get_app_settings
 from iotguard.db.engine import get_session_factory
+from iotguard.db.redis import get_redis
 from iotguard.mqtt.service import MqttService
 from iotguard.observability.health import HealthChecker
 
@@ -22,6 +23,7 @@ def _build_checker(settings: SettingsDep) -> HealthChecker:
         redis_settings=settings.redis,
         gemini_settings=settings.gemini,
         mqtt_service=_mqtt_service,
+        redis_client=get_redis(settings.redis),
     )
 
 
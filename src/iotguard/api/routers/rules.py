@@ -8,13 +8,27 @@ from typing import Any
 
 from pydantic import BaseModel, Field
 from fastapi import APIRouter, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from iotguard.analysis.rules.backtest import (
+    BacktestJob,
+    BacktestRunner,
+    RuleSetDiff,
+    RuleSpec,
+    get_backtest_jobs,
+)
+from iotguard.analysis.rules.compiled import get_rule_store
+from iotguard.analysis.rules.engine import RuleEvaluationResult, SecurityRuleEngine
+from iotguard.analysis.rules.guard import get_rule_guard
+from iotguard.analysis.rules.literals import required_literals
+from iotguard.analysis.rules.validation import PatternCost, get_pattern_validator
 from iotguard.api.dependencies import (
-    AnalysisServiceDep,
     DbSession,
     OperatorUser,
+    SettingsDep,
     ViewerUser,
 )
+from iotguard.db.engine import get_engine
 from iotguard.db.models import SecurityRule
 from iotguard.db.repositories import SecurityRuleRepository
 
@@ -26,6 +40,18 @@ router = APIRouter(prefix="/v1/rules", tags=["rules"])
 # ---------------------------------------------------------------------------
 
 
+class RuleStatsOut(BaseModel):
+    """Execution statistics of a rule in the serving worker process."""
+
+    evaluations: int
+    hits: int
+    total_ms: float
+    max_ms: float
+    overruns: int
+    quarantined: bool
+    sandboxed: bool
+
+
 class RuleOut(BaseModel):
     id: str
     name: str
@@ -35,6 +61,16 @@ class RuleOut(BaseModel):
     is_active: bool
     priority: int
     created_at: datetime
+    device_types: list[str] | None = None
+    device_ids: list[str] | None = None
+    state_predicates: dict[str, Any] | None = None
+    # Literals one of which a command must contain for the rule's regex to
+    # run at all; empty means the rule is evaluated against every command.
+    required_literals: list[str] = []
+    cost_us: float | None = None
+    # Non-fatal findings from pattern validation (create / update only)
+    warnings: list[str] = []
+    stats: RuleStatsOut | None = None
 
     class Config:
         from_attributes = True
@@ -46,6 +82,11 @@ class RuleCreate(BaseModel):
     pattern: str = Field(..., min_length=1)
     action: str = Field("BLOCK", pattern=r"^(BLOCK|WARN|LOG)$")
     priority: int = Field(100, ge=0, le=10000)
+    # Scope: omitted / null applies the rule to every device.  State
+    # predicates are equality checks on keys of the device's state.
+    device_types: list[str] | None = None
+    device_ids: list[str] | None = None
+    state_predicates: dict[str, Any] | None = None
 
 
 class RuleUpdate(BaseModel):
@@ -55,10 +96,27 @@ class RuleUpdate(BaseModel):
     action: str | None = Field(None, pattern=r"^(BLOCK|WARN|LOG)$")
     is_active: bool | None = None
     priority: int | None = Field(None, ge=0, le=10000)
+    device_types: list[str] | None = None
+    device_ids: list[str] | None = None
+    state_predicates: dict[str, Any] | None = None
+
+
+class RuleValidateRequest(BaseModel):
+    pattern: str = Field(..., min_length=1)
+
+
+class RuleValidateResponse(BaseModel):
+    cost_us: float
+    worst_us: float
+    backtracking_prone: bool
+    warnings: list[str]
+    required_literals: list[str]
 
 
 class RuleTestRequest(BaseModel):
     command: str
+    # Device scope to evaluate under (device_type, device_id, state)
+    device_context: dict[str, Any] | None = None
 
 
 class RuleTestResponse(BaseModel):
@@ -67,6 +125,105 @@ class RuleTestResponse(BaseModel):
     matched_rules: list[str]
 
 
+class RuleTestBatchRequest(BaseModel):
+    commands: list[str] = Field(..., min_length=1, max_length=10000)
+    device_context: dict[str, Any] | None = None
+
+
+class RuleTestBatchResponse(BaseModel):
+    results: list[RuleTestResponse]
+    blocked: int
+
+
+class RuleBacktestRequest(BaseModel):
+    # Rules to add, or to replace the active rule of the same name
+    upsert: list[RuleCreate] = []
+    # Names of active rules to drop
+    remove: list[str] = []
+    since: datetime | None = None
+    until: datetime | None = None
+
+
+class RuleBacktestJobOut(BaseModel):
+    id: str
+    status: str
+    processed: int
+    total: int
+    started_at: datetime
+    finished_at: datetime | None
+    report: dict[str, Any] | None = None
+    error: str | None = None
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+
+def _rule_out(rule: SecurityRule, cost: PatternCost | None = None) -> RuleOut:
+    stats = get_rule_guard().stats(str(rule.id))
+    return RuleOut(
+        id=str(rule.id),
+        name=rule.name,
+        description=rule.description,
+        pattern=rule.pattern,
+        action=rule.action,
+        is_active=rule.is_active,
+        priority=rule.priority,
+        created_at=rule.created_at,
+        device_types=rule.device_types,
+        device_ids=rule.device_ids,
+        state_predicates=rule.state_predicates,
+        required_literals=list(required_literals(rule.pattern)),
+        cost_us=rule.cost_us,
+        warnings=list(cost.warnings) if cost is not None else [],
+        stats=(
+            RuleStatsOut(
+                evaluations=stats.evaluations,
+                hits=stats.hits,
+                total_ms=round(stats.total_seconds * 1000, 3),
+                max_ms=round(stats.max_seconds * 1000, 3),
+                overruns=stats.overruns,
+                quarantined=stats.quarantined,
+                sandboxed=stats.sandboxed,
+            )
+            if stats is not None
+            else None
+        ),
+    )
+
+
+def _test_response(result: RuleEvaluationResult) -> RuleTestResponse:
+    return RuleTestResponse(
+        blocked=result.blocked,
+        reason=result.block_reason,
+        matched_rules=[m.rule_name for m in result.matches],
+    )
+
+
+def _job_out(job: BacktestJob) -> RuleBacktestJobOut:
+    return RuleBacktestJobOut(
+        id=job.id,
+        status=job.status,
+        processed=job.processed,
+        total=job.total,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        report=job.report.to_dict() if job.report is not None else None,
+        error=job.error,
+    )
+
+
+async def _commit_and_invalidate(session: AsyncSession) -> None:
+    """Commit the rule change, then bump the shared rule-set version.
+
+    Committing first guarantees that the reload triggered by the bump
+    observes the new rule rows.
+    """
+    await session.commit()
+    get_rule_store().bump()
+
+
 # ---------------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------------
@@ -81,19 +238,7 @@ async def list_rules(
 ) -> list[RuleOut]:
     repo = SecurityRuleRepository(session)
     rules = await repo.list_all(offset=offset, limit=limit)
-    return [
-        RuleOut(
-            id=str(r.id),
-            name=r.name,
-            description=r.description,
-            pattern=r.pattern,
-            action=r.action,
-            is_active=r.is_active,
-            priority=r.priority,
-            created_at=r.created_at,
-        )
-        for r in rules
-    ]
+    return [_rule_out(r) for r in rules]
 
 
 @router.post("", response_model=RuleOut, status_code=201)
@@ -102,6 +247,7 @@ async def create_rule(
     user: OperatorUser,
     session: DbSession,
 ) -> RuleOut:
+    cost = await get_pattern_validator().validate_async(body.pattern)
     repo = SecurityRuleRepository(session)
     rule = SecurityRule(
         name=body.name,
@@ -109,18 +255,14 @@ async def create_rule(
         pattern=body.pattern,
         action=body.action,
         priority=body.priority,
+        device_types=body.device_types or None,
+        device_ids=body.device_ids or None,
+        state_predicates=body.state_predicates or None,
+        cost_us=cost.cost_us,
     )
     rule = await repo.create(rule)
-    return RuleOut(
-        id=str(rule.id),
-        name=rule.name,
-        description=rule.description,
-        pattern=rule.pattern,
-        action=rule.action,
-        is_active=rule.is_active,
-        priority=rule.priority,
-        created_at=rule.created_at,
-    )
+    await _commit_and_invalidate(session)
+    return _rule_out(rule, cost)
 
 
 @router.patch("/{rule_id}", response_model=RuleOut)
@@ -135,19 +277,15 @@ async def update_rule(
     if existing is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rule not found")
     values = body.model_dump(exclude_unset=True)
+    cost: PatternCost | None = None
+    if values.get("pattern") is not None:
+        cost = await get_pattern_validator().validate_async(values["pattern"])
+        values["cost_us"] = cost.cost_us
     if values:
         await repo.update(rule_id, values)
+        await _commit_and_invalidate(session)
         await session.refresh(existing)
-    return RuleOut(
-        id=str(existing.id),
-        name=existing.name,
-        description=existing.description,
-        pattern=existing.pattern,
-        action=existing.action,
-        is_active=existing.is_active,
-        priority=existing.priority,
-        created_at=existing.created_at,
-    )
+    return _rule_out(existing, cost)
 
 
 @router.delete("/{rule_id}", status_code=204)
@@ -161,18 +299,91 @@ async def delete_rule(
     if existing is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Rule not found")
     await repo.delete(rule_id)
+    await _commit_and_invalidate(session)
+
+
+@router.post("/validate", response_model=RuleValidateResponse)
+async def validate_rule_pattern(
+    body: RuleValidateRequest,
+    user: OperatorUser,
+) -> RuleValidateResponse:
+    """Check and cost a pattern without storing it; 422 if it would be rejected."""
+    cost = await get_pattern_validator().validate_async(body.pattern)
+    return RuleValidateResponse(
+        cost_us=cost.cost_us,
+        worst_us=cost.worst_us,
+        backtracking_prone=cost.backtracking_prone,
+        warnings=list(cost.warnings),
+        required_literals=list(required_literals(body.pattern)),
+    )
 
 
 @router.post("/test", response_model=RuleTestResponse)
 async def test_rules(
     body: RuleTestRequest,
     user: OperatorUser,
-    analysis_svc: AnalysisServiceDep,
+    session: DbSession,
 ) -> RuleTestResponse:
     """Dry-run a command against active security rules."""
-    result = await analysis_svc.test_command_against_rules(body.command)
-    return RuleTestResponse(
-        blocked=result["blocked"],
-        reason=result.get("reason", ""),
-        matched_rules=result.get("matched_rules", []),
+    result = await SecurityRuleEngine(session).evaluate(
+        body.command, context=body.device_context, dry_run=True
+    )
+    return _test_response(result)
+
+
+@router.post("/test-batch", response_model=RuleTestBatchResponse)
+async def test_rules_batch(
+    body: RuleTestBatchRequest,
+    user: OperatorUser,
+    session: DbSession,
+) -> RuleTestBatchResponse:
+    """Dry-run many commands against one snapshot of the active rules."""
+    results = await SecurityRuleEngine(session).evaluate_many(
+        body.commands, context=body.device_context, dry_run=True
+    )
+    return RuleTestBatchResponse(
+        results=[_test_response(r) for r in results],
+        blocked=sum(1 for r in results if r.blocked),
     )
+
+
+@router.post("/backtest", response_model=RuleBacktestJobOut, status_code=202)
+async def start_backtest(
+    body: RuleBacktestRequest,
+    user: OperatorUser,
+    settings: SettingsDep,
+) -> RuleBacktestJobOut:
+    """Replay ``command_logs`` against the active rules with *body* applied.
+
+    Runs in the background; poll ``GET /v1/rules/backtest/{job_id}``.
+    """
+    validator = get_pattern_validator()
+    for spec in body.upsert:
+        await validator.validate_async(spec.pattern)
+    diff = RuleSetDiff(
+        upsert=tuple(
+            RuleSpec(
+                name=spec.name,
+                pattern=spec.pattern,
+                action=spec.action,
+                priority=spec.priority,
+                description=spec.description,
+                device_types=tuple(spec.device_types) if spec.device_types else None,
+                device_ids=tuple(spec.device_ids) if spec.device_ids else None,
+                state_predicates=spec.state_predicates or None,
+            )
+            for spec in body.upsert
+        ),
+        remove=tuple(body.remove),
+    )
+    runner = BacktestRunner(get_engine(settings.database), settings.rules)
+    job = get_backtest_jobs().start(runner, diff, since=body.since, until=body.until)
+    return _job_out(job)
+
+
+@router.get("/backtest/{job_id}", response_model=RuleBacktestJobOut)
+async def get_backtest(job_id: str, user: OperatorUser) -> RuleBacktestJobOut:
+    job = get_backtest_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Backtest not found")
+    return _job_out(job)
@@ -19,7 +19,7 @@ import asyncio
 import enum
 import time
 from types import TracebackType
-from typing import Type
+from typing import Literal, Type
 
 import structlog
 
@@ -54,6 +54,9 @@ class CircuitBreaker:
         Number of consecutive failures before the breaker opens.
     cooldown:
         Seconds to wait in the *open* state before allowing a probe.
+    neutral:
+        Exception types that say nothing about the service's health (e.g.
+        the caller giving up) and count as neither success nor failure.
     """
 
     def __init__(
@@ -62,10 +65,12 @@ class CircuitBreaker:
         name: str = "default",
         failure_threshold: int = 5,
         cooldown: float = 30.0,
+        neutral: tuple[type[BaseException], ...] = (),
     ) -> None:
         self.name = name
         self.failure_threshold = failure_threshold
         self.cooldown = cooldown
+        self._neutral = neutral
 
         self._state = CircuitState.CLOSED
         self._failure_count: int = 0
@@ -105,7 +110,9 @@ class CircuitBreaker:
         exc_type: Type[BaseException] | None,
         exc_val: BaseException | None,
         exc_tb: TracebackType | None,
-    ) -> bool:
+    ) -> Literal[False]:
+        if exc_type is not None and issubclass(exc_type, self._neutral):
+            return False
         async with self._lock:
             if exc_type is None:
                 # Success -- reset the breaker
@@ -32,6 +32,10 @@ class ApiSettings(BaseSettings):
     cors_origins: List[str] = ["http://localhost:3000"]
     title: str = "IoTGuard"
     version: str = "1.0.0"
+    # Analysis deadline in seconds when the client sends no
+    # X-Request-Deadline header; 0 = none.  Positive max caps both.
+    default_deadline: float = 0.0
+    max_deadline: float = 60.0
 
 
 class JwtSettings(BaseSettings):
@@ -88,6 +92,10 @@ class RedisSettings(BaseSettings):
     db: int = 0
     password: SecretStr | None = None
     key_prefix: str = "iotguard:"
+    max_connections: int = 50
+    socket_timeout: float = 0.5
+    socket_connect_timeout: float = 0.5
+    health_check_interval: int = 30
 
     @property
     def url(self) -> str:
@@ -106,6 +114,135 @@ class GeminiSettings(BaseSettings):
     model_name: str = "gemini-1.5-flash"
     temperature: float = 0.2
     max_tokens: int = 2048
+    max_concurrency: int = 8  # upper bound of the adaptive limit
+    min_concurrency: int = 1
+    rpm_limit: int = 0  # requests per minute, 0 = unlimited
+    tpm_limit: int = 0  # tokens per minute, 0 = unlimited
+    latency_target: float = 10.0  # slower calls shrink the concurrency limit
+    queue_timeout: float = 30.0
+    max_queue: int = 0  # 0 = unbounded; beyond it the lowest priority is shed
+    # Lower is served first; unlisted device types get 1.
+    device_priorities: dict[str, int] = {
+        "door_lock": 0,
+        "camera": 0,
+        "thermostat": 1,
+        "speaker": 2,
+        "light": 2,
+    }
+    warm_up: bool = False  # one throwaway request at start-up
+    coalesce_lease: float = 60.0  # cross-worker single-flight lease, seconds
+    batch_max_items: int = 1  # >1 packs concurrent misses into one prompt
+    batch_max_wait_ms: float = 10.0
+    call_timeout: float = 30.0  # per attempt, seconds; 0 = none
+    max_attempts: int = 3  # transient failures are retried up to this many calls
+    retry_base_delay: float = 0.2  # full-jitter exponential backoff, seconds
+    retry_max_delay: float = 2.0
+    retry_budget_ratio: float = 0.1  # retries + hedges allowed per call
+    retry_budget_min_per_second: float = 1.0
+    hedge_percentile: float = 0.95  # hedge calls slower than this; 0 disables
+    hedge_min_samples: int = 20  # latencies needed before hedging starts
+
+
+class CacheSettings(BaseSettings):
+    """Two-tier (in-process L1, Redis L2) cache of LLM verdicts.
+
+    ``ttl_<risk>`` is how long a verdict of that risk level stays fresh;
+    L1 copies are additionally capped at ``l1_ttl`` so workers re-read
+    shared state regularly.  Past its TTL a verdict is served for up to
+    ``stale_ttl`` more seconds while it is refreshed in the background.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="CACHE_")
+
+    l1_max_entries: int = 10000  # 0 disables the L1 tier
+    l1_max_bytes: int = 16 * 1024 * 1024
+    l1_ttl: float = 30.0
+    ttl_none: float = 3600.0
+    ttl_low: float = 1800.0
+    ttl_medium: float = 600.0
+    ttl_high: float = 300.0
+    ttl_critical: float = 60.0
+    negative_ttl: float = 10.0  # failed LLM calls; 0 disables
+    stale_ttl: float = 60.0  # 0 disables stale-while-revalidate
+
+
+class SemanticCacheSettings(BaseSettings):
+    """Near-duplicate reuse of LLM verdicts (needs the ``semantic`` extra)."""
+
+    model_config = SettingsConfigDict(env_prefix="SEMANTIC_CACHE_")
+
+    enabled: bool = False
+    threshold: float = 0.9  # cosine similarity needed to reuse a verdict
+    stability_margin: float = 0.1  # neighbours this far below must agree
+    capacity: int = 2048  # entries per device type
+    dimensions: int = 1024
+    max_age: float = 600.0
+    verify_rate: float = 0.0  # fraction of hits re-checked against the LLM
+
+
+class CascadeSettings(BaseSettings):
+    """Cheap-model-first analysis; uncertain verdicts escalate to Gemini.
+
+    Costs are relative units per call, used only for the per-tier cost
+    metric.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="CASCADE_")
+
+    enabled: bool = False
+    cheap_model_name: str = "gemini-1.5-flash-8b"
+    cheap_temperature: float = 0.0
+    min_confidence: float = 0.8  # cheap answers less sure than this escalate
+    escalate_risks: list[str] = ["MEDIUM"]  # cheap answers at these levels escalate
+    cheap_cost: float = 0.1
+    expensive_cost: float = 1.0
+
+
+class LocalModelSettings(BaseSettings):
+    """Local risk classifier trained from the command log (needs the ``ml`` extra).
+
+    Retrain the artifact at *path* with ``scripts/train_local_model.py``.
+    """
+
+    model_config = SettingsConfigDict(env_prefix="LOCAL_MODEL_")
+
+    enabled: bool = False
+    path: str = "models/risk-classifier"
+    fallback: bool = True  # answer when the LLM fails or the deadline is reached
+    cascade: bool = True  # first cascade tier when CASCADE_ENABLED
+    min_confidence: float = 0.9  # cascade answers less sure than this escalate
+    cost: float = 0.0
+
+
+class RuleSettings(BaseSettings):
+    """Security rule evaluation and cache synchronisation."""
+
+    model_config = SettingsConfigDict(env_prefix="RULES_")
+
+    matcher: str = "literal"
+    match_budget_ms: float = 50.0
+    quarantine_after: int = 3
+    sandbox_enabled: bool = True
+    validation_timeout_ms: float = 500.0
+    cost_warn_us: float = 1000.0
+    cost_reject_us: float = 10000.0
+    adaptive_order: bool = True
+    stats_flush_interval: float = 60.0
+    verdict_cache_size: int = 10000  # 0 disables the verdict memo
+    backtest_workers: int = 0  # 0 = one per CPU
+    backtest_chunk_size: int = 5000
+    backtest_sample_limit: int = 20
+    listen_enabled: bool = True
+    sync_poll_interval: float = 5.0
+
+    @field_validator("matcher")
+    @classmethod
+    def _known_matcher(cls, v: str) -> str:
+        from iotguard.analysis.rules.matcher import MATCHER_BACKENDS
+
+        if v not in MATCHER_BACKENDS:
+            raise ValueError(f"matcher must be one of {', '.join(MATCHER_BACKENDS)}")
+        return v
 
 
 class MqttSettings(BaseSettings):
@@ -183,6 +320,11 @@ class Settings(BaseSettings):
     database: DatabaseSettings = DatabaseSettings()
     redis: RedisSettings = RedisSettings()
     gemini: GeminiSettings = GeminiSettings()
+    cache: CacheSettings = CacheSettings()
+    semantic_cache: SemanticCacheSettings = SemanticCacheSettings()
+    cascade: CascadeSettings = CascadeSettings()
+    local_model: LocalModelSettings = LocalModelSettings()
+    rules: RuleSettings = RuleSettings()
     mqtt: MqttSettings = MqttSettings()
     devices: DeviceSettings = DeviceSettings()
     alerts: AlertSettings = AlertSettings()
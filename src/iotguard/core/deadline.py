@@ -0,0 +1,90 @@
+"""Per-request deadlines, propagated to the analysis engines.
+
+A :class:`Deadline` is a point on the monotonic clock by which a response
+is due.  The API derives one per request from the ``X-Request-Deadline``
+header (milliseconds the client is still willing to wait) or the
+configured default, and :class:`~iotguard.analysis.service.AnalysisService`
+makes it the *current* deadline while the engines run::
+
+    with deadline_scope(Deadline.after(2.5)):
+        ...
+        deadline = current_deadline()
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceededError("no time left")
+
+Being a context variable, the deadline follows the request into every
+task it spawns without being threaded through each engine signature.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+_deadline_ctx: ContextVar[Deadline | None] = ContextVar("request_deadline", default=None)
+
+
+@dataclass(frozen=True, slots=True)
+class Deadline:
+    """Absolute deadline on the :func:`time.monotonic` clock."""
+
+    at: float
+
+    @classmethod
+    def after(cls, seconds: float) -> Deadline:
+        """The deadline *seconds* from now."""
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        """Seconds left, never negative."""
+        return max(0.0, self.at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.at
+
+
+def parse_deadline(
+    header: str | None,
+    *,
+    default: float = 0.0,
+    maximum: float = 0.0,
+) -> Deadline | None:
+    """Build a request's deadline from its ``X-Request-Deadline`` header.
+
+    *header* is the number of milliseconds the client will wait.  Without
+    it *default* seconds apply (0 means no deadline).  A positive *maximum*
+    caps either.  Raises :class:`ValueError` for a malformed header.
+    """
+    if header is None or not header.strip():
+        seconds = default
+    else:
+        try:
+            millis = float(header)
+        except ValueError:
+            raise ValueError(f"X-Request-Deadline must be milliseconds, got {header!r}") from None
+        if not (millis > 0 and math.isfinite(millis)):
+            raise ValueError(f"X-Request-Deadline must be a positive number, got {header!r}")
+        seconds = millis / 1000
+    if maximum > 0:
+        seconds = min(seconds, maximum)
+    return Deadline.after(seconds) if seconds > 0 else None
+
+
+def current_deadline() -> Deadline | None:
+    """The deadline of the request being served, if it has one."""
+    return _deadline_ctx.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline | None) -> Iterator[Deadline | None]:
+    """Make *deadline* the current deadline for the duration of the block."""
+    token = _deadline_ctx.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline_ctx.reset(token)
@@ -140,6 +140,15 @@ class LLMError(AnalysisError):
         self.code = "LLM_ERROR"
 
 
+class DeadlineExceededError(AnalysisError):
+    """The request deadline passed (or would pass) before analysis finished."""
+
+    def __init__(self, detail: str) -> None:
+        super().__init__(detail)
+        self.code = "DEADLINE_EXCEEDED"
+        self.status_code = 504
+
+
 class RuleViolationError(AnalysisError):
     """A security rule was violated."""
 
@@ -150,6 +159,20 @@ class RuleViolationError(AnalysisError):
         self.rule_name = rule_name
 
 
+class InvalidRuleError(IoTGuardError):
+    """A security rule pattern is invalid or too expensive to evaluate."""
+
+    def __init__(self, detail: str) -> None:
+        super().__init__(detail, code="INVALID_RULE", status_code=422)
+
+
+class BacktestBusyError(IoTGuardError):
+    """Too many rule backtests are already running."""
+
+    def __init__(self, detail: str) -> None:
+        super().__init__(detail, code="BACKTEST_BUSY", status_code=409)
+
+
 # ---------------------------------------------------------------------------
 # MQTT / infrastructure
 # ---------------------------------------------------------------------------
@@ -0,0 +1,98 @@
+"""Hedged requests: race a duplicate against a call that is running late.
+
+Most slow responses are slow because of the upstream's tail, not the
+request.  :func:`hedged` starts *call*; if it has not finished after
+*delay* seconds -- normally a high percentile of recent latencies kept by
+a :class:`LatencyWindow` -- and *allow* agrees, it starts a second copy.
+The first successful result wins and the other copy is cancelled.
+
+Usage::
+
+    window = LatencyWindow()
+
+    delay = window.quantile(0.95)
+    start = time.monotonic()
+    result = await hedged(call, delay=delay, allow=budget.withdraw, name="gemini")
+    window.record(time.monotonic() - start)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+from collections import deque
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from iotguard.observability.metrics import llm_hedges_total
+
+T = TypeVar("T")
+
+
+class LatencyWindow:
+    """The last *size* latencies, for percentile-based hedge delays."""
+
+    def __init__(self, size: int = 200, *, min_samples: int = 20) -> None:
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> float | None:
+        """The *q*-quantile of the window; ``None`` until ``min_samples`` are in."""
+        if len(self._samples) < max(self.min_samples, 1):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+async def hedged(
+    call: Callable[[], Awaitable[T]],
+    *,
+    delay: float | None,
+    allow: Callable[[], bool],
+    name: str,
+) -> T:
+    """Await *call()*, hedging it with a second copy after *delay* seconds.
+
+    ``delay=None`` disables hedging.  *allow* is consulted once, when the
+    hedge is due, and may refuse it (e.g. an exhausted retry budget).  If
+    both copies fail, the first error is raised.
+    """
+    primary: asyncio.Future[T] = asyncio.ensure_future(call())
+    if delay is None:
+        return await primary
+
+    hedge: asyncio.Future[T] | None = None
+    try:
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not allow():
+            return await primary
+
+        hedge = asyncio.ensure_future(call())
+        llm_hedges_total.labels(name=name, outcome="fired").inc()
+        pending: set[asyncio.Future[T]] = {primary, hedge}
+        error: BaseException | None = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            winner = None
+            for task in done:
+                exc = task.exception()
+                if exc is None:
+                    winner = winner or task
+                elif error is None:
+                    error = exc
+            if winner is not None:
+                if winner is hedge:
+                    llm_hedges_total.labels(name=name, outcome="won").inc()
+                return winner.result()
+        assert error is not None
+        raise error
+    finally:
+        for call_future in (primary, hedge):
+            if call_future is not None and not call_future.done():
+                call_future.cancel()
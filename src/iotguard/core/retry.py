@@ -0,0 +1,88 @@
+"""Retry budget and jittered backoff for calls to external services.
+
+Unbounded retries turn an upstream brown-out into a retry storm.  A
+:class:`RetryBudget` caps extra attempts -- retries and hedged duplicates
+alike -- at a fraction of the original calls: every call deposits
+``ratio`` tokens, every extra attempt withdraws one.  A small time-based
+allowance (``min_per_second``) keeps retries possible at low traffic.
+
+Waits between attempts use "full jitter" exponential backoff so that
+callers which failed together do not retry together.
+
+Usage::
+
+    budget = RetryBudget(ratio=0.1)
+
+    budget.deposit()
+    for attempt in itertools.count():
+        try:
+            return await call()
+        except TransientError:
+            if not budget.withdraw():
+                raise
+            await asyncio.sleep(backoff_delay(attempt, base=0.2, cap=2.0))
+"""
+
+from __future__ import annotations
+
+import random
+import time
+
+
+class RetryBudget:
+    """Token balance allowing ``ratio`` extra attempts per original call.
+
+    Parameters
+    ----------
+    ratio:
+        Tokens deposited per original call; 0.1 allows one extra attempt
+        per ten calls.
+    min_per_second:
+        Tokens added per second regardless of traffic.
+    capacity:
+        Upper bound of the balance, so a quiet period cannot bank an
+        unlimited burst of retries.  The budget starts full.
+    """
+
+    def __init__(
+        self,
+        ratio: float = 0.1,
+        *,
+        min_per_second: float = 1.0,
+        capacity: float = 10.0,
+    ) -> None:
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self._balance = capacity
+        self._stamp = time.monotonic()
+
+    @property
+    def balance(self) -> float:
+        self._refill()
+        return self._balance
+
+    def deposit(self) -> None:
+        """Record an original call."""
+        self._refill()
+        self._balance = min(self.capacity, self._balance + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Pay for one extra attempt; ``False`` if the budget is exhausted."""
+        self._refill()
+        if self._balance < 1.0:
+            return False
+        self._balance -= 1.0
+        return True
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._balance = min(
+            self.capacity, self._balance + (now - self._stamp) * self.min_per_second
+        )
+        self._stamp = now
+
+
+def backoff_delay(attempt: int, *, base: float, cap: float) -> float:
+    """Full-jitter delay before retry number *attempt* (0-based)."""
+    return random.uniform(0.0, min(cap, base * 2**attempt))  # noqa: S311 - jitter only
@@ -0,0 +1,342 @@
+"""Quota-aware, adaptive admission of calls to a rate-limited service.
+
+:class:`AdaptiveScheduler` bounds the calls in flight to an upstream that
+enforces per-minute quotas:
+
+* **Quotas.**  Requests-per-minute and tokens-per-minute budgets are token
+  buckets; a call is only started when both can pay for it.  Callers pass
+  an estimate of the tokens a call will use and may settle the real usage
+  afterwards.
+* **Adaptive concurrency.**  The in-flight limit moves AIMD-style between
+  ``min_limit`` and ``max_limit``: each on-time success adds ``1/limit``,
+  a failure, throttle (HTTP 429) or response slower than
+  ``latency_target`` multiplies it by ``backoff`` (at most once per
+  observed latency, so one slow burst does not collapse the limit).
+* **Priorities.**  Waiters are served lowest ``priority`` first, FIFO
+  within a priority.  When ``max_queue`` waiters are queued, the newest
+  waiter of the worst priority is shed.
+
+Queue depth and wait per priority, shed counts and the current limit are
+exported to Prometheus.
+
+Usage::
+
+    scheduler = AdaptiveScheduler("gemini", max_limit=8, rpm=60, tpm=100_000)
+
+    async with scheduler.slot(priority=0, tokens=900) as ticket:
+        response = await call_external_api()
+        ticket.settle(response.total_tokens)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+
+from iotguard.observability.metrics import (
+    scheduler_concurrency_limit,
+    scheduler_in_flight,
+    scheduler_queue_depth,
+    scheduler_queue_wait_seconds,
+    scheduler_shed_total,
+)
+
+
+class QueueTimeoutError(TimeoutError):
+    """No slot became free within the scheduler's queue timeout."""
+
+
+class ShedError(Exception):
+    """The call was dropped from a full queue without being started."""
+
+
+class TokenBucket:
+    """Continuous-refill bucket holding at most one minute of budget.
+
+    A ``per_minute`` of 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self._rate = per_minute / 60.0
+        self._stamp = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._stamp) * self._rate)
+        self._stamp = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until *amount* (capped at the capacity) can be paid."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return missing / self._rate if missing > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        """Pay *amount*; negative amounts refund.  The balance may go negative."""
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+    def drain(self) -> None:
+        """Empty the bucket (after the upstream said we are over quota)."""
+        if self.enabled:
+            self._refill()
+            self.tokens = min(self.tokens, 0.0)
+
+
+class Ticket:
+    """Handle of one admitted call, for reporting what actually happened."""
+
+    __slots__ = ("duplicates", "estimate", "is_throttled", "tokens")
+
+    def __init__(self, estimate: int) -> None:
+        self.estimate = estimate
+        self.tokens = estimate
+        self.is_throttled = False
+        self.duplicates = 0
+
+    def settle(self, tokens: int) -> None:
+        """Record the tokens the call really used."""
+        self.tokens = tokens
+
+    def throttled(self) -> None:
+        """Mark the call as rejected by the upstream's rate limiter."""
+        self.is_throttled = True
+
+    def duplicated(self) -> None:
+        """Record one extra (hedged) request sent within this slot.
+
+        It is charged one request and the estimated tokens against the quota.
+        """
+        self.duplicates += 1
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    enqueued: float = field(compare=False)
+    future: asyncio.Future[None] = field(compare=False)
+    queued: bool = field(default=True, compare=False)
+    admitted: bool = field(default=False, compare=False)
+
+
+class AdaptiveScheduler:
+    """Priority queue in front of an AIMD concurrency limit and quota buckets.
+
+    Parameters
+    ----------
+    name:
+        Label used in metrics.
+    max_limit, min_limit:
+        Bounds of the adaptive concurrency limit; it starts at ``max_limit``.
+    rpm, tpm:
+        Requests and tokens per minute; 0 means unlimited.
+    latency_target:
+        Calls slower than this (seconds) count as congestion.
+    backoff:
+        Multiplicative decrease factor.
+    queue_timeout:
+        Seconds a caller may wait before :class:`QueueTimeoutError`;
+        ``None`` waits indefinitely.
+    max_queue:
+        Queued callers beyond which the worst-priority one is shed with
+        :class:`ShedError`; 0 means unbounded.
+    neutral:
+        Exception types that say nothing about upstream health (e.g. an
+        open circuit breaker) and leave the limit alone.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_limit: int,
+        min_limit: int = 1,
+        rpm: float = 0,
+        tpm: float = 0,
+        latency_target: float = 10.0,
+        backoff: float = 0.7,
+        queue_timeout: float | None = None,
+        max_queue: int = 0,
+        neutral: tuple[type[BaseException], ...] = (),
+    ) -> None:
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("need 1 <= min_limit <= max_limit")
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self._neutral = neutral
+        self._limit = float(max_limit)
+        self._requests = TokenBucket(rpm)
+        self._tokens = TokenBucket(tpm)
+        self._heap: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._queued = 0
+        self._in_flight = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._hold_until = 0.0
+        self._limit_gauge = scheduler_concurrency_limit.labels(name=name)
+        self._in_flight_gauge = scheduler_in_flight.labels(name=name)
+        self._limit_gauge.set(self._limit)
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0, tokens: int = 0) -> AsyncIterator[Ticket]:
+        """Wait for admission, then hold a slot for the duration of the block."""
+        waiter = self._enqueue(priority, tokens)
+        label = str(priority)
+        try:
+            async with asyncio.timeout(self.queue_timeout):
+                await waiter.future
+        except TimeoutError:
+            self._abandon(waiter)
+            scheduler_shed_total.labels(name=self.name, reason="timeout").inc()
+            raise QueueTimeoutError(
+                f"'{self.name}' queue wait exceeded {self.queue_timeout:g}s"
+            ) from None
+        except BaseException:
+            self._abandon(waiter)
+            raise
+        finally:
+            scheduler_queue_wait_seconds.labels(name=self.name, priority=label).observe(
+                time.monotonic() - waiter.enqueued
+            )
+
+        ticket = Ticket(tokens)
+        start = time.monotonic()
+        try:
+            yield ticket
+        except BaseException as exc:
+            if not isinstance(exc, self._neutral):
+                self._record(ticket, time.monotonic() - start, ok=False)
+            raise
+        else:
+            self._record(ticket, time.monotonic() - start, ok=not ticket.is_throttled)
+        finally:
+            self._in_flight -= 1
+            self._in_flight_gauge.set(self._in_flight)
+            self._dispatch()
+
+    # -- queue --------------------------------------------------------------
+
+    def _enqueue(self, priority: int, tokens: int) -> _Waiter:
+        waiter = _Waiter(
+            priority,
+            next(self._seq),
+            tokens,
+            time.monotonic(),
+            asyncio.get_running_loop().create_future(),
+        )
+        if self.max_queue and self._queued >= self.max_queue:
+            worst = max((w for w in self._heap if w.queued), default=None)
+            if worst is None or worst < waiter:
+                scheduler_shed_total.labels(name=self.name, reason="queue_full").inc()
+                raise ShedError(f"'{self.name}' queue full; shed priority {priority}")
+            self._dequeued(worst)
+            worst.future.set_exception(
+                ShedError(f"'{self.name}' queue full; shed priority {worst.priority}")
+            )
+            scheduler_shed_total.labels(name=self.name, reason="queue_full").inc()
+        heapq.heappush(self._heap, waiter)
+        self._queued += 1
+        scheduler_queue_depth.labels(name=self.name, priority=str(priority)).inc()
+        self._dispatch()
+        return waiter
+
+    def _dequeued(self, waiter: _Waiter) -> None:
+        waiter.queued = False
+        self._queued -= 1
+        scheduler_queue_depth.labels(name=self.name, priority=str(waiter.priority)).dec()
+
+    def _abandon(self, waiter: _Waiter) -> None:
+        """Forget a waiter that gave up, returning its slot if it had one."""
+        if waiter.queued:
+            waiter.future.cancel()
+            self._dequeued(waiter)  # lazily removed from the heap
+        elif waiter.admitted:
+            # Admitted at the same moment it timed out or was cancelled.
+            self._in_flight -= 1
+            self._in_flight_gauge.set(self._in_flight)
+            self._requests.take(-1)
+            self._tokens.take(-waiter.tokens)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Admit waiters in priority order while slots and quota allow."""
+        heap = self._heap
+        while heap and self._in_flight < self.limit:
+            waiter = heap[0]
+            if not waiter.queued or waiter.future.done():
+                # Shed, or cancelled and not yet cleaned up by its caller.
+                heapq.heappop(heap)
+                continue
+            delay = max(self._requests.delay(1), self._tokens.delay(waiter.tokens))
+            if delay > 0:
+                self._wake_in(delay)
+                return
+            heapq.heappop(heap)
+            self._dequeued(waiter)
+            waiter.admitted = True
+            self._requests.take(1)
+            self._tokens.take(waiter.tokens)
+            self._in_flight += 1
+            self._in_flight_gauge.set(self._in_flight)
+            waiter.future.set_result(None)
+
+    def _wake_in(self, delay: float) -> None:
+        if self._timer is not None:
+            return
+
+        def wake() -> None:
+            self._timer = None
+            self._dispatch()
+
+        self._timer = asyncio.get_running_loop().call_later(delay, wake)
+
+    # -- adaptation ---------------------------------------------------------
+
+    def _record(self, ticket: Ticket, latency: float, *, ok: bool) -> None:
+        self._tokens.take(ticket.tokens - ticket.estimate + ticket.duplicates * ticket.estimate)
+        self._requests.take(ticket.duplicates)
+        if ticket.is_throttled:
+            self._requests.drain()
+        now = time.monotonic()
+        if ok and latency <= self.latency_target:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+        elif now >= self._hold_until:
+            self._limit = max(self.min_limit, self._limit * self.backoff)
+            # One decrease per round trip: calls already in flight were
+            # admitted under the old limit and would otherwise compound it.
+            self._hold_until = now + max(latency, 0.1)
+        self._limit_gauge.set(self._limit)
@@ -0,0 +1,202 @@
+"""Coalescing of identical concurrent calls ("single flight").
+
+When many callers ask for the same expensive result at once, only one of
+them should do the work.  :class:`SingleFlight` runs the first call for a
+key as a shared task; concurrent callers in the same process await that
+task instead of starting their own.
+
+With a Redis client the same holds across worker processes: the local
+leader takes a short lease (``SET NX PX``) before calling upstream.  A
+worker that finds the lease held subscribes to the key's notification
+channel, waits for the holder to publish, and then reads the result from
+the shared cache via the caller's *load* function.  If the holder dies,
+its lease expires and the waiter does the work itself.  Any Redis error
+degrades to in-process coalescing only.
+
+The shared call runs in a fresh :mod:`contextvars` context, so it does not
+inherit the first caller's request deadline; each caller bounds only its
+own wait by its own deadline.
+
+Usage::
+
+    flights = SingleFlight("gemini", redis=client, lease_ttl=60.0)
+
+    result = await flights.do(cache_key, fetch_and_cache, load=read_cache)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import secrets
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any, Generic, TypeVar
+
+import structlog
+
+from iotguard.core.deadline import current_deadline
+from iotguard.observability.metrics import singleflight_calls_total
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+# Delete the lease only if we still own it.
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+#: Seconds between checks that a remote lease holder is still alive.
+_LEASE_CHECK_INTERVAL = 1.0
+
+
+class SingleFlight(Generic[T]):
+    """Run at most one call per key at a time and share its result.
+
+    Parameters
+    ----------
+    name:
+        Label used in logs and metrics.
+    redis:
+        Optional ``redis.asyncio`` client for cross-process coalescing.
+    lease_ttl:
+        Seconds a Redis lease is held at most; should exceed the longest
+        expected call so that waiters are not released early.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        redis: Any | None = None,
+        lease_ttl: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.lease_ttl = lease_ttl
+        self._redis = redis
+        self._flights: dict[str, asyncio.Task[T]] = {}
+        self._leader = singleflight_calls_total.labels(name=name, role="leader")
+        self._follower = singleflight_calls_total.labels(name=name, role="follower")
+        self._remote = singleflight_calls_total.labels(name=name, role="remote")
+
+    def __len__(self) -> int:
+        return len(self._flights)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._flights
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        *,
+        load: Callable[[], Awaitable[T | None]] | None = None,
+    ) -> T:
+        """Return ``await fn()``, sharing one call among concurrent callers.
+
+        *load* reads the result another worker has stored; it is required
+        for cross-process coalescing and ignored otherwise.  Raises
+        ``TimeoutError`` if the caller's deadline passes first.
+        """
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(
+                self._run(key, fn, load), context=contextvars.Context()
+            )
+            self._flights[key] = task
+            task.add_done_callback(lambda _t: self._flights.pop(key, None))
+        else:
+            self._follower.inc()
+        deadline = current_deadline()
+        # Shielded: a caller that gives up must not cancel the shared call.
+        async with asyncio.timeout(deadline.remaining() if deadline else None):
+            return await asyncio.shield(task)
+
+    async def aclose(self) -> None:
+        """Cancel in-flight shared calls (called on shutdown)."""
+        tasks = list(self._flights.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    # -- internals ----------------------------------------------------------
+
+    async def _run(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        load: Callable[[], Awaitable[T | None]] | None,
+    ) -> T:
+        redis = self._redis
+        if redis is None or load is None:
+            self._leader.inc()
+            return await fn()
+
+        token = secrets.token_hex(8)
+        if not await self._acquire(redis, key, token):
+            result = await self._await_remote(redis, key, load)
+            if result is not None:
+                self._remote.inc()
+                return result
+            # The holder failed or vanished; take over.
+            await self._acquire(redis, key, token)
+
+        self._leader.inc()
+        try:
+            return await fn()
+        finally:
+            await self._release(redis, key, token)
+
+    async def _acquire(self, redis: Any, key: str, token: str) -> bool:
+        """Take the lease; ``True`` also when Redis is unreachable."""
+        try:
+            return bool(
+                await redis.set(f"{key}:lease", token, nx=True, px=int(self.lease_ttl * 1000))
+            )
+        except Exception:
+            logger.debug("singleflight_lease_error", name=self.name, key=key)
+            return True
+
+    async def _release(self, redis: Any, key: str, token: str) -> None:
+        try:
+            await redis.eval(_RELEASE_SCRIPT, 1, f"{key}:lease", token)
+            await redis.publish(f"{key}:done", token)
+        except Exception:
+            logger.debug("singleflight_release_error", name=self.name, key=key)
+
+    async def _await_remote(
+        self,
+        redis: Any,
+        key: str,
+        load: Callable[[], Awaitable[T | None]],
+    ) -> T | None:
+        """Wait for another worker's call, then load its stored result."""
+        deadline = time.monotonic() + self.lease_ttl
+        try:
+            pubsub = redis.pubsub()
+            try:
+                await pubsub.subscribe(f"{key}:done")
+                # The holder may have finished before we subscribed.
+                result = await load()
+                if result is not None:
+                    return result
+                while (remaining := deadline - time.monotonic()) > 0:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True,
+                        timeout=min(remaining, _LEASE_CHECK_INTERVAL),
+                    )
+                    if message is not None:
+                        break
+                    if not await redis.exists(f"{key}:lease"):
+                        break
+            finally:
+                await pubsub.aclose()
+        except Exception:
+            logger.debug("singleflight_wait_error", name=self.name, key=key)
+            return None
+        return await load()
@@ -12,9 +12,11 @@ from datetime import UTC, datetime
 from typing import Any
 
 from sqlalchemy import (
+    BigInteger,
     Boolean,
     DateTime,
     Enum,
+    Float,
     ForeignKey,
     Index,
     Integer,
@@ -121,6 +123,15 @@ class SecurityRule(Base):
     )
     is_active: Mapped[bool] = mapped_column(Boolean, default=True)
     priority: Mapped[int] = mapped_column(Integer, default=100)
+    # Optional scope; NULL / empty means the rule applies to every device
+    device_types: Mapped[list[str] | None] = mapped_column(JSONB, nullable=True)
+    device_ids: Mapped[list[str] | None] = mapped_column(JSONB, nullable=True)
+    state_predicates: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True)
+    # Mean search time (microseconds) measured when the pattern was validated
+    cost_us: Mapped[float | None] = mapped_column(Float, nullable=True)
+    # Aggregated evaluation statistics (see analysis.rules.ordering)
+    hit_count: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
+    eval_count: Mapped[int] = mapped_column(BigInteger, default=0, server_default="0")
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(UTC)
     )
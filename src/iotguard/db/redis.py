@@ -0,0 +1,80 @@
+"""Shared ``redis.asyncio`` connection pool and client.
+
+Mirrors :mod:`iotguard.db.engine`: a single pool / client pair is lazily
+created on first access, shared by every cache user (analysis engines,
+health checks, ...) and torn down via :func:`close_redis` at shutdown.
+Creating the client does not open a connection; connections are checked
+out of the bounded pool on demand.
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import structlog
+from redis.asyncio import ConnectionPool, Redis
+
+from iotguard.core.config import RedisSettings
+from iotguard.observability.metrics import redis_pool_connections, redis_pool_max_connections
+
+logger = structlog.get_logger(__name__)
+
+_pool: ConnectionPool | None = None
+_client: Redis | None = None
+
+
+def get_redis_pool(settings: RedisSettings) -> ConnectionPool:
+    """Return (and lazily create) the connection pool singleton."""
+    global _pool
+    if _pool is None:
+        _pool = ConnectionPool.from_url(
+            settings.url,
+            max_connections=settings.max_connections,
+            socket_timeout=settings.socket_timeout,
+            socket_connect_timeout=settings.socket_connect_timeout,
+            health_check_interval=settings.health_check_interval,
+        )
+        _bind_pool_metrics(_pool)
+        logger.info("redis_pool_created", max_connections=settings.max_connections)
+    return _pool
+
+
+def get_redis(settings: RedisSettings) -> Redis:
+    """Return (and lazily create) the shared client backed by the pool."""
+    global _client
+    if _client is None:
+        _client = Redis(connection_pool=get_redis_pool(settings))
+    return _client
+
+
+def pool_stats(pool: ConnectionPool) -> dict[str, Any]:
+    """Return a snapshot of pool utilisation."""
+    in_use = len(pool._in_use_connections)
+    idle = len(pool._available_connections)
+    return {
+        "in_use": in_use,
+        "idle": idle,
+        "max_connections": pool.max_connections,
+    }
+
+
+async def close_redis() -> None:
+    """Close the shared client and disconnect every pooled connection."""
+    global _pool, _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    if _pool is not None:
+        await _pool.disconnect()
+        _pool = None
+
+
+def _bind_pool_metrics(pool: ConnectionPool) -> None:
+    """Expose pool utilisation as scrape-time Prometheus gauges."""
+    redis_pool_connections.labels(state="in_use").set_function(
+        lambda: len(pool._in_use_connections)
+    )
+    redis_pool_connections.labels(state="idle").set_function(
+        lambda: len(pool._available_connections)
+    )
+    redis_pool_max_connections.set(pool.max_connections)
@@ -10,10 +10,11 @@ from __future__ import annotations
 
 import re
 import uuid
+from collections.abc import AsyncIterator
 from datetime import UTC, datetime
-from typing import Any, Sequence
+from typing import Any, Sequence, cast
 
-from sqlalchemy import delete, func, select, update
+from sqlalchemy import Row, delete, func, select, text, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from iotguard.db.models import (
@@ -77,6 +78,10 @@ class UserRepository:
 # ---------------------------------------------------------------------------
 
 
+#: What :meth:`DeviceRepository.get_scope` returns: ``(id, device_id, device_type, state)``.
+DeviceScope = tuple[uuid.UUID, str, str, dict[str, Any] | None]
+
+
 class DeviceRepository:
     def __init__(self, session: AsyncSession) -> None:
         self._s = session
@@ -94,6 +99,25 @@ class DeviceRepository:
         result = await self._s.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_scope(self, device_id: str) -> DeviceScope | None:
+        """Return the ``(id, device_id, device_type, state)`` of a device.
+
+        *device_id* is looked up as the primary key when it parses as a
+        UUID, then as the external id, as callers hold either form.  Only
+        the columns rule scoping needs are loaded, not the whole row.
+        """
+        columns = select(Device.id, Device.device_id, Device.device_type, Device.state)
+        try:
+            pk = uuid.UUID(device_id)
+        except ValueError:
+            pass
+        else:
+            row = (await self._s.execute(columns.where(Device.id == pk))).one_or_none()
+            if row is not None:
+                return (row[0], row[1], row[2], row[3])
+        row = (await self._s.execute(columns.where(Device.device_id == device_id))).one_or_none()
+        return None if row is None else (row[0], row[1], row[2], row[3])
+
     async def list_all(
         self, *, offset: int = 0, limit: int = 50
     ) -> Sequence[Device]:
@@ -139,6 +163,9 @@ class DeviceRepository:
 # Security rule repository
 # ---------------------------------------------------------------------------
 
+#: Postgres NOTIFY channel announcing that the rule catalogue changed.
+RULES_CHANGED_CHANNEL = "iotguard_rules_changed"
+
 
 class SecurityRuleRepository:
     def __init__(self, session: AsyncSession) -> None:
@@ -147,6 +174,7 @@ class SecurityRuleRepository:
     async def create(self, rule: SecurityRule) -> SecurityRule:
         self._s.add(rule)
         await self._s.flush()
+        await self._notify_changed()
         return rule
 
     async def list_active(self) -> Sequence[SecurityRule]:
@@ -177,10 +205,58 @@ class SecurityRuleRepository:
             update(SecurityRule).where(SecurityRule.id == rule_id).values(**values)
         )
         await self._s.execute(stmt)
+        await self._notify_changed()
 
     async def delete(self, rule_id: uuid.UUID) -> None:
         stmt = delete(SecurityRule).where(SecurityRule.id == rule_id)
         await self._s.execute(stmt)
+        await self._notify_changed()
+
+    async def add_counters(
+        self, hits: dict[uuid.UUID, int], evaluations: dict[uuid.UUID, int]
+    ) -> None:
+        """Add observed hit / evaluation counts to the stored totals.
+
+        ``updated_at`` is left untouched so that statistics do not look like
+        rule edits to other workers' change detection.
+        """
+        for rule_id, evaluated in evaluations.items():
+            stmt = (
+                update(SecurityRule)
+                .where(SecurityRule.id == rule_id)
+                .values(
+                    hit_count=SecurityRule.hit_count + hits.get(rule_id, 0),
+                    eval_count=SecurityRule.eval_count + evaluated,
+                    updated_at=SecurityRule.updated_at,
+                )
+            )
+            await self._s.execute(stmt)
+
+    async def change_fingerprint(self) -> tuple[int, datetime | None]:
+        """Return ``(row count, max(updated_at))`` -- cheap change detection.
+
+        The count catches deletions, which ``max(updated_at)`` alone misses.
+        """
+        stmt = select(func.count(), func.max(SecurityRule.updated_at)).select_from(
+            SecurityRule
+        )
+        row = (await self._s.execute(stmt)).one()
+        return int(row[0]), row[1]
+
+    async def _notify_changed(self) -> None:
+        """Emit a NOTIFY so that other workers reload their rule sets.
+
+        ``pg_notify`` is transactional: listeners are only told once the
+        surrounding transaction commits.  Other dialects are a no-op; their
+        workers converge via polling instead.
+        """
+        bind = self._s.bind
+        if bind is None or bind.dialect.name != "postgresql":
+            return
+        await self._s.execute(
+            text("SELECT pg_notify(:channel, '')"),
+            {"channel": RULES_CHANGED_CHANNEL},
+        )
 
     async def get_matching_rules(self, command: str) -> Sequence[SecurityRule]:
         """Return active rules whose regex pattern matches *command*.
@@ -204,6 +280,10 @@ class SecurityRuleRepository:
 # ---------------------------------------------------------------------------
 
 
+#: One row of :meth:`CommandLogRepository.stream_window`.
+CommandWindowRow = tuple[uuid.UUID, datetime, str, str | None, str | None, uuid.UUID | None]
+
+
 class CommandLogRepository:
     def __init__(self, session: AsyncSession) -> None:
         self._s = session
@@ -236,6 +316,84 @@ class CommandLogRepository:
         result = await self._s.execute(stmt)
         return result.scalars().all()
 
+    @staticmethod
+    def _window(stmt: Any, since: datetime | None, until: datetime | None) -> Any:
+        if since is not None:
+            stmt = stmt.where(CommandLog.timestamp >= since)
+        if until is not None:
+            stmt = stmt.where(CommandLog.timestamp <= until)
+        return stmt
+
+    async def count_window(
+        self,
+        *,
+        since: datetime | None = None,
+        until: datetime | None = None,
+    ) -> int:
+        stmt = self._window(select(func.count()).select_from(CommandLog), since, until)
+        return int((await self._s.execute(stmt)).scalar_one())
+
+    async def stream_window(
+        self,
+        *,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        batch_size: int = 5000,
+    ) -> AsyncIterator[Sequence[CommandWindowRow]]:
+        """Yield batches of ``(id, timestamp, command, device_id, device_type, device_pk)``.
+
+        Rows come oldest first from a server-side cursor, so memory use is
+        bounded by *batch_size* however large the window is.
+        ``device_id`` is the device's external identifier and ``device_pk``
+        its primary key.
+        """
+        stmt = self._window(
+            select(
+                CommandLog.id,
+                CommandLog.timestamp,
+                CommandLog.command,
+                Device.device_id,
+                Device.device_type,
+                CommandLog.device_id,
+            )
+            .outerjoin(Device, CommandLog.device_id == Device.id)
+            .order_by(CommandLog.timestamp.asc(), CommandLog.id.asc()),
+            since,
+            until,
+        )
+        result = await self._s.stream(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.partitions(batch_size):
+            # Rows unpack like tuples; Row's generic form differs across 2.x.
+            yield cast(Sequence[CommandWindowRow], partition)
+
+    async def stream_labels(
+        self,
+        *,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        batch_size: int = 5000,
+    ) -> AsyncIterator[Sequence[Row[Any]]]:
+        """Yield batches of ``(command, device_type, risk_level, was_blocked)``.
+
+        The verdicts to train the local risk classifier on, oldest first
+        from a server-side cursor like :meth:`stream_window`.
+        """
+        stmt = self._window(
+            select(
+                CommandLog.command,
+                Device.device_type,
+                CommandLog.risk_level,
+                CommandLog.was_blocked,
+            )
+            .outerjoin(Device, CommandLog.device_id == Device.id)
+            .order_by(CommandLog.timestamp.asc(), CommandLog.id.asc()),
+            since,
+            until,
+        )
+        result = await self._s.stream(stmt.execution_options(yield_per=batch_size))
+        async for partition in result.partitions(batch_size):
+            yield partition
+
     async def get_stats(
         self,
         *,
@@ -13,6 +13,7 @@ from typing import Any
 import structlog
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from iotguard.analysis.command import ParsedCommand
 from iotguard.core.events import CommandExecutedEvent, DeviceStatusEvent, EventBus
 from iotguard.core.exceptions import (
     DeviceNotFoundError,
@@ -132,7 +133,7 @@ class DeviceService:
     async def execute_command(
         self,
         device_pk: uuid.UUID,
-        command: str,
+        command: str | ParsedCommand,
         *,
         user: str = "system",
         user_id: uuid.UUID | None = None,
@@ -143,6 +144,8 @@ class DeviceService:
         In a real deployment this would dispatch via MQTT/gRPC; here we
         simulate the state change.
         """
+        parsed = ParsedCommand.of(command)
+        command = parsed.raw
         device = await self.get_device(device_pk)
 
         if not device.is_online:
@@ -159,7 +162,7 @@ class DeviceService:
                 )
 
         # Simulate state mutation
-        new_state = self._simulate_state_change(command, device.state or {})
+        new_state = self._simulate_state_change(parsed, device.state or {})
         if new_state != device.state:
             await self._repo.update_state(device_pk, new_state)
 
@@ -202,34 +205,30 @@ class DeviceService:
 
     @staticmethod
     def _simulate_state_change(
-        command: str,
+        command: str | ParsedCommand,
         current_state: dict[str, Any],
     ) -> dict[str, Any]:
         """Apply simple keyword-based state mutations."""
+        parsed = ParsedCommand.of(command)
         new_state = dict(current_state)
-        cmd_lower = command.lower().strip()
 
         for keyword, effect in _STATE_EFFECTS.items():
-            if keyword in cmd_lower:
+            if keyword in parsed.tokens:
                 new_state.update(effect)
 
         # Handle set_temperature / set_brightness patterns
-        if "set_temperature" in cmd_lower:
-            parts = cmd_lower.split()
-            for i, p in enumerate(parts):
-                if p == "set_temperature" and i + 1 < len(parts):
-                    try:
-                        new_state["temperature"] = float(parts[i + 1])
-                    except ValueError:
-                        pass
-
-        if "set_brightness" in cmd_lower:
-            parts = cmd_lower.split()
-            for i, p in enumerate(parts):
-                if p == "set_brightness" and i + 1 < len(parts):
-                    try:
-                        new_state["brightness"] = int(parts[i + 1])
-                    except ValueError:
-                        pass
+        temperature = parsed.arg_after("set_temperature")
+        if temperature is not None:
+            try:
+                new_state["temperature"] = float(temperature)
+            except ValueError:
+                pass
+
+        brightness = parsed.arg_after("set_brightness")
+        if brightness is not None:
+            try:
+                new_state["brightness"] = int(brightness)
+            except ValueError:
+                pass
 
         return new_state
@@ -16,6 +16,7 @@ from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from iotguard.core.config import GeminiSettings, RedisSettings
+from iotguard.db.redis import pool_stats
 from iotguard.mqtt.service import MqttService
 
 logger = structlog.get_logger(__name__)
@@ -30,11 +31,14 @@ class HealthChecker:
         redis_settings: RedisSettings,
         gemini_settings: GeminiSettings,
         mqtt_service: MqttService | None = None,
+        *,
+        redis_client: Redis | None = None,
     ) -> None:
         self._session_factory = session_factory
         self._redis_settings = redis_settings
         self._gemini_settings = gemini_settings
         self._mqtt = mqtt_service
+        self._redis = redis_client
 
     # ------------------------------------------------------------------
     # Individual probes
@@ -50,6 +54,17 @@ class HealthChecker:
             return {"status": "unhealthy", "error": str(exc)}
 
     async def check_redis(self) -> dict[str, Any]:
+        if self._redis is not None:
+            try:
+                pong = await self._redis.ping()
+                return {
+                    "status": "healthy" if pong else "unhealthy",
+                    "pool": pool_stats(self._redis.connection_pool),
+                }
+            except Exception as exc:
+                logger.warning("health_redis_failed", error=str(exc))
+                return {"status": "unhealthy", "error": str(exc)}
+
         try:
             client = Redis.from_url(self._redis_settings.url)
             try:
@@ -70,6 +70,190 @@ http_request_duration_seconds = Histogram(
     buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
 )
 
+redis_pool_connections = Gauge(
+    "iotguard_redis_pool_connections",
+    "Connections held by the shared Redis pool",
+    labelnames=["state"],
+)
+
+redis_pool_max_connections = Gauge(
+    "iotguard_redis_pool_max_connections",
+    "Configured upper bound of the shared Redis pool",
+)
+
+scheduler_queue_depth = Gauge(
+    "iotguard_scheduler_queue_depth",
+    "Calls queued for admission to a rate-limited service, by priority",
+    labelnames=["name", "priority"],
+)
+
+scheduler_queue_wait_seconds = Histogram(
+    "iotguard_scheduler_queue_wait_seconds",
+    "Time calls waited for admission to a rate-limited service, by priority",
+    labelnames=["name", "priority"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+scheduler_shed_total = Counter(
+    "iotguard_scheduler_shed_total",
+    "Calls dropped before starting (queue full or queue timeout)",
+    labelnames=["name", "reason"],
+)
+
+scheduler_concurrency_limit = Gauge(
+    "iotguard_scheduler_concurrency_limit",
+    "Current adaptive concurrency limit",
+    labelnames=["name"],
+)
+
+scheduler_in_flight = Gauge(
+    "iotguard_scheduler_in_flight",
+    "Calls currently admitted by the scheduler",
+    labelnames=["name"],
+)
+
+analysis_cache_requests_total = Counter(
+    "iotguard_analysis_cache_requests_total",
+    "LLM verdict cache lookups by tier and outcome (hit, stale, negative, miss)",
+    labelnames=["tier", "result"],
+)
+
+analysis_cache_l1_bytes = Gauge(
+    "iotguard_analysis_cache_l1_bytes",
+    "Approximate size of the in-process LLM verdict cache",
+)
+
+semantic_cache_requests_total = Counter(
+    "iotguard_semantic_cache_requests_total",
+    "Near-duplicate verdict lookups (hit, miss, unstable neighbourhood)",
+    labelnames=["result"],
+)
+
+semantic_cache_similarity = Histogram(
+    "iotguard_semantic_cache_similarity",
+    "Cosine similarity of reused near-duplicate verdicts",
+    buckets=(0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 0.99, 1.0),
+)
+
+semantic_cache_verifications_total = Counter(
+    "iotguard_semantic_cache_verifications_total",
+    "Sampled near-duplicate hits re-checked against the LLM, by agreement",
+    labelnames=["agree"],
+)
+
+semantic_cache_entries = Gauge(
+    "iotguard_semantic_cache_entries",
+    "Verdicts held in the near-duplicate index",
+)
+
+llm_batch_size = Histogram(
+    "iotguard_llm_batch_size",
+    "Commands packed into one micro-batched LLM call",
+    labelnames=["name"],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+llm_batch_fallbacks_total = Counter(
+    "iotguard_llm_batch_fallbacks_total",
+    "Batched items retried as single calls after a malformed batch response",
+    labelnames=["name"],
+)
+
+llm_stream_verdict_seconds = Histogram(
+    "iotguard_llm_stream_verdict_seconds",
+    "Time from sending a streamed LLM call until its risk level was parsed",
+    labelnames=["name"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+llm_hedges_total = Counter(
+    "iotguard_llm_hedges_total",
+    "Hedged duplicate LLM calls by outcome (fired, won)",
+    labelnames=["name", "outcome"],
+)
+
+llm_retries_total = Counter(
+    "iotguard_llm_retries_total",
+    "Transient LLM failures by outcome (retried, budget_exhausted, deadline)",
+    labelnames=["name", "outcome"],
+)
+
+analysis_deadline_fallbacks_total = Counter(
+    "iotguard_analysis_deadline_fallbacks_total",
+    "Analyses answered from the rules alone because the request deadline was reached",
+)
+
+analysis_engine_fallbacks_total = Counter(
+    "iotguard_analysis_engine_fallbacks_total",
+    "Analyses answered by the fallback engine because the LLM failed or ran out of time",
+    labelnames=["reason"],
+)
+
+local_model_inference_seconds = Histogram(
+    "iotguard_local_model_inference_seconds",
+    "Local risk classifier time per command (mode: single or batch)",
+    labelnames=["mode"],
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.005),
+)
+
+cascade_tier_requests_total = Counter(
+    "iotguard_cascade_tier_requests_total",
+    "Analyses handled per cascade tier by outcome (answered, escalated, failed)",
+    labelnames=["tier", "outcome"],
+)
+
+cascade_tier_latency_seconds = Histogram(
+    "iotguard_cascade_tier_latency_seconds",
+    "Time a cascade tier took to answer",
+    labelnames=["tier"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+cascade_tier_cost_total = Counter(
+    "iotguard_cascade_tier_cost_total",
+    "Configured cost units spent per cascade tier",
+    labelnames=["tier"],
+)
+
+cascade_tier_agreement_total = Counter(
+    "iotguard_cascade_tier_agreement_total",
+    "Escalated verdicts by whether the next tier agreed on the risk level",
+    labelnames=["tier", "agree"],
+)
+
+singleflight_calls_total = Counter(
+    "iotguard_singleflight_calls_total",
+    "Coalesced calls by role (leader calls upstream, others share its result)",
+    labelnames=["name", "role"],
+)
+
+rule_quarantined_total = Counter(
+    "iotguard_rule_quarantined_total",
+    "Rules quarantined after repeatedly exceeding the match time budget",
+    labelnames=["rule_name"],
+)
+
+rules_quarantined = Gauge(
+    "iotguard_rules_quarantined",
+    "Rules currently skipped because they exceeded the match time budget",
+)
+
+rule_verdict_cache_requests_total = Counter(
+    "iotguard_rule_verdict_cache_requests_total",
+    "Rule verdict memo lookups",
+    labelnames=["result"],
+)
+
+rule_verdict_cache_evictions_total = Counter(
+    "iotguard_rule_verdict_cache_evictions_total",
+    "Rule verdicts evicted from the memo to respect its size bound",
+)
+
+rule_verdict_cache_entries = Gauge(
+    "iotguard_rule_verdict_cache_entries",
+    "Rule verdicts currently memoised",
+)
+
 rule_violations_total = Counter(
     "iotguard_rule_violations_total",
     "Total security rule violations",
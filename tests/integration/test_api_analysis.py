@@ -8,7 +8,7 @@ import pytest
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from iotguard.db.models import Device
+from iotguard.db.models import Device, SecurityRule
 
 
 async def _seed_device(session: AsyncSession) -> Device:
@@ -96,6 +96,33 @@ class TestAnalyzeAndExecuteEndpoint:
         )
         assert resp.status_code == 403
 
+    async def test_device_id_scoped_rule_blocks_by_primary_key(
+        self,
+        test_client: AsyncClient,
+        auth_headers: dict[str, str],
+        db_session: AsyncSession,
+    ) -> None:
+        dev = await _seed_device(db_session)
+        db_session.add(
+            SecurityRule(
+                name="no-strobe",
+                pattern=r"strobe",
+                action="BLOCK",
+                device_ids=[dev.device_id],
+            )
+        )
+        await db_session.commit()
+
+        resp = await test_client.post(
+            "/v1/analyze-and-execute",
+            json={"command": "strobe", "device_id": str(dev.id)},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        body = resp.json()
+        assert body["analysis"]["was_blocked"] is True
+        assert body["executed"] is False
+
 
 class TestAnalysisHistory:
     """Test GET /v1/analysis/history."""
@@ -136,6 +136,32 @@ class TestRuleCreate:
         )
         assert resp.status_code == 422
 
+    async def test_create_rule_rejects_catastrophic_pattern(
+        self,
+        test_client: AsyncClient,
+        auth_headers: dict[str, str],
+    ) -> None:
+        resp = await test_client.post(
+            "/v1/rules",
+            json={"name": "redos", "pattern": r"(a+)+$", "action": "BLOCK"},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 422
+        assert resp.json()["error"] == "INVALID_RULE"
+
+    async def test_create_rule_stores_cost(
+        self,
+        test_client: AsyncClient,
+        auth_headers: dict[str, str],
+    ) -> None:
+        resp = await test_client.post(
+            "/v1/rules",
+            json={"name": "costed", "pattern": r"factory_reset", "action": "BLOCK"},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 201
+        assert resp.json()["cost_us"] > 0
+
 
 class TestRuleDelete:
     """Test DELETE /v1/rules/{id}."""
@@ -188,3 +214,81 @@ class TestRuleTestEndpoint:
             json={"command": "rm -rf /"},
         )
         assert resp.status_code == 401
+
+    async def test_test_endpoint_reports_matches(
+        self,
+        test_client: AsyncClient,
+        auth_headers: dict[str, str],
+        db_session: AsyncSession,
+    ) -> None:
+        db_session.add(
+            SecurityRule(
+                id=uuid.uuid4(),
+                name="test-endpoint-rule",
+                pattern=r"rm\s+-rf",
+                action="BLOCK",
+                is_active=True,
+                priority=10,
+            )
+        )
+        await db_session.commit()
+
+        resp = await test_client.post(
+            "/v1/rules/test",
+            json={"command": "rm -rf /"},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["blocked"] is True
+        assert "test-endpoint-rule" in data["matched_rules"]
+
+
+class TestRuleTestBatchEndpoint:
+    """Test POST /v1/rules/test-batch."""
+
+    async def test_batch_results_in_order(
+        self,
+        test_client: AsyncClient,
+        auth_headers: dict[str, str],
+    ) -> None:
+        resp = await test_client.post(
+            "/v1/rules/test-batch",
+            json={"commands": ["turn_on light", "get_status"]},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 200
+        data = resp.json()
+        assert len(data["results"]) == 2
+        assert data["blocked"] == sum(r["blocked"] for r in data["results"])
+
+    async def test_batch_rejects_empty(
+        self,
+        test_client: AsyncClient,
+        auth_headers: dict[str, str],
+    ) -> None:
+        resp = await test_client.post(
+            "/v1/rules/test-batch",
+            json={"commands": []},
+            headers=auth_headers,
+        )
+        assert resp.status_code == 422
+
+
+class TestRuleBacktestEndpoint:
+    """Test POST /v1/rules/backtest and GET /v1/rules/backtest/{id}."""
+
+    async def test_backtest_requires_auth(
+        self,
+        test_client: AsyncClient,
+    ) -> None:
+        resp = await test_client.post("/v1/rules/backtest", json={})
+        assert resp.status_code == 401
+
+    async def test_unknown_backtest_404(
+        self,
+        test_client: AsyncClient,
+        auth_headers: dict[str, str],
+    ) -> None:
+        resp = await test_client.get("/v1/rules/backtest/nope", headers=auth_headers)
+        assert resp.status_code == 404
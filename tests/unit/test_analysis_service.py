@@ -2,15 +2,19 @@
 
 from __future__ import annotations
 
+import asyncio
 import uuid
 from typing import Any
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
+from iotguard.analysis.engines.streaming import StreamedAnalysis
 from iotguard.analysis.models import AnalysisRequest, AnalysisResult, RiskLevel
 from iotguard.analysis.service import AnalysisService
+from iotguard.core.deadline import Deadline, current_deadline
 from iotguard.core.events import EventBus
+from iotguard.core.exceptions import AnalysisError
 
 
 class FakeRuleEngine:
@@ -23,9 +27,11 @@ class FakeRuleEngine:
             was_blocked=False,
         )
         self.call_count = 0
+        self.last_context: dict[str, Any] | None = None
 
     async def analyze(self, command: str, device_context: dict[str, Any]) -> AnalysisResult:
         self.call_count += 1
+        self.last_context = device_context
         return self.result
 
 
@@ -70,6 +76,7 @@ class TestRulesFirstThenLLM:
         svc._event_bus = event_bus
         svc._rule_engine = rule_engine
         svc._llm_engine = llm_engine
+        svc._fallback_engine = None
         svc._log_repo = AsyncMock()
         svc._log_repo.create = AsyncMock()
 
@@ -100,6 +107,7 @@ class TestRulesFirstThenLLM:
         svc._event_bus = event_bus
         svc._rule_engine = rule_engine
         svc._llm_engine = llm_engine
+        svc._fallback_engine = None
         svc._log_repo = AsyncMock()
         svc._log_repo.create = AsyncMock()
 
@@ -132,6 +140,7 @@ class TestRiskLevelMapping:
         svc._event_bus = event_bus
         svc._rule_engine = rule_engine
         svc._llm_engine = llm_engine
+        svc._fallback_engine = None
         svc._log_repo = AsyncMock()
         svc._log_repo.create = AsyncMock()
 
@@ -161,6 +170,7 @@ class TestRiskLevelMapping:
         svc._event_bus = event_bus
         svc._rule_engine = rule_engine
         svc._llm_engine = llm_engine
+        svc._fallback_engine = None
         svc._log_repo = AsyncMock()
         svc._log_repo.create = AsyncMock()
 
@@ -192,6 +202,7 @@ class TestBlockingLogic:
         svc._event_bus = event_bus
         svc._rule_engine = rule_engine
         svc._llm_engine = llm_engine
+        svc._fallback_engine = None
         svc._log_repo = AsyncMock()
         svc._log_repo.create = AsyncMock()
 
@@ -225,6 +236,7 @@ class TestLLMFallback:
         svc._event_bus = event_bus
         svc._rule_engine = rule_engine
         svc._llm_engine = llm_engine
+        svc._fallback_engine = None
         svc._log_repo = AsyncMock()
         svc._log_repo.create = AsyncMock()
 
@@ -235,6 +247,76 @@ class TestLLMFallback:
         assert result.risk_level == RiskLevel.MEDIUM
 
 
+class TestFallbackEngine:
+    """The fallback engine answers when the LLM cannot."""
+
+    @staticmethod
+    def _service(
+        db_session: Any,
+        event_bus: EventBus,
+        llm_engine: Any,
+        fallback_engine: Any,
+    ) -> AnalysisService:
+        svc = AnalysisService.__new__(AnalysisService)
+        svc._session = db_session
+        svc._event_bus = event_bus
+        svc._rule_engine = FakeRuleEngine()
+        svc._llm_engine = llm_engine
+        svc._fallback_engine = fallback_engine
+        svc._log_repo = AsyncMock()
+        svc._log_repo.create = AsyncMock()
+        return svc
+
+    async def test_llm_failure_without_rule_match_uses_fallback(
+        self,
+        db_session: Any,
+        event_bus: EventBus,
+    ) -> None:
+        fallback = FakeLLMEngine(
+            AnalysisResult(risk_level=RiskLevel.HIGH, explanation="Local model estimate")
+        )
+        svc = self._service(db_session, event_bus, FakeLLMEngine(should_fail=True), fallback)
+
+        result = await svc.analyze(AnalysisRequest(command="unlock door", device_id="dev-1"))
+
+        assert fallback.call_count == 1
+        assert result.risk_level == RiskLevel.HIGH
+        assert "Local model estimate" in result.explanation
+
+    async def test_deadline_uses_fallback(
+        self,
+        db_session: Any,
+        event_bus: EventBus,
+    ) -> None:
+        fallback = FakeLLMEngine(
+            AnalysisResult(risk_level=RiskLevel.MEDIUM, explanation="Local model estimate")
+        )
+        svc = self._service(db_session, event_bus, SlowLLMEngine(delay=5.0), fallback)
+
+        result = await svc.analyze(
+            AnalysisRequest(command="turn_on light", device_id="dev-1"),
+            deadline=Deadline.after(0.05),
+        )
+
+        assert result.risk_level == RiskLevel.MEDIUM
+        assert "deadline" in result.explanation
+
+    async def test_failing_fallback_still_raises(
+        self,
+        db_session: Any,
+        event_bus: EventBus,
+    ) -> None:
+        svc = self._service(
+            db_session,
+            event_bus,
+            FakeLLMEngine(should_fail=True),
+            FakeLLMEngine(should_fail=True),
+        )
+
+        with pytest.raises(AnalysisError):
+            await svc.analyze(AnalysisRequest(command="unlock door", device_id="dev-1"))
+
+
 class TestMergeResults:
     """Test the static _merge_results helper."""
 
@@ -266,3 +348,301 @@ class TestMergeResults:
         r2 = AnalysisResult(risk_level=RiskLevel.LOW, explanation="", was_blocked=False)
         merged = AnalysisService._merge_results(r1, r2)
         assert merged.was_blocked is True
+
+
+class TestDeviceContext:
+    """Registered devices contribute their type and state to the context."""
+
+    async def test_registered_device_enriches_context(
+        self,
+        db_session: Any,
+        event_bus: EventBus,
+    ) -> None:
+        from iotguard.db.models import Device
+
+        device = Device(
+            device_id="lock-1", name="Front", device_type="lock", state={"alarm": "armed"}
+        )
+        db_session.add(device)
+        await db_session.flush()
+
+        rule_engine = FakeRuleEngine()
+        svc = AnalysisService.__new__(AnalysisService)
+        svc._session = db_session
+        svc._event_bus = event_bus
+        svc._rule_engine = rule_engine
+        svc._llm_engine = FakeLLMEngine()
+        svc._fallback_engine = None
+        svc._log_repo = AsyncMock()
+        svc._log_repo.create = AsyncMock()
+
+        await svc.analyze(AnalysisRequest(command="unlock", device_id="lock-1"))
+        assert rule_engine.last_context == {
+            "device_id": "lock-1",
+            "device_pk": str(device.id),
+            "device_type": "lock",
+            "state": {"alarm": "armed"},
+        }
+
+        # Resolved by primary key too, with the external id filled in.
+        await svc.analyze(AnalysisRequest(command="unlock", device_id=str(device.id)))
+        assert rule_engine.last_context == {
+            "device_id": "lock-1",
+            "device_pk": str(device.id),
+            "device_type": "lock",
+            "state": {"alarm": "armed"},
+        }
+
+        await svc.analyze(
+            AnalysisRequest(
+                command="unlock",
+                device_id="lock-1",
+                user_context={"device_type": "door", "state": {}, "device_id": "x", "room": "a"},
+            )
+        )
+        assert rule_engine.last_context == {
+            "device_id": "lock-1",
+            "device_pk": str(device.id),
+            "device_type": "lock",
+            "state": {"alarm": "armed"},
+            "room": "a",
+        }
+
+    async def test_spoofed_device_type_cannot_skip_scoped_block_rule(
+        self,
+        db_session: Any,
+        event_bus: EventBus,
+    ) -> None:
+        from iotguard.analysis.engines.rule_based import RuleBasedEngine
+        from iotguard.analysis.rules.compiled import RuleSetStore
+        from iotguard.db.models import Device, SecurityRule
+
+        db_session.add_all(
+            [
+                Device(device_id="lock-1", name="Front", device_type="lock", state={}),
+                SecurityRule(
+                    name="no-unlock", pattern=r"unlock", action="BLOCK", device_types=["lock"]
+                ),
+            ]
+        )
+        await db_session.flush()
+
+        svc = AnalysisService.__new__(AnalysisService)
+        svc._session = db_session
+        svc._event_bus = event_bus
+        svc._rule_engine = RuleBasedEngine(db_session, rule_store=RuleSetStore())
+        svc._llm_engine = FakeLLMEngine()
+        svc._fallback_engine = None
+        svc._log_repo = AsyncMock()
+        svc._log_repo.create = AsyncMock()
+
+        result = await svc.analyze(
+            AnalysisRequest(
+                command="unlock", device_id="lock-1", user_context={"device_type": "bogus"}
+            )
+        )
+        assert result.was_blocked is True
+
+
+class SlowLLMEngine(FakeLLMEngine):
+    """LLM stub that takes *delay* seconds and records the deadline it saw."""
+
+    def __init__(self, delay: float) -> None:
+        super().__init__()
+        self.delay = delay
+        self.seen_deadline: Any = None
+
+    async def analyze(self, command: str, device_context: dict[str, Any]) -> AnalysisResult:
+        self.call_count += 1
+        self.seen_deadline = current_deadline()
+        await asyncio.sleep(self.delay)
+        return self.result
+
+
+class TestDeadline:
+    """Past the request deadline the rule-only verdict is returned."""
+
+    @staticmethod
+    def _service(db_session: Any, event_bus: EventBus, llm_engine: Any) -> AnalysisService:
+        svc = AnalysisService.__new__(AnalysisService)
+        svc._session = db_session
+        svc._event_bus = event_bus
+        svc._rule_engine = FakeRuleEngine()
+        svc._llm_engine = llm_engine
+        svc._fallback_engine = None
+        svc._log_repo = AsyncMock()
+        svc._log_repo.create = AsyncMock()
+        return svc
+
+    async def test_slow_llm_falls_back_to_rules(
+        self,
+        db_session: Any,
+        event_bus: EventBus,
+    ) -> None:
+        llm_engine = SlowLLMEngine(delay=5.0)
+        svc = self._service(db_session, event_bus, llm_engine)
+        deadline = Deadline.after(0.05)
+
+        result = await svc.analyze(
+            AnalysisRequest(command="turn_on light", device_id="dev-1"), deadline=deadline
+        )
+
+        assert llm_engine.seen_deadline is deadline
+        assert result.risk_level == RiskLevel.NONE
+        assert "deadline" in result.explanation
+        assert current_deadline() is None
+
+    async def test_expired_deadline_skips_llm(
+        self,
+        db_session: Any,
+        event_bus: EventBus,
+    ) -> None:
+        llm_engine = SlowLLMEngine(delay=0.0)
+        svc = self._service(db_session, event_bus, llm_engine)
+
+        result = await svc.analyze(
+            AnalysisRequest(command="turn_on light", device_id="dev-1"),
+            deadline=Deadline.after(0.0),
+        )
+
+        assert llm_engine.call_count == 0
+        assert result.explanation.startswith("No rules matched.")
+
+    async def test_llm_within_deadline_is_merged(
+        self,
+        db_session: Any,
+        event_bus: EventBus,
+    ) -> None:
+        svc = self._service(db_session, event_bus, SlowLLMEngine(delay=0.0))
+
+        result = await svc.analyze(
+            AnalysisRequest(command="turn_on light", device_id="dev-1"),
+            deadline=Deadline.after(5.0),
+        )
+
+        assert result.risk_level == RiskLevel.LOW
+
+
+class StreamingLLMEngine(FakeLLMEngine):
+    """LLM stub whose risk level is known before *release* lets the details through."""
+
+    def __init__(self) -> None:
+        super().__init__(AnalysisResult(risk_level=RiskLevel.HIGH, explanation="Opens the door."))
+        self.release = asyncio.Event()
+
+    def analyze_streaming(self, command: Any, device_context: dict[str, Any]) -> StreamedAnalysis:
+        risk: asyncio.Future[RiskLevel] = asyncio.get_running_loop().create_future()
+
+        async def work() -> AnalysisResult:
+            risk.set_result(self.result.risk_level)
+            await self.release.wait()
+            return self.result
+
+        return StreamedAnalysis.start(work(), risk)
+
+
+class TestAnalyzeStream:
+    """The verdict is yielded before the LLM's details arrive."""
+
+    @staticmethod
+    def _service(db_session: Any, event_bus: EventBus, llm_engine: Any) -> AnalysisService:
+        return TestDeadline._service(db_session, event_bus, llm_engine)
+
+    async def test_verdict_then_result(self, db_session: Any, event_bus: EventBus) -> None:
+        llm_engine = StreamingLLMEngine()
+        svc = self._service(db_session, event_bus, llm_engine)
+        stream = svc.analyze_stream(AnalysisRequest(command="unlock", device_id="dev-1"))
+
+        stage, verdict = await asyncio.wait_for(anext(stream), 1.0)
+        assert stage == "verdict"
+        assert verdict.risk_level == RiskLevel.HIGH
+        assert "Opens the door." not in verdict.explanation
+        svc._log_repo.create.assert_not_awaited()
+
+        llm_engine.release.set()
+        stage, result = await asyncio.wait_for(anext(stream), 1.0)
+        assert stage == "result"
+        assert "Opens the door." in result.explanation
+        svc._log_repo.create.assert_awaited_once()
+
+    async def test_verdict_only_without_details(
+        self, db_session: Any, event_bus: EventBus
+    ) -> None:
+        svc = self._service(db_session, event_bus, StreamingLLMEngine())
+        stages = [
+            stage
+            async for stage, _ in svc.analyze_stream(
+                AnalysisRequest(command="unlock", device_id="dev-1"), details=False
+            )
+        ]
+        assert stages == ["verdict"]
+        svc._log_repo.create.assert_awaited_once()
+
+    async def test_non_streaming_engine_is_wrapped(
+        self, db_session: Any, event_bus: EventBus
+    ) -> None:
+        svc = self._service(db_session, event_bus, FakeLLMEngine())
+        events = [
+            (stage, result.risk_level)
+            async for stage, result in svc.analyze_stream(
+                AnalysisRequest(command="turn_on light", device_id="dev-1")
+            )
+        ]
+        assert events == [("verdict", RiskLevel.LOW), ("result", RiskLevel.LOW)]
+
+    async def test_deadline_yields_rule_verdict(
+        self, db_session: Any, event_bus: EventBus
+    ) -> None:
+        svc = self._service(db_session, event_bus, SlowLLMEngine(delay=5.0))
+        events = [
+            (stage, result)
+            async for stage, result in svc.analyze_stream(
+                AnalysisRequest(command="turn_on light", device_id="dev-1"),
+                deadline=Deadline.after(0.05),
+            )
+        ]
+        assert [stage for stage, _ in events] == ["verdict"]
+        assert "deadline" in events[0][1].explanation
+
+    async def test_id_scoped_rule_blocks_analyze_and_execute_by_primary_key(
+        self,
+        db_session: Any,
+        event_bus: EventBus,
+    ) -> None:
+        from iotguard.analysis.engines.rule_based import RuleBasedEngine
+        from iotguard.analysis.rules.compiled import RuleSetStore
+        from iotguard.api.routers.analysis import AnalyzeRequest, analyze_and_execute
+        from iotguard.db.models import Device, SecurityRule
+
+        device = Device(device_id="lock-1", name="Front", device_type="lock", state={})
+        db_session.add_all(
+            [
+                device,
+                SecurityRule(
+                    name="no-unlock", pattern=r"unlock", action="BLOCK", device_ids=["lock-1"]
+                ),
+            ]
+        )
+        await db_session.flush()
+
+        svc = AnalysisService.__new__(AnalysisService)
+        svc._session = db_session
+        svc._event_bus = event_bus
+        svc._rule_engine = RuleBasedEngine(db_session, rule_store=RuleSetStore())
+        svc._llm_engine = FakeLLMEngine()
+        svc._fallback_engine = None
+        svc._log_repo = AsyncMock()
+        svc._log_repo.create = AsyncMock()
+        device_svc = AsyncMock()
+
+        # The endpoint only executes by primary key, so that is what callers send.
+        response = await analyze_and_execute(
+            AnalyzeRequest(command="unlock", device_id=str(device.id)),
+            MagicMock(sub=str(uuid.uuid4())),
+            svc,
+            device_svc,
+            None,
+        )
+        assert response.analysis.was_blocked is True
+        assert response.executed is False
+        device_svc.execute_command.assert_not_awaited()
@@ -0,0 +1,96 @@
+"""Unit tests for the MicroBatcher front end."""
+
+from __future__ import annotations
+
+import asyncio
+from collections.abc import Sequence
+
+import pytest
+
+from iotguard.analysis.engines.batching import MicroBatcher
+from iotguard.core.deadline import Deadline, current_deadline, deadline_scope
+
+
+class _Recorder:
+    def __init__(self) -> None:
+        self.batches: list[list[int]] = []
+        self.fallbacks: list[int] = []
+
+    async def send(self, items: Sequence[int]) -> list[int | None]:
+        self.batches.append(list(items))
+        await asyncio.sleep(0)
+        return [None if i < 0 else i * 10 for i in items]
+
+    async def fallback(self, item: int) -> int:
+        self.fallbacks.append(item)
+        return -1
+
+
+class TestMicroBatcher:
+    async def test_full_batch_is_sent_immediately(self) -> None:
+        rec = _Recorder()
+        batcher = MicroBatcher("t", rec.send, rec.fallback, max_items=3, max_wait=10.0)
+        results = await asyncio.wait_for(
+            asyncio.gather(*(batcher.submit(i) for i in (1, 2, 3))), timeout=1.0
+        )
+        assert results == [10, 20, 30]
+        assert rec.batches == [[1, 2, 3]]
+
+    async def test_partial_batch_is_sent_after_max_wait(self) -> None:
+        rec = _Recorder()
+        batcher = MicroBatcher("t", rec.send, rec.fallback, max_items=10, max_wait=0.01)
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+        assert results == [10, 20]
+        assert rec.batches == [[1, 2]]
+
+    async def test_overflow_starts_a_new_batch(self) -> None:
+        rec = _Recorder()
+        batcher = MicroBatcher("t", rec.send, rec.fallback, max_items=2, max_wait=0.01)
+        await asyncio.gather(*(batcher.submit(i) for i in range(5)))
+        assert [len(b) for b in rec.batches] == [2, 2, 1]
+
+    async def test_batch_does_not_inherit_a_caller_deadline(self) -> None:
+        seen: list[Deadline | None] = []
+
+        async def send(items: Sequence[int]) -> list[int | None]:
+            seen.append(current_deadline())
+            return list(items)
+
+        batcher = MicroBatcher("t", send, _Recorder().fallback, max_items=2, max_wait=0.01)
+        with deadline_scope(Deadline.after(5)):
+            await asyncio.gather(*(batcher.submit(i) for i in range(3)))
+        assert seen == [None, None]
+
+    async def test_malformed_item_falls_back_alone(self) -> None:
+        rec = _Recorder()
+        batcher = MicroBatcher("t", rec.send, rec.fallback, max_items=3, max_wait=0.01)
+        results = await asyncio.gather(*(batcher.submit(i) for i in (1, -5, 3)))
+        assert results == [10, -1, 30]
+        assert rec.fallbacks == [-5]
+
+    async def test_batch_failure_reaches_every_caller(self) -> None:
+        async def send(items: Sequence[int]) -> list[int | None]:
+            raise RuntimeError("upstream down")
+
+        async def fallback(item: int) -> int:
+            raise AssertionError("not used")
+
+        batcher = MicroBatcher("t", send, fallback, max_items=2, max_wait=0.01)
+        outcomes = await asyncio.gather(
+            batcher.submit(1), batcher.submit(2), return_exceptions=True
+        )
+        assert all(isinstance(o, RuntimeError) for o in outcomes)
+
+    async def test_wrong_result_count_falls_back(self) -> None:
+        rec = _Recorder()
+
+        async def send(items: Sequence[int]) -> list[int | None]:
+            return [1]
+
+        batcher = MicroBatcher("t", send, rec.fallback, max_items=2, max_wait=0.01)
+        assert await asyncio.gather(batcher.submit(1), batcher.submit(2)) == [-1, -1]
+
+    def test_max_items_must_be_positive(self) -> None:
+        rec = _Recorder()
+        with pytest.raises(ValueError):
+            MicroBatcher("t", rec.send, rec.fallback, max_items=0, max_wait=0.01)
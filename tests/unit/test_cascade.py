@@ -0,0 +1,121 @@
+"""Unit tests for the cheapest-first CascadeEngine, using stub engines."""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.engines.base import AnalysisEngine
+from iotguard.analysis.engines.cascade import CascadeEngine, CascadeTier
+from iotguard.analysis.models import AnalysisResult, RiskLevel
+from iotguard.core.exceptions import LLMError
+
+
+class StubEngine:
+    """Answers every command with a fixed verdict (or error)."""
+
+    def __init__(
+        self,
+        risk_level: RiskLevel = RiskLevel.LOW,
+        *,
+        confidence: float | None = None,
+        error: Exception | None = None,
+    ) -> None:
+        self.result = AnalysisResult(
+            risk_level=risk_level, explanation="stub", confidence=confidence
+        )
+        self.error = error
+        self.calls = 0
+
+    async def analyze(
+        self, command: str | ParsedCommand, device_context: dict[str, Any]
+    ) -> AnalysisResult:
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def _cascade(cheap: StubEngine, expensive: StubEngine) -> CascadeEngine:
+    return CascadeEngine(
+        [
+            CascadeTier("cheap", cheap, cost=0.1, min_confidence=0.8),
+            CascadeTier("expensive", expensive, cost=1.0),
+        ]
+    )
+
+
+class TestCascadeEngine:
+    def test_stubs_implement_the_protocol(self) -> None:
+        assert isinstance(StubEngine(), AnalysisEngine)
+        assert isinstance(_cascade(StubEngine(), StubEngine()), AnalysisEngine)
+
+    async def test_confident_cheap_verdict_is_final(self) -> None:
+        cheap, expensive = StubEngine(RiskLevel.LOW, confidence=0.95), StubEngine()
+        result = await _cascade(cheap, expensive).analyze("turn on light", {})
+        assert result is cheap.result
+        assert expensive.calls == 0
+
+    async def test_unreported_confidence_is_not_escalated(self) -> None:
+        cheap, expensive = StubEngine(RiskLevel.CRITICAL), StubEngine()
+        assert await _cascade(cheap, expensive).analyze("rm -rf /", {}) is cheap.result
+        assert expensive.calls == 0
+
+    async def test_low_confidence_escalates(self) -> None:
+        cheap = StubEngine(RiskLevel.LOW, confidence=0.5)
+        expensive = StubEngine(RiskLevel.HIGH)
+        assert await _cascade(cheap, expensive).analyze("unlock", {}) is expensive.result
+
+    async def test_medium_risk_escalates(self) -> None:
+        cheap = StubEngine(RiskLevel.MEDIUM, confidence=0.99)
+        expensive = StubEngine(RiskLevel.LOW)
+        assert await _cascade(cheap, expensive).analyze("open garage", {}) is expensive.result
+        assert cheap.calls == expensive.calls == 1
+
+    async def test_last_tier_always_answers(self) -> None:
+        cheap = StubEngine(RiskLevel.MEDIUM)
+        expensive = StubEngine(RiskLevel.MEDIUM, confidence=0.1)
+        assert await _cascade(cheap, expensive).analyze("x", {}) is expensive.result
+
+    async def test_failed_cheap_tier_falls_through(self) -> None:
+        cheap = StubEngine(error=LLMError("down"))
+        expensive = StubEngine(RiskLevel.LOW)
+        assert await _cascade(cheap, expensive).analyze("x", {}) is expensive.result
+
+    async def test_failed_escalation_returns_cheaper_verdict(self) -> None:
+        cheap = StubEngine(RiskLevel.MEDIUM)
+        expensive = StubEngine(error=LLMError("down"))
+        assert await _cascade(cheap, expensive).analyze("x", {}) is cheap.result
+
+    async def test_all_tiers_failing_raises(self) -> None:
+        cheap = StubEngine(error=LLMError("cheap down"))
+        expensive = StubEngine(error=LLMError("expensive down"))
+        with pytest.raises(LLMError, match="expensive down"):
+            await _cascade(cheap, expensive).analyze("x", {})
+
+    def test_empty_cascade_rejected(self) -> None:
+        with pytest.raises(ValueError):
+            CascadeEngine([])
+
+
+class TestCascadeMetrics:
+    async def test_agreement_and_cost_recorded(self) -> None:
+        from prometheus_client import REGISTRY
+
+        def sample(name: str, **labels: str) -> float:
+            return REGISTRY.get_sample_value(name, labels) or 0.0
+
+        agree_before = sample("iotguard_cascade_tier_agreement_total", tier="cheap", agree="true")
+        cost_before = sample("iotguard_cascade_tier_cost_total", tier="expensive")
+
+        await _cascade(StubEngine(RiskLevel.MEDIUM), StubEngine(RiskLevel.MEDIUM)).analyze("x", {})
+
+        assert (
+            sample("iotguard_cascade_tier_agreement_total", tier="cheap", agree="true")
+            == agree_before + 1
+        )
+        assert sample("iotguard_cascade_tier_cost_total", tier="expensive") == pytest.approx(
+            cost_before + 1.0
+        )
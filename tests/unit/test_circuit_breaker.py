@@ -167,3 +167,11 @@ class TestCircuitBreakerExceptionPropagation:
         async with cb:
             pass
         assert cb.failure_count == 0
+
+    async def test_neutral_errors_are_not_counted(self) -> None:
+        cb = CircuitBreaker(name="test", failure_threshold=1, cooldown=1.0, neutral=(KeyError,))
+        with pytest.raises(KeyError):
+            async with cb:
+                raise KeyError("caller gave up")
+        assert cb.failure_count == 0
+        assert cb.state == CircuitState.CLOSED
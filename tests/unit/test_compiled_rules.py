@@ -0,0 +1,116 @@
+"""Unit tests for CompiledRuleSet and the versioned RuleSetStore."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import uuid
+from typing import Any
+from unittest.mock import AsyncMock, patch
+
+from iotguard.analysis.rules.compiled import CompiledRuleSet, RuleSetStore
+from iotguard.db.models import SecurityRule
+
+
+def _rule(name: str, pattern: str, action: str = "BLOCK", priority: int = 100) -> SecurityRule:
+    return SecurityRule(
+        id=uuid.uuid4(),
+        name=name,
+        pattern=pattern,
+        action=action,
+        priority=priority,
+        is_active=True,
+        description=name,
+    )
+
+
+def _repo(rules: list[SecurityRule]) -> Any:
+    repo = AsyncMock()
+    repo.list_active = AsyncMock(return_value=rules)
+    return repo
+
+
+class TestCompiledRuleSet:
+    """Compilation happens once and drops invalid patterns."""
+
+    def test_invalid_patterns_dropped_at_compile_time(self) -> None:
+        rule_set = CompiledRuleSet.compile(
+            [_rule("bad", r"[oops("), _rule("good", r"unlock")], version=1
+        )
+        assert [r.name for r in rule_set.rules] == ["good"]
+
+    def test_rules_sorted_by_priority_then_name(self) -> None:
+        rule_set = CompiledRuleSet.compile(
+            [
+                _rule("b", "x", priority=20),
+                _rule("a", "x", priority=20),
+                _rule("c", "x", priority=5),
+            ],
+            version=1,
+        )
+        assert [r.name for r in rule_set.rules] == ["c", "a", "b"]
+
+    def test_match_is_case_insensitive(self) -> None:
+        rule_set = CompiledRuleSet.compile([_rule("fmt", r"FORMAT\s+disk")], version=1)
+        assert [r.name for r in rule_set.match("format disk_c")] == ["fmt"]
+        assert rule_set.match("turn_on light") == []
+
+    def test_action_is_normalised(self) -> None:
+        rule_set = CompiledRuleSet.compile([_rule("w", "x", action="warn")], version=1)
+        assert rule_set.rules[0].action == "WARN"
+
+    async def test_batch_is_matched_off_the_loop(self) -> None:
+        rule_set = CompiledRuleSet.compile([_rule("fmt", r"format")], version=1)
+        threads: list[str] = []
+        match_many = CompiledRuleSet.match_many
+
+        def _match_many(self: CompiledRuleSet, *args: Any, **kwargs: Any) -> Any:
+            threads.append(threading.current_thread().name)
+            return match_many(self, *args, **kwargs)
+
+        with patch.object(CompiledRuleSet, "match_many", _match_many):
+            matched = await rule_set.match_many_async(["format disk", "turn_on light"])
+
+        assert [[r.name for r in m] for m in matched] == [["fmt"], []]
+        assert threads and threading.current_thread().name not in threads
+
+
+class TestRuleSetStore:
+    """The store reloads only when the version is bumped."""
+
+    async def test_snapshot_reused_until_bump(self) -> None:
+        repo = _repo([_rule("r", "x")])
+        store = RuleSetStore()
+
+        first = await store.get(repo)
+        second = await store.get(repo)
+        assert first is second
+        assert repo.list_active.call_count == 1
+
+        new_version = store.bump()
+        third = await store.get(repo)
+        assert third is not first
+        assert third.version == new_version
+        assert repo.list_active.call_count == 2
+
+    async def test_concurrent_readers_load_once(self) -> None:
+        repo = _repo([_rule("r", "x")])
+        store = RuleSetStore()
+
+        snapshots = await asyncio.gather(*(store.get(repo) for _ in range(10)))
+
+        assert all(s is snapshots[0] for s in snapshots)
+        assert repo.list_active.call_count == 1
+
+    async def test_bump_during_load_leaves_snapshot_stale(self) -> None:
+        store = RuleSetStore()
+
+        async def _slow_list_active() -> list[SecurityRule]:
+            store.bump()
+            return [_rule("r", "x")]
+
+        repo = AsyncMock()
+        repo.list_active = _slow_list_active
+
+        loaded = await store.get(repo)
+        assert loaded.version < store.version
@@ -0,0 +1,50 @@
+"""Unit tests for request deadlines."""
+
+from __future__ import annotations
+
+import pytest
+
+from iotguard.core.deadline import Deadline, current_deadline, deadline_scope, parse_deadline
+
+
+class TestParseDeadline:
+    def test_header_is_milliseconds(self) -> None:
+        deadline = parse_deadline("2500")
+        assert deadline is not None
+        assert deadline.remaining() == pytest.approx(2.5, abs=0.05)
+
+    def test_default_applies_without_header(self) -> None:
+        deadline = parse_deadline(None, default=3.0)
+        assert deadline is not None
+        assert deadline.remaining() == pytest.approx(3.0, abs=0.05)
+
+    def test_no_header_and_no_default_means_no_deadline(self) -> None:
+        assert parse_deadline(None) is None
+        assert parse_deadline("  ", maximum=60.0) is None
+
+    def test_maximum_caps_the_header(self) -> None:
+        deadline = parse_deadline("600000", maximum=10.0)
+        assert deadline is not None
+        assert deadline.remaining() == pytest.approx(10.0, abs=0.05)
+
+    @pytest.mark.parametrize("header", ["soon", "-5", "0", "inf", "nan"])
+    def test_malformed_header_rejected(self, header: str) -> None:
+        with pytest.raises(ValueError):
+            parse_deadline(header)
+
+
+class TestDeadline:
+    def test_expiry(self) -> None:
+        assert Deadline.after(0.0).expired
+        assert Deadline.after(0.0).remaining() == 0.0
+        assert not Deadline.after(10.0).expired
+
+    async def test_scope_sets_and_restores_current_deadline(self) -> None:
+        deadline = Deadline.after(1.0)
+        assert current_deadline() is None
+        with deadline_scope(deadline):
+            assert current_deadline() is deadline
+            with deadline_scope(None):
+                assert current_deadline() is None
+            assert current_deadline() is deadline
+        assert current_deadline() is None
@@ -0,0 +1,114 @@
+"""Unit tests for the process-wide EngineRegistry."""
+
+from __future__ import annotations
+
+from typing import Any
+from unittest.mock import AsyncMock
+
+import pytest
+
+from iotguard.analysis.registry import (
+    EngineRegistry,
+    dispose_engine_registry,
+    get_engine_registry,
+)
+from iotguard.analysis.service import AnalysisService
+from iotguard.core.config import Settings
+from iotguard.core.events import EventBus
+
+
+class TestEngineRegistry:
+    """The registry builds engines once and shares them."""
+
+    async def test_singleton_is_reused(self, test_settings: Settings) -> None:
+        await dispose_engine_registry()
+        try:
+            first = get_engine_registry(test_settings)
+            second = get_engine_registry(test_settings)
+            assert first is second
+            assert first.llm_engine is second.llm_engine
+        finally:
+            await dispose_engine_registry()
+
+    async def test_dispose_creates_fresh_registry(self, test_settings: Settings) -> None:
+        await dispose_engine_registry()
+        first = get_engine_registry(test_settings)
+        await dispose_engine_registry()
+        second = get_engine_registry(test_settings)
+        try:
+            assert first is not second
+        finally:
+            await dispose_engine_registry()
+
+    def test_services_share_circuit_breaker(
+        self,
+        test_settings: Settings,
+        event_bus: EventBus,
+    ) -> None:
+        registry = EngineRegistry(test_settings)
+        session: Any = AsyncMock()
+
+        svc1 = AnalysisService(
+            session, test_settings.gemini, event_bus, llm_engine=registry.llm_engine
+        )
+        svc2 = AnalysisService(
+            session, test_settings.gemini, event_bus, llm_engine=registry.llm_engine
+        )
+
+        assert svc1._llm_engine is svc2._llm_engine
+        assert svc1._llm_engine._breaker is svc2._llm_engine._breaker  # type: ignore[attr-defined]
+
+    async def test_cascade_wraps_cheap_and_expensive_gemini(self, test_settings: Settings) -> None:
+        from iotguard.analysis.engines.cascade import CascadeEngine
+        from iotguard.analysis.models import RiskLevel
+        from iotguard.core.config import CascadeSettings
+
+        settings = test_settings.model_copy(
+            update={"cascade": CascadeSettings(enabled=True, escalate_risks=["medium", "HIGH"])}
+        )
+        registry = EngineRegistry(settings, redis_client=AsyncMock())
+        try:
+            assert isinstance(registry.llm_engine, CascadeEngine)
+            cheap, expensive = registry.llm_engine.tiers
+            assert cheap.engine is registry.cheap_gemini
+            assert expensive.engine is registry.gemini
+            assert cheap.escalate_on == {RiskLevel.MEDIUM, RiskLevel.HIGH}
+            assert registry.cheap_gemini is not None
+            assert registry.cheap_gemini._cache_key("x", {}) != registry.gemini._cache_key("x", {})
+        finally:
+            await registry.aclose()
+
+    async def test_local_model_is_fallback_and_first_cascade_tier(
+        self, test_settings: Settings, tmp_path: Any
+    ) -> None:
+        pytest.importorskip("numpy")
+        from iotguard.analysis.classifier import RiskClassifier
+        from iotguard.analysis.engines.local import LocalModelEngine
+        from iotguard.analysis.models import RiskLevel
+        from iotguard.core.config import CascadeSettings, LocalModelSettings
+
+        RiskClassifier.train(
+            [("unlock the door", "door_lock"), ("turn on the light", "light")],
+            [RiskLevel.HIGH, RiskLevel.NONE],
+            dimensions=256,
+            epochs=5,
+        ).save(tmp_path / "model")
+        settings = test_settings.model_copy(
+            update={
+                "cascade": CascadeSettings(enabled=True),
+                "local_model": LocalModelSettings(
+                    enabled=True, path=str(tmp_path / "model"), min_confidence=0.95
+                ),
+            }
+        )
+        registry = EngineRegistry(settings, redis_client=AsyncMock())
+        try:
+            assert isinstance(registry.local_model, LocalModelEngine)
+            assert registry.fallback_engine is registry.local_model
+            local, cheap, expensive = registry.llm_engine.tiers  # type: ignore[attr-defined]
+            assert local.engine is registry.local_model
+            assert local.min_confidence == 0.95
+            assert cheap.engine is registry.cheap_gemini
+            assert expensive.engine is registry.gemini
+        finally:
+            await registry.aclose()
@@ -2,18 +2,29 @@
 
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import Any
+from typing import Any, ClassVar
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from pydantic import SecretStr
 
+from iotguard.analysis.command import ParsedCommand
 from iotguard.analysis.engines.gemini import GeminiAnalysisEngine
 from iotguard.analysis.models import AnalysisResult, RiskLevel
 from iotguard.core.circuit_breaker import CircuitOpenError
-from iotguard.core.config import GeminiSettings, RedisSettings
-from iotguard.core.exceptions import LLMError
+from iotguard.core.config import (
+    CacheSettings,
+    GeminiSettings,
+    RedisSettings,
+    SemanticCacheSettings,
+)
+from iotguard.core.deadline import Deadline, deadline_scope
+from iotguard.core.exceptions import DeadlineExceededError, LLMError
+from iotguard.core.hedging import LatencyWindow
+from iotguard.core.retry import RetryBudget
+from iotguard.devices.models import DeviceType
 
 
 _GEMINI_SETTINGS = GeminiSettings(
@@ -74,6 +85,13 @@ class TestResponseParsing:
         result = GeminiAnalysisEngine._parse_response(raw)
         assert result.risk_level == RiskLevel.CRITICAL
 
+    def test_confidence_parsed_and_clamped(self) -> None:
+        parse = GeminiAnalysisEngine._parse_response
+        assert parse('{"risk_level": "LOW", "confidence": 0.7}').confidence == 0.7
+        assert parse('{"risk_level": "LOW", "confidence": 3}').confidence == 1.0
+        assert parse('{"risk_level": "LOW", "confidence": "sure"}').confidence is None
+        assert parse('{"risk_level": "LOW"}').confidence is None
+
     def test_was_blocked_is_always_false(self) -> None:
         """The LLM engine never sets was_blocked -- that's the rule engine's job."""
         raw = json.dumps({"risk_level": "HIGH", "explanation": "x"})
@@ -101,6 +119,385 @@ class TestCircuitBreakerIntegration:
         assert engine._breaker.name == "gemini"
 
 
+class _FakeModel:
+    """Stands in for ``genai.GenerativeModel`` with a slow async call."""
+
+    active = 0
+    peak = 0
+    created = 0
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        type(self).created += 1
+
+    async def generate_content_async(self, prompt: str) -> Any:
+        cls = type(self)
+        cls.active += 1
+        cls.peak = max(cls.peak, cls.active)
+        await asyncio.sleep(0.02)
+        cls.active -= 1
+        return MagicMock(text=json.dumps({"risk_level": "LOW", "explanation": "ok"}))
+
+
+class TestAsyncCalls:
+    """Gemini calls do not block the event loop and respect the limit."""
+
+    async def test_concurrency_bounded_and_loop_free(self) -> None:
+        settings = _GEMINI_SETTINGS.model_copy(update={"max_concurrency": 2})
+        _FakeModel.active = _FakeModel.peak = 0
+        ticks = 0
+
+        async def ticker() -> None:
+            nonlocal ticks
+            for _ in range(5):
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _FakeModel):
+            engine = GeminiAnalysisEngine(settings)
+            results = await asyncio.gather(
+                *(engine.analyze(f"cmd{i}", {"device_id": "d1"}) for i in range(6)),
+                ticker(),
+            )
+
+        assert all(r.risk_level == RiskLevel.LOW for r in results[:6])
+        assert _FakeModel.peak == 2
+        assert ticks == 5
+
+    async def test_queue_timeout_raises_llm_error(self) -> None:
+        settings = _GEMINI_SETTINGS.model_copy(
+            update={"max_concurrency": 1, "queue_timeout": 0.001}
+        )
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _FakeModel):
+            engine = GeminiAnalysisEngine(settings)
+            outcomes = await asyncio.gather(
+                engine.analyze("a", {}), engine.analyze("b", {}), return_exceptions=True
+            )
+        assert sum(isinstance(o, LLMError) for o in outcomes) == 1
+
+
+class TestCoalescing:
+    """Identical concurrent analyses share one Gemini call."""
+
+    async def test_identical_burst_makes_one_call(self) -> None:
+        calls = 0
+
+        class _CountingModel(_FakeModel):
+            async def generate_content_async(self, prompt: str) -> Any:
+                nonlocal calls
+                calls += 1
+                return await super().generate_content_async(prompt)
+
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _CountingModel):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+            results = await asyncio.gather(
+                *(engine.analyze("turn on light", {"device_id": "d1"}) for _ in range(20))
+            )
+
+        assert calls == 1
+        assert {r.risk_level for r in results} == {RiskLevel.LOW}
+
+
+class TestCacheBehaviour:
+    """Negative caching and stale-while-revalidate in the engine."""
+
+    async def test_failure_is_remembered_briefly(self) -> None:
+        model = MagicMock()
+        model.generate_content_async = AsyncMock(side_effect=RuntimeError("down"))
+        with patch(
+            "iotguard.analysis.engines.gemini.genai.GenerativeModel", return_value=model
+        ):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+            with pytest.raises(LLMError):
+                await engine.analyze("cmd", {})
+            with pytest.raises(LLMError, match="recently failed"):
+                await engine.analyze("cmd", {})
+        assert model.generate_content_async.await_count == 1
+
+    async def test_stale_verdict_served_and_refreshed(self) -> None:
+        cache = CacheSettings(ttl_low=0.0, stale_ttl=60.0)
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _FakeModel):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS, cache_settings=cache)
+            await engine._set_cached(
+                engine._cache_key("cmd", {}),
+                AnalysisResult(risk_level=RiskLevel.LOW, explanation="old"),
+            )
+            result = await engine.analyze("cmd", {})
+            assert result.explanation == "old"
+            assert len(engine._refreshes) == 1
+            await asyncio.gather(*engine._refreshes)
+
+        refreshed = await engine._get_cached(engine._cache_key("cmd", {}))
+        assert refreshed is not None and refreshed.explanation == "ok"
+        await engine.aclose()
+
+
+class TestSemanticCache:
+    """Near-identical commands reuse an earlier verdict when enabled."""
+
+    async def test_near_duplicate_skips_llm(self) -> None:
+        pytest.importorskip("numpy")
+        calls = 0
+
+        class _CountingModel(_FakeModel):
+            async def generate_content_async(self, prompt: str) -> Any:
+                nonlocal calls
+                calls += 1
+                return await super().generate_content_async(prompt)
+
+        semantic = SemanticCacheSettings(enabled=True)
+        ctx = {"device_type": "door_lock"}
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _CountingModel):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS, semantic_settings=semantic)
+            await engine.analyze("unlock the front door", ctx)
+            result = await engine.analyze("please unlock front door now", ctx)
+            await engine.analyze("lock the front door", ctx)
+
+        assert result.risk_level == RiskLevel.LOW
+        assert calls == 2
+
+    def test_disabled_by_default(self) -> None:
+        assert GeminiAnalysisEngine(_GEMINI_SETTINGS)._semantic is None
+
+
+class _BatchModel:
+    """Answers batch prompts with a JSON array; item 1 is malformed."""
+
+    prompts: ClassVar[list[str]] = []
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+    async def generate_content_async(self, prompt: str) -> Any:
+        type(self).prompts.append(prompt)
+        if "**Commands:**" not in prompt:
+            return MagicMock(text=json.dumps({"risk_level": "HIGH", "explanation": "single"}))
+        items = json.loads(prompt.rsplit("**Commands:**", 1)[1])
+        verdicts = [
+            {"id": item["id"], "risk_level": "bogus" if item["id"] == 1 else "LOW"}
+            for item in items
+        ]
+        return MagicMock(text=json.dumps(verdicts))
+
+
+class TestMicroBatching:
+    """Concurrent misses share one prompt when batching is enabled."""
+
+    async def test_batch_with_malformed_item_falls_back(self) -> None:
+        _BatchModel.prompts = []
+        settings = _GEMINI_SETTINGS.model_copy(
+            update={"batch_max_items": 3, "batch_max_wait_ms": 50.0}
+        )
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _BatchModel):
+            engine = GeminiAnalysisEngine(settings)
+            results = await asyncio.gather(
+                *(engine.analyze(f"cmd{i}", {}) for i in range(3))
+            )
+            await engine.aclose()
+
+        assert [r.risk_level for r in results] == [RiskLevel.LOW, RiskLevel.HIGH, RiskLevel.LOW]
+        assert len(_BatchModel.prompts) == 2  # one batch + one single retry
+
+    def test_parse_batch_response(self) -> None:
+        text = json.dumps(
+            [
+                {"id": 0, "risk_level": "low", "explanation": "a"},
+                {"id": 0, "risk_level": "HIGH"},
+                {"id": 7, "risk_level": "LOW"},
+                {"id": 2, "explanation": "no risk level"},
+            ]
+        )
+        results = GeminiAnalysisEngine._parse_batch_response(f"```json\n{text}\n```", 3)
+        assert results[0] is not None and results[0].risk_level == RiskLevel.LOW
+        assert results[1] is None and results[2] is None
+
+    def test_parse_batch_response_not_a_list(self) -> None:
+        assert GeminiAnalysisEngine._parse_batch_response('{"id": 0}', 2) == [None, None]
+        assert GeminiAnalysisEngine._parse_batch_response("garbage", 1) == [None]
+
+
+class TestScheduling:
+    """Calls are prioritised by device type."""
+
+    def test_priority_by_device_type(self) -> None:
+        engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+        assert engine._priority({"device_type": DeviceType.DOOR_LOCK}) == 0
+        assert engine._priority({"device_type": "light"}) == 2
+        assert engine._priority({"device_type": "toaster"}) == 1
+        assert engine._priority({}) == 1
+
+    async def test_rate_limited_call_shrinks_concurrency(self) -> None:
+        from google.api_core import exceptions as google_exceptions
+
+        model = MagicMock()
+        model.generate_content_async = AsyncMock(
+            side_effect=google_exceptions.ResourceExhausted("429 quota")
+        )
+        with patch(
+            "iotguard.analysis.engines.gemini.genai.GenerativeModel", return_value=model
+        ):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+            with pytest.raises(LLMError):
+                await engine.analyze("cmd", {})
+        assert engine._scheduler.limit < _GEMINI_SETTINGS.max_concurrency
+
+
+class TestRetriesAndDeadlines:
+    """Transient failures are retried within budget; deadlines cut calls short."""
+
+    async def test_transient_failure_is_retried(self) -> None:
+        from google.api_core import exceptions as google_exceptions
+
+        model = MagicMock()
+        model.generate_content_async = AsyncMock(
+            side_effect=[
+                google_exceptions.ServiceUnavailable("503"),
+                MagicMock(text=json.dumps({"risk_level": "LOW", "explanation": "ok"})),
+            ]
+        )
+        settings = _GEMINI_SETTINGS.model_copy(update={"retry_base_delay": 0.001})
+        with patch(
+            "iotguard.analysis.engines.gemini.genai.GenerativeModel", return_value=model
+        ):
+            engine = GeminiAnalysisEngine(settings)
+            result = await engine.analyze("cmd", {})
+        assert result.risk_level == RiskLevel.LOW
+        assert model.generate_content_async.await_count == 2
+
+    async def test_exhausted_budget_stops_retries(self) -> None:
+        from google.api_core import exceptions as google_exceptions
+
+        model = MagicMock()
+        model.generate_content_async = AsyncMock(
+            side_effect=google_exceptions.ServiceUnavailable("503")
+        )
+        with patch(
+            "iotguard.analysis.engines.gemini.genai.GenerativeModel", return_value=model
+        ):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+            engine._retry_budget = RetryBudget(0.0, min_per_second=0.0, capacity=0.0)
+            with pytest.raises(LLMError):
+                await engine.analyze("cmd", {})
+        assert model.generate_content_async.await_count == 1
+
+    async def test_deadline_cuts_call_short_without_penalties(self) -> None:
+        class _SlowModel(_FakeModel):
+            async def generate_content_async(self, prompt: str) -> Any:
+                await asyncio.sleep(5)
+                return await super().generate_content_async(prompt)
+
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _SlowModel):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+            with deadline_scope(Deadline.after(0.05)):
+                with pytest.raises(DeadlineExceededError):
+                    await engine.analyze("cmd", {})
+        assert engine._breaker.failure_count == 0
+        assert engine._scheduler.limit == _GEMINI_SETTINGS.max_concurrency
+        assert await engine._cache.get(engine._cache_key("cmd", {})) is None
+        await engine.aclose()
+
+    async def test_slow_call_is_hedged(self) -> None:
+        calls = 0
+
+        class _TailModel(_FakeModel):
+            async def generate_content_async(self, prompt: str) -> Any:
+                nonlocal calls
+                calls += 1
+                if calls == 1:
+                    await asyncio.sleep(5)
+                return await super().generate_content_async(prompt)
+
+        settings = _GEMINI_SETTINGS.model_copy(update={"hedge_min_samples": 1})
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _TailModel):
+            engine = GeminiAnalysisEngine(settings)
+            engine._latencies[engine._model_key] = window = LatencyWindow(min_samples=1)
+            window.record(0.01)
+            result = await asyncio.wait_for(engine.analyze("cmd", {}), timeout=1.0)
+        assert result.risk_level == RiskLevel.LOW
+        assert calls == 2
+
+
+class _StreamingModel(_FakeModel):
+    """Streams a verdict in chunks; the details arrive only after *release*."""
+
+    release: asyncio.Event
+
+    async def generate_content_async(self, prompt: str, stream: bool = False) -> Any:
+        assert stream
+        release = type(self).release
+
+        class _Stream:
+            usage_metadata = None
+
+            async def __aiter__(self) -> Any:
+                yield MagicMock(text='{"risk_level": "HIGH", ')
+                await release.wait()
+                yield MagicMock(text='"explanation": "Unlocks the door"}')
+
+        return _Stream()
+
+
+class TestStreaming:
+    """The risk level is reported before the rest of the response arrives."""
+
+    async def test_risk_level_resolves_before_result(self) -> None:
+        _StreamingModel.release = asyncio.Event()
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _StreamingModel):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+            streamed = engine.analyze_streaming("unlock door", {"device_id": "d1"})
+            assert await asyncio.wait_for(streamed.risk_level, 1.0) is RiskLevel.HIGH
+            assert not streamed.result.done()
+            _StreamingModel.release.set()
+            result = await asyncio.wait_for(streamed.result, 1.0)
+        assert result.explanation == "Unlocks the door"
+        cached = await engine._get_cached(engine._cache_key("unlock door", {"device_id": "d1"}))
+        assert cached is not None and cached.risk_level is RiskLevel.HIGH
+
+    async def test_cached_verdict_resolves_both(self) -> None:
+        engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+        verdict = AnalysisResult(risk_level=RiskLevel.LOW, explanation="cached")
+        await engine._set_cached(engine._cache_key("cmd", {}), verdict)
+        streamed = engine.analyze_streaming("cmd", {})
+        assert await streamed.risk_level is RiskLevel.LOW
+        assert (await streamed.result).explanation == "cached"
+
+
+class TestModelPool:
+    """The configured model is built once and reused across calls."""
+
+    async def test_model_created_once_at_startup(self) -> None:
+        _FakeModel.created = 0
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _FakeModel):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+            assert _FakeModel.created == 1
+            for i in range(3):
+                await engine.analyze(f"cmd{i}", {})
+        assert _FakeModel.created == 1
+
+    def test_no_model_without_api_key(self) -> None:
+        settings = _GEMINI_SETTINGS.model_copy(update={"api_key": SecretStr("")})
+        engine = GeminiAnalysisEngine(settings)
+        assert len(engine._models) == 0
+
+    async def test_warm_up_calls_model(self) -> None:
+        with patch("iotguard.analysis.engines.gemini.genai.GenerativeModel", _FakeModel):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+            assert await engine.warm_up() is True
+
+    async def test_warm_up_failure_is_swallowed(self) -> None:
+        model = MagicMock()
+        model.generate_content_async = AsyncMock(side_effect=RuntimeError("down"))
+        with patch(
+            "iotguard.analysis.engines.gemini.genai.GenerativeModel", return_value=model
+        ):
+            engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+            assert await engine.warm_up() is False
+        assert engine._breaker.failure_count == 0
+
+    async def test_warm_up_skipped_without_api_key(self) -> None:
+        settings = _GEMINI_SETTINGS.model_copy(update={"api_key": SecretStr("")})
+        assert await GeminiAnalysisEngine(settings).warm_up() is False
+
+
 class TestCaching:
     """The engine caches results in Redis when available."""
 
@@ -116,6 +513,12 @@ class TestCaching:
         k2 = engine._cache_key("cmd2", {"device_id": "d1"})
         assert k1 != k2
 
+    def test_cache_key_ignores_whitespace_and_case(self) -> None:
+        engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
+        k1 = engine._cache_key("Lock  door ", {"device_id": "d1"})
+        k2 = engine._cache_key(ParsedCommand.parse("lock door"), {"device_id": "d1"})
+        assert k1 == k2
+
     def test_cache_key_varies_by_context(self) -> None:
         engine = GeminiAnalysisEngine(_GEMINI_SETTINGS)
         k1 = engine._cache_key("cmd", {"device_id": "d1"})
@@ -0,0 +1,98 @@
+"""Unit tests for hedged calls and the latency window."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from iotguard.core.hedging import LatencyWindow, hedged
+
+
+class TestLatencyWindow:
+    def test_no_quantile_before_min_samples(self) -> None:
+        window = LatencyWindow(min_samples=3)
+        window.record(1.0)
+        window.record(2.0)
+        assert window.quantile(0.95) is None
+
+    def test_quantile(self) -> None:
+        window = LatencyWindow(min_samples=1)
+        for i in range(1, 101):
+            window.record(i / 100)
+        assert window.quantile(0.95) == pytest.approx(0.95)
+        assert window.quantile(0.5) == pytest.approx(0.5)
+
+    def test_window_keeps_recent_samples(self) -> None:
+        window = LatencyWindow(size=2, min_samples=1)
+        for value in (5.0, 1.0, 1.0):
+            window.record(value)
+        assert len(window) == 2
+        assert window.quantile(1.0) == 1.0
+
+
+class _Upstream:
+    """First call takes *first_delay* seconds, later calls are fast."""
+
+    def __init__(self, first_delay: float) -> None:
+        self.first_delay = first_delay
+        self.calls = 0
+        self.cancelled = 0
+
+    async def call(self) -> int:
+        self.calls += 1
+        n = self.calls
+        try:
+            await asyncio.sleep(self.first_delay if n == 1 else 0.01)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return n
+
+
+class TestHedged:
+    async def test_fast_call_is_not_hedged(self) -> None:
+        upstream = _Upstream(0.0)
+        result = await hedged(upstream.call, delay=0.05, allow=lambda: True, name="t")
+        assert result == 1
+        assert upstream.calls == 1
+
+    async def test_slow_call_is_hedged_and_loser_cancelled(self) -> None:
+        upstream = _Upstream(5.0)
+        result = await hedged(upstream.call, delay=0.01, allow=lambda: True, name="t")
+        assert result == 2
+        await asyncio.sleep(0)
+        assert upstream.cancelled == 1
+
+    async def test_refused_hedge_waits_for_primary(self) -> None:
+        upstream = _Upstream(0.05)
+        result = await hedged(upstream.call, delay=0.01, allow=lambda: False, name="t")
+        assert result == 1
+        assert upstream.calls == 1
+
+    async def test_disabled_without_delay(self) -> None:
+        upstream = _Upstream(0.05)
+        assert await hedged(upstream.call, delay=None, allow=lambda: True, name="t") == 1
+        assert upstream.calls == 1
+
+    async def test_failed_primary_waits_for_hedge(self) -> None:
+        calls = 0
+
+        async def call() -> int:
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                await asyncio.sleep(0.02)
+                raise RuntimeError("primary failed")
+            await asyncio.sleep(0.05)  # still running when the primary fails
+            return calls
+
+        assert await hedged(call, delay=0.01, allow=lambda: True, name="t") == 2
+
+    async def test_both_failing_raises(self) -> None:
+        async def call() -> int:
+            await asyncio.sleep(0.02)
+            raise RuntimeError("down")
+
+        with pytest.raises(RuntimeError, match="down"):
+            await hedged(call, delay=0.005, allow=lambda: True, name="t")
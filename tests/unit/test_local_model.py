@@ -0,0 +1,134 @@
+"""Unit tests for the local risk classifier and its analysis engine."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("numpy")
+
+import numpy as np
+
+from iotguard.analysis.classifier import (
+    LABELS,
+    RiskClassifier,
+    evaluate,
+    training_label,
+)
+from iotguard.analysis.engines.base import AnalysisEngine
+from iotguard.analysis.engines.local import LocalModelEngine
+from iotguard.analysis.models import RiskLevel
+from iotguard.core.exceptions import ConfigError
+
+_DATA = [
+    ("turn on the light", "light", RiskLevel.NONE),
+    ("turn off the light", "light", RiskLevel.NONE),
+    ("dim the light to 20", "light", RiskLevel.NONE),
+    ("lock the front door", "door_lock", RiskLevel.NONE),
+    ("unlock the front door", "door_lock", RiskLevel.HIGH),
+    ("unlock the back door", "door_lock", RiskLevel.HIGH),
+    ("set temperature to 21", "thermostat", RiskLevel.LOW),
+    ("disable the alarm", "alarm", RiskLevel.CRITICAL),
+    ("arm the alarm", "alarm", RiskLevel.NONE),
+    ("turn off the camera", "camera", RiskLevel.HIGH),
+]
+
+
+@pytest.fixture(scope="module")
+def model() -> RiskClassifier:
+    examples = [(command, device) for command, device, _ in _DATA]
+    labels = [label for *_, label in _DATA]
+    return RiskClassifier.train(examples, labels, dimensions=4096, epochs=150)
+
+
+class TestTrainingLabel:
+    def test_logged_level_is_the_label(self) -> None:
+        assert training_label("low", False) == RiskLevel.LOW
+
+    def test_blocked_commands_are_at_least_high(self) -> None:
+        assert training_label("NONE", True) == RiskLevel.HIGH
+        assert training_label("CRITICAL", True) == RiskLevel.CRITICAL
+
+    def test_unknown_level_is_medium(self) -> None:
+        assert training_label("weird", False) == RiskLevel.MEDIUM
+
+
+class TestClassifier:
+    def test_learns_the_training_set(self, model: RiskClassifier) -> None:
+        report = evaluate(model, [(c, d) for c, d, _ in _DATA], [label for *_, label in _DATA])
+        assert report.accuracy == 1.0
+        assert report.underestimated == 0.0
+
+    def test_generalises_to_rephrasings(self, model: RiskClassifier) -> None:
+        risk, confidence = model.predict("please unlock front door now", "door_lock")
+        assert risk == RiskLevel.HIGH
+        assert 0.0 < confidence <= 1.0
+
+    def test_probabilities_sum_to_one(self, model: RiskClassifier) -> None:
+        proba = model.predict_proba("turn on the light", "light")
+        assert proba.shape == (len(LABELS),)
+        assert float(proba.sum()) == pytest.approx(1.0)
+
+    def test_batch_matches_single(self, model: RiskClassifier) -> None:
+        examples = [("unlock the door", "door_lock"), ("", "*"), ("turn on light", "light")]
+        batch = model.predict_proba_batch(examples)
+        single = np.stack([model.predict_proba(c, d) for c, d in examples])
+        np.testing.assert_allclose(batch, single, rtol=1e-5)
+        assert model.predict_batch([]) == []
+
+    def test_rejects_mismatched_input(self) -> None:
+        with pytest.raises(ValueError):
+            RiskClassifier.train([("x", "*")], [])
+
+
+class TestArtifact:
+    def test_round_trip_is_memory_mapped(self, model: RiskClassifier, tmp_path: Path) -> None:
+        model.save(tmp_path / "model")
+        loaded = RiskClassifier.load(tmp_path / "model")
+
+        assert isinstance(loaded.weights.base, np.memmap)
+        assert loaded.dimensions == model.dimensions
+        assert loaded.meta["samples"] == len(_DATA)
+        np.testing.assert_allclose(
+            loaded.predict_proba("unlock the door", "door_lock"),
+            model.predict_proba("unlock the door", "door_lock"),
+            rtol=1e-5,
+        )
+
+    def test_missing_artifact_is_a_config_error(self, tmp_path: Path) -> None:
+        with pytest.raises(ConfigError):
+            RiskClassifier.load(tmp_path / "nowhere")
+
+    def test_label_mismatch_is_rejected(self, model: RiskClassifier, tmp_path: Path) -> None:
+        path = model.save(tmp_path / "model")
+        meta = json.loads((path / "meta.json").read_text())
+        meta["labels"] = ["SAFE", "UNSAFE"]
+        (path / "meta.json").write_text(json.dumps(meta))
+
+        with pytest.raises(ConfigError):
+            RiskClassifier.load(path)
+
+
+class TestLocalModelEngine:
+    async def test_answers_with_confidence(self, model: RiskClassifier) -> None:
+        engine = LocalModelEngine(model)
+        assert isinstance(engine, AnalysisEngine)
+
+        result = await engine.analyze("unlock the front door", {"device_type": "DOOR_LOCK"})
+
+        assert result.risk_level == RiskLevel.HIGH
+        assert result.confidence is not None and result.confidence > 0.5
+        assert result.was_blocked is False
+        assert "Local model" in result.explanation
+
+    async def test_batch_keeps_order(self, model: RiskClassifier) -> None:
+        engine = LocalModelEngine(model)
+        results = await engine.analyze_batch(
+            [
+                ("turn on the light", {"device_type": "light"}),
+                ("disable the alarm", {"device_type": "alarm"}),
+            ]
+        )
+        assert [r.risk_level for r in results] == [RiskLevel.NONE, RiskLevel.CRITICAL]
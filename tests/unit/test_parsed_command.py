@@ -0,0 +1,45 @@
+"""Unit tests for the shared ParsedCommand stage."""
+
+from __future__ import annotations
+
+from iotguard.analysis.command import ParsedCommand
+
+
+class TestParse:
+    def test_fields(self) -> None:
+        parsed = ParsedCommand.parse("  Set_Temperature   22.5  now ")
+        assert parsed.raw == "  Set_Temperature   22.5  now "
+        assert parsed.normalized == "set_temperature 22.5 now"
+        assert parsed.tokens == ("set_temperature", "22.5", "now")
+        assert parsed.verb == "set_temperature"
+        assert parsed.params == (22.5,)
+        assert parsed.folded == "  set_temperature   22.5  now "
+        assert str(parsed) == parsed.raw
+
+    def test_digest_stable_across_trivial_variants(self) -> None:
+        a = ParsedCommand.parse("LOCK front_door")
+        b = ParsedCommand.parse("lock\tfront_door ")
+        c = ParsedCommand.parse("unlock front_door")
+        assert a.digest == b.digest
+        assert a.digest != c.digest
+
+    def test_empty(self) -> None:
+        parsed = ParsedCommand.parse("   ")
+        assert parsed.tokens == ()
+        assert parsed.verb == ""
+        assert parsed.params == ()
+
+    def test_numeric_params(self) -> None:
+        parsed = ParsedCommand.parse("move -3 +4.5 .5 x1 1e3")
+        assert parsed.params == (-3.0, 4.5, 0.5)
+
+    def test_of_reuses_parsed(self) -> None:
+        parsed = ParsedCommand.parse("reboot")
+        assert ParsedCommand.of(parsed) is parsed
+        assert ParsedCommand.of("reboot") == parsed
+
+    def test_arg_after(self) -> None:
+        parsed = ParsedCommand.parse("set_brightness 75")
+        assert parsed.arg_after("set_brightness") == "75"
+        assert parsed.arg_after("75") is None
+        assert parsed.arg_after("missing") is None
@@ -0,0 +1,73 @@
+"""Unit tests for the shared Redis pool and its consumers."""
+
+from __future__ import annotations
+
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+from redis.asyncio import ConnectionPool
+
+from iotguard.analysis.registry import EngineRegistry
+from iotguard.core.config import GeminiSettings, RedisSettings, Settings
+from iotguard.db.redis import close_redis, get_redis, get_redis_pool, pool_stats
+from iotguard.observability.health import HealthChecker
+
+
+class TestSharedPool:
+    """One pool / client pair is shared until closed."""
+
+    async def test_client_is_singleton(self) -> None:
+        settings = RedisSettings(host="localhost", port=6379, db=15)
+        await close_redis()
+        try:
+            assert get_redis(settings) is get_redis(settings)
+            assert get_redis(settings).connection_pool is get_redis_pool(settings)
+        finally:
+            await close_redis()
+
+    async def test_pool_honours_settings(self) -> None:
+        settings = RedisSettings(max_connections=7, socket_timeout=0.25)
+        await close_redis()
+        try:
+            pool = get_redis_pool(settings)
+            assert pool.max_connections == 7
+            assert pool.connection_kwargs["socket_timeout"] == 0.25
+        finally:
+            await close_redis()
+
+    async def test_pool_stats_shape(self) -> None:
+        await close_redis()
+        try:
+            stats = pool_stats(get_redis_pool(RedisSettings(max_connections=3)))
+            assert stats == {"in_use": 0, "idle": 0, "max_connections": 3}
+        finally:
+            await close_redis()
+
+
+class TestConsumers:
+    """Engines and health checks reuse the injected client."""
+
+    def test_registry_injects_client_into_llm_engine(self, test_settings: Settings) -> None:
+        client = MagicMock()
+        registry = EngineRegistry(test_settings, redis_client=client)
+        assert registry.llm_engine._redis is client
+
+    async def test_health_check_uses_shared_client(self) -> None:
+        client: Any = AsyncMock()
+        client.ping = AsyncMock(return_value=True)
+        client.connection_pool = ConnectionPool(max_connections=2)
+        checker = HealthChecker(
+            session_factory=MagicMock(),
+            redis_settings=RedisSettings(),
+            gemini_settings=GeminiSettings(),
+            redis_client=client,
+        )
+
+        result = await checker.check_redis()
+
+        assert result == {
+            "status": "healthy",
+            "pool": {"in_use": 0, "idle": 0, "max_connections": 2},
+        }
+        client.ping.assert_awaited_once()
+        client.aclose.assert_not_called()
@@ -0,0 +1,40 @@
+"""Unit tests for the retry budget and jittered backoff."""
+
+from __future__ import annotations
+
+import pytest
+
+from iotguard.core.retry import RetryBudget, backoff_delay
+
+
+class TestRetryBudget:
+    def test_starts_full_then_exhausts(self) -> None:
+        budget = RetryBudget(0.1, min_per_second=0.0, capacity=2.0)
+        assert budget.withdraw()
+        assert budget.withdraw()
+        assert not budget.withdraw()
+
+    def test_deposits_earn_retries(self) -> None:
+        budget = RetryBudget(0.5, min_per_second=0.0, capacity=2.0)
+        budget.withdraw()
+        budget.withdraw()
+        budget.deposit()
+        assert not budget.withdraw()
+        budget.deposit()
+        assert budget.withdraw()
+
+    def test_balance_is_capped(self) -> None:
+        budget = RetryBudget(1.0, min_per_second=0.0, capacity=3.0)
+        for _ in range(10):
+            budget.deposit()
+        assert budget.balance == pytest.approx(3.0)
+
+
+class TestBackoffDelay:
+    def test_delay_is_jittered_within_exponential_bound(self) -> None:
+        delays = [backoff_delay(2, base=0.1, cap=10.0) for _ in range(200)]
+        assert all(0.0 <= d <= 0.4 for d in delays)
+        assert len(set(delays)) > 1
+
+    def test_delay_respects_cap(self) -> None:
+        assert all(backoff_delay(20, base=0.1, cap=1.0) <= 1.0 for _ in range(50))
@@ -0,0 +1,156 @@
+"""Unit tests for replaying command history against candidate rules."""
+
+from __future__ import annotations
+
+import asyncio
+import uuid
+from datetime import UTC, datetime, timedelta
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from iotguard.analysis.rules.backtest import (
+    BacktestJobs,
+    BacktestProgress,
+    BacktestReport,
+    BacktestRunner,
+    RuleSetDiff,
+    RuleSpec,
+    _compile,
+    replay_chunk,
+)
+from iotguard.core.config import RuleSettings
+from iotguard.core.exceptions import BacktestBusyError
+from iotguard.db.models import CommandLog, Device, SecurityRule
+
+
+def _row(
+    command: str, device_type: str | None = None
+) -> tuple[str, str, str, None, str | None, None]:
+    return (str(uuid.uuid4()), "2026-01-01T00:00:00", command, None, device_type, None)
+
+
+class TestRuleSetDiff:
+    def test_upsert_replaces_and_adds(self) -> None:
+        baseline = [RuleSpec("a", "x"), RuleSpec("b", "y"), RuleSpec("c", "z")]
+        diff = RuleSetDiff(
+            upsert=(RuleSpec("b", "yy", "WARN"), RuleSpec("d", "w")),
+            remove=("c",),
+        )
+        candidate = diff.apply(baseline)
+        assert [(s.name, s.pattern) for s in candidate] == [("a", "x"), ("b", "yy"), ("d", "w")]
+
+
+class TestReplayChunk:
+    """Outcomes compare the candidate rule set against the baseline."""
+
+    def test_classifies_outcomes(self) -> None:
+        baseline = _compile(
+            [RuleSpec("rm", r"rm\s+-rf"), RuleSpec("reboot", r"reboot", "WARN")], "literal"
+        )
+        candidate = _compile(
+            [RuleSpec("reboot", r"reboot"), RuleSpec("unlock", r"unlock", "WARN")], "literal"
+        )
+        rows = [
+            _row("rm -rf /"),  # newly allowed
+            _row("reboot now"),  # newly blocked
+            _row("unlock door"),  # changed risk
+            _row("turn_on light"),  # unchanged
+        ]
+
+        report = replay_chunk(rows, baseline, candidate, sample_limit=10)
+
+        assert (report.scanned, report.unchanged) == (4, 1)
+        assert (report.newly_blocked, report.newly_allowed, report.changed_risk) == (1, 1, 1)
+        sample = report.samples["newly_blocked"][0]
+        assert sample.command == "reboot now"
+        assert (sample.risk_before, sample.risk_after) == ("HIGH", "CRITICAL")
+        assert sample.rules_after == ("reboot",)
+
+    def test_respects_device_scope(self) -> None:
+        baseline = _compile([], "literal")
+        candidate = _compile([RuleSpec("lock", r"unlock", device_types=("lock",))], "literal")
+        report = replay_chunk(
+            [_row("unlock", "lock"), _row("unlock", "camera")], baseline, candidate, 10
+        )
+        assert report.newly_blocked == 1
+
+    def test_sample_limit(self) -> None:
+        baseline = _compile([], "literal")
+        candidate = _compile([RuleSpec("x", r"x")], "literal")
+        report = replay_chunk([_row("x")] * 5, baseline, candidate, sample_limit=2)
+        assert report.newly_blocked == 5
+        assert len(report.samples["newly_blocked"]) == 2
+
+    def test_state_predicates_do_not_exclude_rules(self) -> None:
+        baseline = _compile([], "literal")
+        candidate = _compile(
+            [RuleSpec("disarm", r"disarm", state_predicates={"alarm": "armed"})], "literal"
+        )
+        report = replay_chunk([_row("disarm")], baseline, candidate, 10)
+        assert report.newly_blocked == 1
+
+
+class TestBacktestJobs:
+    async def test_second_job_rejected_while_one_runs(self) -> None:
+        release = asyncio.Event()
+
+        async def run(*args: object, **kwargs: object) -> BacktestReport:
+            await release.wait()
+            return BacktestReport()
+
+        runner = MagicMock(run=run)
+        jobs = BacktestJobs()
+        first = jobs.start(runner, RuleSetDiff())
+        with pytest.raises(BacktestBusyError):
+            jobs.start(runner, RuleSetDiff())
+
+        release.set()
+        assert first.task is not None
+        await first.task
+        assert first.status == "completed"
+        assert jobs.start(runner, RuleSetDiff()).status == "running"
+        await jobs.cancel_all()
+
+
+class TestBacktestRunner:
+    """End to end over command_logs, with a worker process."""
+
+    async def test_streams_window(self, db_engine: AsyncEngine) -> None:
+        now = datetime.now(UTC)
+        async with AsyncSession(db_engine) as session:
+            device = Device(id=uuid.uuid4(), device_id="lock-1", name="L", device_type="lock")
+            session.add(device)
+            session.add(SecurityRule(name="rm", pattern=r"rm\s+-rf", action="BLOCK", priority=1))
+            for i, command in enumerate(["rm -rf /", "unlock", "unlock", "status", "unlock"]):
+                session.add(
+                    CommandLog(
+                        timestamp=now - timedelta(minutes=i),
+                        device_id=device.id,
+                        command=command,
+                        risk_level="NONE",
+                    )
+                )
+            # Outside the window
+            session.add(
+                CommandLog(timestamp=now - timedelta(days=2), command="unlock", risk_level="NONE")
+            )
+            await session.commit()
+
+        settings = RuleSettings(backtest_workers=1, backtest_chunk_size=2, backtest_sample_limit=1)
+        progress: list[BacktestProgress] = []
+        diff = RuleSetDiff(
+            upsert=(RuleSpec("unlock", r"unlock", device_types=("lock",)),), remove=("rm",)
+        )
+
+        report = await BacktestRunner(db_engine, settings).run(
+            diff, since=now - timedelta(days=1), progress=progress.append
+        )
+
+        assert report.scanned == 5
+        assert report.newly_blocked == 3
+        assert report.newly_allowed == 1
+        assert report.unchanged == 1
+        assert len(report.samples["newly_blocked"]) == 1
+        assert progress[-1] == BacktestProgress(processed=5, total=5)
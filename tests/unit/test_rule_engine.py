@@ -8,6 +8,7 @@ from unittest.mock import AsyncMock, MagicMock
 
 import pytest
 
+from iotguard.analysis.rules.compiled import RuleSetStore
 from iotguard.analysis.rules.engine import RuleEvaluationResult, RuleMatch, SecurityRuleEngine
 from iotguard.db.models import SecurityRule
 
@@ -21,15 +22,22 @@ def _rule(
     description: str = "",
 ) -> SecurityRule:
     """Helper to build a SecurityRule without touching the DB."""
-    r = SecurityRule.__new__(SecurityRule)
-    r.id = uuid.uuid4()
-    r.name = name
-    r.pattern = pattern
-    r.action = action
-    r.priority = priority
-    r.is_active = is_active
-    r.description = description or name
-    return r
+    return SecurityRule(
+        id=uuid.uuid4(),
+        name=name,
+        pattern=pattern,
+        action=action,
+        priority=priority,
+        is_active=is_active,
+        description=description or name,
+    )
+
+
+def _engine(repo: Any) -> SecurityRuleEngine:
+    """Helper to build an engine with its own rule store and a mocked repo."""
+    engine = SecurityRuleEngine(AsyncMock(), rule_store=RuleSetStore())
+    engine._repo = repo
+    return engine
 
 
 class TestPatternMatching:
@@ -41,9 +49,7 @@ class TestPatternMatching:
             _rule("no-rm", r"rm\s+-rf", "BLOCK", 10),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         result = await engine.evaluate("rm -rf /tmp")
         assert result.has_matches
@@ -55,9 +61,7 @@ class TestPatternMatching:
             _rule("no-format", r"FORMAT", "BLOCK", 10),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         result = await engine.evaluate("format disk_c")
         assert result.has_matches
@@ -68,9 +72,7 @@ class TestPatternMatching:
             _rule("no-rm", r"rm\s+-rf", "BLOCK", 10),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         result = await engine.evaluate("turn_on light")
         assert not result.has_matches
@@ -83,9 +85,7 @@ class TestPatternMatching:
             _rule("good-rule", r"unlock", "WARN", 20),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         result = await engine.evaluate("unlock door")
         # Bad regex skipped, good rule matches
@@ -104,9 +104,7 @@ class TestPriorityOrdering:
             _rule("mid-priority", r"door", "LOG", 100),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         result = await engine.evaluate("unlock door")
         assert len(result.matches) == 3
@@ -124,9 +122,7 @@ class TestActions:
             _rule("block-rule", r"dangerous", "BLOCK", 10),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         result = await engine.evaluate("dangerous command")
         assert result.blocked is True
@@ -138,9 +134,7 @@ class TestActions:
             _rule("warn-rule", r"suspicious", "WARN", 10),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         result = await engine.evaluate("suspicious activity")
         assert not result.blocked
@@ -152,9 +146,7 @@ class TestActions:
             _rule("log-rule", r"monitor", "LOG", 10),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         result = await engine.evaluate("monitor this")
         assert not result.blocked
@@ -168,9 +160,7 @@ class TestActions:
             _rule("block-it", r"cmd", "BLOCK", 10),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         result = await engine.evaluate("cmd execute")
         assert result.blocked is True
@@ -188,9 +178,7 @@ class TestRuleCaching:
             _rule("r1", r"x", "BLOCK", 10),
         ])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         rules1 = await engine.load_rules()
         rules2 = await engine.load_rules()
@@ -201,16 +189,74 @@ class TestRuleCaching:
         mock_repo = AsyncMock()
         mock_repo.list_active = AsyncMock(return_value=[])
 
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._repo = mock_repo
-        engine._cached_rules = None
+        engine = _engine(mock_repo)
 
         await engine.load_rules()
         await engine.load_rules(force=True)
         assert mock_repo.list_active.call_count == 2
 
-    def test_invalidate_cache(self) -> None:
-        engine = SecurityRuleEngine.__new__(SecurityRuleEngine)
-        engine._cached_rules = [_rule("r", "x")]
+    async def test_invalidate_cache(self) -> None:
+        mock_repo = AsyncMock()
+        mock_repo.list_active = AsyncMock(return_value=[_rule("r", "x")])
+
+        engine = _engine(mock_repo)
+
+        await engine.load_rules()
         engine.invalidate_cache()
-        assert engine._cached_rules is None
+        await engine.load_rules()
+        assert mock_repo.list_active.call_count == 2
+
+    async def test_rule_set_shared_between_engines(self) -> None:
+        mock_repo = AsyncMock()
+        mock_repo.list_active = AsyncMock(return_value=[_rule("r", "x")])
+        store = RuleSetStore()
+
+        first = SecurityRuleEngine(AsyncMock(), rule_store=store)
+        first._repo = mock_repo
+        second = SecurityRuleEngine(AsyncMock(), rule_store=store)
+        second._repo = mock_repo
+
+        await first.evaluate("x")
+        await second.evaluate("x")
+        assert mock_repo.list_active.call_count == 1
+
+
+class TestEvaluateMany:
+    """Batch evaluation agrees with per-command evaluation."""
+
+    async def test_matches_evaluate(self) -> None:
+        mock_repo = AsyncMock()
+        mock_repo.list_active = AsyncMock(return_value=[
+            _rule("no-rm", r"rm\s+-rf", "BLOCK", 10),
+            _rule("warn-door", r"unlock", "WARN", 20),
+            _rule("log-all", r".", "LOG", 30),
+        ])
+        engine = _engine(mock_repo)
+        commands = ["rm -rf /", "unlock door", "turn_on light", "", "rm -rf /"]
+
+        batch = await engine.evaluate_many(commands)
+        single = [await engine.evaluate(c) for c in commands]
+
+        assert batch == single
+        assert [r.blocked for r in batch] == [True, False, False, False, True]
+        assert mock_repo.list_active.call_count == 1
+
+    async def test_empty_batch(self) -> None:
+        mock_repo = AsyncMock()
+        mock_repo.list_active = AsyncMock(return_value=[_rule("r", "x")])
+        engine = _engine(mock_repo)
+
+        assert await engine.evaluate_many([]) == []
+
+    async def test_duplicates_counted_for_ordering(self) -> None:
+        rule = _rule("r", "x")
+        mock_repo = AsyncMock()
+        mock_repo.list_active = AsyncMock(return_value=[rule])
+        store = RuleSetStore()
+        engine = SecurityRuleEngine(AsyncMock(), rule_store=store)
+        engine._repo = mock_repo
+
+        await engine.evaluate_many(["x", "x", "y"])
+        hits, evaluations = store.counters.drain()
+        assert hits == {rule.id: 2}
+        assert evaluations == {rule.id: 3}
@@ -0,0 +1,235 @@
+"""Unit tests for time-budgeted rule execution and quarantine."""
+
+from __future__ import annotations
+
+import re
+import threading
+import time
+import uuid
+from collections.abc import Iterator
+from typing import Any
+from unittest.mock import AsyncMock
+
+import pytest
+
+from iotguard.analysis.rules.compiled import CompiledRuleSet, RuleSetStore
+from iotguard.analysis.rules.guard import RuleGuard
+from iotguard.analysis.rules.safety import is_backtracking_prone
+from iotguard.analysis.rules.validation import PatternValidator
+from iotguard.core.config import RuleSettings
+from iotguard.db.models import SecurityRule
+
+
+def _rule(name: str, pattern: str, action: str = "BLOCK") -> SecurityRule:
+    return SecurityRule(id=uuid.uuid4(), name=name, pattern=pattern, action=action, priority=10)
+
+
+class _SlowPattern:
+    """Stands in for a regex whose search exceeds any sensible budget."""
+
+    pattern = "slow"
+    flags = 0
+
+    def search(self, string: str, pos: int = 0) -> None:
+        time.sleep(0.02)
+        return None
+
+
+@pytest.fixture
+def guard() -> Iterator[RuleGuard]:
+    guard = RuleGuard(budget_ms=5, quarantine_after=2)
+    guard.warm()
+    yield guard
+    guard.close()
+
+
+def _admit(guard: RuleGuard, rule: SecurityRule) -> None:
+    guard.admit(str(rule.id), rule.name, cheap=True)
+
+
+class TestStaticDetection:
+    @pytest.mark.parametrize(
+        "pattern",
+        [
+            r"(a+)+$",
+            r"(a|aa)*b",
+            r"(\w+\s?)*$",
+            r"(.)\1",
+            r"(.*a){12}",
+            r".*.*.*=.*x",
+            r"(\d|\w)+!",
+            r"a{1,30}a{1,30}a{1,30}b",
+        ],
+    )
+    def test_prone(self, pattern: str) -> None:
+        assert is_backtracking_prone(pattern)
+
+    @pytest.mark.parametrize(
+        "pattern",
+        [
+            r"(rm\s+-rf|format|mkfs)",
+            r"set_temperature\s+(3[5-9]|\d{3,})",
+            r"(?:ab)+",
+            r"(a++)+",
+            r"firmware\s+(update|flash)+",
+            r"(\d{1,3}\.){3}\d{1,3}",
+            r"set_wifi\s+ssid=.*password=.*",
+            r"unlock.*door",
+        ],
+    )
+    def test_linear(self, pattern: str) -> None:
+        assert not is_backtracking_prone(pattern)
+
+
+class TestAccounting:
+    def test_hits_and_evaluations_recorded(self, guard: RuleGuard) -> None:
+        rule = _rule("unlock", r"unlock")
+        rule_set = CompiledRuleSet.compile([rule], version=1, guard=guard)
+
+        assert [r.name for r in rule_set.match("unlock door")] == ["unlock"]
+        rule_set.match("lock door")
+
+        stats = guard.stats(str(rule.id))
+        assert stats is not None
+        assert stats.hits == 1
+        assert stats.evaluations >= 1
+        assert stats.total_seconds > 0
+
+    def test_stats_survive_reload_but_reset_on_pattern_change(self, guard: RuleGuard) -> None:
+        rule = _rule("unlock", r"unlock")
+        CompiledRuleSet.compile([rule], version=1, guard=guard).match("unlock")
+        CompiledRuleSet.compile([rule], version=2, guard=guard)
+        assert guard.stats(str(rule.id)).hits == 1  # type: ignore[union-attr]
+
+        rule.pattern = r"open"
+        CompiledRuleSet.compile([rule], version=3, guard=guard)
+        assert guard.stats(str(rule.id)).hits == 0  # type: ignore[union-attr]
+
+
+class TestQuarantine:
+    def test_repeated_overruns_flag_rule_but_keep_it_running(self) -> None:
+        guard = RuleGuard(budget_ms=5, quarantine_after=2, sandbox_enabled=False)
+        pattern = guard.wrap("k", "slow", re.compile("slow"))
+        pattern._regex = _SlowPattern()  # type: ignore[assignment]
+
+        pattern.search("x")
+        assert not pattern.stats.quarantined
+        pattern.search("x")
+        assert pattern.stats.quarantined
+        assert guard.quarantined_count() == 1
+        assert guard.overruns == 2
+
+        evaluations = pattern.stats.evaluations
+        pattern.search("slow")
+        assert pattern.stats.evaluations == evaluations + 1
+
+    def test_overrun_moves_admitted_rule_back_into_sandbox(self, guard: RuleGuard) -> None:
+        pattern = guard.wrap("k", "slow", re.compile("slow"))
+        guard.admit("k", "slow", cheap=True)
+        assert not pattern.stats.sandboxed
+        pattern._regex = _SlowPattern()  # type: ignore[assignment]
+
+        pattern.search("x")
+        assert pattern.stats.sandboxed
+        assert not pattern.stats.quarantined
+
+    def test_catastrophic_pattern_is_sandboxed_and_bounded(self, guard: RuleGuard) -> None:
+        unlock = _rule("unlock", r"unlock")
+        rule_set = CompiledRuleSet.compile(
+            [_rule("evil", r"(a+)+$", action="WARN"), unlock], version=1, guard=guard
+        )
+        _admit(guard, unlock)
+        evil = "a" * 40 + "!"
+
+        start = time.perf_counter()
+        matched = [r.name for r in rule_set.match(evil + " unlock")]
+        assert time.perf_counter() - start < 5
+
+        assert matched == ["unlock"]
+        stats = rule_set.stats[0]
+        assert stats.sandboxed
+        assert stats.overruns == 1
+        guard.warm()
+        assert [r.name for r in rule_set.match("aaa")] == ["evil"]
+        assert stats.overruns == 1
+
+    def test_block_rule_fails_closed_on_timeout(self, guard: RuleGuard) -> None:
+        rule_set = CompiledRuleSet.compile([_rule("evil", r"(a+)+$")], version=1, guard=guard)
+        evil = "a" * 40 + "!"
+
+        for _ in range(3):
+            assert [r.name for r in rule_set.match(evil)] == ["evil"]
+            guard.warm()
+        stats = rule_set.stats[0]
+        assert stats.quarantined
+        assert stats.evaluations == 3
+
+    def test_block_rule_fails_closed_while_sandbox_starts(
+        self, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        guard = RuleGuard(budget_ms=5)
+        monkeypatch.setattr(guard._sandbox, "start", lambda: None)
+        rule_set = CompiledRuleSet.compile(
+            [_rule("evil", r"(a+)+$"), _rule("noisy", r"(b+)+$", action="LOG")],
+            version=1,
+            guard=guard,
+        )
+
+        assert [r.name for r in rule_set.match("a blob")] == ["evil"]
+        assert guard.overruns == 2
+        assert all(not s.overruns for s in rule_set.stats)
+
+
+class TestProbation:
+    def test_new_rules_start_in_the_sandbox(self, guard: RuleGuard) -> None:
+        rule = _rule("unlock", r"unlock")
+        rule_set = CompiledRuleSet.compile([rule], version=1, guard=guard)
+        stats = rule_set.stats[0]
+        assert stats.sandboxed
+        assert not stats.validated
+
+        _admit(guard, rule)
+        assert not stats.sandboxed
+        assert stats.validated
+
+    def test_costly_rule_stays_sandboxed(self, guard: RuleGuard) -> None:
+        rule_set = CompiledRuleSet.compile([_rule("evil", r"(a+)+$")], version=1, guard=guard)
+        guard.admit(rule_set.rules[0].key, "evil", cheap=False)
+        assert rule_set.stats[0].sandboxed
+
+    def test_rejected_rule_is_quarantined(self, guard: RuleGuard) -> None:
+        rule_set = CompiledRuleSet.compile([_rule("evil", r"(a+)+$")], version=1, guard=guard)
+        guard.reject(rule_set.rules[0].key, "evil", "too slow")
+        assert rule_set.stats[0].quarantined
+        assert rule_set.stats[0].sandboxed
+
+    async def test_sandboxed_rules_are_awaited_off_the_loop(self, guard: RuleGuard) -> None:
+        rule_set = CompiledRuleSet.compile([_rule("unlock", r"unlock")], version=1, guard=guard)
+        threads: list[str] = []
+        run = guard._sandbox.run
+
+        def _run(*args: Any) -> bool:
+            threads.append(threading.current_thread().name)
+            return run(*args)
+
+        guard._sandbox.run = _run  # type: ignore[method-assign]
+        matched = await rule_set.match_async("unlock door")
+
+        assert [r.name for r in matched] == ["unlock"]
+        assert threads and threading.current_thread().name not in threads
+
+    async def test_store_validates_loaded_rules(self, guard: RuleGuard) -> None:
+        cheap, costly = _rule("unlock", r"unlock"), _rule("evil", r"(a+)+$", action="WARN")
+        repo = AsyncMock()
+        repo.list_active = AsyncMock(return_value=[cheap, costly])
+        validator = PatternValidator(RuleSettings(validation_timeout_ms=300))
+        try:
+            store = RuleSetStore(guard=guard, validator=validator)
+            rule_set = await store.get(repo)
+        finally:
+            validator.close()
+
+        stats = {r.name: s for r, s in zip(rule_set.rules, rule_set.stats, strict=True)}
+        assert stats["unlock"].validated and not stats["unlock"].sandboxed
+        assert stats["evil"].sandboxed
+        assert stats["evil"].quarantined  # rejected: exceeds the validation budget
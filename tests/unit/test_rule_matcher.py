@@ -0,0 +1,128 @@
+"""Unit tests for rule literal extraction and the matcher back-ends."""
+
+from __future__ import annotations
+
+import re
+
+import pytest
+
+from iotguard.analysis.rules.literals import literal_prefixes, required_literals
+from iotguard.analysis.rules.matcher import (
+    MATCHER_BACKENDS,
+    AhoCorasick,
+    LoopMatcher,
+    PrefixDispatchMatcher,
+    RequiredLiteralMatcher,
+    build_matcher,
+)
+
+PATTERNS = [
+    r"(rm\s+-rf|format|fdisk|mkfs|dd\s+if=)",
+    r"(flash_firmware|update_firmware|ota_update)",
+    r"unlock",
+    r"\bunlock\b",
+    r"set_temperature\s+(3[5-9]|[4-9]\d|\d{3,})",
+    r"(start_recording|stop_recording|record)",
+    r"(set_wifi|change_ssid|set_proxy|set_dns)",
+    r"^reboot",
+    r"\d+\s*volts",
+    r"(?<!safe_)delete",
+    r"x",
+    r"[ab]cd",
+]
+
+COMMANDS = [
+    "",
+    "rm -rf /",
+    "RM  -RF /tmp",
+    "please UNLOCK the door",
+    "unlocked",
+    "set_temperature 37",
+    "set_temperature 20",
+    "reboot now",
+    "now reboot",
+    "apply 240 volts",
+    "safe_delete file",
+    "delete file",
+    "xylophone",
+    "BCD",
+    "stop_recording; set_dns 8.8.8.8",
+    "ünlock the door",
+    "set_temperature 99 ünicode",
+]
+
+
+class TestLiteralPrefixes:
+    """Prefixes are extracted from the parsed pattern, lower-cased."""
+
+    @pytest.mark.parametrize(
+        ("pattern", "expected"),
+        [
+            (r"Unlock", ("unlock",)),
+            (r"(rm\s+-rf|format|dd\s+if=)", ("rm", "format", "dd")),
+            (r"\bfactory[_ ]reset", ("factory_reset", "factory reset")),
+            (r"(?x) un lock", ("unlock",)),
+            (r"(ab)+c", ("ab",)),
+        ],
+    )
+    def test_extracted(self, pattern: str, expected: tuple[str, ...]) -> None:
+        assert literal_prefixes(pattern) == expected
+
+    @pytest.mark.parametrize("pattern", [r"\d+abc", r"a?b", r"(x|)", r"[oops(", "ÄBC"])
+    def test_no_usable_prefix(self, pattern: str) -> None:
+        assert literal_prefixes(pattern) == ()
+
+
+class TestRequiredLiterals:
+    """Required literals may sit anywhere in the pattern."""
+
+    @pytest.mark.parametrize(
+        ("pattern", "expected"),
+        [
+            (r"\d+\s*Volts", ("volts",)),
+            (r"(?<!safe_)delete", ("delete",)),
+            (r"(?i:factory).*reset_all", ("reset_all",)),
+            (r"(rm\s+-rf|format|mkfs)", ("-rf", "format", "mkfs")),
+            (r"set_temperature\s+(3[5-9]|\d{3,})", ("set_temperature",)),
+        ],
+    )
+    def test_extracted(self, pattern: str, expected: tuple[str, ...]) -> None:
+        assert required_literals(pattern) == expected
+
+    @pytest.mark.parametrize("pattern", [r".*", r"(foo|\d+)", r"\w+", r"[oops("])
+    def test_none_provable(self, pattern: str) -> None:
+        assert required_literals(pattern) == ()
+
+
+class TestAhoCorasick:
+    """The automaton reports every keyword occurrence, overlaps included."""
+
+    def test_overlapping_keywords(self) -> None:
+        automaton = AhoCorasick([("he", 0), ("she", 1), ("his", 2), ("hers", 3)])
+        assert automaton.find("ushers") == {0, 1, 3}
+        assert automaton.find("nothing") == set()
+
+
+class TestMatcherEquivalence:
+    """Every back-end must agree with a per-rule ``re.search``."""
+
+    @pytest.mark.parametrize("backend", MATCHER_BACKENDS)
+    @pytest.mark.parametrize("command", COMMANDS)
+    def test_backend_matches_loop(self, backend: str, command: str) -> None:
+        regexes = [re.compile(p, re.IGNORECASE) for p in PATTERNS]
+        expected = LoopMatcher(regexes).match(command)
+        assert build_matcher(backend, regexes).match(command) == expected
+
+    def test_short_and_unprefixed_rules_are_residual(self) -> None:
+        regexes = [re.compile(p, re.IGNORECASE) for p in (r"x", r"\d+", r"unlock")]
+        assert PrefixDispatchMatcher(regexes).indexed_count == 1
+
+    def test_unliteral_rules_always_run(self) -> None:
+        regexes = [re.compile(p, re.IGNORECASE) for p in (r"\w+\d", r"unlock")]
+        matcher = RequiredLiteralMatcher(regexes)
+        assert matcher.indexed_count == 1
+        assert matcher.match("door7") == [0]
+
+    def test_build_matcher_rejects_unknown_backend(self) -> None:
+        with pytest.raises(ValueError, match="Unknown rule matcher"):
+            build_matcher("dfa", [])
@@ -0,0 +1,160 @@
+"""Unit tests for the rule verdict memo."""
+
+from __future__ import annotations
+
+import uuid
+from unittest.mock import AsyncMock
+
+from iotguard.analysis.command import ParsedCommand
+from iotguard.analysis.rules.compiled import CompiledRuleSet, RuleSetStore
+from iotguard.analysis.rules.guard import RuleGuard
+from iotguard.analysis.rules.memo import VerdictMemo, folds_case, normalize_command
+from iotguard.db.models import SecurityRule
+from iotguard.observability.metrics import (
+    rule_verdict_cache_evictions_total,
+    rule_verdict_cache_requests_total,
+)
+
+
+def _rule(name: str, pattern: str, action: str = "BLOCK", **scope: object) -> SecurityRule:
+    return SecurityRule(
+        id=uuid.uuid4(), name=name, pattern=pattern, action=action, priority=10, **scope
+    )
+
+
+def _hits() -> float:
+    return rule_verdict_cache_requests_total.labels(result="hit")._value.get()
+
+
+class TestNormalize:
+    def test_folds_ascii_case_only(self) -> None:
+        assert normalize_command("Lock DOOR") == "lock door"
+        assert normalize_command("lock  door") == "lock  door"
+        assert normalize_command("İSTANBUL") == "İSTANBUL"
+
+    def test_case_sensitive_groups_disable_folding(self) -> None:
+        assert folds_case([r"rm\s+-rf", r"(?s:a.b)", r"(?i:x)"])
+        assert not folds_case([r"unlock", r"(?-i:REBOOT)"])
+        assert not folds_case([r"(?s-i:HALT.)"])
+
+
+class TestVerdictMemo:
+    def test_lru_eviction(self) -> None:
+        memo = VerdictMemo(2)
+        evictions = rule_verdict_cache_evictions_total._value.get()
+        memo.put(1, "a", (1,))
+        memo.put(1, "b", (2,))
+        assert memo.get(1, "a") == (1,)
+        memo.put(1, "c", (3,))
+
+        assert memo.get(1, "b") is None
+        assert memo.get(1, "a") == (1,)
+        assert len(memo) == 2
+        assert rule_verdict_cache_evictions_total._value.get() == evictions + 1
+
+    def test_new_version_drops_entries(self) -> None:
+        memo = VerdictMemo(10)
+        memo.put(1, "a", (1,))
+        assert memo.get(2, "a") is None
+        assert len(memo) == 0
+        # A stale snapshot cannot repopulate the memo.
+        memo.put(1, "a", (1,))
+        assert len(memo) == 0
+
+
+class TestMemoisedMatch:
+    def test_repeated_command_served_from_memo(self) -> None:
+        memo = VerdictMemo(10)
+        rule_set = CompiledRuleSet.compile([_rule("rm", r"rm\s+-rf")], version=1, memo=memo)
+        before = _hits()
+
+        first = rule_set.match("rm -rf /")
+        second = rule_set.match("RM -RF /")
+
+        assert [r.name for r in first] == [r.name for r in second] == ["rm"]
+        assert _hits() == before + 1
+
+    def test_case_sensitive_rule_not_bypassed_by_folded_key(self) -> None:
+        memo = VerdictMemo(10)
+        rule_set = CompiledRuleSet.compile(
+            [_rule("reboot", r"(?-i:REBOOT)")], version=1, memo=memo
+        )
+        assert not rule_set.fold_case
+        for _ in range(2):
+            assert rule_set.match("reboot now") == []
+            assert [r.name for r in rule_set.match("REBOOT now")] == ["reboot"]
+            parsed = ParsedCommand.parse("REBOOT now")
+            assert [r.name for r in rule_set.match(parsed, first_block=True)] == ["reboot"]
+
+    def test_first_block_keyed_separately(self) -> None:
+        memo = VerdictMemo(10)
+        rule_set = CompiledRuleSet.compile(
+            [_rule("a", "door"), _rule("b", "door", "WARN")], version=1, memo=memo
+        )
+        assert len(rule_set.match("door", first_block=True)) == 1
+        assert len(rule_set.match("door")) == 2
+
+    def test_scope_is_part_of_key(self) -> None:
+        memo = VerdictMemo(10)
+        rule_set = CompiledRuleSet.compile(
+            [
+                _rule("lock", "unlock", device_types=["lock"]),
+                _rule("front", "open", device_ids=["front"]),
+                _rule("armed", "disarm", state_predicates={"alarm": "armed"}),
+            ],
+            version=1,
+            memo=memo,
+        )
+        for _ in range(2):
+            assert rule_set.match("unlock", context={"device_type": "lock"})
+            assert not rule_set.match("unlock", context={"device_type": "camera"})
+            assert rule_set.match("open", context={"device_id": "front"})
+            assert not rule_set.match("open", context={"device_id": "back"})
+            assert rule_set.match("open", context={"device_id": "x", "device_pk": "front"})
+            assert rule_set.match("disarm", context={"state": {"alarm": "armed"}})
+            assert not rule_set.match("disarm", context={"state": {"alarm": "off"}})
+
+    def test_counters_see_memo_hits(self) -> None:
+        store = RuleSetStore(memo_size=10)
+        rule = _rule("x", "x")
+        rule_set = CompiledRuleSet.compile(
+            [rule], version=1, counters=store.counters, memo=store.memo
+        )
+        rule_set.match("x")
+        rule_set.match("x")
+        hits, evaluations = store.counters.drain()
+        assert hits == {rule.id: 2}
+        assert evaluations == {rule.id: 2}
+
+    def test_rule_stats_count_memo_hits(self) -> None:
+        guard = RuleGuard(sandbox_enabled=False)
+        rule = _rule("x", "x")
+        rule_set = CompiledRuleSet.compile([rule], version=1, guard=guard, memo=VerdictMemo(10))
+        rule_set.match("x")
+        rule_set.match("x")
+        assert guard.stats(str(rule.id)).hits == 2  # type: ignore[union-attr]
+
+    def test_overrun_verdict_not_memoised(self) -> None:
+        # No search finishes within a nanosecond.
+        guard = RuleGuard(budget_ms=1e-6, quarantine_after=100, sandbox_enabled=False)
+        memo = VerdictMemo(10)
+        rule_set = CompiledRuleSet.compile(
+            [_rule("slow", "slow")], version=1, guard=guard, memo=memo
+        )
+
+        assert rule_set.match("slow")
+        assert len(memo) == 0
+        assert rule_set.match("slow")
+        assert guard.overruns == 2
+
+
+class TestStoreInvalidation:
+    async def test_bump_invalidates_memo(self) -> None:
+        repo = AsyncMock()
+        repo.list_active = AsyncMock(return_value=[_rule("x", "x")])
+        store = RuleSetStore(memo_size=10)
+
+        assert (await store.get(repo)).match("x")
+        repo.list_active = AsyncMock(return_value=[])
+        store.bump()
+        assert not (await store.get(repo)).match("x")
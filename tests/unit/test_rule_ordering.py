@@ -0,0 +1,144 @@
+"""Unit tests for early-exit evaluation and adaptive rule ordering."""
+
+from __future__ import annotations
+
+import uuid
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from iotguard.analysis.rules.compiled import CompiledRuleSet, RuleSetStore
+from iotguard.analysis.rules.ordering import RuleCounters, RuleStatsFlusher
+from iotguard.core.config import RuleSettings
+from iotguard.db.models import SecurityRule
+from iotguard.db.repositories import SecurityRuleRepository
+
+
+def _rule(
+    name: str,
+    pattern: str,
+    action: str = "BLOCK",
+    priority: int = 10,
+    **extra: object,
+) -> SecurityRule:
+    return SecurityRule(
+        id=uuid.uuid4(), name=name, pattern=pattern, action=action, priority=priority, **extra
+    )
+
+
+class TestEarlyExit:
+    """``first_block`` stops after the deciding BLOCK rule."""
+
+    def test_stops_at_first_block(self) -> None:
+        rule_set = CompiledRuleSet.compile(
+            [
+                _rule("a-warn", r"door", "WARN", priority=1),
+                _rule("b-block", r"unlock", priority=5),
+                _rule("c-block", r"door", priority=5),
+                _rule("d-log", r"front", "LOG", priority=9),
+            ],
+            version=1,
+        )
+        full = rule_set.match("unlock front door")
+        short = rule_set.match("unlock front door", first_block=True)
+
+        assert [r.name for r in full] == ["a-warn", "b-block", "c-block", "d-log"]
+        assert [r.name for r in short] == ["a-warn", "b-block"]
+
+    def test_same_result_without_block(self) -> None:
+        rule_set = CompiledRuleSet.compile(
+            [_rule("warn", r"door", "WARN"), _rule("log", r"front", "LOG")], version=1
+        )
+        assert rule_set.match("front door", first_block=True) == rule_set.match("front door")
+
+
+class TestAdaptiveOrdering:
+    """Within a tier, frequent and cheap rules go first."""
+
+    def test_hit_rate_over_cost(self) -> None:
+        rules = [
+            _rule("rare", r"x", cost_us=1.0, hit_count=0, eval_count=1000),
+            _rule("frequent", r"x", cost_us=1.0, hit_count=500, eval_count=1000),
+            _rule("frequent-pricey", r"x", cost_us=1000.0, hit_count=500, eval_count=1000),
+            _rule("urgent", r"x", priority=1, cost_us=50.0, hit_count=0, eval_count=1000),
+        ]
+        rule_set = CompiledRuleSet.compile(rules, version=1, adaptive=True)
+        assert [r.name for r in rule_set.rules] == [
+            "urgent",
+            "frequent",
+            "rare",
+            "frequent-pricey",
+        ]
+
+    def test_only_full_evaluations_counted(self) -> None:
+        counters = RuleCounters()
+        hit, miss = _rule("hit", r"unlock"), _rule("miss", r"reboot")
+        rule_set = CompiledRuleSet.compile([hit, miss], version=1, counters=counters)
+
+        rule_set.match("unlock")
+        rule_set.match("unlock")
+        rule_set.match("unlock", first_block=True)
+
+        hits, evaluations = counters.drain()
+        assert hits == {hit.id: 2}
+        assert evaluations == {hit.id: 2, miss.id: 2}
+        assert counters.drain() == ({}, {})
+
+    def test_dry_runs_not_counted(self) -> None:
+        counters = RuleCounters()
+        rule_set = CompiledRuleSet.compile([_rule("hit", r"unlock")], version=1, counters=counters)
+
+        rule_set.match("unlock", dry_run=True)
+        rule_set.match_many(["unlock", "unlock"], dry_run=True)
+
+        assert counters.drain() == ({}, {})
+
+
+class TestFlusher:
+    """Counters are added to the stored totals without touching updated_at."""
+
+    async def test_flush_persists_without_reload_while_order_holds(
+        self, db_engine: AsyncEngine
+    ) -> None:
+        rule = _rule("unlock", r"unlock")
+        async with AsyncSession(db_engine, expire_on_commit=False) as session:
+            session.add(rule)
+            await session.commit()
+            updated_at = rule.updated_at
+
+        store = RuleSetStore(adaptive=True)
+        flusher = RuleStatsFlusher(db_engine, store, RuleSettings())
+        async with AsyncSession(db_engine) as session:
+            rule_set = await store.get(SecurityRuleRepository(session))
+        rule_set.match("unlock now")
+        rule_set.match("reboot")
+        version = store.version
+
+        assert await flusher.flush_once() is True
+        assert await flusher.flush_once() is False
+        assert store.version == version
+
+        async with AsyncSession(db_engine) as session:
+            stored = (await session.execute(select(SecurityRule))).scalar_one()
+        assert (stored.hit_count, stored.eval_count) == (1, 2)
+        assert stored.updated_at.replace(tzinfo=None) == updated_at.replace(tzinfo=None)
+
+    async def test_flush_reloads_when_order_changes(self, db_engine: AsyncEngine) -> None:
+        async with AsyncSession(db_engine) as session:
+            session.add_all([_rule("a-rare", r"reboot"), _rule("b-frequent", r"unlock")])
+            await session.commit()
+
+        store = RuleSetStore(adaptive=True)
+        flusher = RuleStatsFlusher(db_engine, store, RuleSettings())
+        async with AsyncSession(db_engine) as session:
+            rule_set = await store.get(SecurityRuleRepository(session))
+        assert [r.name for r in rule_set.rules] == ["a-rare", "b-frequent"]
+        for _ in range(5):
+            rule_set.match("unlock now")
+        version = store.version
+
+        assert await flusher.flush_once() is True
+        assert store.version == version + 1
+        async with AsyncSession(db_engine) as session:
+            reloaded = await store.get(SecurityRuleRepository(session))
+        assert [r.name for r in reloaded.rules] == ["b-frequent", "a-rare"]
@@ -0,0 +1,150 @@
+"""Unit tests for device-type, device-id and state scoped rules."""
+
+from __future__ import annotations
+
+import uuid
+
+import pytest
+
+from iotguard.analysis.rules.compiled import GLOBAL_PARTITION, CompiledRuleSet
+from iotguard.analysis.rules.ordering import RuleCounters
+from iotguard.db.models import SecurityRule
+
+
+def _rule(
+    name: str, pattern: str, action: str = "BLOCK", priority: int = 10, **scope: object
+) -> SecurityRule:
+    return SecurityRule(
+        id=uuid.uuid4(), name=name, pattern=pattern, action=action, priority=priority, **scope
+    )
+
+
+@pytest.fixture
+def rule_set() -> CompiledRuleSet:
+    return CompiledRuleSet.compile(
+        [
+            _rule("any-rm", r"rm\s+-rf"),
+            _rule("lock-open", r"unlock", device_types=["Lock"]),
+            _rule("cam-off", r"disable", device_types=["camera"]),
+            _rule("hvac-heat", r"set_temperature\s+\d{3}", device_types=["thermostat", "hvac"]),
+        ],
+        version=1,
+    )
+
+
+class TestPartitions:
+    """One partition per device type, each including the global rules."""
+
+    def test_partitions_built(self, rule_set: CompiledRuleSet) -> None:
+        names = {
+            key: [rule_set.rules[i].name for i in p.indices]
+            for key, p in rule_set.partitions.items()
+        }
+        assert set(names) == {GLOBAL_PARTITION, "lock", "camera", "thermostat", "hvac"}
+        assert names[GLOBAL_PARTITION] == ["any-rm"]
+        assert sorted(names["lock"]) == ["any-rm", "lock-open"]
+
+    def test_no_partitions_without_scoped_rules(self) -> None:
+        rule_set = CompiledRuleSet.compile([_rule("a", "x")], version=1)
+        assert rule_set.partitions == {}
+        assert rule_set.partition_for({"device_type": "lock"}) is None
+
+    def test_only_matching_type_evaluated(self, rule_set: CompiledRuleSet) -> None:
+        command = "unlock and disable"
+        assert [r.name for r in rule_set.match(command, context={"device_type": "lock"})] == [
+            "lock-open"
+        ]
+        assert [r.name for r in rule_set.match(command, context={"device_type": "CAMERA"})] == [
+            "cam-off"
+        ]
+
+    def test_unscoped_type_uses_global_rules(self, rule_set: CompiledRuleSet) -> None:
+        assert rule_set.match("unlock", context={"device_type": "light"}) == []
+        assert [r.name for r in rule_set.match("rm -rf /", context={"device_type": "light"})] == [
+            "any-rm"
+        ]
+
+    def test_unknown_type_evaluates_everything(self, rule_set: CompiledRuleSet) -> None:
+        # Without a device type every rule may apply; fail closed.
+        assert [r.name for r in rule_set.match("unlock", context={"device_id": "d1"})] == [
+            "lock-open"
+        ]
+        assert [r.name for r in rule_set.match("disable")] == ["cam-off"]
+
+    def test_equivalent_to_full_scan_for_type(self, rule_set: CompiledRuleSet) -> None:
+        commands = ["unlock", "disable", "rm -rf /", "set_temperature 120", "noop"]
+        for device_type in ("lock", "camera", "hvac", "light"):
+            context = {"device_type": device_type}
+            expected = [
+                r for r in rule_set.rules if not r.device_types or device_type in r.device_types
+            ]
+            for command in commands:
+                want = [r for r in expected if r.regex.search(command)]
+                assert rule_set.match(command, context=context) == want
+
+
+class TestContextScope:
+    """Device-id and state predicates filter rules after matching."""
+
+    def test_device_ids(self) -> None:
+        rule_set = CompiledRuleSet.compile(
+            [_rule("front", r"unlock", device_ids=["front-door"])], version=1
+        )
+        assert rule_set.match("unlock", context={"device_id": "front-door"})
+        assert not rule_set.match("unlock", context={"device_id": "garage"})
+        # Unknown device: the rule applies.
+        assert rule_set.match("unlock", context={})
+
+    def test_device_ids_match_either_id_form(self) -> None:
+        pk = str(uuid.uuid4())
+        rule_set = CompiledRuleSet.compile(
+            [
+                _rule("by-id", r"unlock", device_ids=["front-door"]),
+                _rule("by-pk", r"open", device_ids=[pk]),
+            ],
+            version=1,
+        )
+        context = {"device_id": "front-door", "device_pk": pk}
+        assert rule_set.match("unlock", context=context)
+        assert rule_set.match("open", context=context)
+        assert not rule_set.match("open", context={"device_id": "front-door"})
+        assert not rule_set.match("unlock", context={"device_id": "garage", "device_pk": pk})
+
+    def test_state_predicates(self) -> None:
+        rule_set = CompiledRuleSet.compile(
+            [_rule("armed", r"unlock", state_predicates={"alarm": "armed"})], version=1
+        )
+        assert rule_set.match("unlock", context={"state": {"alarm": "armed"}})
+        assert not rule_set.match("unlock", context={"state": {"alarm": "disarmed"}})
+        # State key missing: the rule applies.
+        assert rule_set.match("unlock", context={"state": {}})
+
+    def test_first_block_skips_out_of_scope_block(self) -> None:
+        rule_set = CompiledRuleSet.compile(
+            [
+                _rule("other", r"unlock", priority=1, device_ids=["garage"]),
+                _rule("warn", r"unlock", "WARN", priority=2),
+                _rule("mine", r"unlock", priority=3, device_ids=["front-door"]),
+            ],
+            version=1,
+        )
+        matched = rule_set.match("unlock", first_block=True, context={"device_id": "front-door"})
+        assert [r.name for r in matched] == ["warn", "mine"]
+
+
+class TestPartitionCounters:
+    """Only rules of the evaluated partition are credited an evaluation."""
+
+    def test_evaluations_per_partition(self) -> None:
+        lock = _rule("lock-open", r"unlock", device_types=["lock"])
+        cam = _rule("cam-off", r"disable", device_types=["camera"])
+        counters = RuleCounters()
+        rule_set = CompiledRuleSet.compile([lock, cam], version=1, counters=counters)
+
+        rule_set.match("unlock", context={"device_type": "lock"})
+        rule_set.match("unlock", context={"device_type": "lock"})
+        rule_set.match("noop")
+
+        hits, evaluations = counters.drain()
+        assert hits == {lock.id: 2}
+        assert evaluations == {lock.id: 3, cam.id: 1}
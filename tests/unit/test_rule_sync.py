@@ -0,0 +1,93 @@
+"""Unit tests for cross-worker rule-set invalidation (NOTIFY + polling)."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+from unittest.mock import AsyncMock, MagicMock
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from iotguard.analysis.rules.compiled import RuleSetStore
+from iotguard.analysis.rules.sync import RuleChangeListener
+from iotguard.core.config import RuleSettings
+from iotguard.db.models import SecurityRule
+from iotguard.db.repositories import RULES_CHANGED_CHANNEL, SecurityRuleRepository
+
+
+async def _add_rule(engine: AsyncEngine, name: str) -> None:
+    async with AsyncSession(engine) as session:
+        await SecurityRuleRepository(session).create(
+            SecurityRule(name=name, pattern="x", action="BLOCK", priority=10)
+        )
+        await session.commit()
+
+
+class TestPollingFallback:
+    """Without LISTEN, the fingerprint poll detects rule changes."""
+
+    async def test_first_poll_records_baseline(self, db_engine: AsyncEngine) -> None:
+        store = RuleSetStore()
+        listener = RuleChangeListener(db_engine, store, RuleSettings())
+        version = store.version
+
+        assert await listener.poll_once() is False
+        assert store.version == version
+
+    async def test_insert_detected(self, db_engine: AsyncEngine) -> None:
+        store = RuleSetStore()
+        listener = RuleChangeListener(db_engine, store, RuleSettings())
+        await listener.poll_once()
+        version = store.version
+
+        await _add_rule(db_engine, "new-rule")
+
+        assert await listener.poll_once() is True
+        assert store.version == version + 1
+        assert await listener.poll_once() is False
+
+    async def test_background_loop_converges(self, db_engine: AsyncEngine) -> None:
+        store = RuleSetStore()
+        listener = RuleChangeListener(db_engine, store, RuleSettings(sync_poll_interval=0.01))
+        await listener.start()
+        try:
+            while listener._fingerprint is None:
+                await asyncio.sleep(0.01)
+            version = store.version
+            await _add_rule(db_engine, "late-rule")
+            for _ in range(200):
+                if store.version > version:
+                    break
+                await asyncio.sleep(0.01)
+            assert store.version > version
+            assert listener.is_listening is False
+        finally:
+            await listener.stop()
+
+
+class TestNotify:
+    """NOTIFY is emitted by the repository and consumed by the listener."""
+
+    def test_notification_bumps_store(self, db_engine: AsyncEngine) -> None:
+        store = RuleSetStore()
+        listener = RuleChangeListener(db_engine, store, RuleSettings())
+        version = store.version
+
+        listener._on_notify(None, 1234, RULES_CHANGED_CHANNEL, "")
+
+        assert store.version == version + 1
+
+    async def test_repository_notifies_on_postgres(self) -> None:
+        session: Any = MagicMock()
+        session.bind.dialect.name = "postgresql"
+        session.execute = AsyncMock()
+
+        await SecurityRuleRepository(session).delete(MagicMock())
+
+        sql_texts = [str(call.args[0]) for call in session.execute.await_args_list]
+        assert any("pg_notify" in sql for sql in sql_texts)
+
+    async def test_repository_skips_notify_on_sqlite(self, db_session: AsyncSession) -> None:
+        repo = SecurityRuleRepository(db_session)
+        rule = await repo.create(SecurityRule(name="r", pattern="x"))
+        assert rule.id is not None
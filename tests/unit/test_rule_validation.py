@@ -0,0 +1,72 @@
+"""Unit tests for rule pattern validation and cost measurement."""
+
+from __future__ import annotations
+
+import uuid
+from collections.abc import Iterator
+
+import pytest
+
+from iotguard.analysis.rules.compiled import CompiledRuleSet
+from iotguard.analysis.rules.validation import PatternValidator, adversarial_corpus
+from iotguard.core.config import RuleSettings
+from iotguard.core.exceptions import InvalidRuleError
+from iotguard.db.models import SecurityRule
+
+
+@pytest.fixture
+def validator() -> Iterator[PatternValidator]:
+    validator = PatternValidator(RuleSettings(validation_timeout_ms=300))
+    yield validator
+    validator.close()
+
+
+class TestValidation:
+    def test_linear_pattern_accepted_with_cost(self, validator: PatternValidator) -> None:
+        cost = validator.validate(r"(rm\s+-rf|format|mkfs)")
+        assert cost.cost_us > 0
+        assert cost.worst_us >= cost.cost_us
+        assert not cost.backtracking_prone
+        assert cost.warnings == ()
+
+    def test_invalid_regex_rejected(self, validator: PatternValidator) -> None:
+        with pytest.raises(InvalidRuleError, match="does not compile"):
+            validator.validate(r"[oops(")
+
+    @pytest.mark.parametrize("pattern", [r"(a+)+$", r"(\w+\s?)*$", r".*a.*b.*c"])
+    def test_super_linear_pattern_rejected(
+        self, validator: PatternValidator, pattern: str
+    ) -> None:
+        with pytest.raises(InvalidRuleError) as exc_info:
+            validator.validate(pattern)
+        assert exc_info.value.status_code == 422
+
+    def test_prone_but_cheap_pattern_flagged(self, validator: PatternValidator) -> None:
+        cost = validator.validate(r"^(a|ab)+$")
+        assert cost.backtracking_prone
+        assert cost.warnings
+
+    def test_adversarial_corpus_pumps_pattern_characters(self) -> None:
+        corpus = adversarial_corpus(r"x(\d+-)+y", length=64)
+        assert all(len(text) == 64 for text in corpus)
+        assert any(text.startswith("000") for text in corpus)
+        assert any(text.startswith("---") for text in corpus)
+
+
+class TestCostOrdering:
+    def test_cheaper_rule_first_within_priority(self) -> None:
+        def rule(name: str, cost: float | None, priority: int = 10) -> SecurityRule:
+            return SecurityRule(
+                id=uuid.uuid4(), name=name, pattern="x", priority=priority, cost_us=cost
+            )
+
+        rule_set = CompiledRuleSet.compile(
+            [
+                rule("a-pricey", 9.0),
+                rule("b-unknown", None),
+                rule("c-cheap", 1.0),
+                rule("top", 50.0, 1),
+            ],
+            version=1,
+        )
+        assert [r.name for r in rule_set.rules] == ["top", "c-cheap", "a-pricey", "b-unknown"]
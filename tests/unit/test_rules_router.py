@@ -0,0 +1,119 @@
+"""Unit tests for the rules API helpers (no application or database needed)."""
+
+from __future__ import annotations
+
+import re
+import uuid
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import HTTPException
+
+from iotguard.analysis.rules.backtest import BacktestJob, BacktestJobs
+from iotguard.analysis.rules.engine import RuleEvaluationResult, RuleMatch
+from iotguard.analysis.rules.guard import RuleGuard
+from iotguard.analysis.rules.validation import PatternCost
+from iotguard.api.routers import rules as router
+from iotguard.db.models import SecurityRule
+
+
+def _rule(pattern: str = r"unlock\s+(front|back)\s+door", **fields: object) -> SecurityRule:
+    values: dict[str, object] = {
+        "id": uuid.uuid4(),
+        "name": "unlock",
+        "description": None,
+        "pattern": pattern,
+        "action": "BLOCK",
+        "is_active": True,
+        "priority": 10,
+        "created_at": datetime(2026, 1, 1, tzinfo=UTC),
+    }
+    values.update(fields)
+    return SecurityRule(**values)
+
+
+@pytest.fixture
+def guard() -> Iterator[RuleGuard]:
+    guard = RuleGuard(sandbox_enabled=False)
+    with patch.object(router, "get_rule_guard", return_value=guard):
+        yield guard
+
+
+class TestRuleOut:
+    def test_reports_required_literals_and_scope(self, guard: RuleGuard) -> None:
+        rule = _rule(device_types=["lock"], state_predicates={"mode": "away"}, cost_us=1.5)
+        out = router._rule_out(rule)
+
+        assert out.id == str(rule.id)
+        assert out.required_literals == ["unlock"]
+        assert out.device_types == ["lock"]
+        assert out.state_predicates == {"mode": "away"}
+        assert out.cost_us == 1.5
+        assert out.warnings == []
+        assert out.stats is None
+
+    def test_unanchored_pattern_has_no_required_literals(self, guard: RuleGuard) -> None:
+        assert router._rule_out(_rule(r"\d+")).required_literals == []
+
+    def test_includes_runtime_stats_once_the_rule_has_run(self, guard: RuleGuard) -> None:
+        rule = _rule()
+        pattern = guard.wrap(str(rule.id), rule.name, re.compile(rule.pattern))
+        pattern.search("unlock front door")
+        pattern.stats.hits = 1
+
+        stats = router._rule_out(rule).stats
+        assert stats is not None
+        assert stats.evaluations == 1
+        assert stats.hits == 1
+        assert not stats.quarantined
+        assert not stats.sandboxed
+
+    def test_includes_validation_warnings(self, guard: RuleGuard) -> None:
+        cost = PatternCost(cost_us=2.0, worst_us=50.0, backtracking_prone=True, warnings=("slow",))
+        assert router._rule_out(_rule(), cost).warnings == ["slow"]
+
+
+class TestTestResponse:
+    def test_lists_matched_rule_names(self) -> None:
+        result = RuleEvaluationResult(
+            matches=[
+                RuleMatch("unlock", "unlock", "BLOCK", "", 10),
+                RuleMatch("door", "door", "WARN", "", 20),
+            ],
+            blocked=True,
+            block_reason="Blocked by rule: unlock",
+        )
+        out = router._test_response(result)
+        assert out.blocked
+        assert out.reason == "Blocked by rule: unlock"
+        assert out.matched_rules == ["unlock", "door"]
+
+    def test_no_match(self) -> None:
+        out = router._test_response(RuleEvaluationResult())
+        assert not out.blocked
+        assert out.matched_rules == []
+
+
+class TestBacktestJobs:
+    def test_job_out_serialises_report(self) -> None:
+        report = MagicMock()
+        report.to_dict.return_value = {"commands": 3}
+        job = BacktestJob(id="j1", status="completed", processed=3, total=3, report=report)
+
+        out = router._job_out(job)
+        assert out.id == "j1"
+        assert out.status == "completed"
+        assert out.report == {"commands": 3}
+
+    def test_job_out_without_report(self) -> None:
+        out = router._job_out(BacktestJob(id="j2", error="boom", status="failed"))
+        assert out.report is None
+        assert out.error == "boom"
+
+    async def test_unknown_job_is_404(self) -> None:
+        with patch.object(router, "get_backtest_jobs", return_value=BacktestJobs()):
+            with pytest.raises(HTTPException) as exc_info:
+                await router.get_backtest("missing", MagicMock())
+        assert exc_info.value.status_code == 404
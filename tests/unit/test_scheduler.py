@@ -0,0 +1,209 @@
+"""Unit tests for the quota-aware AdaptiveScheduler."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from iotguard.core.scheduler import AdaptiveScheduler, QueueTimeoutError, ShedError, TokenBucket
+
+
+class TestTokenBucket:
+    def test_disabled_bucket_never_delays(self) -> None:
+        bucket = TokenBucket(0)
+        bucket.take(1_000_000)
+        assert bucket.delay(1_000_000) == 0.0
+
+    def test_delay_after_spending(self) -> None:
+        bucket = TokenBucket(60)  # one per second
+        bucket.take(60)
+        assert bucket.delay(1) == pytest.approx(1.0, abs=0.05)
+
+    def test_refund_and_drain(self) -> None:
+        bucket = TokenBucket(60)
+        bucket.take(30)
+        bucket.take(-10)
+        assert bucket.tokens == pytest.approx(40, abs=0.5)
+        bucket.drain()
+        assert bucket.tokens <= 0.0
+
+
+class TestAdmission:
+    async def test_concurrency_bounded(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=2)
+        active = peak = 0
+
+        async def call() -> None:
+            nonlocal active, peak
+            async with scheduler.slot():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        assert peak == 2
+        assert scheduler.in_flight == 0 and scheduler.queued == 0
+
+    async def test_lower_priority_value_served_first(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=1)
+        order: list[str] = []
+        release = asyncio.Event()
+
+        async def hold() -> None:
+            async with scheduler.slot():
+                await release.wait()
+
+        async def call(name: str, priority: int) -> None:
+            async with scheduler.slot(priority):
+                order.append(name)
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        waiters = [
+            asyncio.ensure_future(call("light", 2)),
+            asyncio.ensure_future(call("thermostat", 1)),
+            asyncio.ensure_future(call("door_lock", 0)),
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        assert order == ["door_lock", "thermostat", "light"]
+
+    async def test_queue_timeout(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=1, queue_timeout=0.01)
+        async with scheduler.slot():
+            with pytest.raises(QueueTimeoutError):
+                async with scheduler.slot():
+                    pass
+        assert scheduler.queued == 0 and scheduler.in_flight == 0
+
+    async def test_rpm_budget_delays_admission(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=10, rpm=2, queue_timeout=0.05)
+        async with scheduler.slot():
+            pass
+        async with scheduler.slot():
+            pass
+        with pytest.raises(QueueTimeoutError):
+            async with scheduler.slot():
+                pass
+
+    async def test_tpm_budget_delays_admission(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=10, tpm=1000, queue_timeout=0.05)
+        async with scheduler.slot(tokens=900):
+            pass
+        with pytest.raises(QueueTimeoutError):
+            async with scheduler.slot(tokens=500):
+                pass
+
+
+class TestShedding:
+    async def test_new_low_priority_call_is_shed(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=1, max_queue=1)
+
+        async def call(priority: int) -> None:
+            async with scheduler.slot(priority):
+                pass
+
+        async with scheduler.slot():
+            queued = asyncio.ensure_future(call(0))
+            await asyncio.sleep(0)
+            with pytest.raises(ShedError):
+                await call(2)
+        await queued
+        assert scheduler.queued == 0
+
+    async def test_high_priority_call_displaces_worst_waiter(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=1, max_queue=1)
+        release = asyncio.Event()
+        served: list[int] = []
+
+        async def call(priority: int) -> None:
+            async with scheduler.slot(priority):
+                served.append(priority)
+
+        async def hold() -> None:
+            async with scheduler.slot():
+                await release.wait()
+
+        holder = asyncio.ensure_future(hold())
+        await asyncio.sleep(0)
+        low = asyncio.ensure_future(call(2))
+        await asyncio.sleep(0)
+        high = asyncio.ensure_future(call(0))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(holder, high)
+        with pytest.raises(ShedError):
+            await low
+        assert served == [0]
+
+
+class TestAdaptation:
+    async def test_failures_shrink_and_successes_grow_limit(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=10, min_limit=2)
+        with pytest.raises(RuntimeError):
+            async with scheduler.slot():
+                raise RuntimeError("upstream error")
+        assert scheduler.limit == 7
+        scheduler._hold_until = 0.0
+        for _ in range(10):
+            async with scheduler.slot():
+                pass
+        assert scheduler.limit > 7
+
+    async def test_limit_respects_floor(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=4, min_limit=2)
+        for _ in range(5):
+            scheduler._hold_until = 0.0
+            with pytest.raises(RuntimeError):
+                async with scheduler.slot():
+                    raise RuntimeError
+        assert scheduler.limit == 2
+
+    async def test_one_decrease_per_round_trip(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=10)
+        for _ in range(3):
+            with pytest.raises(RuntimeError):
+                async with scheduler.slot():
+                    raise RuntimeError
+        assert scheduler.limit == 7
+
+    async def test_slow_call_counts_as_congestion(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=10, latency_target=0.001)
+        async with scheduler.slot():
+            await asyncio.sleep(0.01)
+        assert scheduler.limit == 7
+
+    async def test_neutral_errors_leave_limit_alone(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=10, neutral=(KeyError,))
+        with pytest.raises(KeyError):
+            async with scheduler.slot():
+                raise KeyError("breaker open")
+        assert scheduler.limit == 10
+
+    async def test_throttle_drains_request_budget(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=10, rpm=600, queue_timeout=0.01)
+        async with scheduler.slot() as ticket:
+            ticket.throttled()
+        assert scheduler.limit == 7
+        with pytest.raises(QueueTimeoutError):
+            async with scheduler.slot():
+                pass
+
+    async def test_settled_tokens_are_charged(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=10, tpm=1000, queue_timeout=0.01)
+        async with scheduler.slot(tokens=100) as ticket:
+            ticket.settle(950)
+        with pytest.raises(QueueTimeoutError):
+            async with scheduler.slot(tokens=100):
+                pass
+
+    async def test_duplicates_are_charged(self) -> None:
+        scheduler = AdaptiveScheduler("t", max_limit=10, rpm=2, queue_timeout=0.01)
+        async with scheduler.slot() as ticket:
+            ticket.duplicated()
+        with pytest.raises(QueueTimeoutError):
+            async with scheduler.slot():
+                pass
@@ -0,0 +1,91 @@
+"""Unit tests for the near-duplicate SemanticCache."""
+
+from __future__ import annotations
+
+from typing import Any
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from iotguard.analysis.models import AnalysisResult, RiskLevel
+from iotguard.analysis.semantic import SemanticCache
+from iotguard.core.config import SemanticCacheSettings
+
+_LOCK = {"device_type": "door_lock"}
+
+
+def _cache(**overrides: Any) -> SemanticCache:
+    return SemanticCache(SemanticCacheSettings(enabled=True, **overrides))
+
+
+def _result(risk: RiskLevel = RiskLevel.HIGH) -> AnalysisResult:
+    return AnalysisResult(risk_level=risk, explanation="cached")
+
+
+class TestEmbedding:
+    def test_filler_words_do_not_matter(self) -> None:
+        cache = _cache()
+        a = cache.embed("unlock the front door")
+        b = cache.embed("please unlock front door now")
+        assert float(a @ b) > 0.99
+
+    def test_opposite_verbs_stay_apart(self) -> None:
+        cache = _cache()
+        assert float(cache.embed("unlock the door") @ cache.embed("lock the door")) < 0.8
+
+    def test_vectors_are_unit_length(self) -> None:
+        vector = _cache().embed("turn on the light")
+        assert float(vector @ vector) == pytest.approx(1.0, abs=1e-5)
+
+
+class TestLookup:
+    def test_near_duplicate_reuses_verdict(self) -> None:
+        cache = _cache()
+        cache.add("unlock the front door", _LOCK, _result())
+        hit = cache.lookup("Please unlock front door now", _LOCK)
+        assert hit is not None
+        assert hit.result.risk_level == RiskLevel.HIGH
+        assert hit.matched == "unlock the front door"
+        assert hit.similarity >= 0.9
+
+    def test_indexes_are_per_device_type(self) -> None:
+        cache = _cache()
+        cache.add("unlock the front door", _LOCK, _result())
+        assert cache.lookup("unlock the front door", {"device_type": "camera"}) is None
+
+    def test_different_parameters_never_match(self) -> None:
+        cache = _cache()
+        ctx = {"device_type": "thermostat"}
+        cache.add("set temperature 20", ctx, _result(RiskLevel.NONE))
+        assert cache.lookup("please set temperature 90", ctx) is None
+        assert cache.lookup("please set temperature 20", ctx) is not None
+
+    def test_unstable_neighbourhood_is_a_miss(self) -> None:
+        cache = _cache(stability_margin=0.2)
+        cache.add("open the garage door", _LOCK, _result(RiskLevel.LOW))
+        cache.add("open the garage door quickly", _LOCK, _result(RiskLevel.CRITICAL))
+        assert cache.lookup("please open the garage door", _LOCK) is None
+
+    def test_old_entries_are_ignored(self) -> None:
+        cache = _cache(max_age=10.0)
+        with patch("iotguard.analysis.semantic.time.time", return_value=1_000.0):
+            cache.add("unlock the front door", _LOCK, _result())
+        with patch("iotguard.analysis.semantic.time.time", return_value=1_020.0):
+            assert cache.lookup("unlock the front door", _LOCK) is None
+
+
+class TestCapacity:
+    def test_least_recently_used_row_is_replaced(self) -> None:
+        cache = _cache(capacity=2)
+        with patch("iotguard.analysis.semantic.time.time", return_value=1.0):
+            cache.add("turn on the light", _LOCK, _result())
+        with patch("iotguard.analysis.semantic.time.time", return_value=2.0):
+            cache.add("open the window", _LOCK, _result())
+        with patch("iotguard.analysis.semantic.time.time", return_value=3.0):
+            assert cache.lookup("turn on the light", _LOCK) is not None
+            cache.add("start the vacuum", _LOCK, _result())
+            assert len(cache) == 2
+            assert cache.lookup("open the window", _LOCK) is None
+            assert cache.lookup("turn on the light", _LOCK) is not None
@@ -0,0 +1,223 @@
+"""Unit tests for SingleFlight call coalescing."""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from iotguard.core.deadline import Deadline, current_deadline, deadline_scope
+from iotguard.core.singleflight import SingleFlight
+
+
+class _FakePubSub:
+    def __init__(self, redis: _FakeRedis) -> None:
+        self._redis = redis
+        self._queue: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._channels: list[str] = []
+
+    async def subscribe(self, channel: str) -> None:
+        self._channels.append(channel)
+        self._redis.subscribers.setdefault(channel, []).append(self._queue)
+
+    async def get_message(self, *, ignore_subscribe_messages: bool, timeout: float) -> Any:
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+    async def aclose(self) -> None:
+        for channel in self._channels:
+            self._redis.subscribers[channel].remove(self._queue)
+
+
+class _FakeRedis:
+    """Just enough of ``redis.asyncio.Redis`` for leases and pub/sub."""
+
+    def __init__(self) -> None:
+        self.data: dict[str, Any] = {}
+        self.subscribers: dict[str, list[asyncio.Queue[dict[str, Any]]]] = {}
+
+    async def set(self, key: str, value: Any, *, nx: bool = False, px: int | None = None) -> bool:
+        if nx and key in self.data:
+            return False
+        self.data[key] = value
+        return True
+
+    async def get(self, key: str) -> Any:
+        return self.data.get(key)
+
+    async def exists(self, key: str) -> int:
+        return int(key in self.data)
+
+    async def eval(self, script: str, numkeys: int, key: str, token: str) -> int:
+        if self.data.get(key) == token:
+            del self.data[key]
+            return 1
+        return 0
+
+    async def publish(self, channel: str, message: str) -> int:
+        queues = self.subscribers.get(channel, [])
+        for queue in queues:
+            queue.put_nowait({"channel": channel, "data": message})
+        return len(queues)
+
+    def pubsub(self) -> _FakePubSub:
+        return _FakePubSub(self)
+
+
+class TestInProcess:
+    async def test_concurrent_calls_share_one_upstream_call(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test")
+        calls = 0
+
+        async def fetch() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 42
+
+        results = await asyncio.gather(*(flights.do("k", fetch) for _ in range(10)))
+        assert results == [42] * 10
+        assert calls == 1
+        assert len(flights) == 0
+
+    async def test_distinct_keys_do_not_coalesce(self) -> None:
+        flights: SingleFlight[str] = SingleFlight("test")
+
+        async def fetch(key: str) -> str:
+            await asyncio.sleep(0)
+            return key
+
+        results = await asyncio.gather(
+            flights.do("a", lambda: fetch("a")), flights.do("b", lambda: fetch("b"))
+        )
+        assert results == ["a", "b"]
+
+    async def test_error_is_shared_and_not_cached(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test")
+        calls = 0
+
+        async def failing() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise RuntimeError("upstream down")
+
+        outcomes = await asyncio.gather(
+            *(flights.do("k", failing) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(o, RuntimeError) for o in outcomes)
+        assert calls == 1
+
+        async def ok() -> int:
+            return 1
+
+        assert await flights.do("k", ok) == 1
+
+    async def test_cancelled_caller_does_not_cancel_shared_call(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test")
+
+        async def fetch() -> int:
+            await asyncio.sleep(0.02)
+            return 7
+
+        first = asyncio.ensure_future(flights.do("k", fetch))
+        second = asyncio.ensure_future(flights.do("k", fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        assert await second == 7
+
+    async def test_shared_call_does_not_inherit_leader_deadline(self) -> None:
+        flights: SingleFlight[Deadline | None] = SingleFlight("test")
+
+        async def fetch() -> Deadline | None:
+            return current_deadline()
+
+        with deadline_scope(Deadline.after(5)):
+            assert await flights.do("k", fetch) is None
+
+    async def test_each_caller_waits_until_its_own_deadline(self) -> None:
+        flights: SingleFlight[int] = SingleFlight("test")
+
+        async def fetch() -> int:
+            await asyncio.sleep(0.05)
+            return 7
+
+        async def impatient() -> int:
+            with deadline_scope(Deadline.after(0.01)):
+                return await flights.do("k", fetch)
+
+        leader = asyncio.ensure_future(impatient())
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do("k", fetch))
+        with pytest.raises(TimeoutError):
+            await leader
+        assert await follower == 7
+
+
+class TestAcrossWorkers:
+    async def test_waiter_loads_result_published_by_lease_holder(self) -> None:
+        redis = _FakeRedis()
+        worker_a: SingleFlight[str] = SingleFlight("test", redis=redis, lease_ttl=5.0)
+        worker_b: SingleFlight[str] = SingleFlight("test", redis=redis, lease_ttl=5.0)
+        calls = 0
+
+        async def fetch() -> str:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.02)
+            redis.data["k"] = "result"
+            return "result"
+
+        async def load() -> str | None:
+            return redis.data.get("k")
+
+        a = asyncio.ensure_future(worker_a.do("k", fetch, load=load))
+        await asyncio.sleep(0)
+        b = await worker_b.do("k", fetch, load=load)
+
+        assert await a == "result"
+        assert b == "result"
+        assert calls == 1
+        assert "k:lease" not in redis.data
+
+    async def test_waiter_takes_over_when_lease_holder_fails(self) -> None:
+        redis = _FakeRedis()
+        worker_a: SingleFlight[str] = SingleFlight("test", redis=redis, lease_ttl=5.0)
+        worker_b: SingleFlight[str] = SingleFlight("test", redis=redis, lease_ttl=5.0)
+
+        async def failing() -> str:
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        async def fetch() -> str:
+            return "fallback"
+
+        async def load() -> str | None:
+            return None
+
+        a = asyncio.ensure_future(worker_a.do("k", failing, load=load))
+        await asyncio.sleep(0)
+        assert await worker_b.do("k", fetch, load=load) == "fallback"
+        with pytest.raises(RuntimeError):
+            await a
+
+    async def test_redis_errors_fall_back_to_local_call(self) -> None:
+        class _Broken:
+            async def set(self, *args: Any, **kwargs: Any) -> bool:
+                raise ConnectionError("redis down")
+
+            async def eval(self, *args: Any) -> int:
+                raise ConnectionError("redis down")
+
+        flights: SingleFlight[int] = SingleFlight("test", redis=_Broken())
+
+        async def fetch() -> int:
+            return 3
+
+        async def load() -> int | None:
+            return None
+
+        assert await flights.do("k", fetch, load=load) == 3
@@ -0,0 +1,64 @@
+"""Unit tests for early risk-level parsing of streamed LLM responses."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from iotguard.analysis.engines.streaming import RiskLevelScanner, StreamedAnalysis
+from iotguard.analysis.models import AnalysisResult, RiskLevel
+
+
+class TestRiskLevelScanner:
+    def test_risk_level_found_before_the_rest(self) -> None:
+        scanner = RiskLevelScanner()
+        assert scanner.feed('{"risk_') is None
+        assert scanner.feed('level": "hi') is None
+        assert scanner.feed('gh", "explanation": "Unlocks the') is RiskLevel.HIGH
+        assert scanner.feed(' front door"}') is None
+        assert scanner.risk_level is RiskLevel.HIGH
+
+    def test_fenced_response(self) -> None:
+        scanner = RiskLevelScanner()
+        assert scanner.feed('```json\n{\n  "risk_level" : "LOW",') is RiskLevel.LOW
+
+    def test_unknown_level_defaults_to_medium(self) -> None:
+        assert RiskLevelScanner().feed('{"risk_level": "SEVERE"}') is RiskLevel.MEDIUM
+
+    def test_key_split_across_many_chunks(self) -> None:
+        scanner = RiskLevelScanner()
+        text = '{"explanation": "' + "x" * 500 + '", "risk_level": "NONE"}'
+        found = [level for ch in text if (level := scanner.feed(ch)) is not None]
+        assert found == [RiskLevel.NONE]
+
+
+class TestStreamedAnalysis:
+    async def test_risk_level_follows_result(self) -> None:
+        async def work() -> AnalysisResult:
+            return AnalysisResult(risk_level=RiskLevel.LOW, explanation="ok")
+
+        streamed = StreamedAnalysis.start(work())
+        assert await streamed.risk_level is RiskLevel.LOW
+        assert (await streamed.result).explanation == "ok"
+
+    async def test_early_risk_level_is_kept(self) -> None:
+        risk: asyncio.Future[RiskLevel] = asyncio.get_running_loop().create_future()
+
+        async def work() -> AnalysisResult:
+            risk.set_result(RiskLevel.HIGH)
+            await asyncio.sleep(0.01)
+            raise RuntimeError("stream broke")
+
+        streamed = StreamedAnalysis.start(work(), risk)
+        assert await streamed.risk_level is RiskLevel.HIGH
+        with pytest.raises(RuntimeError):
+            await streamed.result
+
+    async def test_failure_before_risk_level_fails_both(self) -> None:
+        async def work() -> AnalysisResult:
+            raise RuntimeError("down")
+
+        streamed = StreamedAnalysis.start(work())
+        with pytest.raises(RuntimeError):
+            await streamed.risk_level
@@ -0,0 +1,160 @@
+"""Unit tests for the two-tier VerdictCache."""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+from prometheus_client import REGISTRY
+
+from iotguard.analysis.cache import VerdictCache
+from iotguard.analysis.models import AnalysisResult, RiskLevel
+from iotguard.core.config import CacheSettings
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class _DictRedis:
+    def __init__(self) -> None:
+        self.data: dict[str, str] = {}
+        self.gets = 0
+
+    async def get(self, key: str) -> str | None:
+        self.gets += 1
+        return self.data.get(key)
+
+    async def set(self, key: str, value: str, ex: int = 0) -> None:
+        self.data[key] = value
+
+
+def _settings(**overrides: Any) -> CacheSettings:
+    return CacheSettings(**overrides)
+
+
+def _result(risk: RiskLevel = RiskLevel.LOW) -> AnalysisResult:
+    return AnalysisResult(risk_level=risk, explanation="ok")
+
+
+def _l1_bytes() -> float:
+    return REGISTRY.get_sample_value("iotguard_analysis_cache_l1_bytes") or 0.0
+
+
+class TestTiers:
+    async def test_l1_hit_skips_redis(self) -> None:
+        redis = _DictRedis()
+        cache = VerdictCache(_settings(), redis=redis)
+        await cache.put("k", _result())
+        hit = await cache.get("k")
+        assert hit is not None and hit.result is not None
+        assert hit.result.risk_level == RiskLevel.LOW
+        assert redis.gets == 0
+
+    async def test_l2_hit_populates_l1(self) -> None:
+        redis = _DictRedis()
+        writer = VerdictCache(_settings(), redis=redis)
+        reader = VerdictCache(_settings(), redis=redis)
+        await writer.put("k", _result())
+
+        assert (await reader.get("k")) is not None
+        assert (await reader.get("k")) is not None
+        assert redis.gets == 1
+
+    async def test_l1_copy_expires_after_l1_ttl(self) -> None:
+        clock = _Clock()
+        redis = _DictRedis()
+        cache = VerdictCache(_settings(l1_ttl=5.0), redis=redis, clock=clock)
+        await cache.put("k", _result())
+        clock.now += 6
+        assert (await cache.get("k")) is not None
+        assert redis.gets == 1
+
+    async def test_legacy_redis_entry_without_freshness(self) -> None:
+        redis = _DictRedis()
+        redis.data["k"] = json.dumps({"risk_level": "HIGH", "explanation": "old"})
+        hit = await VerdictCache(_settings(), redis=redis).get("k")
+        assert hit is not None and not hit.stale
+        assert hit.result is not None and hit.result.risk_level == RiskLevel.HIGH
+
+    async def test_hits_are_copies(self) -> None:
+        cache = VerdictCache(_settings())
+        await cache.put("k", _result())
+        first = await cache.get("k")
+        assert first is not None and first.result is not None
+        first.result.explanation = "mutated"
+        second = await cache.get("k")
+        assert second is not None and second.result is not None
+        assert second.result.explanation == "ok"
+
+
+class TestBounds:
+    async def test_entry_count_bound_evicts_lru(self) -> None:
+        cache = VerdictCache(_settings(l1_max_entries=2))
+        for key in ("a", "b", "c"):
+            await cache.put(key, _result())
+        assert len(cache) == 2
+        assert (await cache.get("a")) is None
+
+    async def test_byte_bound(self) -> None:
+        cache = VerdictCache(_settings(l1_max_bytes=300))
+        for key in ("a", "b", "c", "d"):
+            await cache.put(key, _result())
+        assert 0 < cache.nbytes <= 300
+        assert len(cache) < 4
+
+    async def test_bytes_gauge_sums_every_cache(self) -> None:
+        before = _l1_bytes()
+        first, second = VerdictCache(_settings()), VerdictCache(_settings())
+        await first.put("a", _result())
+        await second.put("b", _result())
+        await second.put("c", _result())
+        assert _l1_bytes() - before == first.nbytes + second.nbytes
+
+
+class TestFreshness:
+    async def test_ttl_depends_on_risk(self) -> None:
+        clock = _Clock()
+        cache = VerdictCache(
+            _settings(ttl_low=100.0, ttl_critical=10.0, stale_ttl=0.0), clock=clock
+        )
+        await cache.put("safe", _result(RiskLevel.LOW))
+        await cache.put("bad", _result(RiskLevel.CRITICAL))
+        clock.now += 50
+        assert (await cache.get("safe")) is not None
+        assert (await cache.get("bad")) is None
+
+    async def test_stale_window(self) -> None:
+        clock = _Clock()
+        cache = VerdictCache(_settings(ttl_low=10.0, stale_ttl=20.0), clock=clock)
+        await cache.put("k", _result())
+        clock.now += 15
+        hit = await cache.get("k")
+        assert hit is not None and hit.stale
+        clock.now += 20
+        assert (await cache.get("k")) is None
+
+    async def test_negative_entry(self) -> None:
+        clock = _Clock()
+        redis = _DictRedis()
+        cache = VerdictCache(_settings(negative_ttl=5.0), redis=redis, clock=clock)
+        await cache.put_error("k", "boom")
+        hit = await cache.get("k")
+        assert hit is not None and hit.result is None and hit.error == "boom"
+
+        other_worker = VerdictCache(_settings(negative_ttl=5.0), redis=redis, clock=clock)
+        remote = await other_worker.get("k")
+        assert remote is not None and remote.error == "boom"
+
+        clock.now += 6
+        cache.clear()
+        assert (await cache.get("k")) is None
+
+    async def test_negative_caching_disabled(self) -> None:
+        cache = VerdictCache(_settings(negative_ttl=0.0))
+        await cache.put_error("k", "boom")
+        assert (await cache.get("k")) is None